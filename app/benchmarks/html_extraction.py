@@ -0,0 +1,91 @@
+"""
+HTML-to-text extraction speed on the AskUs articles.
+
+Compares the previous extraction, which parsed each page with BeautifulSoup,
+serialized the question and answer elements with `str()` and parsed them again
+with html2text, against the single pass `HtmlTextExtractor` used by
+`HtmlDirectoryLoader` now. Each page is converted `ROUNDS` times and the best
+round is reported, with the output size of each method:
+
+    python benchmarks/html_extraction.py
+"""
+
+import os
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from bs4 import BeautifulSoup
+from html2text import HTML2Text
+
+from manoa_agent.parsers.html_text import HtmlTextExtractor
+
+ROUNDS = 3
+IDS = ["kb_article_question", "kb_article_text"]
+
+
+def double_parse(pages):
+    h = HTML2Text()
+    h.ignore_images = True
+    texts = []
+    for html in pages:
+        soup = BeautifulSoup(html, "lxml")
+        texts.append(
+            "\n".join(
+                h.handle(str(element))
+                for element in (soup.find(id=element_id) for element_id in IDS)
+                if element
+            )
+        )
+    return texts
+
+
+def single_pass(pages):
+    extractor = HtmlTextExtractor(ignore_images=True)
+    texts = []
+    for html in pages:
+        root = extractor.parse_tree(html)
+        elements = [extractor.select(root, [element_id]) for element_id in IDS]
+        texts.append(
+            "\n".join(
+                extractor.to_text(element)
+                for element in elements
+                if element is not None
+            )
+        )
+    return texts
+
+
+def best_time(method, pages):
+    best = float("inf")
+    for _ in range(ROUNDS):
+        start = time.perf_counter()
+        texts = method(pages)
+        best = min(best, time.perf_counter() - start)
+    return best, texts
+
+
+def main():
+    paths = sorted(Path("data/askus").glob("*.html"))
+    pages = [path.read_text(encoding="utf-8") for path in paths]
+    print(f"{len(pages)} pages, {sum(map(len, pages)) / 2**20:.1f}MB of HTML")
+    print(f"{'method':<34}{'per page':>12}{'total':>10}{'text':>10}")
+
+    baseline = None
+    for name, method in [
+        ("BeautifulSoup + html2text", double_parse),
+        ("HtmlTextExtractor", single_pass),
+    ]:
+        seconds, texts = best_time(method, pages)
+        baseline = baseline or seconds
+        print(
+            f"{name:<34}{seconds / len(pages) * 1e3:>10.3f}ms{seconds:>9.2f}s"
+            f"{sum(map(len, texts)) / 2**20:>8.2f}MB"
+        )
+    print(f"speedup: {baseline / seconds:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+Query embedding latency and throughput of a local ONNX model.
+
+Embeds the AskUs article questions one at a time, to measure the latency of
+a lone query, and then from `CONCURRENCY` threads at once, with and without
+dynamic batching, to measure throughput under load:
+
+    python benchmarks/onnx_embedding.py models/bge-small
+"""
+
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+import numpy as np
+
+from manoa_agent.embeddings.onnx import OnnxEmbedder
+from manoa_agent.ingest.hypothetical import article_question
+from manoa_agent.loaders.html import HtmlDirectoryLoader
+
+CONCURRENCY = 16
+
+
+def concurrent_run(embedder, queries):
+    start = time.perf_counter()
+    with ThreadPoolExecutor(CONCURRENCY) as executor:
+        list(executor.map(embedder.embed_query, queries))
+    return time.perf_counter() - start
+
+
+def main():
+    model_dir = sys.argv[1]
+    queries = [
+        question
+        for question in map(article_question, HtmlDirectoryLoader("data/askus").load())
+        if question
+    ]
+    print(f"{len(queries)} queries, {CONCURRENCY} threads")
+
+    embedder = OnnxEmbedder(model_dir)
+    embedder.embed_query(queries[0])
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        embedder.embed_query(query)
+        latencies.append(time.perf_counter() - start)
+    print(
+        f"{embedder.model_path}: single query "
+        f"p50 {np.percentile(latencies, 50) * 1e3:.2f}ms, "
+        f"p95 {np.percentile(latencies, 95) * 1e3:.2f}ms"
+    )
+
+    for name, max_batch_size in [("unbatched", 1), ("dynamic batching", 32)]:
+        embedder.batcher.max_batch_size = max_batch_size
+        batches = embedder.batcher.batches
+        seconds = concurrent_run(embedder, queries)
+        print(
+            f"{name:<18}{len(queries) / seconds:>10.1f} queries/s"
+            f"{len(queries) / (embedder.batcher.batches - batches):>8.1f} per batch"
+        )
+    embedder.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+Recall and latency of reduced and quantized embeddings on the AskUs articles.
+
+Every article's question is used as a query, and its own article is the
+expected result. Each configuration is compared against exact search over the
+full 3072 dimension float32 embeddings:
+
+- recall@k: overlap of the top k with the exact top k.
+- hit@k: how often the question's own article is in the top k.
+- latency: mean search time per query, excluding the query embedding.
+- memory: in-memory size of the index.
+
+Embeddings are cached in EMBEDDING_CACHE_PATH, so only the first run calls the
+embeddings API.
+
+    python benchmarks/quantization.py
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+import numpy as np
+from dotenv import load_dotenv
+from openai import OpenAI
+
+from manoa_agent.embeddings.cache import CachedEmbedder
+from manoa_agent.embeddings.convert import from_open_ai
+from manoa_agent.embeddings.quantize import normalize_rows
+from manoa_agent.loaders.html import HtmlDirectoryLoader
+from manoa_agent.retrievers.quantized import QuantizedVectorIndex
+
+K = 5
+MODEL = "text-embedding-3-large"
+CONFIGS = [
+    # (method, dimensions, dtype, rescore_k)
+    ("truncate", 1024, "float16", 0),
+    ("truncate", 1024, "int8", 0),
+    ("truncate", 256, "float16", 0),
+    ("truncate", 256, "int8", 0),
+    ("truncate", 256, "int8", 4 * K),
+    ("pca", 256, "int8", 0),
+    ("pca", 256, "int8", 4 * K),
+    ("truncate", 128, "int8", 8 * K),
+    ("pca", 128, "int8", 8 * K),
+]
+
+
+def main():
+    load_dotenv(override=True)
+    embedder = CachedEmbedder(
+        from_open_ai(OpenAI(), MODEL),
+        os.getenv("EMBEDDING_CACHE_PATH", "data/embedding_cache.sqlite"),
+        namespace=MODEL,
+    )
+
+    documents = list(HtmlDirectoryLoader("data/askus").lazy_load())
+    questions = [doc.page_content.split("\n", 1)[0].strip("# ") for doc in documents]
+
+    doc_embeddings = embedder.embed_documents([doc.page_content for doc in documents])
+    query_embeddings = embedder.embed_documents(questions)
+
+    full = normalize_rows(doc_embeddings)
+    queries = normalize_rows(query_embeddings)
+    exact = np.argsort(-(queries @ full.T), axis=1)[:, :K]
+
+    start = time.perf_counter()
+    for query in queries:
+        np.argsort(-(full @ query))[:K]
+    baseline = (time.perf_counter() - start) / len(queries)
+
+    print(f"{len(documents)} documents, {len(questions)} queries, k={K}")
+    print(f"{'config':<28}{'recall@k':>10}{'hit@k':>8}{'latency':>12}{'memory':>12}")
+    print(
+        f"{'float32 3072 exact':<28}{1:>10.3f}"
+        f"{np.mean([i in row for i, row in enumerate(exact)]):>8.3f}"
+        f"{baseline * 1e3:>10.3f}ms{full.nbytes / 2**20:>10.2f}MB"
+    )
+
+    for method, dimensions, dtype, rescore_k in CONFIGS:
+        index = QuantizedVectorIndex.build(
+            doc_embeddings, documents, dimensions=dimensions, method=method, dtype=dtype
+        )
+        results = []
+        start = time.perf_counter()
+        for query in query_embeddings:
+            results.append([row for row, _ in index.search(query, K, rescore_k)])
+        latency = (time.perf_counter() - start) / len(queries)
+
+        recall = np.mean(
+            [
+                len(set(found) & set(expected)) / K
+                for found, expected in zip(results, exact)
+            ]
+        )
+        hits = np.mean([i in found for i, found in enumerate(results)])
+        name = f"{method} {dimensions} {dtype}"
+        if rescore_k:
+            name += f" +{rescore_k} rescored"
+        print(
+            f"{name:<28}{recall:>10.3f}{hits:>8.3f}"
+            f"{latency * 1e3:>10.3f}ms{index.nbytes / 2**20:>10.2f}MB"
+        )
+
+
+if __name__ == "__main__":
+    main()
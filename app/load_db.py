@@ -5,37 +5,179 @@ sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
 
 from chromadb import HttpClient
 from dotenv import load_dotenv
-from langchain.text_splitter import CharacterTextSplitter
 from langchain_chroma import Chroma
-from openai import OpenAI
 
 from manoa_agent.db.chroma import utils
-from manoa_agent.embeddings.convert import OpenAIEmbeddingAdapter
+from manoa_agent.db.chroma.journal import UploadJournal
+from manoa_agent.db.chroma.migration import EmbedderRegistry, embedding_metadata
+from manoa_agent.db.chroma.versions import CollectionVersions, carry_over
+from manoa_agent.db.docstore import SQLiteDocStore
+from manoa_agent.embeddings import convert
+from manoa_agent.ingest.delta import apply_delta, read_delta
+from manoa_agent.ingest.hypothetical import HypotheticalQuestionIndexer
+from manoa_agent.llm.routing import build_model
 from manoa_agent.loaders.html import HtmlDirectoryLoader
 from manoa_agent.loaders.json_loader import JSONFileLoader
+from manoa_agent.splitters.structure import StructureAwareTextSplitter
 
 load_dotenv(override=True)
 
-embedder = OpenAIEmbeddingAdapter(OpenAI(), "text-embedding-3-large")
+# Collections built with EMBEDDING_DIMENSIONS must be served with the same value.
+embedding_model = os.getenv("EMBEDDING_MODEL", "text-embedding-3-large")
+embedding_dimensions = os.getenv("EMBEDDING_DIMENSIONS")
+embedding_dimensions = int(embedding_dimensions) if embedding_dimensions else None
+embedder = convert.from_spec(embedding_model, embedding_dimensions)
 http_client = HttpClient(host=os.getenv("CHROMA_HOST"), port=os.getenv("CHROMA_PORT"))
-
+# New versions record their embedding model, and are always written with it.
+embedders = EmbedderRegistry(embedder, embedding_model, embedding_dimensions)
+
+# Uploads go to the collection that is being served, unless NEW_VERSION is set:
+# then general_faq is rebuilt into a new version (general_faq-v2, ...) that is
+# only promoted once it is complete, so the server never sees a partial index.
+collection_versions = CollectionVersions(http_client)
+new_version = os.getenv("NEW_VERSION", "0") != "0"
+if new_version:
+    general_collection_name = collection_versions.create(
+        "general_faq",
+        metadata=embedding_metadata(embedding_model, embedding_dimensions),
+    )
+else:
+    general_collection_name = collection_versions.resolve("general_faq")
+
+# A collection that does not exist yet is created with the model recorded, so
+# the server queries it with the model it is written with.
 general_collection = Chroma(
-    collection_name="general_faq",
+    collection_name=general_collection_name,
     client=http_client,
-    embedding_function=embedder,
-    collection_metadata={"hnsw:space": "cosine"},
+    embedding_function=embedders.get_or_create(http_client, general_collection_name),
 )
 
-
-text_splitter = CharacterTextSplitter(
-    separator="\n", chunk_size=8000, chunk_overlap=100
+# Embedding model migration: with SHADOW_EMBEDDING_MODEL set (e.g.
+# "huggingface:dunzhang/stella_en_1.5B_v5"), every chunk is also written to a
+# new, unpromoted version of general_faq embedded with that model. Compare both
+# with `python -m manoa_agent.eval.shadow general_faq <shadow collection>` and
+# promote the shadow version to switch. SHADOW_COLLECTION continues writing to
+# an existing shadow version instead of creating one.
+shadow_collection = None
+shadow_model = os.getenv("SHADOW_EMBEDDING_MODEL")
+if shadow_model:
+    shadow_dimensions = os.getenv("SHADOW_EMBEDDING_DIMENSIONS")
+    shadow_dimensions = int(shadow_dimensions) if shadow_dimensions else None
+    shadow_collection = Chroma(
+        collection_name=os.getenv("SHADOW_COLLECTION")
+        or collection_versions.create(
+            "general_faq", metadata=embedding_metadata(shadow_model, shadow_dimensions)
+        ),
+        client=http_client,
+        embedding_function=convert.from_spec(shadow_model, shadow_dimensions),
+    )
+
+
+# Small chunks split along headings, steps and policy section numbering are
+# embedded for matching. Their parent sections go to a local docstore that the
+# retrievers read from at answer time.
+text_splitter = StructureAwareTextSplitter(
+    chunk_size=1000, chunk_overlap=100, include_parent_content=False
 )
+docstore = SQLiteDocStore(os.getenv("DOCSTORE_PATH", "data/docstore.sqlite"))
+
+# Batches already uploaded by an earlier (possibly failed) run are skipped, so
+# rerunning the script resumes instead of duplicating chunks. Set
+# UPLOAD_RESUME=0 to upload everything again.
+journal = UploadJournal(os.getenv("UPLOAD_JOURNAL_PATH", "data/upload_journal.sqlite"))
+resume = os.getenv("UPLOAD_RESUME", "1") != "0"
 
 faq_loader = HtmlDirectoryLoader("data/askus")
-utils.upload(general_collection, faq_loader, text_splitter, reset=False, batch_size=30)
+utils.upload(
+    general_collection,
+    faq_loader,
+    text_splitter,
+    reset=False,
+    batch_size=30,
+    docstore=docstore,
+    journal=journal,
+    resume=resume,
+    shadow=shadow_collection,
+)
+
+# Paraphrased user questions for every AskUs article, matched question to
+# question at answer time. Only new or changed articles are regenerated.
+questions_collection = Chroma(
+    collection_name="askus_questions",
+    client=http_client,
+    embedding_function=embedder,
+    collection_metadata={"hnsw:space": "cosine"},
+)
+question_indexer = HypotheticalQuestionIndexer(
+    questions_collection,
+    docstore,
+    build_model(os.getenv("LLM_SMALL_MODEL", "gpt-4o-mini")),
+    n_questions=5,
+)
+question_indexer.index(faq_loader.lazy_load())
 
 json_loader = JSONFileLoader("data/json/policies.json")
-utils.upload(general_collection, json_loader, text_splitter, reset=False, batch_size=30)
+utils.upload(
+    general_collection,
+    json_loader,
+    text_splitter,
+    reset=False,
+    batch_size=30,
+    docstore=docstore,
+    journal=journal,
+    resume=resume,
+    shadow=shadow_collection,
+)
+
+# A new version is built from the loaders above, but the served version also
+# holds pages from earlier crawl deltas and the crawler's ChromaPipeline. Their
+# chunks are copied over, and embedded again if the models differ. So are
+# those that the shadow version is missing, embedded with the shadow model.
+served_collection_name = collection_versions.resolve("general_faq")
+if collection_versions.exists(served_collection_name):
+    served_collection = http_client.get_collection(
+        served_collection_name, embedding_function=None
+    )
+    if new_version:
+        same_model = (
+            embedders.for_collection(http_client, served_collection_name)
+            is general_collection.embeddings
+        )
+        carry_over(
+            served_collection,
+            general_collection._collection,
+            None if same_model else general_collection.embeddings,
+        )
+    if shadow_collection is not None:
+        carry_over(
+            served_collection,
+            shadow_collection._collection,
+            shadow_collection.embeddings,
+        )
+
+# Changes from an incremental crawl (`scrapy crawl manoa -s INCREMENTAL_ENABLED=1
+# -O delta.jsonl`): only added, updated and deleted pages are re-embedded. The
+# docstore is shared by every version, so parents still referenced by the
+# served, previous or shadow versions are kept.
+crawl_delta = os.getenv("CRAWL_DELTA")
+if crawl_delta:
+    delta = read_delta(crawl_delta)
+    protect = [general_collection._collection] + [
+        http_client.get_collection(name, embedding_function=None)
+        for name in collection_versions.served()
+    ]
+    if shadow_collection is not None:
+        protect.append(shadow_collection._collection)
+    apply_delta(general_collection, delta, text_splitter, docstore, protect=protect)
+    if shadow_collection is not None:
+        apply_delta(shadow_collection, delta, text_splitter, docstore, protect=protect)
+
+# The previous version stays in Chroma for
+# `python -m manoa_agent.db.chroma.versions rollback general_faq`.
+if new_version:
+    collection_versions.promote("general_faq", general_collection_name)
+if shadow_collection is not None:
+    print(f"Shadow collection: {shadow_collection._collection.name}")
 
 
 # its_faq_collection = Chroma(
@@ -6,11 +6,27 @@ from dotenv import load_dotenv
 # from manoa_agent.retrievers.graphdb import GraphVectorRetriever
 # from neo4j_graphrag.retrievers import VectorRetriever
 from langchain_chroma import Chroma
-from langchain_openai import ChatOpenAI
 from langgraph.graph import END, StateGraph, START
 from openai import OpenAI
 
+from manoa_agent.agent.coalesce import CoalescingRunnable
+from manoa_agent.db.chroma.migration import EmbedderRegistry
+from manoa_agent.db.chroma.versions import CollectionVersions
+from manoa_agent.db.docstore import SQLiteDocStore
 from manoa_agent.embeddings import convert
+from manoa_agent.llm.gateway import LLMGateway
+from manoa_agent.llm.routing import ModelRouter
+from manoa_agent.retrievers.aliased import AliasedRetriever
+from manoa_agent.retrievers.catalog import CatalogIndex, CatalogRetriever
+from manoa_agent.retrievers.course_graph import CourseGraph, CourseGraphRetriever
+from manoa_agent.retrievers.parent import SmallToBigRetriever
+from manoa_agent.retrievers.predefined import PredefinedIndex
+from manoa_agent.retrievers.quantized import QuantizedRetriever, QuantizedVectorIndex
+from manoa_agent.retrievers.shadow import ShadowRetriever
+from manoa_agent.retrievers.speculative import SpeculativeRetriever
+from manoa_agent.server.admission import AdmissionController, AdmissionMiddleware
+from manoa_agent.server.deadline import DeadlineMiddleware
+from manoa_agent.server.ratelimit import ClientRateLimiter, TokenBucket
 
 # from langchain_google_genai import GoogleGenerativeAI
 from manoa_agent.prompts.promp_injection import load
@@ -22,40 +38,57 @@ load_dotenv(override=True)
 #     auth=(os.getenv('NEO4J_USERNAME'), os.getenv('NEO4J_PASSWORD'))
 # )
 
-embedder = convert.from_open_ai(OpenAI(), "text-embedding-3-large")
+# EMBEDDING_MODEL is a model spec (see `convert.from_spec`) and
+# EMBEDDING_DIMENSIONS shortens the stored embeddings (e.g. 256 or 1024). Both
+# must match the values used by load_db.py when the collections were built.
+embedding_model = os.getenv("EMBEDDING_MODEL", "text-embedding-3-large")
+embedding_dimensions = os.getenv("EMBEDDING_DIMENSIONS")
+embedding_dimensions = int(embedding_dimensions) if embedding_dimensions else None
+embedder = convert.from_spec(embedding_model, embedding_dimensions)
+# The prompt injection classifier was trained on full 3072 dimension embeddings,
+# and the predefined questions were embedded with the same model. Both keep
+# calling the OpenAI API when EMBEDDING_MODEL is a local model (e.g. "onnx:..."),
+# which then only embeds the retrieval queries; retrain the classifier and
+# re-embed the predefined questions with the local model to go fully offline.
+full_embedder = convert.from_open_ai(OpenAI(), "text-embedding-3-large")
 http_client = HttpClient(host=os.getenv("CHROMA_HOST"), port=os.getenv("CHROMA_PORT"))
 
-its_faq_collection = Chroma(
-    collection_name="its_faq",
-    client=http_client,
-    embedding_function=embedder,
-    collection_metadata={"hnsw:space": "cosine"},
-)
-
-policies_collection = Chroma(
-    collection_name="uh_policies",
-    client=http_client,
-    embedding_function=embedder,
-    collection_metadata={"hnsw:space": "cosine"},
-)
-
-general_collection = Chroma(
-    collection_name="general_faq",
-    client=http_client,
-    embedding_function=embedder,
-    collection_metadata={"hnsw:space": "cosine"},
-)
-
+# The collections are re-indexed into new versions (general_faq-v2, ...) that
+# are promoted with `python -m manoa_agent.db.chroma.versions`. The retrievers
+# follow their alias, so a promotion or rollback needs no restart. Each version
+# is queried with the embedding model recorded in its metadata, so promoting a
+# version built with a new model switches models too.
+collection_versions = CollectionVersions(http_client)
+embedders = EmbedderRegistry(embedder, embedding_model, embedding_dimensions)
+
+
+def collection_retriever(alias: str, **kwargs) -> AliasedRetriever:
+    return AliasedRetriever(
+        versions=collection_versions,
+        alias=alias,
+        build=lambda name: Chroma(
+            collection_name=name,
+            client=http_client,
+            embedding_function=embedders.for_collection(http_client, name),
+            collection_metadata={"hnsw:space": "cosine"},
+        ).as_retriever(**kwargs),
+    )
+
+
+# The predefined questions were embedded with the full text-embedding-3-large
+# model, whatever EMBEDDING_MODEL the other collections use.
 predefined_collection = Chroma(
     collection_name="predefined",
     client=http_client,
-    embedding_function=embedder,
+    embedding_function=full_embedder,
     collection_metadata={"hnsw:space": "cosine"},
 )
 
-faq_retriever = its_faq_collection.as_retriever(
+faq_retriever = collection_retriever(
+    "its_faq",
     search_type="similarity",
-    search_kwargs={"k": 2},
+    # Several small chunks may share a parent; AgentNode keeps the top two.
+    search_kwargs={"k": 4},
     # search_type="similarity_score_threshold", search_kwargs={"score_threshold": 0.5}
 )
 
@@ -64,18 +97,53 @@ faq_retriever = its_faq_collection.as_retriever(
 #     search_type="similarity_score_threshold", search_kwargs={"score_threshold": 0.5}
 # )
 
-policies_retriever = policies_collection.as_retriever(
-    search_type="similarity_score_threshold", search_kwargs={"score_threshold": 0.5}
+policies_retriever = collection_retriever(
+    "uh_policies",
+    search_type="similarity_score_threshold",
+    search_kwargs={"score_threshold": 0.5},
 )
 
-general_retriever = general_collection.as_retriever(
+general_retriever = collection_retriever(
+    "general_faq",
     search_type="similarity",
-    search_kwargs={"k": 2},
+    # Several small chunks may share a parent; AgentNode keeps the top two.
+    search_kwargs={"k": 4},
     # search_type="similarity_score_threshold", search_kwargs={"score_threshold": 0.5}
 )
 
-predefined_retriever = predefined_collection.as_retriever(
-    search_type="similarity_score_threshold", search_kwargs={"score_threshold": 0.95}
+# With QUANTIZED_INDEX set, general queries are answered from an in-process
+# int8 index (built with `python -m manoa_agent.retrievers.quantized general_faq
+# <directory>`) instead of a Chroma query. The index is a snapshot of the
+# version it was built from; rebuild it after promoting a new one.
+quantized_index = os.getenv("QUANTIZED_INDEX")
+if quantized_index:
+    quantized = QuantizedVectorIndex.load(quantized_index)
+    general_retriever = QuantizedRetriever(
+        index=quantized,
+        embedder=embedders.for_collection(
+            http_client, quantized.collection or "general_faq"
+        ),
+        k=4,
+    )
+
+# A sample of the general queries is replayed against SHADOW_COLLECTION (the
+# chunks embedded with a candidate model by load_db.py) in the background; its
+# latency and agreement with the served results are logged, answers are not
+# affected.
+shadow_collection = os.getenv("SHADOW_COLLECTION")
+if shadow_collection:
+    general_retriever = ShadowRetriever(
+        retriever=general_retriever,
+        shadow=Chroma(
+            collection_name=shadow_collection,
+            client=http_client,
+            embedding_function=embedders.for_collection(http_client, shadow_collection),
+        ).as_retriever(search_type="similarity", search_kwargs={"k": 4}),
+        sample_rate=float(os.getenv("SHADOW_SAMPLE_RATE", "0.1")),
+    )
+
+predefined_index = PredefinedIndex(
+    predefined_collection, full_embedder, score_threshold=0.95
 )
 
 # vector_retriever = VectorRetriever(
@@ -93,14 +161,89 @@ retrievers = {
     "general": general_retriever,
 }
 
-llm = ChatOpenAI(model="gpt-4o")
+# Match small chunks, answer from their parent sections in the local docstore
+# written by load_db.py.
+docstore_path = os.getenv("DOCSTORE_PATH", "data/docstore.sqlite")
+if os.path.exists(docstore_path):
+    docstore = SQLiteDocStore(docstore_path)
+    retrievers = {
+        name: SmallToBigRetriever(child_retriever=retriever, docstore=docstore)
+        for name, retriever in retrievers.items()
+    }
+
+    # AskUs questions are matched against paraphrased questions written for
+    # every article by load_db.py, which are closer to user wording than the
+    # article text, so fewer candidates are needed.
+    if os.getenv("HYPOTHETICAL_QUESTIONS", "false").lower() == "true":
+        questions_collection = Chroma(
+            collection_name="askus_questions",
+            client=http_client,
+            embedding_function=embedder,
+            collection_metadata={"hnsw:space": "cosine"},
+        )
+        retrievers["askus"] = SmallToBigRetriever(
+            child_retriever=questions_collection.as_retriever(
+                search_type="similarity", search_kwargs={"k": 6}
+            ),
+            docstore=docstore,
+            max_parents=2,
+        )
+
+# Prerequisite chains, cross-listings and subject course lists, answered from
+# the course catalog held in memory.
+course_graphml = "data/course-data/all-courses.graphml"
+course_catalog = "data/course-data/catalog.json"
+course_retriever = None
+if os.path.exists(course_graphml) and os.path.exists(course_catalog):
+    course_graph = CourseGraph.load(course_graphml, course_catalog)
+    course_retriever = CourseGraphRetriever(graph=course_graph)
+    retrievers["courses"] = course_retriever
+
+# Questions naming a course ("what is ICS 311", "how many credits is ARCH 686")
+# with the default or courses retriever selected, or naming a course title with
+# the courses retriever, skip embedding and vector search and are answered from
+# the catalog index.
+catalog_index = None
+if os.path.exists(course_catalog):
+    catalog_index = CatalogIndex.from_json(course_catalog)
+    catalog_retriever = CatalogRetriever(
+        index=catalog_index, graph_retriever=course_retriever
+    )
+
+# Retrieve for the raw message while GeneralAgentNode decides whether
+# retrieval is needed, and reuse the results if the reformulated question is
+# close enough to the raw one.
+speculative_retrieval = os.getenv("SPECULATIVE_RETRIEVAL", "false").lower() == "true"
+speculator = SpeculativeRetriever(embedder, retrievers, similarity_threshold=0.9)
+
+# Small model for gating and reformulation, large model for grounded answers.
+# Set LLM_MODEL_<NODE>=ollama:<model> to run a node on a local Ollama model.
+router = ModelRouter.from_env(
+    max_connections=int(os.getenv("LLM_MAX_CONNECTIONS", "32"))
+)
 # llm = ChatOllama(model=os.getenv("OLLAMA_MODEL"), base_url=os.getenv("OLLAMA_HOST"))
 # llm = ChatOpenAI(model="gemini-2.0-flash", api_key=os.getenv("GEMINI_API_KEY"), base_url=os.getenv("GEMINI_BASE_URL"))
 # llm = GoogleGenerativeAI(model="gemini-2.0-flash", api_key=os.getenv("GEMINI_API_KEY"))
 
+# Upstream LLM calls per second shared by every node, so request spikes are
+# smoothed out instead of cascading into 429s from the provider. This budgets
+# requests, not LLM tokens: the provider's tokens-per-minute limit is not
+# enforced here.
+upstream_call_budget = TokenBucket(
+    rate=float(os.getenv("UPSTREAM_CALLS_PER_SECOND", "10")),
+    capacity=float(os.getenv("UPSTREAM_CALL_BURST", "20")),
+)
+
+gateway = LLMGateway(
+    budget=upstream_call_budget,
+    timeouts={"reformulate": 10, "general_agent": 10, "rag_agent": 30},
+    max_retries=int(os.getenv("LLM_MAX_RETRIES", "2")),
+    hedge=os.getenv("LLM_HEDGE", "false").lower() == "true",
+)
 
 prompt_injection_classifier = load(
-    embedder=embedder, load_path="data/prompt_injection_model/injection_model.joblib"
+    embedder=full_embedder,
+    load_path="data/prompt_injection_model/injection_model.joblib",
 )
 
 from manoa_agent.agent.nodes import *
@@ -130,9 +273,28 @@ def prompt_injection_condition(state: PromptInjectionState):
         return "prompt_injection"
     else:
         logger.info("prompt_injection_condition: state is safe")
+        if speculative_retrieval:
+            return ["safe", "speculate"]
         return "safe"
 
 
+def course_lookup_condition(state: ReformulateState):
+    question = state["reformulated"]
+    # A user who picked the AskUs or policies sources wants those searched,
+    # even for a question that mentions a course code.
+    if state["retriever"] not in ("default", "courses"):
+        return "get_documents"
+    if catalog_index.detect(question):
+        logger.info("course_lookup_condition: question names a catalog course")
+        return "course_lookup"
+    # Titles are only matched for course questions; on other questions a
+    # word like "calculus" would skip the vector search.
+    if state["retriever"] == "courses" and catalog_index.search_titles(question, k=1):
+        logger.info("course_lookup_condition: question names a course title")
+        return "course_lookup"
+    return "get_documents"
+
+
 def rag_agent_condition(state: GeneralAgentState):
     if state["should_call_rag"]:
         return "rag_agent"
@@ -142,22 +304,57 @@ def rag_agent_condition(state: GeneralAgentState):
 
 workflow = StateGraph(AgentState, output=AgentOutputState)
 
-workflow.add_node("predefined", PredefinedNode(retriever=predefined_retriever))
+workflow.add_node("predefined", PredefinedNode(index=predefined_index))
 workflow.add_node("prompt_injection", PromptInjectionNode(prompt_injection_classifier))
-workflow.add_node("reformulate", ReformulateNode(llm=llm))
-workflow.add_node("get_documents", DocumentsNode(retrievers=retrievers))
-workflow.add_node("rag_agent", AgentNode(llm=llm))
-workflow.add_node("general_agent", GeneralAgentNode(llm=llm))
+workflow.add_node(
+    "reformulate",
+    ReformulateNode(
+        llm=router.model("reformulate"),
+        gateway=gateway,
+        fallback_llm=router.fallback("reformulate"),
+    ),
+)
+workflow.add_node(
+    "get_documents", DocumentsNode(retrievers=retrievers, speculator=speculator)
+)
+workflow.add_node("speculate", SpeculativeDocumentsNode(speculator))
+if catalog_index is not None:
+    workflow.add_node("course_lookup", CourseLookupNode(catalog_retriever))
+workflow.add_node(
+    "rag_agent",
+    AgentNode(
+        llm=router.model("rag_agent"),
+        gateway=gateway,
+        expand_to_parent=os.getenv("EXPAND_TO_PARENT", "true").lower() == "true",
+    ),
+)
+workflow.add_node(
+    "general_agent",
+    GeneralAgentNode(
+        llm=router.model("general_agent"),
+        gateway=gateway,
+        fallback_llm=router.fallback("general_agent"),
+    ),
+)
 
 workflow.add_edge(START, "predefined")
-workflow.add_edge("reformulate", "get_documents")
+if catalog_index is not None:
+    workflow.add_conditional_edges(
+        "reformulate",
+        course_lookup_condition,
+        {"course_lookup": "course_lookup", "get_documents": "get_documents"},
+    )
+    workflow.add_edge("course_lookup", "rag_agent")
+else:
+    workflow.add_edge("reformulate", "get_documents")
 workflow.add_edge("get_documents", "rag_agent")
 workflow.add_edge("rag_agent", END)
+workflow.add_edge("speculate", END)
 
 workflow.add_conditional_edges(
     "prompt_injection",
     prompt_injection_condition,
-    {"prompt_injection": END, "safe": "general_agent"},
+    {"prompt_injection": END, "safe": "general_agent", "speculate": "speculate"},
 )
 workflow.add_conditional_edges(
     "predefined",
@@ -168,7 +365,8 @@ workflow.add_conditional_edges(
     "general_agent", rag_agent_condition, {"rag_agent": "reformulate", "answered": END}
 )
 
-agent = workflow.compile()
+# Concurrent requests asking the same first question share one graph run.
+agent = CoalescingRunnable(workflow.compile())
 logger.info("Workflow compiled successfully")
 
 from fastapi import FastAPI
@@ -181,6 +379,29 @@ app = FastAPI(
     description="A simple api server using Langchain's Runnable interfaces",
 )
 
+app.add_middleware(
+    DeadlineMiddleware,
+    seconds=float(os.getenv("ASKUS_REQUEST_DEADLINE", "45")),
+    path_prefix="/askus",
+)
+
+app.add_middleware(
+    AdmissionMiddleware,
+    controller=AdmissionController(
+        max_concurrency=int(os.getenv("ASKUS_MAX_CONCURRENCY", "16")),
+        max_queue=int(os.getenv("ASKUS_MAX_QUEUE", "64")),
+        queue_timeout=float(os.getenv("ASKUS_QUEUE_TIMEOUT", "10")),
+    ),
+    limiter=ClientRateLimiter(
+        rate=float(os.getenv("ASKUS_CLIENT_RATE", "1")),
+        capacity=float(os.getenv("ASKUS_CLIENT_BURST", "10")),
+    ),
+    path_prefix="/askus",
+    # Only these peers (the web frontend's server) may identify the client
+    # with x-client-id or x-forwarded-for.
+    trusted_proxies=os.getenv("ASKUS_TRUSTED_PROXIES", "127.0.0.1,::1"),
+)
+
 origins = ["*"]
 
 app.add_middleware(
@@ -0,0 +1,214 @@
+import asyncio
+import copy
+import logging
+import threading
+from concurrent.futures import Future
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, TypeVar
+
+from langchain_core.runnables import Runnable, RunnableConfig
+
+from manoa_agent.parsers.normalize import normalize_question
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls that share the same key.
+
+    The first caller for a key (the leader) runs the computation. Callers that
+    arrive with the same key while the leader is still running wait for the
+    leader and receive a copy of its result (or its exception) instead of
+    starting their own computation. Once the leader finishes the key is
+    released, so results are never cached beyond the lifetime of the in-flight
+    call.
+
+    A key of None always runs the computation without coalescing.
+    """
+
+    def __init__(self, name: str = "single_flight"):
+        self.name = name
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, Future] = {}
+        self._async_calls: Dict[Hashable, dict] = {}
+
+    def do(self, key: Optional[Hashable], fn: Callable[[], T]) -> T:
+        """
+        Run `fn` once for all concurrent callers with the same key.
+
+        Args:
+            key: The coalescing key, or None to disable coalescing.
+            fn: The computation to run.
+
+        Returns:
+            The result of the (possibly shared) computation.
+        """
+        if key is None:
+            return fn()
+
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._calls[key] = future
+
+        if not leader:
+            logger.info(f"{self.name}: joining in-flight call")
+            return copy.deepcopy(future.result())
+
+        try:
+            result = fn()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+
+    async def ado(self, key: Optional[Hashable], fn: Callable[[], Awaitable[T]]) -> T:
+        """
+        Async version of `do`. Coalescing applies to callers on the same event
+        loop.
+
+        The computation runs as a task shared by every caller with the key, so
+        a caller that is cancelled (e.g. a client disconnecting) leaves it
+        running for the others. It is only cancelled once every caller is gone.
+
+        Args:
+            key: The coalescing key, or None to disable coalescing.
+            fn: A coroutine function running the computation.
+
+        Returns:
+            The result of the (possibly shared) computation.
+        """
+        if key is None:
+            return await fn()
+
+        with self._lock:
+            call = self._async_calls.get(key)
+            leader = call is None
+            if leader:
+                call = {"task": asyncio.ensure_future(fn()), "waiters": 0}
+                self._async_calls[key] = call
+                call["task"].add_done_callback(
+                    lambda task: self._release_async(key, call)
+                )
+            call["waiters"] += 1
+
+        if not leader:
+            logger.info(f"{self.name}: joining in-flight call")
+        try:
+            result = await asyncio.shield(call["task"])
+        except asyncio.CancelledError:
+            with self._lock:
+                call["waiters"] -= 1
+                abandoned = call["waiters"] == 0
+            if abandoned:
+                call["task"].cancel()
+            raise
+        except BaseException:
+            with self._lock:
+                call["waiters"] -= 1
+            raise
+        with self._lock:
+            call["waiters"] -= 1
+        return result if leader else copy.deepcopy(result)
+
+    def _release_async(self, key: Hashable, call: dict) -> None:
+        with self._lock:
+            if self._async_calls.get(key) is call:
+                del self._async_calls[key]
+        if not call["task"].cancelled():
+            # Mark the exception as retrieved in case nobody else was waiting.
+            call["task"].exception()
+
+
+def _message_content(message: Any) -> Optional[str]:
+    if isinstance(message, dict):
+        return message.get("content")
+    if isinstance(message, (tuple, list)) and len(message) == 2:
+        return message[1]
+    return getattr(message, "content", None)
+
+
+def question_key(input: Any) -> Optional[Hashable]:
+    """
+    Build the coalescing key for a graph input.
+
+    Only conversations without history are coalesced, since the answer to a
+    follow-up question depends on everything said before it.
+
+    Args:
+        input: The graph input with "messages" and "retriever" keys.
+
+    Returns:
+        Optional[Hashable]: The key, or None if the input must not be coalesced.
+    """
+    if not isinstance(input, dict):
+        return None
+    messages = input.get("messages") or []
+    if len(messages) != 1:
+        return None
+    content = _message_content(messages[0])
+    if not isinstance(content, str):
+        return None
+    return (normalize_question(content), input.get("retriever"))
+
+
+class CoalescingRunnable(Runnable):
+    """
+    Wraps the compiled agent graph so that concurrent requests asking the same
+    question without chat history share a single graph execution.
+
+    Schemas are delegated to the wrapped runnable, so it can be served with
+    langserve in place of the graph itself.
+
+    Only `invoke` and `ainvoke` are coalesced, which also covers the default
+    `batch` and `abatch` built on them. `stream` and `astream` use the
+    `Runnable` defaults: they run `invoke`/`ainvoke` and yield the final output
+    once.
+    """
+
+    def __init__(self, runnable: Runnable, flight: Optional[SingleFlight] = None):
+        self.runnable = runnable
+        self.flight = flight or SingleFlight("graph")
+        self.name = runnable.get_name()
+
+    @property
+    def InputType(self):
+        return self.runnable.InputType
+
+    @property
+    def OutputType(self):
+        return self.runnable.OutputType
+
+    @property
+    def config_specs(self):
+        return self.runnable.config_specs
+
+    def get_input_schema(self, config: Optional[RunnableConfig] = None):
+        return self.runnable.get_input_schema(config)
+
+    def get_output_schema(self, config: Optional[RunnableConfig] = None):
+        return self.runnable.get_output_schema(config)
+
+    def get_graph(self, config: Optional[RunnableConfig] = None):
+        return self.runnable.get_graph(config)
+
+    def invoke(self, input, config: Optional[RunnableConfig] = None, **kwargs):
+        return self.flight.do(
+            question_key(input),
+            lambda: self.runnable.invoke(input, config, **kwargs),
+        )
+
+    async def ainvoke(self, input, config: Optional[RunnableConfig] = None, **kwargs):
+        return await self.flight.ado(
+            question_key(input),
+            lambda: self.runnable.ainvoke(input, config, **kwargs),
+        )
@@ -6,34 +6,39 @@ from langchain_core.language_models import BaseChatModel
 from langchain_core.messages import AIMessage
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 from langchain_core.retrievers import BaseRetriever
-from langchain_core.vectorstores import VectorStoreRetriever
 from pydantic import BaseModel
 
+from manoa_agent.agent.coalesce import SingleFlight
 from manoa_agent.agent.states import *
+from manoa_agent.llm.gateway import LLMGateway
+from manoa_agent.llm.routing import invoke_with_fallback, is_reformulation
+from manoa_agent.parsers.normalize import normalize_question
 from manoa_agent.prompts.promp_injection import PromptInjectionClassifier
+from manoa_agent.retrievers.catalog import CatalogRetriever
+from manoa_agent.retrievers.predefined import PredefinedIndex
+from manoa_agent.retrievers.speculative import SpeculativeRetriever
+from manoa_agent.splitters.structure import expand_to_parents
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
 class PredefinedNode:
-    def __init__(self, retriever: VectorStoreRetriever):
-        self.retriever = retriever
+    def __init__(self, index: PredefinedIndex):
+        self.index = index
 
     def __call__(self, state: PredefinedState) -> PredefinedState:
         logger.info("Entering PredefinedNode.__call__")
         message = state["messages"][-1].content
-        docs = self.retriever.invoke(message)
-
-        for doc in docs:
-            predefined = doc.metadata.get("predefined", "")
-            if predefined:
-                logger.info(f"Message '{message}' is predefined to: {predefined}")
-                return {
-                    "is_predefined": True,
-                    "message": AIMessage(content=predefined),
-                    "sources": [],
-                }
+        predefined = self.index.lookup(message)
+
+        if predefined:
+            logger.info(f"Message '{message}' is predefined to: {predefined}")
+            return {
+                "is_predefined": True,
+                "message": AIMessage(content=predefined),
+                "sources": [],
+            }
 
         logger.info(f"Message: '{message}' is not predefined")
         return {"is_predefined": False}
@@ -61,8 +66,15 @@ class PromptInjectionNode:
 
 
 class ReformulateNode:
-    def __init__(self, llm: BaseChatModel):
+    def __init__(
+        self,
+        llm: BaseChatModel,
+        gateway: Optional[LLMGateway] = None,
+        fallback_llm: Optional[BaseChatModel] = None,
+    ):
         self.llm = llm
+        self.gateway = gateway or LLMGateway()
+        self.fallback_llm = fallback_llm
 
     def __call__(self, state: AgentState) -> ReformulateState:
         logger.info("Entering ReformulateNode.__call__")
@@ -87,29 +99,76 @@ class ReformulateNode:
             ]
         )
 
-        chain = contextualize_q_prompt | self.llm
-        reformulated = chain.invoke({"chat_history": state["messages"]}).content
+        question = state["messages"][-1].content
+        reformulated = invoke_with_fallback(
+            self.gateway,
+            "reformulate",
+            lambda llm: contextualize_q_prompt | llm,
+            self.llm,
+            self.fallback_llm,
+            {"chat_history": state["messages"]},
+            lambda response: is_reformulation(response, question),
+        ).content
         logger.info(f"Reformulating message to :'{reformulated}'")
         return {"reformulated": reformulated}
 
 
+class SpeculativeDocumentsNode:
+    def __init__(self, speculator: SpeculativeRetriever):
+        self.speculator = speculator
+
+    def __call__(self, state: SpeculativeState) -> SpeculativeState:
+        logger.info("Entering SpeculativeDocumentsNode.__call__")
+        message = state["messages"][-1].content
+        return {"speculation": self.speculator.speculate(message, state["retriever"])}
+
+
 class DocumentsNode:
-    def __init__(self, retrievers: Dict[str, BaseRetriever]):
+    def __init__(
+        self,
+        retrievers: Dict[str, BaseRetriever],
+        speculator: Optional[SpeculativeRetriever] = None,
+    ):
         self.retrievers = retrievers
+        self.speculator = speculator
 
-    def __call__(self, state: ReformulateState) -> DocumentsState:
+    def __call__(self, state: SpeculativeReformulateState) -> DocumentsState:
         logger.info("Entering DocumentsNode.__call__")
         logger.info("Get Documents Node called")
         retriever = self.retrievers.get(state["retriever"], None)
         if not retriever:
             return {"relevant_docs": []}
 
+        speculation = state.get("speculation")
+        if self.speculator and speculation:
+            return {
+                "relevant_docs": self.speculator.resolve(
+                    speculation, state["reformulated"], retriever
+                )
+            }
+
         return {"relevant_docs": retriever.invoke(state["reformulated"])}
 
 
+class CourseLookupNode:
+    def __init__(self, retriever: CatalogRetriever):
+        self.retriever = retriever
+
+    def __call__(self, state: ReformulateState) -> DocumentsState:
+        logger.info("Entering CourseLookupNode.__call__")
+        return {"relevant_docs": self.retriever.invoke(state["reformulated"])}
+
+
 class GeneralAgentNode:
-    def __init__(self, llm: BaseChatModel):
+    def __init__(
+        self,
+        llm: BaseChatModel,
+        gateway: Optional[LLMGateway] = None,
+        fallback_llm: Optional[BaseChatModel] = None,
+    ):
         self.llm = llm
+        self.gateway = gateway or LLMGateway()
+        self.fallback_llm = fallback_llm
 
     def __call__(self, state: GeneralAgentState) -> GeneralAgentState:
         class SystemAnswer(BaseModel):
@@ -131,12 +190,17 @@ class GeneralAgentNode:
             ]
         )
 
-        chain_general = general_prompt | self.llm.with_structured_output(SystemAnswer)
-        result = chain_general.invoke(
+        result = invoke_with_fallback(
+            self.gateway,
+            "general_agent",
+            lambda llm: general_prompt | llm.with_structured_output(SystemAnswer),
+            self.llm,
+            self.fallback_llm,
             {
                 "chat_history": state["messages"],
                 # "input": state["reformulated"]
-            }
+            },
+            lambda result: isinstance(result, SystemAnswer),
         )
         logger.info(f"System prompt chain returned: {result}")
 
@@ -151,11 +215,22 @@ class GeneralAgentNode:
 
 
 class AgentNode:
-    def __init__(self, llm: BaseChatModel):
+    def __init__(
+        self,
+        llm: BaseChatModel,
+        flight: Optional[SingleFlight] = None,
+        gateway: Optional[LLMGateway] = None,
+        expand_to_parent: bool = False,
+    ):
         self.llm = llm
+        self.flight = flight or SingleFlight("rag_agent")
+        self.gateway = gateway or LLMGateway()
+        self.expand_to_parent = expand_to_parent
 
     def __call__(self, state: DocumentsState) -> DocumentsState:
         relevant_docs = state["relevant_docs"]
+        if self.expand_to_parent:
+            relevant_docs = expand_to_parents(relevant_docs)
         if len(relevant_docs) > 2:
             relevant_docs = relevant_docs[:2]
         sources = [
@@ -187,12 +262,24 @@ Do not mention the context in your response.""",
                 ]
             )
             chain_docs = qa_prompt | self.llm
-            response = chain_docs.invoke(
-                {
-                    "chat_history": state["messages"],
-                    "context": context,
-                    "input": state["reformulated"],
-                }
+
+            # Identical questions without history over the same context get
+            # the same answer, so concurrent ones share a single LLM call.
+            key = None
+            if len(state["messages"]) == 1:
+                key = (normalize_question(state["reformulated"]), context)
+
+            response = self.flight.do(
+                key,
+                lambda: self.gateway.invoke(
+                    "rag_agent",
+                    chain_docs,
+                    {
+                        "chat_history": state["messages"],
+                        "context": context,
+                        "input": state["reformulated"],
+                    },
+                ),
             )
             logger.info(
                 "Documents chain returned an answer from the relevant documents."
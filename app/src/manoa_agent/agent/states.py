@@ -1,4 +1,4 @@
-from typing import Sequence, TypedDict, List
+from typing import List, Optional, Sequence, TypedDict
 
 from langchain.schema import BaseMessage, Document
 from langgraph.graph import MessagesState
@@ -31,3 +31,11 @@ class DocumentsState(AgentState, AgentOutputState, ReformulateState):
 
 class GeneralAgentState(ReformulateState):
     should_call_rag: bool
+
+
+class SpeculativeState(AgentState):
+    speculation: Optional[dict]
+
+
+class SpeculativeReformulateState(ReformulateState, SpeculativeState):
+    pass
@@ -0,0 +1,87 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from typing import Sequence
+
+from langchain_core.documents import Document
+
+
+def batch_hash(docs: Sequence[Document]) -> str:
+    """
+    Content hash of a group of documents (in `utils.upload`, the chunks of one
+    source): their text and metadata, in order.
+    """
+    digest = hashlib.sha256()
+    for doc in docs:
+        digest.update(
+            json.dumps(
+                [doc.page_content, doc.metadata], sort_keys=True, ensure_ascii=False
+            ).encode("utf-8")
+        )
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class UploadJournal:
+    """
+    Journal of the document groups committed to each collection, by content
+    hash, persisted in a SQLite file.
+
+    `utils.upload` records a source once Chroma has accepted all its chunks,
+    so a failed run can be resumed, and a rerun only uploads the sources
+    whose content changed.
+    """
+
+    def __init__(self, path: str):
+        """
+        Args:
+            path: Path of the SQLite journal file.
+        """
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS batches (collection TEXT NOT NULL, "
+            "batch TEXT NOT NULL, documents INTEGER NOT NULL, committed REAL, "
+            "PRIMARY KEY (collection, batch))"
+        )
+        self._conn.commit()
+
+    def is_committed(self, collection: str, batch: str) -> bool:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT 1 FROM batches WHERE collection = ? AND batch = ?",
+                (collection, batch),
+            ).fetchone()
+        return row is not None
+
+    def commit(self, collection: str, batch: str, documents: int) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO batches "
+                "(collection, batch, documents, committed) VALUES (?, ?, ?, ?)",
+                (collection, batch, documents, time.time()),
+            )
+            self._conn.commit()
+
+    def clear(self, collection: str) -> None:
+        """
+        Forget the committed batches of a collection.
+        """
+        with self._lock:
+            self._conn.execute(
+                "DELETE FROM batches WHERE collection = ?", (collection,)
+            )
+            self._conn.commit()
+
+    def committed_documents(self, collection: str) -> int:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT COALESCE(SUM(documents), 0) FROM batches WHERE collection = ?",
+                (collection,),
+            ).fetchone()
+        return row[0]
+
+    def close(self) -> None:
+        self._conn.close()
@@ -0,0 +1,143 @@
+"""
+Embedding models of Chroma collections.
+
+Every collection version records the embedding model it was built with in its
+metadata, so collections built with different models can live side by side
+(e.g. while migrating to a new model with `utils.upload(..., shadow=...)`)
+and each is queried with the right embedder, also after a promotion.
+"""
+
+import threading
+from typing import Callable, Dict, Optional, Tuple
+
+from chromadb.errors import ChromaError
+
+from manoa_agent.embeddings import convert
+from manoa_agent.embeddings.base import Embedder
+
+MODEL_KEY = "embedding_model"
+DIMENSIONS_KEY = "embedding_dimensions"
+# The model of the collections built before models were recorded.
+LEGACY_MODEL = "text-embedding-3-large"
+
+
+def embedding_metadata(spec: str, dimensions: Optional[int] = None) -> dict:
+    """
+    Collection metadata for a collection embedded with a model.
+
+    Args:
+        spec: The model spec, see `convert.from_spec`.
+        dimensions: The shortened embedding size, if any.
+
+    Returns:
+        dict: Cosine distance and the embedding model.
+    """
+    metadata = {"hnsw:space": "cosine", MODEL_KEY: spec}
+    if dimensions:
+        metadata[DIMENSIONS_KEY] = int(dimensions)
+    return metadata
+
+
+def collection_model(metadata: Optional[dict]) -> Tuple[Optional[str], Optional[int]]:
+    """
+    The model spec and dimensions recorded in collection metadata, or None
+    for collections built before models were recorded.
+    """
+    metadata = metadata or {}
+    return metadata.get(MODEL_KEY), metadata.get(DIMENSIONS_KEY)
+
+
+class EmbedderRegistry:
+    """
+    Embedders by model, built once and shared by every collection using the
+    same model.
+    """
+
+    def __init__(
+        self,
+        default: Embedder,
+        spec: str,
+        dimensions: Optional[int] = None,
+        factory: Callable[[str, Optional[int]], Embedder] = convert.from_spec,
+    ):
+        """
+        Args:
+            default: The embedder of the served model.
+            spec: The model spec of `default`.
+            dimensions: The dimensions of `default`.
+            factory: Builds the embedders of other models.
+        """
+        self.factory = factory
+        self._lock = threading.Lock()
+        self._embedders: Dict[Tuple[str, Optional[int]], Embedder] = {
+            (spec, dimensions or None): default
+        }
+        self.default = default
+        self.spec = spec
+        self.dimensions = dimensions or None
+
+    def get(self, spec: Optional[str], dimensions: Optional[int] = None) -> Embedder:
+        """
+        The embedder of a model. Collections without a recorded model
+        (`spec` None) were built with `LEGACY_MODEL`, whatever model is
+        served now.
+        """
+        if spec is None:
+            spec, dimensions = LEGACY_MODEL, None
+        key = (spec, dimensions or None)
+        with self._lock:
+            if key not in self._embedders:
+                self._embedders[key] = self.factory(spec, dimensions)
+            return self._embedders[key]
+
+    def for_collection(self, client, name: str) -> Embedder:
+        """
+        The embedder for a collection, from the model in its metadata. A
+        collection that does not exist yet gets the default embedder.
+
+        Args:
+            client: The chromadb client.
+            name: The collection name.
+        """
+        try:
+            collection = client.get_collection(name, embedding_function=None)
+        except (ChromaError, ValueError) as e:
+            if not _is_not_found(e):
+                raise
+            return self.default
+        return self.get(*collection_model(collection.metadata))
+
+    def get_or_create(self, client, name: str) -> Embedder:
+        """
+        The embedder for a collection that is about to be written. A missing
+        collection is created with the default model recorded in its
+        metadata, and so is an empty collection without a recorded model, so
+        `for_collection` later queries it with the model it was written with.
+
+        Args:
+            client: The chromadb client.
+            name: The collection name.
+        """
+        metadata = embedding_metadata(self.spec, self.dimensions)
+        try:
+            collection = client.get_collection(name, embedding_function=None)
+        except (ChromaError, ValueError) as e:
+            if not _is_not_found(e):
+                raise
+            client.get_or_create_collection(
+                name, metadata=metadata, embedding_function=None
+            )
+            return self.default
+        spec, dimensions = collection_model(collection.metadata)
+        if spec is None and not collection.count():
+            # Created before models were recorded but never written: record
+            # the default model instead of taking it for a legacy collection.
+            client.delete_collection(name)
+            client.create_collection(name, metadata=metadata, embedding_function=None)
+            return self.default
+        return self.get(spec, dimensions)
+
+
+def _is_not_found(error: Exception) -> bool:
+    # A NotFoundError in newer chromadb versions, a ValueError in older ones.
+    return type(error).__name__ == "NotFoundError" or "does not exist" in str(error)
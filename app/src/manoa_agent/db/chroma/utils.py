@@ -1,8 +1,121 @@
+import hashlib
+import logging
+import random
+import time
+from typing import Tuple, Type
+
+import httpx
+import openai
+import requests
 from langchain.text_splitter import TextSplitter
 from langchain_chroma import Chroma
 from langchain_core.document_loaders import BaseLoader
+from langchain_core.documents import Document
+from langchain_core.stores import BaseStore
 from tqdm import tqdm  # progress bar
 
+from manoa_agent.db.chroma.journal import UploadJournal, batch_hash
+
+logger = logging.getLogger(__name__)
+
+# Failures worth retrying: rate limits, server errors and unreachable servers
+# of the embeddings API, and a Chroma server that is restarting (its client
+# uses requests in older and httpx in newer chromadb versions). Anything else,
+# e.g. a bad request or a dimension mismatch, fails the same way on a retry.
+TRANSIENT_ERRORS: Tuple[Type[BaseException], ...] = (
+    openai.RateLimitError,
+    openai.APIConnectionError,
+    openai.InternalServerError,
+    requests.exceptions.ConnectionError,
+    httpx.TransportError,
+    ConnectionError,
+)
+
+
+def upload_batch(
+    chroma: Chroma,
+    batch: list[Document],
+    ids: list[str] = None,
+    max_retries: int = 3,
+    backoff_base: float = 1.0,
+    backoff_max: float = 30.0,
+) -> list[str]:
+    """
+    Upload one batch of documents, retrying with exponential backoff and full
+    jitter when embedding or writing fails with one of `TRANSIENT_ERRORS`
+    (e.g. a 429 from the embeddings API or a restarting Chroma server). Other
+    errors are raised at once.
+
+    Args:
+        chroma (Chroma): An instance of the ChromaDB wrapper.
+        batch (list[Document]): The documents to upload.
+        ids (list[str], optional): Document ids. With fixed ids, a retry of a
+            batch that was partly written overwrites it instead of adding
+            duplicates.
+        max_retries (int): Number of retries before the error is raised.
+        backoff_base (float): Backoff before the first retry, doubled per retry.
+        backoff_max (float): Upper bound on a single backoff.
+    Returns:
+        list[str]: The IDs of the uploaded documents.
+    """
+    for attempt in range(max_retries + 1):
+        try:
+            return chroma.add_documents(batch, ids=ids)
+        except TRANSIENT_ERRORS as e:
+            if attempt == max_retries:
+                raise
+            backoff = random.uniform(0, min(backoff_max, backoff_base * 2**attempt))
+            logger.warning(
+                f"Upload of {len(batch)} documents failed ({e!r}), "
+                f"retry {attempt + 1}/{max_retries} in {backoff:.2f}s"
+            )
+            time.sleep(backoff)
+
+
+def document_ids(docs: list[Document]) -> list[str]:
+    """
+    Ids derived from the "source" and "parent_id" of every document and its
+    position among the documents sharing both, so uploading the same pages
+    again overwrites their chunks however the input is ordered or batched.
+    """
+    positions: dict[tuple, int] = {}
+    ids = []
+    for doc in docs:
+        key = (doc.metadata.get("source", ""), doc.metadata.get("parent_id", ""))
+        position = positions.get(key, 0)
+        positions[key] = position + 1
+        ids.append(
+            hashlib.sha1(f"{key[0]}\0{key[1]}\0{position}".encode("utf-8")).hexdigest()
+        )
+    return ids
+
+
+def _group_by_source(docs: list[Document]) -> dict[str, list[int]]:
+    groups: dict[str, list[int]] = {}
+    for index, doc in enumerate(docs):
+        groups.setdefault(doc.metadata.get("source", ""), []).append(index)
+    return groups
+
+
+def _remove_stale(
+    chroma: Chroma, sources: list[str], keep: set[str], batch_size: int = 30
+) -> int:
+    """
+    Delete the chunks of the given sources whose ids are not in `keep`, i.e.
+    chunks of an earlier version of a page that the new version no longer has.
+    """
+    removed = 0
+    for start in range(0, len(sources), batch_size):
+        existing = chroma.get(
+            where={"source": {"$in": sources[start : start + batch_size]}},
+            include=[],
+        )
+        stale = [id for id in existing["ids"] if id not in keep]
+        if stale:
+            chroma.delete(ids=stale)
+            removed += len(stale)
+    return removed
+
 
 def upload(
     chroma: Chroma,
@@ -10,6 +123,12 @@ def upload(
     splitter: TextSplitter = None,
     batch_size: int = -1,
     reset: bool = False,
+    docstore: BaseStore[str, Document] = None,
+    journal: UploadJournal = None,
+    resume: bool = True,
+    max_retries: int = 3,
+    backoff_base: float = 1.0,
+    shadow: Chroma = None,
 ) -> list[str]:
     """
     Upload documents into a ChromaDB collection after optional splitting
@@ -21,33 +140,109 @@ def upload(
         splitter (TextSplitter, optional): Text splitter for splitting document
             text.
         batch_size (int): The number of documents per upload batch. Use -1 for
-            no batching.
-        reset (bool): If True, clear the collection before uploading.
+            no batching. Documents are upserted under ids from `document_ids`,
+            so uploading the same pages again does not add duplicates, and
+            chunks that an earlier version of an uploaded source had beyond
+            its new ones are deleted.
+        reset (bool): If True, clear the collection before uploading. The
+            collection is empty or partial until the upload finishes; to
+            rebuild a collection that is being served, upload into a new
+            version from `CollectionVersions.create` and promote it instead.
+        docstore (BaseStore, optional): Store for parent sections. Requires a
+            splitter with `split_with_parents` (e.g. StructureAwareTextSplitter);
+            the parents are stored by "parent_id" and only the child chunks
+            are uploaded to the collection.
+        journal (UploadJournal, optional): Journal of committed sources. The
+            documents of each source are recorded by content hash once they
+            are all uploaded.
+        resume (bool): With a journal, skip the sources it has recorded as
+            committed with the same content, so a failed run continues from
+            where it stopped and a rerun only uploads new or changed pages.
+            If False, the collection's journal is cleared and every source is
+            uploaded.
+        max_retries (int): Retries per batch, see `upload_batch`.
+        backoff_base (float): Backoff before the first retry of a batch.
+        shadow (Chroma, optional): A second collection, usually embedded with
+            another model, that every batch is also written to under the same
+            ids, e.g. to compare models before switching. With a journal, it
+            is journaled under its own name.
     Returns:
         list[str]: A list of document IDs after upload.
     """
 
     # If reset is True, clear the collection.
+    targets = [chroma] if shadow is None else [chroma, shadow]
     if reset:
-        chroma.reset_collection()
-
-    # Load documents. If a splitter is provided, use loader.load_and_split,
-    # otherwise, fallback to loader.load.
-    docs = loader.load_and_split(splitter) if splitter else loader.load()
-
-    # Upload documents by batches.
-    if batch_size > 0:
-        total_docs = len(docs)
-        ids: list[str] = []
-        # Wrap the loop with tqdm to create a progress bar.
-        for i in tqdm(
-            range(0, total_docs, batch_size), desc="Uploading documents in batches"
-        ):
-            batch = docs[i : i + batch_size]
-            batch_ids = chroma.add_documents(batch)
-            ids.extend(batch_ids)
-        return ids
+        for target in targets:
+            target.reset_collection()
+    names = [target._collection.name for target in targets]
+    if journal is not None and (reset or not resume):
+        for name in names:
+            journal.clear(name)
+
+    # Load documents. If a docstore is provided, split into children and
+    # parents and store the parents locally. If only a splitter is provided,
+    # use loader.load_and_split, otherwise, fallback to loader.load.
+    if docstore is not None:
+        if not hasattr(splitter, "split_with_parents"):
+            raise ValueError("A docstore requires a splitter with split_with_parents")
+        docs, parents = splitter.split_with_parents(loader.load())
+        docstore.mset([(parent.metadata["parent_id"], parent) for parent in parents])
+    else:
+        docs = loader.load_and_split(splitter) if splitter else loader.load()
 
     # If batch_size is -1, upload all documents at once.
     if batch_size == -1:
-        return chroma.add_documents(docs)
+        batch_size = max(len(docs), 1)
+    if batch_size <= 0:
+        return None
+
+    ids = document_ids(docs)
+    groups = _group_by_source(docs)
+    keys = {
+        source: batch_hash([docs[index] for index in indexes])
+        for source, indexes in groups.items()
+    }
+
+    for target, name in zip(targets, names):
+        pending = list(groups)
+        if journal is not None:
+            if resume:
+                pending = [
+                    source
+                    for source in pending
+                    if not journal.is_committed(name, keys[source])
+                ]
+            if len(pending) < len(groups):
+                logger.info(
+                    f"Skipped {len(groups) - len(pending)} sources already "
+                    f"committed to {name}"
+                )
+        if pending and not reset:
+            removed = _remove_stale(target, pending, set(ids))
+            if removed:
+                logger.info(f"Removed {removed} outdated chunks from {name}")
+
+        # Sources are committed to the journal once their last chunk is in.
+        indexes = [index for source in pending for index in groups[source]]
+        remaining = {source: len(groups[source]) for source in pending}
+        for start in tqdm(
+            range(0, len(indexes), batch_size), desc=f"Uploading documents to {name}"
+        ):
+            batch = indexes[start : start + batch_size]
+            upload_batch(
+                target,
+                [docs[index] for index in batch],
+                [ids[index] for index in batch],
+                max_retries,
+                backoff_base,
+            )
+            if journal is None:
+                continue
+            for index in batch:
+                source = docs[index].metadata.get("source", "")
+                remaining[source] -= 1
+                if not remaining[source]:
+                    journal.commit(name, keys[source], len(groups[source]))
+
+    return ids
@@ -0,0 +1,317 @@
+"""
+Versioned Chroma collections behind aliases.
+
+A collection is re-indexed by building a new version (`general_faq-v42`)
+next to the one being served and then promoting it, which points the alias
+(`general_faq`) at it. Retrievers resolve the alias (see
+`manoa_agent.retrievers.aliased.AliasedRetriever`), so they switch to the new
+version without ever seeing an empty or half-built collection. The previous
+version is kept, and `rollback` points the alias back at it.
+
+The aliases are stored as the metadata of one registry collection in the same
+Chroma server, so every process sees the same aliases, and a promotion or
+rollback is a single metadata write.
+
+Usage:
+
+    python -m manoa_agent.db.chroma.versions list general_faq
+    python -m manoa_agent.db.chroma.versions promote general_faq general_faq-v42
+    python -m manoa_agent.db.chroma.versions rollback general_faq
+    python -m manoa_agent.db.chroma.versions prune general_faq --keep 3
+"""
+
+import argparse
+import json
+import logging
+import os
+import re
+from typing import Dict, List, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+REGISTRY = "collection-aliases"
+
+
+def version_name(alias: str, version: int) -> str:
+    """
+    Name of a collection version. Chroma collection names cannot contain "@",
+    so versions are named like "general_faq-v42".
+    """
+    return f"{alias}-v{version}"
+
+
+class CollectionVersions:
+    """
+    Creates, promotes, rolls back and prunes versions of aliased collections.
+    """
+
+    def __init__(self, client, registry: str = REGISTRY):
+        """
+        Args:
+            client: The chromadb client (e.g. `HttpClient`).
+            registry: Name of the collection that stores the aliases.
+        """
+        self.client = client
+        self.registry = registry
+
+    def _registry(self):
+        return self.client.get_or_create_collection(
+            self.registry, embedding_function=None
+        )
+
+    def aliases(self) -> Dict[str, Dict[str, Optional[str]]]:
+        """
+        Returns:
+            Dict: The "current" and "previous" collection of every alias.
+        """
+        metadata = self._registry().metadata or {}
+        return json.loads(metadata.get("aliases", "{}"))
+
+    def _save(self, aliases: Dict[str, Dict[str, Optional[str]]]) -> None:
+        self._registry().modify(metadata={"aliases": json.dumps(aliases)})
+
+    def resolve(self, alias: str) -> str:
+        """
+        The collection an alias points to. An alias that was never promoted
+        resolves to the collection with the alias' own name, so unversioned
+        collections keep working.
+        """
+        return self.aliases().get(alias, {}).get("current") or alias
+
+    def _names(self) -> List[str]:
+        # Newer chromadb clients list names, older ones collections.
+        return [
+            getattr(collection, "name", collection)
+            for collection in self.client.list_collections()
+        ]
+
+    def exists(self, name: str) -> bool:
+        return name in self._names()
+
+    def versions(self, alias: str) -> List[int]:
+        """
+        The version numbers of an alias' collections, in increasing order.
+        """
+        pattern = re.compile(rf"{re.escape(alias)}-v(\d+)")
+        versions = []
+        for name in self._names():
+            match = pattern.fullmatch(name)
+            if match:
+                versions.append(int(match.group(1)))
+        return sorted(versions)
+
+    def served(self) -> List[str]:
+        """
+        The current and previous collections of every alias that exist, i.e.
+        the collections that are served or can be rolled back to. They share
+        the parent docstore, see `delta.delete_sources`.
+        """
+        names = set(self._names())
+        served = set()
+        for entry in self.aliases().values():
+            served.update(
+                name for name in (entry.get("current"), entry.get("previous")) if name
+            )
+        return sorted(served & names)
+
+    def create(self, alias: str, metadata: Optional[dict] = None) -> str:
+        """
+        Create the next, empty version of an alias' collection.
+
+        Args:
+            alias: The alias, e.g. "general_faq".
+            metadata: Collection metadata, cosine distance by default like
+                every collection of the app.
+
+        Returns:
+            str: The name of the new collection.
+        """
+        versions = self.versions(alias)
+        name = version_name(alias, versions[-1] + 1 if versions else 1)
+        self.client.create_collection(
+            name,
+            metadata=metadata or {"hnsw:space": "cosine"},
+            embedding_function=None,
+        )
+        logger.info(f"Created collection {name}")
+        return name
+
+    def promote(self, alias: str, name: str, allow_empty: bool = False) -> str:
+        """
+        Point an alias at a collection, keeping the collection it pointed to
+        for `rollback`.
+
+        Args:
+            alias: The alias.
+            name: The collection to serve, usually from `create`.
+            allow_empty: Promote even if the collection is empty.
+
+        Returns:
+            str: The collection the alias pointed to before.
+
+        Raises:
+            ValueError: If the collection is empty and `allow_empty` is False.
+        """
+        # Raises if the collection does not exist.
+        if not self.client.get_collection(name).count() and not allow_empty:
+            raise ValueError(f"Refusing to promote empty collection {name}")
+        aliases = self.aliases()
+        previous = aliases.get(alias, {}).get("current") or alias
+        if previous == name:
+            return previous
+        aliases[alias] = {"current": name, "previous": previous}
+        self._save(aliases)
+        logger.info(f"Promoted {name} to {alias} (was {previous})")
+        return previous
+
+    def rollback(self, alias: str) -> str:
+        """
+        Point an alias back at its previous collection.
+
+        Returns:
+            str: The collection the alias points to now.
+
+        Raises:
+            ValueError: If the alias has no previous collection.
+        """
+        aliases = self.aliases()
+        entry = aliases.get(alias, {})
+        if not entry.get("previous"):
+            raise ValueError(f"{alias} has no previous version to roll back to")
+        aliases[alias] = {"current": entry["previous"], "previous": entry["current"]}
+        self._save(aliases)
+        logger.info(f"Rolled {alias} back to {entry['previous']}")
+        return entry["previous"]
+
+    def prune(self, alias: str, keep: int = 2) -> List[str]:
+        """
+        Delete old versions of an alias' collection. The newest `keep`
+        versions, and the current and previous collections, are kept.
+
+        Returns:
+            List[str]: The deleted collections.
+        """
+        entry = self.aliases().get(alias, {})
+        protected = {entry.get("current"), entry.get("previous")}
+        versions = self.versions(alias)
+        old = versions[: max(len(versions) - keep, 0)]
+        deleted = []
+        for version in old:
+            name = version_name(alias, version)
+            if name not in protected:
+                self.client.delete_collection(name)
+                deleted.append(name)
+        if deleted:
+            logger.info(f"Deleted {', '.join(deleted)}")
+        return deleted
+
+
+def carry_over(
+    previous, target, embedder=None, batch_size: int = 100, origin: str = "crawl"
+) -> int:
+    """
+    Copy the chunks of sources that a new version does not have from the
+    version it replaces, e.g. pages that a crawl delta or the crawler's
+    ChromaPipeline added to the served version, which a rebuild from the
+    loaders or a manifest would otherwise drop.
+
+    Only chunks with that "origin" metadata are copied, as set by
+    `apply_delta`. Pages removed from the loaders' data or the manifest are
+    thus dropped by the rebuild instead of carried over again.
+
+    Args:
+        previous: The chromadb collection to copy from.
+        target: The chromadb collection to copy to.
+        embedder: Embeds the copied chunks for `target` when the versions were
+            built with different models. Without one, the embeddings of
+            `previous` are copied.
+        batch_size: Number of chunks per read and write.
+        origin: The "origin" of the chunks to copy.
+
+    Returns:
+        int: Number of copied chunks.
+    """
+    loaded = set()
+    for batch in _batches(target, ["metadatas"], batch_size):
+        loaded.update(metadata.get("source") for metadata in batch["metadatas"])
+
+    include = ["documents", "metadatas"]
+    if embedder is None:
+        include.append("embeddings")
+    copied = 0
+    for batch in _batches(previous, include, batch_size, {"origin": origin}):
+        keep = [
+            i
+            for i, metadata in enumerate(batch["metadatas"])
+            if metadata.get("source") not in loaded
+        ]
+        if not keep:
+            continue
+        documents = [batch["documents"][i] for i in keep]
+        target.upsert(
+            ids=[batch["ids"][i] for i in keep],
+            embeddings=(
+                embedder.embed_documents(documents)
+                if embedder is not None
+                else [batch["embeddings"][i] for i in keep]
+            ),
+            documents=documents,
+            metadatas=[batch["metadatas"][i] for i in keep],
+        )
+        copied += len(keep)
+    if copied:
+        logger.info(f"Carried {copied} chunks over from {previous.name}")
+    return copied
+
+
+def _batches(
+    collection, include: List[str], batch_size: int, where: Optional[dict] = None
+):
+    offset = 0
+    while True:
+        batch = collection.get(
+            where=where, include=include, limit=batch_size, offset=offset
+        )
+        if not batch["ids"]:
+            return
+        batch["metadatas"] = [metadata or {} for metadata in batch["metadatas"]]
+        yield batch
+        offset += len(batch["ids"])
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("command", choices=["list", "promote", "rollback", "prune"])
+    parser.add_argument("alias")
+    parser.add_argument("name", nargs="?", help="Collection to promote")
+    parser.add_argument("--keep", type=int, default=2, help="Versions to keep")
+    args = parser.parse_args(argv)
+
+    from chromadb import HttpClient
+    from dotenv import load_dotenv
+
+    logging.basicConfig(level=logging.INFO)
+    load_dotenv(override=True)
+    versions = CollectionVersions(
+        HttpClient(host=os.getenv("CHROMA_HOST"), port=os.getenv("CHROMA_PORT"))
+    )
+
+    if args.command == "promote":
+        if not args.name:
+            parser.error("promote needs the name of the collection")
+        versions.promote(args.alias, args.name)
+    elif args.command == "rollback":
+        versions.rollback(args.alias)
+    elif args.command == "prune":
+        versions.prune(args.alias, args.keep)
+
+    entry = versions.aliases().get(args.alias, {})
+    print(f"{args.alias} -> {versions.resolve(args.alias)}")
+    if entry.get("previous"):
+        print(f"previous: {entry['previous']}")
+    for version in versions.versions(args.alias):
+        print(f"  {version_name(args.alias, version)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+import json
+import sqlite3
+import threading
+from typing import Iterator, List, Optional, Sequence, Tuple
+
+from langchain_core.documents import Document
+from langchain_core.stores import BaseStore
+
+
+class SQLiteDocStore(BaseStore[str, Document]):
+    """
+    Local key-value store of documents backed by a single SQLite file.
+
+    Used to keep parent sections next to the vector store, so fetching the
+    parents of retrieved chunks is a local (memory-mapped) read instead of
+    another round trip to Chroma.
+    """
+
+    def __init__(self, path: str, mmap_size: int = 256 * 1024 * 1024):
+        """
+        Args:
+            path: Path of the SQLite database file. It is created if missing.
+            mmap_size: Number of bytes of the database file to memory-map.
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(f"PRAGMA mmap_size={int(mmap_size)}")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS documents ("
+            "id TEXT PRIMARY KEY, page_content TEXT NOT NULL, metadata TEXT NOT NULL)"
+        )
+        self._conn.commit()
+
+    def mget(self, keys: Sequence[str]) -> List[Optional[Document]]:
+        if not keys:
+            return []
+        placeholders = ",".join("?" for _ in keys)
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT id, page_content, metadata FROM documents "
+                f"WHERE id IN ({placeholders})",
+                list(keys),
+            ).fetchall()
+        found = {
+            key: Document(page_content=content, metadata=json.loads(metadata))
+            for key, content, metadata in rows
+        }
+        return [found.get(key) for key in keys]
+
+    def mset(self, key_value_pairs: Sequence[Tuple[str, Document]]) -> None:
+        rows = [
+            (key, doc.page_content, json.dumps(doc.metadata))
+            for key, doc in key_value_pairs
+        ]
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO documents (id, page_content, metadata) "
+                "VALUES (?, ?, ?)",
+                rows,
+            )
+            self._conn.commit()
+
+    def mdelete(self, keys: Sequence[str]) -> None:
+        with self._lock:
+            self._conn.executemany(
+                "DELETE FROM documents WHERE id = ?", [(key,) for key in keys]
+            )
+            self._conn.commit()
+
+    def yield_keys(self, *, prefix: Optional[str] = None) -> Iterator[str]:
+        with self._lock:
+            if prefix is None:
+                rows = self._conn.execute("SELECT id FROM documents").fetchall()
+            else:
+                rows = self._conn.execute(
+                    "SELECT id FROM documents WHERE substr(id, 1, ?) = ?",
+                    (len(prefix), prefix),
+                ).fetchall()
+        for (key,) in rows:
+            yield key
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,72 @@
+import hashlib
+import sqlite3
+import threading
+
+import numpy as np
+
+from manoa_agent.embeddings.base import Embedder
+
+
+class CachedEmbedder(Embedder):
+    """
+    Embedder that stores every embedding it computes in a local SQLite file.
+
+    Texts that were embedded before (by any process using the same cache file
+    and namespace) are served from disk, so benchmarks and evaluations can be
+    rerun offline once their embeddings have been computed.
+    """
+
+    def __init__(self, embedder: Embedder, path: str, namespace: str = ""):
+        """
+        Args:
+            embedder: The embedder used for cache misses.
+            path: Path of the SQLite cache file.
+            namespace: Cache namespace, e.g. the model name and dimensions.
+                Embeddings from different models must not share a namespace.
+        """
+        self.embedder = embedder
+        self.namespace = namespace
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB)"
+        )
+        self._conn.commit()
+
+    def _key(self, text: str) -> str:
+        return hashlib.sha1(f"{self.namespace}\0{text}".encode("utf-8")).hexdigest()
+
+    def embed_query(self, text: str) -> list[float]:
+        return self.embed_documents([text])[0]
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        keys = [self._key(text) for text in texts]
+        found = {}
+        with self._lock:
+            for start in range(0, len(keys), 500):
+                batch = keys[start : start + 500]
+                placeholders = ",".join("?" for _ in batch)
+                query = (
+                    "SELECT key, vector FROM embeddings "
+                    f"WHERE key IN ({placeholders})"
+                )
+                rows = self._conn.execute(query, batch).fetchall()
+                found.update(rows)
+
+        missing = list(dict.fromkeys(k for k in keys if k not in found))
+        if missing:
+            text_by_key = dict(zip(keys, texts))
+            vectors = self.embedder.embed_documents([text_by_key[k] for k in missing])
+            rows = [
+                (key, np.asarray(vector, dtype=np.float32).tobytes())
+                for key, vector in zip(missing, vectors)
+            ]
+            with self._lock:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)",
+                    rows,
+                )
+                self._conn.commit()
+            found.update(rows)
+
+        return [np.frombuffer(found[key], dtype=np.float32).tolist() for key in keys]
@@ -1,3 +1,7 @@
+import os
+from typing import Optional
+
+from langchain_core.embeddings import Embeddings
 from openai import OpenAI
 from openai.types import CreateEmbeddingResponse
 
@@ -5,20 +9,111 @@ from manoa_agent.embeddings.base import Embedder
 
 
 class OpenAIEmbeddingAdapter(Embedder):
-    def __init__(self, client: OpenAI, model: str):
+    def __init__(self, client: OpenAI, model: str, dimensions: Optional[int] = None):
         self.client = client
         self.model = model
+        # text-embedding-3 models can return shortened embeddings directly.
+        self.kwargs = {"dimensions": dimensions} if dimensions else {}
 
     def embed_query(self, text):
         response: CreateEmbeddingResponse = self.client.embeddings.create(
-            input=text, model=self.model
+            input=text, model=self.model, **self.kwargs
         )
         return response.data[0].embedding
 
     def embed_documents(self, texts):
-        response = self.client.embeddings.create(input=texts, model=self.model)
+        response = self.client.embeddings.create(
+            input=texts, model=self.model, **self.kwargs
+        )
         return [d.embedding for d in response.data]
 
 
-def from_open_ai(client: OpenAI, model: str) -> Embedder:
-    return OpenAIEmbeddingAdapter(client, model)
+def from_open_ai(
+    client: OpenAI, model: str, dimensions: Optional[int] = None
+) -> Embedder:
+    return OpenAIEmbeddingAdapter(client, model, dimensions)
+
+
+class LangChainEmbeddingAdapter(Embedder):
+    """
+    Adapter for LangChain embeddings, e.g. a local `HuggingFaceEmbeddings`.
+    """
+
+    def __init__(self, embeddings: Embeddings):
+        self.embeddings = embeddings
+
+    def embed_query(self, text):
+        return list(self.embeddings.embed_query(text))
+
+    def embed_documents(self, texts):
+        return [list(v) for v in self.embeddings.embed_documents(texts)]
+
+
+def from_hugging_face(embeddings: Embeddings) -> Embedder:
+    return LangChainEmbeddingAdapter(embeddings)
+
+
+def from_onnx(model_dir: str, **kwargs) -> Embedder:
+    """
+    Build a local CPU embedder from an ONNX model directory.
+
+    Args:
+        model_dir: Directory with the ONNX model and its `tokenizer.json`.
+        **kwargs: Options of `OnnxEmbedder`, e.g. `max_batch_size` or
+            `pooling`.
+
+    Returns:
+        Embedder: The embedder.
+    """
+    try:
+        from manoa_agent.embeddings.onnx import OnnxEmbedder
+    except ImportError as e:
+        raise ImportError(
+            "ONNX models require the onnxruntime and tokenizers packages. "
+            "Install them with `pip install manoa_agent[onnx]`."
+        ) from e
+    return OnnxEmbedder(model_dir, **kwargs)
+
+
+def from_spec(
+    spec: str,
+    dimensions: Optional[int] = None,
+    trust_remote_code: Optional[bool] = None,
+) -> Embedder:
+    """
+    Build an embedder from a model spec.
+
+    Specs of the form "huggingface:<model>" load a local sentence-transformers
+    model and "onnx:<directory>" a local ONNX model. Any other spec is treated
+    as an OpenAI model name.
+
+    Args:
+        spec: The model spec, e.g. "text-embedding-3-large",
+            "huggingface:dunzhang/stella_en_1.5B_v5" or "onnx:models/bge-small".
+        dimensions: Shortened embedding size for OpenAI text-embedding-3 models.
+        trust_remote_code: Let Hugging Face models run the code in their
+            repository, which some (e.g. stella) need. Off unless enabled here
+            or with HF_TRUST_REMOTE_CODE=1, since that code runs unreviewed.
+
+    Returns:
+        Embedder: The embedder.
+    """
+    if spec.startswith("huggingface:"):
+        if trust_remote_code is None:
+            trust_remote_code = os.getenv("HF_TRUST_REMOTE_CODE", "0") != "0"
+        try:
+            from langchain_huggingface import HuggingFaceEmbeddings
+        except ImportError as e:
+            raise ImportError(
+                "Hugging Face models require the langchain-huggingface package. "
+                "Install it with `pip install manoa_agent[huggingface]`."
+            ) from e
+        return from_hugging_face(
+            HuggingFaceEmbeddings(
+                model_name=spec[len("huggingface:") :],
+                model_kwargs={"trust_remote_code": trust_remote_code},
+            )
+        )
+    if spec.startswith("onnx:"):
+        return from_onnx(spec[len("onnx:") :])
+    return from_open_ai(OpenAI(), spec, dimensions)
@@ -0,0 +1,297 @@
+"""
+Local CPU embeddings with ONNX Runtime.
+
+Runs a small sentence-embedding model (e.g. all-MiniLM-L6-v2 or
+bge-small-en-v1.5) exported to ONNX, so queries are embedded in-process
+instead of with a network round trip. A model directory holds the ONNX model
+and the `tokenizer.json` of the Hugging Face tokenizer, e.g. as written by
+
+    optimum-cli export onnx --model BAAI/bge-small-en-v1.5 models/bge-small
+
+The int8 version of a model is used when the directory has one; it is made
+with
+
+    python -m manoa_agent.embeddings.onnx quantize models/bge-small
+"""
+
+import argparse
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, List, Optional, Sequence
+
+import numpy as np
+import onnxruntime as ort
+from tokenizers import Tokenizer
+
+from manoa_agent.embeddings.base import Embedder
+from manoa_agent.embeddings.quantize import normalize_rows
+
+logger = logging.getLogger(__name__)
+
+# Model files looked up in a model directory, preferred first.
+MODEL_FILES = (
+    "model_quantized.onnx",
+    os.path.join("onnx", "model_quantized.onnx"),
+    "model.onnx",
+    os.path.join("onnx", "model.onnx"),
+)
+
+
+def find_model(model_dir: str) -> str:
+    """
+    The ONNX model in a model directory, the int8 version if there is one.
+
+    Raises:
+        FileNotFoundError: If the directory has no model.
+    """
+    for name in MODEL_FILES:
+        path = os.path.join(model_dir, name)
+        if os.path.exists(path):
+            return path
+    raise FileNotFoundError(f"No ONNX model in {model_dir}")
+
+
+def available_cores() -> int:
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def mean_pool(hidden: np.ndarray, mask: np.ndarray) -> np.ndarray:
+    """
+    Average the token embeddings of every text, ignoring padding.
+
+    Args:
+        hidden: Token embeddings, (batch, tokens, dimensions).
+        mask: Attention mask, (batch, tokens).
+
+    Returns:
+        np.ndarray: Text embeddings, (batch, dimensions).
+    """
+    mask = mask[..., None].astype(np.float32)
+    return (hidden * mask).sum(axis=1) / np.maximum(mask.sum(axis=1), 1e-9)
+
+
+class DynamicBatcher:
+    """
+    Groups the texts submitted by concurrent callers into batches for one
+    embedding function, run on a single worker thread.
+
+    A batch takes the texts waiting when the worker is free, up to
+    `max_batch_size`, so a lone query runs right away while the queries
+    arriving during a model call share the next one. With `max_wait`, a batch
+    also waits that many seconds for more texts after its first one.
+    """
+
+    def __init__(
+        self,
+        embed: Callable[[List[str]], np.ndarray],
+        max_batch_size: int = 32,
+        max_wait: float = 0.0,
+    ):
+        """
+        Args:
+            embed: Embeds a batch of texts into a (texts, dimensions) array.
+            max_batch_size: Maximum texts per call of `embed`.
+            max_wait: Seconds to wait for more texts before running a batch.
+        """
+        self.embed_batch = embed
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.batches = 0
+        self._queue: queue.Queue = queue.Queue()
+        self._worker = threading.Thread(
+            target=self._run, name="embedding-batcher", daemon=True
+        )
+        self._worker.start()
+
+    def submit(self, texts: Sequence[str]) -> List[Future]:
+        futures = []
+        for text in texts:
+            future = Future()
+            self._queue.put((text, future))
+            futures.append(future)
+        return futures
+
+    def embed(self, texts: Sequence[str]) -> List[List[float]]:
+        return [future.result() for future in self.submit(texts)]
+
+    def _next_batch(self) -> Optional[list]:
+        item = self._queue.get()
+        if item is None:
+            return None
+        batch = [item]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                # Texts that are already queued are taken without waiting.
+                if remaining > 0:
+                    item = self._queue.get(timeout=remaining)
+                else:
+                    item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                self._queue.put(None)
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self) -> None:
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            try:
+                vectors = self.embed_batch([text for text, _ in batch])
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            self.batches += 1
+            for (_, future), vector in zip(batch, vectors):
+                future.set_result(vector.tolist())
+
+    def close(self) -> None:
+        """
+        Stop the worker once the queued texts are embedded.
+        """
+        self._queue.put(None)
+        self._worker.join()
+
+
+class OnnxEmbedder(Embedder):
+    """
+    Embedder running an ONNX sentence-embedding model on the CPU.
+
+    Concurrent `embed_query` and `embed_documents` calls go through one
+    `DynamicBatcher`, and every model call uses an intra-op thread pool sized
+    to the available cores.
+    """
+
+    def __init__(
+        self,
+        model_dir: str,
+        model_path: Optional[str] = None,
+        max_length: int = 256,
+        max_batch_size: int = 32,
+        max_wait: float = 0.0,
+        threads: Optional[int] = None,
+        pooling: str = "mean",
+        normalize: bool = True,
+    ):
+        """
+        Args:
+            model_dir: Directory with `tokenizer.json` and the model.
+            model_path: The ONNX model, by default found with `find_model`.
+            max_length: Tokens per text; longer texts are truncated.
+            max_batch_size: Maximum texts per model call.
+            max_wait: Seconds a batch waits for more texts.
+            threads: Intra-op threads, the number of usable cores by default.
+            pooling: "mean" to average the token embeddings or "cls" to use
+                the first token's, as the model was trained. Models with a
+                (texts, dimensions) output are used as is.
+            normalize: Scale the embeddings to unit length.
+        """
+        if pooling not in ("mean", "cls"):
+            raise ValueError(f"Unknown pooling {pooling!r}")
+        self.model_path = model_path or find_model(model_dir)
+        self.pooling = pooling
+        self.normalize = normalize
+
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = threads or available_cores()
+        options.inter_op_num_threads = 1
+        options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(
+            self.model_path, options, providers=["CPUExecutionProvider"]
+        )
+        self._inputs = {i.name for i in self.session.get_inputs()}
+
+        self.tokenizer = Tokenizer.from_file(os.path.join(model_dir, "tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length)
+        if self.tokenizer.padding is None:
+            self.tokenizer.enable_padding()
+
+        self.batcher = DynamicBatcher(self._embed_batch, max_batch_size, max_wait)
+        threads = options.intra_op_num_threads
+        logger.info(f"Loaded {self.model_path} with {threads} threads")
+
+    def _embed_batch(self, texts: List[str]) -> np.ndarray:
+        encodings = self.tokenizer.encode_batch(texts)
+        mask = np.array([e.attention_mask for e in encodings], dtype=np.int64)
+        feeds = {
+            "input_ids": np.array([e.ids for e in encodings], dtype=np.int64),
+            "attention_mask": mask,
+            "token_type_ids": np.array([e.type_ids for e in encodings], dtype=np.int64),
+        }
+        output = self.session.run(
+            None, {name: feeds[name] for name in feeds if name in self._inputs}
+        )[0]
+        if output.ndim == 3:
+            output = mean_pool(output, mask) if self.pooling == "mean" else output[:, 0]
+        return normalize_rows(output) if self.normalize else output
+
+    def embed_query(self, text: str) -> list[float]:
+        return self.batcher.embed([text])[0]
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        # Texts of similar length share batches, which keeps padding short.
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        vectors = self.batcher.embed([texts[i] for i in order])
+        result = [None] * len(texts)
+        for i, vector in zip(order, vectors):
+            result[i] = vector
+        return result
+
+    def close(self) -> None:
+        self.batcher.close()
+
+
+def quantize(model_dir: str, output_path: Optional[str] = None) -> str:
+    """
+    Write the dynamic int8 version of a model directory's model.
+
+    Args:
+        model_dir: The model directory.
+        output_path: Where to write the model, `model_quantized.onnx` next to
+            the model by default.
+
+    Returns:
+        str: The path of the quantized model.
+    """
+    # Needs the onnx package, which inference does not.
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    paths = [os.path.join(model_dir, name) for name in MODEL_FILES]
+    paths = [path for path in paths if "quantized" not in path]
+    model_path = next((path for path in paths if os.path.exists(path)), None)
+    if model_path is None:
+        raise FileNotFoundError(f"No ONNX model to quantize in {model_dir}")
+    output_path = output_path or os.path.join(
+        os.path.dirname(model_path), "model_quantized.onnx"
+    )
+    quantize_dynamic(model_path, output_path, weight_type=QuantType.QInt8)
+    logger.info(f"Wrote {output_path}")
+    return output_path
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("command", choices=["quantize"])
+    parser.add_argument("model_dir")
+    parser.add_argument("--output", help="Path of the quantized model")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    quantize(args.model_dir, args.output)
+
+
+if __name__ == "__main__":
+    main()
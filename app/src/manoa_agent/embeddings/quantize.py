@@ -0,0 +1,96 @@
+from typing import Tuple
+
+import numpy as np
+
+
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    """
+    Scale every row to unit length, so dot products are cosine similarities.
+    """
+    matrix = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    return matrix / np.where(norms == 0, 1, norms)
+
+
+def truncate(matrix: np.ndarray, dimensions: int) -> np.ndarray:
+    """
+    Keep the first `dimensions` components and renormalize.
+
+    text-embedding-3 models are trained so that truncated embeddings remain
+    usable; this is what the API's `dimensions` parameter does server side.
+    """
+    return normalize_rows(np.asarray(matrix)[..., :dimensions])
+
+
+class PCAReducer:
+    """
+    Linear dimension reduction fitted on the corpus embeddings.
+    """
+
+    def __init__(self, mean: np.ndarray, components: np.ndarray):
+        """
+        Args:
+            mean: Mean of the training embeddings, shape (d_in,).
+            components: Principal axes, shape (d_out, d_in).
+        """
+        self.mean = mean.astype(np.float32)
+        self.components = components.astype(np.float32)
+
+    @property
+    def dimensions(self) -> int:
+        return self.components.shape[0]
+
+    @classmethod
+    def fit(cls, matrix: np.ndarray, dimensions: int) -> "PCAReducer":
+        """
+        Fit the reducer with a singular value decomposition of the centered
+        embeddings.
+
+        Args:
+            matrix: Training embeddings, shape (n, d_in).
+            dimensions: Number of output dimensions.
+
+        Returns:
+            PCAReducer: The fitted reducer.
+        """
+        matrix = np.asarray(matrix, dtype=np.float32)
+        mean = matrix.mean(axis=0)
+        _, _, vt = np.linalg.svd(matrix - mean, full_matrices=False)
+        return cls(mean, vt[:dimensions])
+
+    def transform(self, matrix: np.ndarray) -> np.ndarray:
+        """
+        Project embeddings onto the principal axes and renormalize.
+        """
+        matrix = np.asarray(matrix, dtype=np.float32)
+        return normalize_rows((matrix - self.mean) @ self.components.T)
+
+    def save(self, path: str) -> None:
+        np.savez(path, mean=self.mean, components=self.components)
+
+    @classmethod
+    def load(cls, path: str) -> "PCAReducer":
+        data = np.load(path)
+        return cls(data["mean"], data["components"])
+
+
+def quantize_int8(matrix: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Symmetric per-dimension int8 quantization.
+
+    Args:
+        matrix: Vectors to quantize, shape (n, d).
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: The int8 codes, shape (n, d), and the
+            float32 scale of every dimension, shape (d,).
+    """
+    matrix = np.asarray(matrix, dtype=np.float32)
+    scale = np.abs(matrix).max(axis=0, initial=0) / 127
+    scale = np.where(scale == 0, 1, scale).astype(np.float32)
+    codes = np.clip(np.rint(matrix / scale), -127, 127).astype(np.int8)
+    return codes, scale
+
+
+def dequantize_int8(codes: np.ndarray, scale: np.ndarray) -> np.ndarray:
+    return codes.astype(np.float32) * scale
@@ -0,0 +1,311 @@
+"""
+Batch evaluation runner for the agent graph.
+
+Runs a JSONL file of conversations through the compiled agent with
+`agent.batch` and writes one result per conversation plus an aggregate report.
+Every input line is an object with the conversation in the web client's
+format, and optionally the retriever and the expected sources:
+
+    {"id": "vpn-1", "retriever": "general",
+     "messages": [{"type": "human", "content": "How do I set up the VPN?"}],
+     "expected_sources": ["https://www.hawaii.edu/askus/1001"]}
+
+Usage:
+
+    python -m manoa_agent.eval.batch questions.jsonl results/ \
+        --concurrency 8 --compare results-previous/report.json
+"""
+
+import argparse
+import json
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional, Sequence
+from uuid import UUID
+
+import numpy as np
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.messages import AIMessage, HumanMessage
+from langchain_core.outputs import LLMResult
+from langchain_core.runnables import Runnable
+
+logger = logging.getLogger(__name__)
+
+
+class NodeStatsHandler(BaseCallbackHandler):
+    """
+    Callback handler that records the wall time of a graph run and of every
+    graph node, and the tokens used by the chat model calls inside each node.
+
+    One handler is used per conversation, so the numbers are not mixed up
+    when conversations run concurrently.
+    """
+
+    def __init__(self):
+        self.latency: Optional[float] = None
+        self.timings: Dict[str, float] = {}
+        self.tokens: Dict[str, Dict[str, int]] = {}
+        self._starts: Dict[UUID, tuple] = {}
+        self._llm_nodes: Dict[UUID, str] = {}
+        self._lock = threading.Lock()
+
+    def on_chain_start(
+        self,
+        serialized: Optional[Dict[str, Any]],
+        inputs: Any,
+        *,
+        run_id: UUID,
+        parent_run_id: Optional[UUID] = None,
+        metadata: Optional[Dict[str, Any]] = None,
+        **kwargs: Any,
+    ) -> None:
+        node = (metadata or {}).get("langgraph_node")
+        if parent_run_id is None:
+            node = None
+        # Only the node's own run, not the prompts and models it calls, and
+        # not LangGraph's internal "__start__" node.
+        elif not node or node.startswith("__") or kwargs.get("name") != node:
+            return
+        with self._lock:
+            self._starts[run_id] = (node, time.perf_counter())
+
+    def _end_chain(self, run_id: UUID) -> None:
+        with self._lock:
+            started = self._starts.pop(run_id, None)
+            if started is None:
+                return
+            node, start = started
+            elapsed = time.perf_counter() - start
+            if node is None:
+                self.latency = elapsed
+            else:
+                self.timings[node] = self.timings.get(node, 0.0) + elapsed
+
+    def on_chain_end(self, outputs: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        self._end_chain(run_id)
+
+    def on_chain_error(
+        self, error: BaseException, *, run_id: UUID, **kwargs: Any
+    ) -> None:
+        self._end_chain(run_id)
+
+    def on_chat_model_start(
+        self,
+        serialized: Dict[str, Any],
+        messages: List[List[Any]],
+        *,
+        run_id: UUID,
+        metadata: Optional[Dict[str, Any]] = None,
+        **kwargs: Any,
+    ) -> None:
+        with self._lock:
+            self._llm_nodes[run_id] = (metadata or {}).get("langgraph_node", "")
+
+    def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs: Any) -> None:
+        usage = _usage(response)
+        with self._lock:
+            node = self._llm_nodes.pop(run_id, "")
+            totals = self.tokens.setdefault(node, {"input": 0, "output": 0})
+            totals["input"] += usage[0]
+            totals["output"] += usage[1]
+
+
+def _usage(response: LLMResult) -> tuple:
+    """
+    Input and output tokens of a chat model response.
+    """
+    for generations in response.generations:
+        for generation in generations:
+            message = getattr(generation, "message", None)
+            usage = getattr(message, "usage_metadata", None)
+            if usage:
+                return usage.get("input_tokens", 0), usage.get("output_tokens", 0)
+    token_usage = (response.llm_output or {}).get("token_usage") or {}
+    return token_usage.get("prompt_tokens", 0), token_usage.get("completion_tokens", 0)
+
+
+def load_items(path: str) -> List[dict]:
+    """
+    Read the conversations of a JSONL file, skipping blank lines.
+    """
+    items = []
+    with open(path, encoding="utf-8") as f:
+        for number, line in enumerate(f, 1):
+            if line.strip():
+                item = json.loads(line)
+                item.setdefault("id", str(number))
+                items.append(item)
+    return items
+
+
+def to_input(item: dict) -> dict:
+    """
+    Convert a conversation in the web client's format to the graph input.
+    """
+    messages = [
+        HumanMessage(m["content"]) if m["type"] == "human" else AIMessage(m["content"])
+        for m in item["messages"]
+    ]
+    return {"messages": messages, "retriever": item.get("retriever", "general")}
+
+
+def run_batch(
+    agent: Runnable,
+    items: Sequence[dict],
+    concurrency: int = 4,
+    warmup: bool = True,
+) -> List[dict]:
+    """
+    Run conversations through the agent with `agent.batch`.
+
+    Args:
+        agent: The compiled agent graph.
+        items: Conversations, as read by `load_items`.
+        concurrency: Maximum number of conversations run at once.
+        warmup: Run the first conversation once before the batch, so that
+            the process-wide caches and connection pools shared by all items
+            are warm and one-off setup does not count against the first
+            items' latency.
+
+    Returns:
+        List[dict]: One result per conversation, in input order.
+    """
+    inputs = [to_input(item) for item in items]
+    if warmup and inputs:
+        try:
+            agent.invoke(inputs[0])
+        except Exception as e:
+            logger.warning(f"Warm-up run failed: {e}")
+
+    handlers = [NodeStatsHandler() for _ in items]
+    configs = [
+        {
+            "callbacks": [handler],
+            "max_concurrency": concurrency,
+            "run_name": f"eval:{item['id']}",
+        }
+        for item, handler in zip(items, handlers)
+    ]
+    outputs = agent.batch(inputs, configs, return_exceptions=True)
+
+    results = []
+    for item, output, handler in zip(items, outputs, handlers):
+        result = {
+            "id": item["id"],
+            "question": item["messages"][-1]["content"],
+            "latency": handler.latency,
+            "node_timings": handler.timings,
+            "tokens": handler.tokens,
+        }
+        if isinstance(output, Exception):
+            result.update(answer=None, sources=[], error=repr(output))
+        else:
+            message = output.get("message")
+            result.update(
+                answer=getattr(message, "content", message),
+                sources=list(output.get("sources") or []),
+                error=None,
+            )
+        if "expected_sources" in item:
+            expected = set(item["expected_sources"])
+            result["source_hit"] = bool(expected & set(result["sources"]))
+        results.append(result)
+    return results
+
+
+def percentiles(values: Sequence[float]) -> Dict[str, float]:
+    if not values:
+        return {}
+    return {
+        "mean": round(float(np.mean(values)), 6),
+        "p50": round(float(np.percentile(values, 50)), 6),
+        "p95": round(float(np.percentile(values, 95)), 6),
+        "max": round(float(np.max(values)), 6),
+    }
+
+
+def aggregate(results: Sequence[dict]) -> dict:
+    """
+    Summarize batch results: error count, latency percentiles, per-node
+    timings and token totals, and the source hit rate when expected sources
+    were given.
+    """
+    nodes = sorted({node for r in results for node in r["node_timings"]})
+    token_nodes = sorted({node for r in results for node in r["tokens"]})
+    hits = [r["source_hit"] for r in results if "source_hit" in r]
+    return {
+        "items": len(results),
+        "errors": sum(1 for r in results if r["error"]),
+        "latency": percentiles([r["latency"] for r in results if r["latency"]]),
+        "node_timings": {
+            node: percentiles(
+                [r["node_timings"][node] for r in results if node in r["node_timings"]]
+            )
+            for node in nodes
+        },
+        "tokens": {
+            node: {
+                kind: sum(r["tokens"].get(node, {}).get(kind, 0) for r in results)
+                for kind in ("input", "output")
+            }
+            for node in token_nodes
+        },
+        "source_hit_rate": round(sum(hits) / len(hits), 4) if hits else None,
+    }
+
+
+def compare(old: dict, new: dict, prefix: str = "") -> Dict[str, tuple]:
+    """
+    Numeric differences between two reports, as {"latency.p95": (old, new)}.
+    """
+    changes = {}
+    for key in sorted(set(old) | set(new)):
+        a, b = old.get(key), new.get(key)
+        name = f"{prefix}{key}"
+        if isinstance(a, dict) or isinstance(b, dict):
+            changes.update(compare(a or {}, b or {}, f"{name}."))
+        elif a != b:
+            changes[name] = (a, b)
+    return changes
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("questions", help="JSONL file of conversations")
+    parser.add_argument("output", help="Directory for results.jsonl and report.json")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--no-warmup", action="store_true")
+    parser.add_argument("--compare", help="Previous report.json to compare against")
+    args = parser.parse_args(argv)
+
+    # Building the agent connects to Chroma and loads every index.
+    from manoa_agent.__main__ import agent
+
+    # Repeated questions are measured separately instead of being coalesced
+    # into one graph run.
+    agent = getattr(agent, "runnable", agent)
+
+    items = load_items(args.questions)
+    results = run_batch(agent, items, args.concurrency, not args.no_warmup)
+    report = aggregate(results)
+
+    os.makedirs(args.output, exist_ok=True)
+    with open(os.path.join(args.output, "results.jsonl"), "w", encoding="utf-8") as f:
+        for result in results:
+            f.write(json.dumps(result, sort_keys=True, ensure_ascii=False) + "\n")
+    with open(os.path.join(args.output, "report.json"), "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+        f.write("\n")
+
+    print(json.dumps(report, indent=2, sort_keys=True))
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            previous = json.load(f)
+        for name, (a, b) in compare(previous, report).items():
+            print(f"{name}: {a} -> {b}")
+
+
+if __name__ == "__main__":
+    main()
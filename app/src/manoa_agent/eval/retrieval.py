@@ -0,0 +1,248 @@
+"""
+Retrieval quality and latency benchmark.
+
+Builds a labelled query set from the AskUs corpus: each article's own
+question is a query, and the article's source URL (derived from the file
+stem by `HtmlDirectoryLoader`) is the expected source. The question line is
+removed from the indexed text, so a query cannot match its article verbatim.
+Additional labelled queries can be given as a JSONL file of
+{"query": ..., "expected_sources": [...]} objects.
+
+Every retriever configuration is run over the same chunks and queries and
+reports recall@k, MRR and per-query latency. Embeddings go through a SQLite
+cache and the vector store is an in-memory Chroma, so once the cache is warm
+the benchmark runs offline.
+
+Usage:
+
+    python -m manoa_agent.eval.retrieval --k 4 --output retrieval-report.json
+"""
+
+import argparse
+import json
+import logging
+import os
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import chromadb
+from langchain_chroma import Chroma
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+from manoa_agent.embeddings.base import Embedder
+from manoa_agent.eval.batch import percentiles
+from manoa_agent.ingest.hypothetical import article_question
+from manoa_agent.loaders.html import HtmlDirectoryLoader
+from manoa_agent.retrievers.hybrid import BM25Index, HybridRetriever
+from manoa_agent.retrievers.quantized import QuantizedRetriever, QuantizedVectorIndex
+from manoa_agent.splitters.structure import StructureAwareTextSplitter
+
+logger = logging.getLogger(__name__)
+
+
+def askus_benchmark(
+    dir_path: str, strip_question: bool = True
+) -> Tuple[List[Document], List[dict]]:
+    """
+    Build the corpus and labelled queries from AskUs articles.
+
+    Args:
+        dir_path: Directory of AskUs HTML files.
+        strip_question: Remove each article's question from its text.
+
+    Returns:
+        Tuple[List[Document], List[dict]]: The articles and the queries, each
+            with "query" and "expected_sources".
+    """
+    articles = []
+    queries = []
+    for doc in HtmlDirectoryLoader(dir_path).lazy_load():
+        question = article_question(doc)
+        if not question:
+            continue
+        if strip_question:
+            body = doc.page_content.split("\n", 1)[-1]
+            doc = Document(page_content=body, metadata=doc.metadata)
+        articles.append(doc)
+        queries.append(
+            {"query": question, "expected_sources": [doc.metadata["source"]]}
+        )
+    return articles, queries
+
+
+def ranked_sources(docs: Sequence[Document]) -> List[str]:
+    """
+    Sources of retrieved documents in rank order, without duplicates.
+    """
+    sources = (doc.metadata.get("source") for doc in docs)
+    return [source for source in dict.fromkeys(sources) if source]
+
+
+def score_sources(
+    sources: Sequence[str], expected: Sequence[str]
+) -> Tuple[float, float]:
+    """
+    Recall and reciprocal rank of the expected sources in ranked sources.
+    """
+    expected = set(expected)
+    recall = len(expected.intersection(sources)) / len(expected)
+    rank = next((i for i, s in enumerate(sources) if s in expected), None)
+    return recall, 0.0 if rank is None else 1 / (rank + 1)
+
+
+def evaluate(retriever: BaseRetriever, queries: Sequence[dict], k: int) -> dict:
+    """
+    Run every query and score the retrieved sources.
+
+    Args:
+        retriever: The retriever to evaluate.
+        queries: Labelled queries with "query" and "expected_sources".
+        k: Cutoff for recall and MRR.
+
+    Returns:
+        dict: "recall@k" (share of expected sources in the top k sources,
+            averaged over queries), "mrr" (mean reciprocal rank of the first
+            expected source within the top k) and per-query "latency"
+            percentiles in seconds.
+    """
+    recalls, reciprocal_ranks, latencies = [], [], []
+    for item in queries:
+        start = time.perf_counter()
+        docs = retriever.invoke(item["query"])
+        latencies.append(time.perf_counter() - start)
+
+        recall, reciprocal_rank = score_sources(
+            ranked_sources(docs)[:k], item["expected_sources"]
+        )
+        recalls.append(recall)
+        reciprocal_ranks.append(reciprocal_rank)
+
+    n = len(queries) or 1
+    return {
+        f"recall@{k}": round(sum(recalls) / n, 4),
+        "mrr": round(sum(reciprocal_ranks) / n, 4),
+        "latency": percentiles(latencies),
+    }
+
+
+def build_retrievers(
+    chunks: List[Document], embedder: Embedder, k: int
+) -> Dict[str, BaseRetriever]:
+    """
+    The retriever configurations compared by the benchmark, all over the same
+    chunks: Chroma "similarity" and "similarity_score_threshold" search,
+    hybrid Chroma and BM25 search, an int8 index over 256 dimensions with
+    full-precision rescoring, and exact in-process search.
+    """
+    collection = Chroma(
+        collection_name="retrieval_benchmark",
+        client=chromadb.EphemeralClient(),
+        embedding_function=embedder,
+        collection_metadata={"hnsw:space": "cosine"},
+    )
+    collection.reset_collection()
+    collection.add_documents(chunks)
+
+    similarity = collection.as_retriever(
+        search_type="similarity", search_kwargs={"k": k}
+    )
+    embeddings = embedder.embed_documents([chunk.page_content for chunk in chunks])
+    dimensions = len(embeddings[0])
+
+    return {
+        "similarity": similarity,
+        "similarity_score_threshold": collection.as_retriever(
+            search_type="similarity_score_threshold",
+            search_kwargs={"k": k, "score_threshold": 0.5},
+        ),
+        "hybrid": HybridRetriever(
+            vector_retriever=similarity, keyword_index=BM25Index(chunks), k=k
+        ),
+        "quantized int8/256": QuantizedRetriever(
+            index=QuantizedVectorIndex.build(embeddings, chunks, dimensions=256),
+            embedder=embedder,
+            k=k,
+            rescore_k=4 * k,
+        ),
+        "in-process exact": QuantizedRetriever(
+            index=QuantizedVectorIndex.build(
+                embeddings, chunks, dimensions=dimensions, dtype="float16"
+            ),
+            embedder=embedder,
+            k=k,
+            rescore_k=4 * k,
+        ),
+    }
+
+
+def run(
+    retrievers: Dict[str, BaseRetriever], queries: Sequence[dict], k: int
+) -> Dict[str, dict]:
+    """
+    Evaluate every retriever; each is run once before timing, so lazy setup
+    is not counted.
+    """
+    report = {}
+    for name, retriever in retrievers.items():
+        if queries:
+            retriever.invoke(queries[0]["query"])
+        report[name] = evaluate(retriever, queries, k)
+        logger.info(f"{name}: {report[name]}")
+    return report
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--askus", default="data/askus")
+    parser.add_argument("--queries", help="Extra labelled queries (JSONL)")
+    parser.add_argument("--k", type=int, default=4)
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    parser.add_argument("--cache", default="data/embedding_cache.sqlite")
+    parser.add_argument("--model", default="text-embedding-3-large")
+    parser.add_argument("--output", help="Write the report to this JSON file")
+    args = parser.parse_args(argv)
+
+    from dotenv import load_dotenv
+    from openai import OpenAI
+
+    from manoa_agent.embeddings.cache import CachedEmbedder
+    from manoa_agent.embeddings.convert import from_open_ai
+
+    load_dotenv(override=True)
+    # Without an API key the benchmark still runs from a warm cache.
+    client = OpenAI(api_key=os.getenv("OPENAI_API_KEY") or "offline")
+    embedder = CachedEmbedder(
+        from_open_ai(client, args.model), args.cache, namespace=args.model
+    )
+
+    articles, queries = askus_benchmark(args.askus)
+    if args.queries:
+        with open(args.queries, encoding="utf-8") as f:
+            queries += [json.loads(line) for line in f if line.strip()]
+    splitter = StructureAwareTextSplitter(chunk_size=args.chunk_size, chunk_overlap=100)
+    chunks = splitter.split_documents(articles)
+    logger.info(
+        f"{len(articles)} articles, {len(chunks)} chunks, {len(queries)} queries"
+    )
+
+    report = run(build_retrievers(chunks, embedder, args.k), queries, args.k)
+
+    recall = f"recall@{args.k}"
+    print(f"{'retriever':<28}{recall:>10}{'mrr':>8}{'p50':>10}{'p95':>10}")
+    for name, scores in report.items():
+        p50 = scores["latency"].get("p50", 0) * 1e3
+        p95 = scores["latency"].get("p95", 0) * 1e3
+        print(
+            f"{name:<28}{scores[recall]:>10.3f}{scores['mrr']:>8.3f}"
+            f"{p50:>8.2f}ms{p95:>8.2f}ms"
+        )
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+            f.write("\n")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
@@ -0,0 +1,272 @@
+"""
+Shadow evaluation of an embedding model migration.
+
+Compares the collection being served with a shadow collection holding the
+same chunks embedded with a candidate model (written by `utils.upload(...,
+shadow=...)`, see load_db.py): storage, query embedding and search latency,
+how often both return the same chunks, and recall@k and MRR on labelled
+queries. The queries are the AskUs article questions, plus an optional JSONL
+file of {"query": ..., "expected_sources": [...]} objects.
+
+The prompt injection classifier is trained on embeddings, so it has to be
+retrained for the new model (`promp_injection.train`). Given both classifiers
+and a labelled CSV, the report also compares their predictions.
+
+Usage:
+
+    python -m manoa_agent.eval.shadow general_faq general_faq-v4 \
+        --output shadow-report.json
+"""
+
+import argparse
+import csv
+import json
+import logging
+import os
+import time
+from typing import Dict, List, Optional, Sequence
+
+from langchain_chroma import Chroma
+
+from manoa_agent.eval.batch import percentiles
+from manoa_agent.eval.retrieval import askus_benchmark, ranked_sources, score_sources
+from manoa_agent.retrievers.shadow import overlap, top1_agrees
+
+logger = logging.getLogger(__name__)
+
+
+def collection_storage(store: Chroma) -> dict:
+    """
+    Size of a collection's embeddings.
+
+    Returns:
+        dict: Chunk count, embedding dimensions and the size of the float32
+            vectors in bytes (the HNSW graph and documents come on top).
+    """
+    collection = store._collection
+    count = collection.count()
+    dimensions = 0
+    if count:
+        embeddings = collection.get(limit=1, include=["embeddings"])["embeddings"]
+        dimensions = len(embeddings[0])
+    return {
+        "chunks": count,
+        "dimensions": dimensions,
+        "vector_bytes": count * dimensions * 4,
+    }
+
+
+def search(store: Chroma, query: str, k: int) -> tuple:
+    """
+    Embed a query with the store's embedder and search by vector.
+
+    Returns:
+        tuple: The documents, the embedding time and the search time.
+    """
+    start = time.perf_counter()
+    embedding = store.embeddings.embed_query(query)
+    embedded = time.perf_counter()
+    docs = store.similarity_search_by_vector(embedding, k=k)
+    return docs, embedded - start, time.perf_counter() - embedded
+
+
+def compare(
+    primary: Chroma, shadow: Chroma, queries: Sequence[dict], k: int
+) -> Dict[str, dict]:
+    """
+    Run every query against both collections.
+
+    Args:
+        primary: The served collection.
+        shadow: The shadow collection.
+        queries: Queries with "query" and optionally "expected_sources".
+        k: Results per query.
+
+    Returns:
+        dict: For "primary" and "shadow", storage, "embed_latency" and
+            "search_latency" percentiles in seconds and, over the labelled
+            queries, "recall@k" and "mrr". Under "agreement", the mean
+            "overlap" of their top k chunks and the "top1" agreement rate.
+    """
+    sides = {"primary": primary, "shadow": shadow}
+    timings = {side: {"embed": [], "search": []} for side in sides}
+    scores = {side: [] for side in sides}
+    overlaps, top1 = [], []
+    for item in queries:
+        results = {}
+        for side, store in sides.items():
+            docs, embed_time, search_time = search(store, item["query"], k)
+            timings[side]["embed"].append(embed_time)
+            timings[side]["search"].append(search_time)
+            if item.get("expected_sources"):
+                scores[side].append(
+                    score_sources(ranked_sources(docs)[:k], item["expected_sources"])
+                )
+            results[side] = docs
+        overlaps.append(overlap(results["primary"], results["shadow"]))
+        top1.append(top1_agrees(results["primary"], results["shadow"]))
+
+    n = len(queries) or 1
+    report = {
+        "agreement": {
+            "overlap": round(sum(overlaps) / n, 4),
+            "top1": round(sum(top1) / n, 4),
+        }
+    }
+    for side, store in sides.items():
+        report[side] = {
+            "collection": store._collection.name,
+            **collection_storage(store),
+            "embed_latency": percentiles(timings[side]["embed"]),
+            "search_latency": percentiles(timings[side]["search"]),
+        }
+        if scores[side]:
+            labelled = len(scores[side])
+            report[side][f"recall@{k}"] = round(
+                sum(recall for recall, _ in scores[side]) / labelled, 4
+            )
+            report[side]["mrr"] = round(sum(rr for _, rr in scores[side]) / labelled, 4)
+    return report
+
+
+def classifier_agreement(
+    primary, shadow, texts: Sequence[str], labels: Sequence[int]
+) -> dict:
+    """
+    Compare two prompt injection classifiers on labelled texts.
+
+    Args:
+        primary: The served `PromptInjectionClassifier`.
+        shadow: The classifier retrained on the candidate model's embeddings.
+        texts: The texts.
+        labels: 1 for prompt injections, 0 otherwise.
+
+    Returns:
+        dict: The accuracy of each classifier and the share of texts on which
+            they agree.
+    """
+    n = len(texts) or 1
+    predictions = {
+        side: [int(classifier.is_prompt_injection(text)) for text in texts]
+        for side, classifier in (("primary", primary), ("shadow", shadow))
+    }
+    report = {
+        f"{side}_accuracy": round(sum(p == y for p, y in zip(predicted, labels)) / n, 4)
+        for side, predicted in predictions.items()
+    }
+    report["agreement"] = round(
+        sum(a == b for a, b in zip(predictions["primary"], predictions["shadow"])) / n,
+        4,
+    )
+    return report
+
+
+def read_labelled_csv(path: str) -> tuple:
+    """
+    Texts and labels from a CSV with "label" and "text" columns, as used to
+    train the prompt injection classifier.
+    """
+    texts: List[str] = []
+    labels: List[int] = []
+    with open(path, newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            try:
+                labels.append(int(row["label"]))
+            except ValueError:
+                continue
+            texts.append(row["text"])
+    return texts, labels
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("primary", help="Served alias or collection")
+    parser.add_argument("shadow", help="Shadow collection")
+    parser.add_argument("--askus", default="data/askus")
+    parser.add_argument("--queries", help="Extra labelled queries (JSONL)")
+    parser.add_argument("--k", type=int, default=4)
+    parser.add_argument(
+        "--model",
+        default="text-embedding-3-large",
+        help="Model of collections that do not record one",
+    )
+    parser.add_argument("--dimensions", type=int)
+    parser.add_argument("--injection-csv", default="data/prompt_injections.csv")
+    parser.add_argument("--injection-model", help="Served classifier (joblib)")
+    parser.add_argument("--shadow-injection-model", help="Retrained classifier")
+    parser.add_argument("--output", help="Write the report to this JSON file")
+    args = parser.parse_args(argv)
+
+    from chromadb import HttpClient
+    from dotenv import load_dotenv
+
+    from manoa_agent.db.chroma.migration import EmbedderRegistry
+    from manoa_agent.db.chroma.versions import CollectionVersions
+    from manoa_agent.embeddings import convert
+
+    load_dotenv(override=True)
+    client = HttpClient(host=os.getenv("CHROMA_HOST"), port=os.getenv("CHROMA_PORT"))
+    embedders = EmbedderRegistry(
+        convert.from_spec(args.model, args.dimensions), args.model, args.dimensions
+    )
+    stores = {}
+    for side, name in (
+        ("primary", CollectionVersions(client).resolve(args.primary)),
+        ("shadow", args.shadow),
+    ):
+        stores[side] = Chroma(
+            collection_name=name,
+            client=client,
+            embedding_function=embedders.for_collection(client, name),
+            create_collection_if_not_exists=False,
+        )
+
+    _, queries = askus_benchmark(args.askus, strip_question=False)
+    if args.queries:
+        with open(args.queries, encoding="utf-8") as f:
+            queries += [json.loads(line) for line in f if line.strip()]
+    report = compare(stores["primary"], stores["shadow"], queries, args.k)
+
+    if args.injection_model and args.shadow_injection_model:
+        from manoa_agent.prompts.promp_injection import load
+
+        texts, labels = read_labelled_csv(args.injection_csv)
+        primary_classifier = load(
+            embedders.get(args.model), load_path=args.injection_model
+        )
+        shadow_classifier = load(
+            stores["shadow"].embeddings, load_path=args.shadow_injection_model
+        )
+        report["injection"] = classifier_agreement(
+            primary_classifier, shadow_classifier, texts, labels
+        )
+
+    recall = f"recall@{args.k}"
+    print(
+        f"{'':<10}{'collection':<24}{'chunks':>8}{'MB':>8}"
+        f"{'embed p50':>12}{'search p50':>12}{recall:>10}{'mrr':>8}"
+    )
+    for side in ("primary", "shadow"):
+        scores = report[side]
+        print(
+            f"{side:<10}{scores['collection']:<24}{scores['chunks']:>8}"
+            f"{scores['vector_bytes'] / 2**20:>8.1f}"
+            f"{scores['embed_latency'].get('p50', 0) * 1e3:>10.2f}ms"
+            f"{scores['search_latency'].get('p50', 0) * 1e3:>10.2f}ms"
+            f"{scores.get(recall, 0):>10.3f}{scores.get('mrr', 0):>8.3f}"
+        )
+    agreement = report["agreement"]
+    print(
+        f"overlap@{args.k}: {agreement['overlap']:.3f}, top1: {agreement['top1']:.3f}"
+    )
+    if "injection" in report:
+        print(f"prompt injection classifier: {report['injection']}")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+            f.write("\n")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
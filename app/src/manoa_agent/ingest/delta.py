@@ -0,0 +1,153 @@
+import json
+import logging
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+from langchain.text_splitter import TextSplitter
+from langchain_chroma import Chroma
+from langchain_core.documents import Document
+from langchain_core.stores import BaseStore
+from tqdm import tqdm
+
+from manoa_agent.db.chroma.utils import document_ids, upload_batch
+
+logger = logging.getLogger(__name__)
+
+CHANGES = ("added", "updated", "deleted")
+
+# "origin" of the chunks written from crawl deltas, which `carry_over` copies
+# into a rebuilt version.
+CRAWL_ORIGIN = "crawl"
+
+
+def read_delta(path: str) -> List[dict]:
+    """
+    Read a delta feed written by the crawler's incremental mode, either as a
+    JSON array or as JSON Lines.
+
+    Every record has a "url" and a "change" ("added", "updated" or "deleted");
+    added and updated records also carry the "extracted" text.
+    """
+    with open(path, encoding="utf-8") as f:
+        text = f.read()
+    if text.lstrip().startswith("["):
+        return json.loads(text)
+    return [json.loads(line) for line in text.splitlines() if line.strip()]
+
+
+def delete_sources(
+    collection: Chroma,
+    urls: List[str],
+    docstore: Optional[BaseStore[str, Document]] = None,
+    batch_size: int = 30,
+    protect: Sequence[Any] = (),
+) -> int:
+    """
+    Remove the chunks of the given pages from a collection, and their parent
+    sections from the docstore.
+
+    Args:
+        collection: The collection, either a langchain Chroma or a chromadb
+            collection. Chunks are matched to pages by their "source" metadata.
+        urls: The "source" of the pages.
+        docstore: Store for parent sections, as in `utils.upload`.
+        batch_size: Number of pages per query.
+        protect: Other collections sharing the docstore, e.g. the served
+            and previous versions from `CollectionVersions.served`. Parents
+            that their chunks still reference are kept.
+
+    Returns:
+        int: Number of removed chunks.
+    """
+    removed = 0
+    for start in range(0, len(urls), batch_size):
+        existing = collection.get(
+            where={"source": {"$in": urls[start : start + batch_size]}},
+            include=["metadatas"],
+        )
+        if existing["ids"]:
+            collection.delete(ids=existing["ids"])
+            removed += len(existing["ids"])
+        parent_ids = {
+            metadata["parent_id"]
+            for metadata in existing["metadatas"]
+            if metadata and "parent_id" in metadata
+        }
+        if docstore is None:
+            continue
+        for other in protect:
+            if not parent_ids:
+                break
+            referenced = other.get(
+                where={"parent_id": {"$in": sorted(parent_ids)}},
+                include=["metadatas"],
+            )
+            parent_ids -= {
+                metadata["parent_id"] for metadata in referenced["metadatas"]
+            }
+        if parent_ids:
+            docstore.mdelete(list(parent_ids))
+    return removed
+
+
+def apply_delta(
+    collection: Chroma,
+    records: Iterable[dict],
+    splitter: TextSplitter,
+    docstore: Optional[BaseStore[str, Document]] = None,
+    batch_size: int = 30,
+    protect: Sequence[Any] = (),
+) -> Dict[str, int]:
+    """
+    Apply a crawl delta to a collection: the chunks (and docstore parents) of
+    updated and deleted pages are removed, and added and updated pages are
+    split and uploaded. Unchanged pages are never re-embedded.
+
+    Args:
+        collection: The collection to update. Chunks are matched to pages by
+            their "source" metadata.
+        records: The delta records, as from `read_delta`.
+        splitter: Text splitter for the added and updated pages.
+        docstore: Store for parent sections, as in `utils.upload`.
+        batch_size: Number of chunks per upload batch.
+        protect: Collections whose parents are kept, see `delete_sources`.
+
+    Returns:
+        Dict[str, int]: Number of added, updated and deleted pages.
+    """
+    pages: Dict[str, dict] = {}
+    for record in records:
+        if record.get("change") not in CHANGES:
+            raise ValueError(f"Unknown change in delta record: {record}")
+        # A page can appear more than once in a feed; the last record wins.
+        pages[record["url"]] = record
+
+    delete_sources(collection, list(pages), docstore, batch_size, protect)
+
+    docs = [
+        Document(
+            page_content=record["extracted"],
+            metadata={"source": url, "origin": CRAWL_ORIGIN},
+        )
+        for url, record in pages.items()
+        if record["change"] != "deleted" and record.get("extracted", "").strip()
+    ]
+    if docstore is not None:
+        chunks, parents = splitter.split_with_parents(docs)
+        docstore.mset([(parent.metadata["parent_id"], parent) for parent in parents])
+    else:
+        chunks = splitter.split_documents(docs)
+    # The same ids as `utils.upload` and the sharded ingestion, so a page
+    # written by any of them is replaced, not duplicated, by the others.
+    ids = document_ids(chunks)
+    for start in tqdm(range(0, len(chunks), batch_size), desc="Applying crawl delta"):
+        upload_batch(
+            collection,
+            chunks[start : start + batch_size],
+            ids[start : start + batch_size],
+        )
+
+    stats = {change: 0 for change in CHANGES}
+    for record in pages.values():
+        stats[record["change"]] += 1
+    logger.info(f"Crawl delta applied: {stats}")
+    return stats
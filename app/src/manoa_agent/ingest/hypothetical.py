@@ -0,0 +1,193 @@
+import hashlib
+import logging
+import re
+from typing import Dict, Iterable, List
+
+from langchain_chroma import Chroma
+from langchain_core.documents import Document
+from langchain_core.language_models import BaseChatModel
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.stores import BaseStore
+from tqdm import tqdm
+
+from manoa_agent.parsers.normalize import normalize_question
+
+logger = logging.getLogger(__name__)
+
+_LIST_MARKER = re.compile(r"^\s*(?:\d+[.)]|[-*•])\s*")
+
+_PROMPT = ChatPromptTemplate.from_messages(
+    [
+        (
+            "system",
+            "You write the questions that University of Hawaii students, faculty "
+            "and staff would type into a help chat to find the article below. "
+            "Write {n} different questions in the words of a user: vary the "
+            "phrasing, use informal wording and abbreviations people actually "
+            "use, and cover the different tasks the article answers. "
+            "Return one question per line and nothing else.",
+        ),
+        ("human", "{article}"),
+    ]
+)
+
+
+def content_hash(doc: Document) -> str:
+    return hashlib.sha256(doc.page_content.encode("utf-8")).hexdigest()
+
+
+def article_question(doc: Document) -> str:
+    """
+    The article's own question: the first line of an AskUs document, as
+    produced by `HtmlDirectoryLoader`.
+    """
+    return doc.page_content.split("\n", 1)[0].strip("# ").strip()
+
+
+def parse_questions(text: str) -> List[str]:
+    """
+    Split a model response into questions, dropping list markers and blanks.
+    """
+    questions = (_LIST_MARKER.sub("", line).strip() for line in text.splitlines())
+    return [q for q in questions if q]
+
+
+class HypotheticalQuestionIndexer:
+    """
+    Offline index of paraphrased user questions for AskUs articles.
+
+    For every article, a chat model writes several questions a user might ask.
+    The questions (plus the article's own question) are embedded into a
+    question collection with the article's "parent_id", and the full article is
+    written to the docstore under that id. A `SmallToBigRetriever` over the
+    question collection then matches question to question and answers with the
+    article.
+
+    Indexing is incremental: each question carries the hash of its article, so
+    only new or changed articles are regenerated and articles that no longer
+    exist are removed.
+    """
+
+    def __init__(
+        self,
+        collection: Chroma,
+        docstore: BaseStore[str, Document],
+        llm: BaseChatModel,
+        n_questions: int = 5,
+        batch_size: int = 64,
+        max_concurrency: int = 8,
+    ):
+        """
+        Args:
+            collection: Collection for the question embeddings.
+            docstore: Store for the articles, keyed by "parent_id".
+            llm: Chat model that writes the questions.
+            n_questions: Number of questions generated per article.
+            batch_size: Number of articles generated and embedded per batch.
+            max_concurrency: Maximum concurrent generation requests.
+        """
+        self.collection = collection
+        self.docstore = docstore
+        self.chain = _PROMPT | llm | StrOutputParser()
+        self.n_questions = n_questions
+        self.batch_size = batch_size
+        self.max_concurrency = max_concurrency
+
+    def _indexed(self) -> Dict[str, dict]:
+        """
+        Map every indexed article id to its content hash and question ids.
+        """
+        existing = self.collection.get(include=["metadatas"])
+        indexed: Dict[str, dict] = {}
+        for id_, metadata in zip(existing["ids"], existing["metadatas"]):
+            entry = indexed.setdefault(
+                metadata["parent_id"], {"hash": metadata["content_hash"], "ids": []}
+            )
+            entry["ids"].append(id_)
+        return indexed
+
+    def generate(self, docs: List[Document]) -> List[List[str]]:
+        """
+        Generate the questions of every article. The article's own question
+        comes first and near-duplicate questions are dropped.
+        """
+        responses = self.chain.batch(
+            [{"article": doc.page_content, "n": self.n_questions} for doc in docs],
+            config={"max_concurrency": self.max_concurrency},
+        )
+        results = []
+        for doc, response in zip(docs, responses):
+            questions = [article_question(doc)] + parse_questions(response)
+            unique = {normalize_question(q): q for q in reversed(questions) if q}
+            results.append(list(reversed(unique.values())))
+        return results
+
+    def index(self, docs: Iterable[Document]) -> Dict[str, int]:
+        """
+        Bring the question index up to date with the given articles.
+
+        Args:
+            docs: All current articles. Articles are identified by their
+                "source" metadata.
+
+        Returns:
+            Dict[str, int]: Number of added, updated, removed and unchanged
+                articles.
+        """
+        indexed = self._indexed()
+        articles = {doc.metadata["source"]: doc for doc in docs}
+        stats = {"added": 0, "updated": 0, "removed": 0, "unchanged": 0}
+
+        changed = []
+        for parent_id, doc in articles.items():
+            entry = indexed.get(parent_id)
+            if entry is None:
+                stats["added"] += 1
+            elif entry["hash"] != content_hash(doc):
+                stats["updated"] += 1
+            else:
+                stats["unchanged"] += 1
+                continue
+            changed.append(parent_id)
+
+        removed = [parent_id for parent_id in indexed if parent_id not in articles]
+        stale_ids = [
+            id_
+            for parent_id in changed + removed
+            if parent_id in indexed
+            for id_ in indexed[parent_id]["ids"]
+        ]
+        if stale_ids:
+            self.collection.delete(ids=stale_ids)
+        if removed:
+            self.docstore.mdelete(removed)
+        stats["removed"] = len(removed)
+
+        for start in tqdm(
+            range(0, len(changed), self.batch_size), desc="Indexing questions"
+        ):
+            batch = [articles[id_] for id_ in changed[start : start + self.batch_size]]
+            self._add(batch, self.generate(batch))
+
+        logger.info(f"Hypothetical question index: {stats}")
+        return stats
+
+    def _add(self, docs: List[Document], questions: List[List[str]]) -> None:
+        texts, metadatas, ids, parents = [], [], [], []
+        for doc, doc_questions in zip(docs, questions):
+            parent_id = doc.metadata["source"]
+            metadata = {"parent_id": parent_id, "content_hash": content_hash(doc)}
+            for i, question in enumerate(doc_questions):
+                texts.append(question)
+                metadatas.append({"source": parent_id, **metadata})
+                ids.append(f"{parent_id}#{i}")
+            parent = Document(
+                page_content=doc.page_content,
+                metadata={**doc.metadata, "parent_id": parent_id},
+            )
+            parents.append((parent_id, parent))
+
+        # Parents first, so a question is never matched without its article.
+        self.docstore.mset(parents)
+        self.collection.add_texts(texts, metadatas=metadatas, ids=ids)
@@ -0,0 +1,664 @@
+"""
+Sharded, multi-process ingestion of the sources listed in a manifest.
+
+A manifest is a JSON file that maps sources to collections:
+
+    {
+      "chunk_size": 1000,
+      "chunk_overlap": 100,
+      "shard_size": 50,
+      "sources": [
+        {"name": "askus", "type": "html_dir", "path": "data/askus",
+         "collection": "general_faq"},
+        {"name": "policies", "type": "json", "path": "data/json/policies.json",
+         "collection": "general_faq"},
+        {"name": "its", "type": "urls", "collection": "general_faq",
+         "urls": ["https://www.hawaii.edu/its/"], "ids": ["content"]}
+      ]
+    }
+
+"html_dir" sources are directories of AskUs articles (`HtmlDirectoryLoader`),
+"json" sources are crawler feeds of {"url", "extracted"} records as a JSON
+array or JSON Lines, and "urls" sources are fetched and converted with
+`HTMLParser`, optionally limited to the element given by "ids" or "tags".
+
+Every source is cut into shards of `shard_size` files, records or URLs. The
+shards are parsed and split in a process pool. Their chunks are embedded in
+batches by a thread pool that shares one rate limit, and written to Chroma by
+another. A shard is recorded in the checkpoint file once all of its chunks are
+written, so an interrupted run resumes with the unfinished shards. The chunks
+of a shard replace the chunks of the same pages, under the ids of
+`utils.document_ids`, so a shard can safely be ingested again.
+
+Usage:
+
+    python -m manoa_agent.ingest.sharded data/manifest.json --workers 8 \
+        --requests-per-minute 3000 --tokens-per-minute 1000000
+"""
+
+import argparse
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    Executor,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+    wait,
+)
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import requests
+from langchain_core.documents import Document
+from langchain_core.stores import BaseStore
+from tqdm import tqdm
+
+from manoa_agent.db.chroma.utils import document_ids
+from manoa_agent.embeddings.base import Embedder
+from manoa_agent.ingest.delta import delete_sources, read_delta
+from manoa_agent.loaders.html import HtmlDirectoryLoader
+from manoa_agent.loaders.website_loader import WebLoader
+from manoa_agent.parsers.html_parser import HTMLParser
+from manoa_agent.server.ratelimit import TokenBucket
+from manoa_agent.splitters.structure import StructureAwareTextSplitter
+
+logger = logging.getLogger(__name__)
+
+SOURCE_TYPES = ("html_dir", "json", "urls")
+STAGES = ("parse", "embed", "write")
+
+
+def load_manifest(path: str) -> dict:
+    """
+    Read and validate an ingestion manifest.
+
+    Raises:
+        ValueError: If a source is incomplete, has an unknown type or a
+            duplicate name, or the manifest has no sources.
+    """
+    with open(path, encoding="utf-8") as f:
+        manifest = json.load(f)
+    sources = manifest.get("sources")
+    if not sources:
+        raise ValueError(f"Manifest {path} has no sources")
+
+    names = set()
+    for source in sources:
+        required = {"name", "type", "collection"}
+        required.add("urls" if source.get("type") == "urls" else "path")
+        missing = required - set(source)
+        if missing:
+            raise ValueError(f"Manifest source {source} is missing {sorted(missing)}")
+        if source["type"] not in SOURCE_TYPES:
+            raise ValueError(f"Unknown source type {source['type']!r}")
+        if source["name"] in names:
+            raise ValueError(f"Duplicate source name {source['name']!r}")
+        names.add(source["name"])
+    return manifest
+
+
+def _fingerprint(value: Any) -> str:
+    data = json.dumps(value, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha1(data.encode("utf-8")).hexdigest()
+
+
+def plan_shards(manifest: dict) -> List[dict]:
+    """
+    Cut the sources of a manifest into shards.
+
+    Every shard has a "key" (collection, source name and shard number), the
+    "source" it belongs to, its "items" (file paths, records or URLs) and a
+    "fingerprint" of its inputs and the chunking settings, which changes when
+    a file, record or the chunking changes.
+    """
+    shard_size = manifest.get("shard_size", 50)
+    settings = [manifest.get("chunk_size", 1000), manifest.get("chunk_overlap", 100)]
+    shards = []
+    for source in manifest["sources"]:
+        if source["type"] == "html_dir":
+            items = [str(path) for path in sorted(Path(source["path"]).glob("*.html"))]
+            # Files are fingerprinted by size and modification time.
+            inputs = [
+                [path, stat.st_size, stat.st_mtime_ns]
+                for path, stat in ((path, os.stat(path)) for path in items)
+            ]
+        elif source["type"] == "json":
+            items = inputs = read_delta(source["path"])
+        else:
+            items = inputs = list(source["urls"])
+
+        # The URL list is carried by the items, not by every shard.
+        info = {key: value for key, value in source.items() if key != "urls"}
+        for index, start in enumerate(range(0, len(items), shard_size)):
+            shards.append(
+                {
+                    "key": f"{source['collection']}/{source['name']}/{index}",
+                    "source": info,
+                    "items": items[start : start + shard_size],
+                    "fingerprint": _fingerprint(
+                        [settings, inputs[start : start + shard_size]]
+                    ),
+                }
+            )
+    return shards
+
+
+def _load_documents(shard: dict) -> List[Document]:
+    source = shard["source"]
+    if source["type"] == "html_dir":
+        loader = HtmlDirectoryLoader(source["path"])
+        documents = [loader.load_file(path) for path in shard["items"]]
+        return [document for document in documents if document is not None]
+
+    if source["type"] == "json":
+        return [
+            Document(page_content=r["extracted"], metadata={"source": r["url"]})
+            for r in shard["items"]
+            if r.get("extracted", "").strip()
+        ]
+
+    parser = HTMLParser(ids=source.get("ids", []), tags=source.get("tags", []))
+    documents = []
+    for url in shard["items"]:
+        try:
+            documents.extend(WebLoader([url], parser).lazy_load())
+        except requests.RequestException as e:
+            logger.warning(f"Skipping {url}: {e!r}")
+    return documents
+
+
+def parse_shard(
+    shard: dict, chunk_size: int = 1000, chunk_overlap: int = 100
+) -> Tuple[int, List[str], List[Document], List[Document], float]:
+    """
+    Load and split the documents of a shard. Runs in a worker process.
+
+    Returns:
+        Tuple: The number of documents, their sources, the chunks, the parent
+            sections and the seconds it took.
+    """
+    start = time.perf_counter()
+    documents = _load_documents(shard)
+    splitter = StructureAwareTextSplitter(
+        chunk_size=chunk_size, chunk_overlap=chunk_overlap, include_parent_content=False
+    )
+    chunks, parents = splitter.split_with_parents(documents)
+    sources = [document.metadata["source"] for document in documents]
+    return len(documents), sources, chunks, parents, time.perf_counter() - start
+
+
+class IngestCheckpoint:
+    """
+    Shards that were completely written, by key and fingerprint, persisted in
+    a SQLite file.
+    """
+
+    def __init__(self, path: str):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS shards "
+            "(key TEXT PRIMARY KEY, fingerprint TEXT NOT NULL, chunks INTEGER, "
+            "completed REAL)"
+        )
+        self._conn.commit()
+
+    def done(self, key: str, fingerprint: str) -> bool:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT fingerprint FROM shards WHERE key = ?", (key,)
+            ).fetchone()
+        return row is not None and row[0] == fingerprint
+
+    def mark(self, key: str, fingerprint: str, chunks: int) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO shards (key, fingerprint, chunks, completed) "
+                "VALUES (?, ?, ?, ?)",
+                (key, fingerprint, chunks, time.time()),
+            )
+            self._conn.commit()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM shards")
+            self._conn.commit()
+
+
+class StageStats:
+    """
+    Items processed by one pipeline stage, the time its workers spent on
+    them, and the wall time from the first to the last item.
+    """
+
+    def __init__(self):
+        self.items = 0
+        self.busy = 0.0
+        self.first: Optional[float] = None
+        self.last: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def record(self, items: int, seconds: float) -> None:
+        now = time.perf_counter()
+        with self._lock:
+            self.items += items
+            self.busy += seconds
+            self.first = min(self.first or now, now - seconds)
+            self.last = now
+
+    def summary(self) -> Dict[str, float]:
+        wall = self.last - self.first if self.first is not None else 0.0
+        return {
+            "items": self.items,
+            "busy_seconds": round(self.busy, 3),
+            "wall_seconds": round(wall, 3),
+            "items_per_second": round(self.items / wall, 2) if wall else 0.0,
+        }
+
+
+class ShardedIngestion:
+    """
+    Parses shards in a process pool, embeds their chunks in a rate-limited
+    thread pool, and writes them to Chroma from another thread pool.
+
+    At most `max_pending_batches` batches are embedded or written at once;
+    when that many are in flight, parsed shards wait, so a slow embedding API
+    slows parsing down instead of filling memory with chunks.
+    """
+
+    def __init__(
+        self,
+        collections: Dict[str, Any],
+        embedder: Embedder,
+        docstore: Optional[BaseStore[str, Document]] = None,
+        checkpoint: Optional[IngestCheckpoint] = None,
+        workers: Optional[int] = None,
+        batch_size: int = 64,
+        embed_concurrency: int = 4,
+        write_concurrency: int = 4,
+        max_pending_batches: int = 32,
+        budget: Optional[TokenBucket] = None,
+        token_budget: Optional[TokenBucket] = None,
+        embedders: Optional[Dict[str, Embedder]] = None,
+        protect: Sequence[Any] = (),
+    ):
+        """
+        Args:
+            collections: chromadb collections by name, for every collection
+                named in the shards.
+            embedder: Embedder for the chunks.
+            docstore: Store for parent sections, as in `utils.upload`.
+            checkpoint: Completed shards, skipped when they did not change.
+            workers: Number of parser processes (default: one per CPU). 0
+                parses in a thread of this process.
+            batch_size: Number of chunks per embedding request and write.
+            embed_concurrency: Number of concurrent embedding requests.
+            write_concurrency: Number of concurrent Chroma writes.
+            max_pending_batches: Maximum number of batches in flight.
+            budget: Embedding requests allowed, shared by every request.
+            token_budget: Embedding tokens allowed (estimated as 4 characters
+                per token), shared by every request.
+            embedders: Embedders by collection name, for collections built
+                with another model than `embedder`.
+            protect: Other collections sharing the docstore, whose parents
+                are kept when a page is replaced, see `delta.delete_sources`.
+        """
+        self.collections = collections
+        self.embedder = embedder
+        self.embedders = embedders or {}
+        self.protect = protect
+        self.docstore = docstore
+        self.checkpoint = checkpoint
+        self.workers = (os.cpu_count() or 1) if workers is None else workers
+        self.batch_size = batch_size
+        self.embed_concurrency = embed_concurrency
+        self.write_concurrency = write_concurrency
+        self.max_pending_batches = max_pending_batches
+        self.budget = budget
+        self.token_budget = token_budget
+
+    def _parse_pool(self) -> Executor:
+        if self.workers == 0:
+            return ThreadPoolExecutor(1, thread_name_prefix="parse")
+        # Spawned rather than forked, since this process runs the embedding
+        # and writing threads.
+        return ProcessPoolExecutor(
+            self.workers, mp_context=multiprocessing.get_context("spawn")
+        )
+
+    def run(
+        self, shards: Sequence[dict], chunk_size: int = 1000, chunk_overlap: int = 100
+    ) -> dict:
+        """
+        Ingest the shards that are not in the checkpoint.
+
+        Returns:
+            dict: Number of shards planned, skipped and ingested, and the
+                throughput of the parse, embed and write stages.
+        """
+        pending = [
+            shard
+            for shard in shards
+            if self.checkpoint is None
+            or not self.checkpoint.done(shard["key"], shard["fingerprint"])
+        ]
+        self._stats = {stage: StageStats() for stage in STAGES}
+        self._error: Optional[BaseException] = None
+        self._lock = threading.Lock()
+        self._remaining: Dict[str, int] = {}
+        self._chunks: Dict[str, int] = {}
+        self._slots = threading.BoundedSemaphore(self.max_pending_batches)
+        self._completed = 0
+        self._progress = tqdm(total=len(pending), desc="Ingesting shards")
+        self._embed_pool = ThreadPoolExecutor(
+            self.embed_concurrency, thread_name_prefix="embed"
+        )
+        self._write_pool = ThreadPoolExecutor(
+            self.write_concurrency, thread_name_prefix="write"
+        )
+        parse_pool = self._parse_pool()
+
+        start = time.perf_counter()
+        try:
+            queue = iter(pending)
+            in_flight = {}
+
+            def submit_next():
+                shard = next(queue, None)
+                if shard is not None:
+                    future = parse_pool.submit(
+                        parse_shard, shard, chunk_size, chunk_overlap
+                    )
+                    in_flight[future] = shard
+
+            # Keep every parser busy, with one shard queued behind each.
+            for _ in range(2 * max(self.workers, 1)):
+                submit_next()
+            while in_flight:
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    shard = in_flight.pop(future)
+                    self._dispatch(shard, *future.result())
+                    submit_next()
+                self._raise_error()
+
+            # Embedding tasks hand their batches to the writers, so the
+            # embedding pool is drained first.
+            self._embed_pool.shutdown(wait=True)
+            self._write_pool.shutdown(wait=True)
+            self._raise_error()
+        finally:
+            parse_pool.shutdown(wait=False, cancel_futures=True)
+            self._embed_pool.shutdown(wait=False, cancel_futures=True)
+            self._write_pool.shutdown(wait=False, cancel_futures=True)
+            self._progress.close()
+
+        return {
+            "shards": {
+                "planned": len(shards),
+                "skipped": len(shards) - len(pending),
+                "ingested": self._completed,
+            },
+            "wall_seconds": round(time.perf_counter() - start, 3),
+            "stages": {stage: self._stats[stage].summary() for stage in STAGES},
+        }
+
+    def _raise_error(self) -> None:
+        if self._error is not None:
+            raise self._error
+
+    def _fail(self, error: BaseException) -> None:
+        with self._lock:
+            if self._error is None:
+                self._error = error
+
+    def _dispatch(
+        self,
+        shard: dict,
+        documents: int,
+        sources: List[str],
+        chunks: List[Document],
+        parents: List[Document],
+        seconds: float,
+    ) -> None:
+        self._stats["parse"].record(documents, seconds)
+        collection = self.collections[shard["source"]["collection"]]
+        # The pages of the shard are replaced, including chunks and parents
+        # that a new version of a page no longer has.
+        delete_sources(collection, sources, self.docstore, protect=list(self.protect))
+        if self.docstore is not None:
+            self.docstore.mset([(p.metadata["parent_id"], p) for p in parents])
+
+        ids = document_ids(chunks)
+        batches = range(0, len(chunks), self.batch_size)
+        with self._lock:
+            self._remaining[shard["key"]] = len(batches)
+            self._chunks[shard["key"]] = len(chunks)
+        if not chunks:
+            self._complete(shard)
+            return
+        for start in batches:
+            self._slots.acquire()
+            self._embed_pool.submit(
+                self._embed,
+                shard,
+                collection,
+                ids[start : start + self.batch_size],
+                chunks[start : start + self.batch_size],
+            )
+
+    def _embed(
+        self, shard: dict, collection: Any, ids: List[str], chunks: List[Document]
+    ) -> None:
+        try:
+            if self._error is not None:
+                self._slots.release()
+                return
+            texts = [chunk.page_content for chunk in chunks]
+            if self.budget is not None:
+                self.budget.acquire()
+            if self.token_budget is not None:
+                tokens = sum(len(text) for text in texts) / 4
+                self.token_budget.acquire(min(tokens, self.token_budget.capacity))
+            start = time.perf_counter()
+            embedder = self.embedders.get(collection.name, self.embedder)
+            vectors = embedder.embed_documents(texts)
+            self._stats["embed"].record(len(chunks), time.perf_counter() - start)
+            self._write_pool.submit(
+                self._write, shard, collection, ids, chunks, vectors
+            )
+        except BaseException as e:
+            self._fail(e)
+            self._slots.release()
+
+    def _write(
+        self,
+        shard: dict,
+        collection: Any,
+        ids: List[str],
+        chunks: List[Document],
+        vectors: List[List[float]],
+    ) -> None:
+        try:
+            if self._error is not None:
+                return
+            start = time.perf_counter()
+            collection.upsert(
+                ids=ids,
+                embeddings=vectors,
+                documents=[chunk.page_content for chunk in chunks],
+                metadatas=[chunk.metadata for chunk in chunks],
+            )
+            self._stats["write"].record(len(chunks), time.perf_counter() - start)
+            with self._lock:
+                self._remaining[shard["key"]] -= 1
+                finished = not self._remaining[shard["key"]]
+            if finished:
+                self._complete(shard)
+        except BaseException as e:
+            self._fail(e)
+        finally:
+            self._slots.release()
+
+    def _complete(self, shard: dict) -> None:
+        if self.checkpoint is not None:
+            self.checkpoint.mark(
+                shard["key"], shard["fingerprint"], self._chunks[shard["key"]]
+            )
+        with self._lock:
+            self._completed += 1
+        self._progress.update(1)
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("manifest", help="JSON manifest of sources")
+    parser.add_argument("--workers", type=int, help="Parser processes")
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--embed-concurrency", type=int, default=4)
+    parser.add_argument("--write-concurrency", type=int, default=4)
+    parser.add_argument("--requests-per-minute", type=float)
+    parser.add_argument("--tokens-per-minute", type=float)
+    parser.add_argument("--checkpoint", default="data/ingest_checkpoint.sqlite")
+    parser.add_argument(
+        "--restart", action="store_true", help="Ignore completed shards"
+    )
+    parser.add_argument(
+        "--new-version",
+        action="store_true",
+        help="Build every collection into a new version instead of the served one",
+    )
+    parser.add_argument(
+        "--promote", action="store_true", help="Promote the new versions when done"
+    )
+    parser.add_argument("--output", help="Write the summary to this JSON file")
+    args = parser.parse_args(argv)
+
+    from chromadb import HttpClient
+    from dotenv import load_dotenv
+
+    from manoa_agent.db.chroma.migration import EmbedderRegistry, embedding_metadata
+    from manoa_agent.db.chroma.versions import CollectionVersions, carry_over
+    from manoa_agent.db.docstore import SQLiteDocStore
+    from manoa_agent.embeddings import convert
+
+    logging.basicConfig(level=logging.INFO)
+    load_dotenv(override=True)
+    manifest = load_manifest(args.manifest)
+
+    # The same embedders, collections and docstore as load_db.py: new versions
+    # record the EMBEDDING_MODEL they are built with, existing ones are written
+    # with the model they recorded.
+    embedding_model = os.getenv("EMBEDDING_MODEL", "text-embedding-3-large")
+    embedding_dimensions = os.getenv("EMBEDDING_DIMENSIONS")
+    embedding_dimensions = int(embedding_dimensions) if embedding_dimensions else None
+    embedder = convert.from_spec(embedding_model, embedding_dimensions)
+    registry = EmbedderRegistry(embedder, embedding_model, embedding_dimensions)
+    client = HttpClient(host=os.getenv("CHROMA_HOST"), port=os.getenv("CHROMA_PORT"))
+
+    # Manifest collections are aliases: sources are written to the version
+    # being served, or to a new one. To resume an interrupted build of a new
+    # version, name the version itself (e.g. general_faq-v3) in the manifest.
+    versions = CollectionVersions(client)
+    metadata = embedding_metadata(embedding_model, embedding_dimensions)
+    targets = {
+        alias: (
+            versions.create(alias, metadata=metadata)
+            if args.new_version
+            else versions.resolve(alias)
+        )
+        for alias in sorted({source["collection"] for source in manifest["sources"]})
+    }
+    for source in manifest["sources"]:
+        source["collection"] = targets[source["collection"]]
+    shards = plan_shards(manifest)
+    embedders = {
+        name: registry.get_or_create(client, name) for name in targets.values()
+    }
+    collections = {
+        name: client.get_collection(name, embedding_function=embedders[name])
+        for name in targets.values()
+    }
+    checkpoint = IngestCheckpoint(args.checkpoint)
+    if args.restart:
+        checkpoint.clear()
+
+    budget = token_budget = None
+    if args.requests_per_minute:
+        budget = TokenBucket(args.requests_per_minute / 60, args.embed_concurrency)
+    if args.tokens_per_minute:
+        # Up to ten seconds' worth of tokens in a burst.
+        token_budget = TokenBucket(
+            args.tokens_per_minute / 60, args.tokens_per_minute / 6
+        )
+
+    ingestion = ShardedIngestion(
+        collections,
+        embedder,
+        docstore=SQLiteDocStore(os.getenv("DOCSTORE_PATH", "data/docstore.sqlite")),
+        checkpoint=checkpoint,
+        workers=args.workers,
+        batch_size=args.batch_size,
+        embed_concurrency=args.embed_concurrency,
+        write_concurrency=args.write_concurrency,
+        budget=budget,
+        token_budget=token_budget,
+        embedders=embedders,
+        # Versions that can be served keep their parents in the shared docstore.
+        protect=[
+            client.get_collection(name, embedding_function=None)
+            for name in versions.served()
+        ],
+    )
+    report = ingestion.run(
+        shards, manifest.get("chunk_size", 1000), manifest.get("chunk_overlap", 100)
+    )
+
+    shard_counts = report["shards"]
+    print(
+        f"{shard_counts['ingested']} shards ingested, {shard_counts['skipped']} "
+        f"skipped as unchanged, in {report['wall_seconds']:.1f}s"
+    )
+    print(f"{'stage':<8}{'items':>10}{'busy':>10}{'wall':>10}{'items/s':>10}")
+    for stage, stats in report["stages"].items():
+        print(
+            f"{stage:<8}{stats['items']:>10}{stats['busy_seconds']:>9.1f}s"
+            f"{stats['wall_seconds']:>9.1f}s{stats['items_per_second']:>10.1f}"
+        )
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+            f.write("\n")
+
+    if args.new_version:
+        for alias, name in targets.items():
+            # Pages that were streamed or applied as crawl deltas into the
+            # served version are not in the manifest; keep them.
+            previous = versions.resolve(alias)
+            if versions.exists(previous):
+                same_model = (
+                    registry.for_collection(client, previous) is embedders[name]
+                )
+                carry_over(
+                    client.get_collection(previous, embedding_function=None),
+                    collections[name],
+                    None if same_model else embedders[name],
+                )
+            if args.promote:
+                versions.promote(alias, name)
+            else:
+                print(
+                    f"Built {name}; serve it with "
+                    f"`python -m manoa_agent.db.chroma.versions promote {alias} {name}`"
+                )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,317 @@
+import contextvars
+import logging
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from typing import Any, Deque, Dict, Optional, Tuple, Type
+
+import httpx
+import openai
+from langchain_core.runnables import Runnable
+from langchain_openai import ChatOpenAI
+
+from manoa_agent.server.ratelimit import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar(
+    "llm_request_deadline", default=None
+)
+# Deadline of the gateway call being made in the current worker thread; the
+# HTTP clients built by `build_chat_model` cap each request's timeout to it.
+_call_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar(
+    "llm_call_deadline", default=None
+)
+
+
+class DeadlineExceeded(TimeoutError):
+    """
+    Raised when the request deadline passed before an LLM call could finish.
+    """
+
+
+@contextmanager
+def request_deadline(seconds: float):
+    """
+    Set the deadline for every LLM call made within the context.
+
+    The deadline is stored in a context variable, so it follows the request
+    into the executor threads LangChain and LangGraph run sync nodes in.
+
+    Args:
+        seconds: Number of seconds from now until the request must finish.
+    """
+    token = _deadline.set(time.monotonic() + seconds)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining_time() -> Optional[float]:
+    """
+    Returns:
+        Optional[float]: Seconds left until the current request deadline, or
+            None if no deadline is set.
+    """
+    deadline = _deadline.get()
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
+
+
+def _cap_timeout(request: httpx.Request) -> None:
+    deadline = _call_deadline.get()
+    if deadline is None:
+        return
+    # Never 0, which httpx would treat as an immediate timeout of every read.
+    remaining = max(deadline - time.monotonic(), 0.001)
+    timeout = request.extensions.get("timeout") or {}
+    request.extensions["timeout"] = {
+        key: remaining if value is None else min(value, remaining)
+        for key, value in {
+            "connect": None,
+            "read": None,
+            "write": None,
+            "pool": None,
+            **timeout,
+        }.items()
+    }
+
+
+async def _acap_timeout(request: httpx.Request) -> None:
+    _cap_timeout(request)
+
+
+def build_chat_model(
+    model: str, max_connections: int = 32, timeout: float = 60, **kwargs
+) -> ChatOpenAI:
+    """
+    Build a ChatOpenAI model backed by connection pools sized for the server's
+    concurrency. Retries are left to the `LLMGateway`, and requests made for a
+    gateway call time out when the call does, so abandoned calls do not keep
+    holding a connection.
+
+    Args:
+        model: The model name.
+        max_connections: Size of the sync and async HTTP connection pools.
+        timeout: Hard timeout in seconds for a single HTTP request.
+        **kwargs: Extra arguments passed to ChatOpenAI (e.g. base_url).
+
+    Returns:
+        ChatOpenAI: The chat model.
+    """
+    limits = httpx.Limits(
+        max_connections=max_connections, max_keepalive_connections=max_connections
+    )
+    return ChatOpenAI(
+        model=model,
+        timeout=timeout,
+        max_retries=0,
+        http_client=httpx.Client(
+            limits=limits,
+            timeout=timeout,
+            event_hooks={"request": [_cap_timeout]},
+        ),
+        http_async_client=httpx.AsyncClient(
+            limits=limits,
+            timeout=timeout,
+            event_hooks={"request": [_acap_timeout]},
+        ),
+        **kwargs,
+    )
+
+
+RETRYABLE_ERRORS: Tuple[Type[BaseException], ...] = (
+    openai.RateLimitError,
+    openai.APITimeoutError,
+    openai.APIConnectionError,
+    openai.InternalServerError,
+    TimeoutError,
+)
+
+
+class LLMGateway:
+    """
+    Single entry point for LLM calls made by the agent nodes.
+
+    Every call
+    - waits for the shared upstream call budget, if one is configured,
+    - gets a timeout that is the smaller of the node's timeout and the time
+      left until the request deadline (see `request_deadline`),
+    - is retried on transient errors with exponential backoff and full
+      jitter, as long as the deadline allows it,
+    - is optionally hedged: once the call has taken longer than the node's
+      observed p95 latency, a duplicate is sent and the first response wins.
+    """
+
+    def __init__(
+        self,
+        budget: Optional[TokenBucket] = None,
+        timeouts: Optional[Dict[str, float]] = None,
+        default_timeout: Optional[float] = None,
+        max_retries: int = 2,
+        backoff_base: float = 0.5,
+        backoff_max: float = 8.0,
+        hedge: bool = False,
+        hedge_quantile: float = 0.95,
+        hedge_min_samples: int = 20,
+        max_workers: int = 32,
+    ):
+        """
+        Args:
+            budget: Upstream calls-per-second budget shared by all nodes.
+            timeouts: Per-node timeouts in seconds, keyed by node name.
+            default_timeout: Timeout for nodes missing from `timeouts`. None
+                means no timeout other than the request deadline.
+            max_retries: Number of retries after the first attempt.
+            backoff_base: Backoff before the first retry, doubled per retry.
+            backoff_max: Upper bound on a single backoff.
+            hedge: Whether to send hedged duplicate requests.
+            hedge_quantile: Latency quantile after which a hedge is sent.
+            hedge_min_samples: Number of latency samples a node needs before
+                its calls are hedged.
+            max_workers: Size of the thread pool running timed and hedged calls.
+        """
+        self.budget = budget
+        self.timeouts = timeouts or {}
+        self.default_timeout = default_timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.hedge = hedge
+        self.hedge_quantile = hedge_quantile
+        self.hedge_min_samples = hedge_min_samples
+        self.max_workers = max_workers
+
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._latencies: Dict[str, Deque[float]] = {}
+
+    def invoke(self, node: str, runnable: Runnable, input: Any) -> Any:
+        """
+        Invoke a runnable (usually a prompt | llm chain) on behalf of a node.
+
+        Args:
+            node: Name of the calling node, used for timeouts and latency stats.
+            runnable: The runnable to invoke.
+            input: The runnable input.
+
+        Returns:
+            The runnable output.
+
+        Raises:
+            DeadlineExceeded: If the request deadline passed.
+        """
+        attempt = 0
+        while True:
+            timeout = self._timeout(node)
+            if self.budget:
+                acquired = self.budget.acquire(timeout=timeout)
+                if not acquired:
+                    raise DeadlineExceeded(f"{node}: no upstream call budget in time")
+                timeout = self._timeout(node)
+
+            try:
+                return self._call(node, runnable, input, timeout)
+            except RETRYABLE_ERRORS as e:
+                if attempt >= self.max_retries:
+                    raise
+                backoff = random.uniform(
+                    0, min(self.backoff_max, self.backoff_base * 2**attempt)
+                )
+                remaining = remaining_time()
+                if remaining is not None and remaining <= backoff:
+                    raise
+                attempt += 1
+                logger.warning(
+                    f"{node}: LLM call failed with {e!r}, "
+                    f"retry {attempt}/{self.max_retries} in {backoff:.2f}s"
+                )
+                time.sleep(backoff)
+
+    def hedge_delay(self, node: str) -> Optional[float]:
+        """
+        Returns:
+            Optional[float]: The latency quantile for a node after which a
+                hedged request is sent, or None if there are too few samples.
+        """
+        with self._lock:
+            samples = sorted(self._latencies.get(node, ()))
+        if len(samples) < self.hedge_min_samples:
+            return None
+        index = min(len(samples) - 1, int(self.hedge_quantile * len(samples)))
+        return samples[index]
+
+    def _timeout(self, node: str) -> Optional[float]:
+        timeout = self.timeouts.get(node, self.default_timeout)
+        remaining = remaining_time()
+        if remaining is None:
+            return timeout
+        if remaining <= 0:
+            raise DeadlineExceeded(f"{node}: request deadline exceeded")
+        return remaining if timeout is None else min(timeout, remaining)
+
+    def _record(self, node: str, latency: float) -> None:
+        with self._lock:
+            samples = self._latencies.setdefault(node, deque(maxlen=200))
+            samples.append(latency)
+
+    def _submit(
+        self, runnable: Runnable, input: Any, deadline: Optional[float] = None
+    ) -> Future:
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(
+                        self.max_workers, thread_name_prefix="llm-gateway"
+                    )
+        # Carry the request context (deadline, callbacks) into the worker.
+        context = contextvars.copy_context()
+        context.run(_call_deadline.set, deadline)
+        return self._executor.submit(context.run, runnable.invoke, input)
+
+    def _call(
+        self, node: str, runnable: Runnable, input: Any, timeout: Optional[float]
+    ) -> Any:
+        start = time.monotonic()
+        hedge_delay = self.hedge_delay(node) if self.hedge else None
+
+        if timeout is None and hedge_delay is None:
+            result = runnable.invoke(input)
+            self._record(node, time.monotonic() - start)
+            return result
+
+        deadline = None if timeout is None else start + timeout
+        pending = {self._submit(runnable, input, deadline)}
+        if hedge_delay is not None and (timeout is None or hedge_delay < timeout):
+            done, _ = wait(pending, timeout=hedge_delay)
+            # Only the hedge itself spends budget, not calls that finished in time.
+            if not done and (not self.budget or self.budget.try_acquire() == 0):
+                logger.info(f"{node}: hedging request after {hedge_delay:.2f}s")
+                pending.add(self._submit(runnable, input, deadline))
+
+        error: Optional[BaseException] = None
+        while pending:
+            remaining = None
+            if timeout is not None:
+                remaining = timeout - (time.monotonic() - start)
+                if remaining <= 0:
+                    break
+            done, pending = wait(
+                pending, timeout=remaining, return_when=FIRST_COMPLETED
+            )
+            for future in done:
+                if future.exception() is None:
+                    self._record(node, time.monotonic() - start)
+                    return future.result()
+                error = future.exception()
+
+        if error is not None and not pending:
+            raise error
+        # Abandoned calls stop at their HTTP timeout, which is capped to the
+        # same deadline (see `build_chat_model`).
+        raise TimeoutError(f"{node}: LLM call timed out after {timeout:.2f}s")
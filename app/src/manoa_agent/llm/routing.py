@@ -0,0 +1,192 @@
+import logging
+import os
+from typing import Any, Callable, Dict, Optional, Tuple, Type
+
+import httpx
+import openai
+from langchain_core.exceptions import OutputParserException
+from langchain_core.language_models import BaseChatModel
+from langchain_core.runnables import Runnable
+
+from manoa_agent.llm.gateway import DeadlineExceeded, LLMGateway, build_chat_model
+
+logger = logging.getLogger(__name__)
+
+# Nodes that only gate or rewrite the question and do not need a frontier model.
+SMALL_MODEL_NODES = ("reformulate", "general_agent")
+
+# Failures of the small model that the large model may not have: unparsable
+# or invalid structured output (pydantic's ValidationError is a ValueError),
+# API errors left after the gateway's retries, timeouts and an unreachable
+# local model server.
+FALLBACK_ERRORS: Tuple[Type[BaseException], ...] = (
+    OutputParserException,
+    ValueError,
+    openai.APIError,
+    httpx.HTTPError,
+    ConnectionError,
+    TimeoutError,
+)
+
+
+def build_model(spec: str, max_connections: int = 32) -> BaseChatModel:
+    """
+    Build a chat model from a model spec.
+
+    Specs of the form "ollama:<model>" build a local Ollama model served from
+    OLLAMA_HOST. Any other spec is treated as an OpenAI model name.
+
+    Args:
+        spec: The model spec, e.g. "gpt-4o-mini" or "ollama:llama3.1".
+        max_connections: Connection pool size for OpenAI models.
+
+    Returns:
+        BaseChatModel: The chat model.
+    """
+    if spec.startswith("ollama:"):
+        try:
+            from langchain_ollama import ChatOllama
+        except ImportError as e:
+            raise ImportError(
+                "Ollama models require the langchain-ollama package. "
+                "Install it with `pip install langchain-ollama`."
+            ) from e
+        return ChatOllama(
+            model=spec[len("ollama:") :], base_url=os.getenv("OLLAMA_HOST")
+        )
+    return build_chat_model(spec, max_connections=max_connections)
+
+
+class ModelRouter:
+    """
+    Per-node model configuration.
+
+    Gating and reformulation go to a small model, the grounded answer goes to
+    the large model, and the large model doubles as the fallback whenever a
+    small model returns invalid output.
+    """
+
+    def __init__(self, large: BaseChatModel, models: Dict[str, BaseChatModel]):
+        """
+        Args:
+            large: The large model used for answers and as the fallback.
+            models: Models keyed by node name. Nodes without an entry use the
+                large model.
+        """
+        self.large = large
+        self.models = models
+
+    def model(self, node: str) -> BaseChatModel:
+        return self.models.get(node, self.large)
+
+    def fallback(self, node: str) -> Optional[BaseChatModel]:
+        """
+        Returns:
+            Optional[BaseChatModel]: The model to retry with when the node's
+                model produces invalid output, or None if the node already
+                uses the large model.
+        """
+        return None if self.model(node) is self.large else self.large
+
+    @classmethod
+    def from_env(cls, max_connections: int = 32) -> "ModelRouter":
+        """
+        Build a router from environment variables.
+
+        LLM_MODEL selects the large model (default "gpt-4o"), LLM_SMALL_MODEL
+        the small model (default "gpt-4o-mini"). LLM_MODEL_<NODE>, e.g.
+        LLM_MODEL_REFORMULATE, overrides the model of a single node.
+        """
+        large_spec = os.getenv("LLM_MODEL", "gpt-4o")
+        small_spec = os.getenv("LLM_SMALL_MODEL", "gpt-4o-mini")
+
+        built: Dict[str, BaseChatModel] = {}
+
+        def get(spec: str) -> BaseChatModel:
+            if spec not in built:
+                built[spec] = build_model(spec, max_connections=max_connections)
+            return built[spec]
+
+        large = get(large_spec)
+        models = {}
+        for node in SMALL_MODEL_NODES + ("rag_agent",):
+            default = small_spec if node in SMALL_MODEL_NODES else large_spec
+            spec = os.getenv(f"LLM_MODEL_{node.upper()}", default)
+            models[node] = get(spec)
+            logger.info(f"Routing node '{node}' to model '{spec}'")
+        return cls(large, models)
+
+
+def invoke_with_fallback(
+    gateway: LLMGateway,
+    node: str,
+    make_chain: Callable[[BaseChatModel], Runnable],
+    llm: BaseChatModel,
+    fallback_llm: Optional[BaseChatModel],
+    input: Any,
+    validate: Callable[[Any], bool],
+) -> Any:
+    """
+    Invoke a chain built on `llm` and rebuild it on `fallback_llm` if the
+    output is invalid or could not be parsed.
+
+    Args:
+        gateway: The gateway used for both attempts.
+        node: Name of the calling node.
+        make_chain: Builds the chain for a given chat model.
+        llm: The node's chat model.
+        fallback_llm: The model to fall back to, or None to disable fallback.
+        input: The chain input.
+        validate: Returns True if an output is acceptable.
+
+    Returns:
+        The output of the first attempt that passed validation. If the fallback
+        also fails validation, its output is returned as is.
+
+    Raises:
+        DeadlineExceeded: If the request deadline passed; it is never retried
+            on the fallback. Errors outside `FALLBACK_ERRORS` (bugs) are not
+            retried either.
+    """
+    if fallback_llm is None:
+        return gateway.invoke(node, make_chain(llm), input)
+
+    try:
+        output = gateway.invoke(node, make_chain(llm), input)
+        if validate(output):
+            return output
+        logger.warning(f"{node}: invalid output {output!r}, falling back")
+    except DeadlineExceeded:
+        raise
+    except FALLBACK_ERRORS as e:
+        logger.warning(f"{node}: small model failed with {e!r}, falling back")
+
+    return gateway.invoke(node, make_chain(fallback_llm), input)
+
+
+def is_reformulation(output: Any, question: str) -> bool:
+    """
+    Check that a reformulation is a rewritten question rather than an answer,
+    which small models sometimes return instead.
+
+    Args:
+        output: The model output, an AIMessage.
+        question: The latest user message that was reformulated.
+
+    Returns:
+        bool: False if the output is empty, spans several lines, is much
+            longer than the question or is no longer a question although the
+            user asked one.
+    """
+    content = getattr(output, "content", None)
+    if not isinstance(content, str):
+        return False
+    text = content.strip()
+    question = question.strip() if isinstance(question, str) else ""
+    if not text or "\n" in text:
+        return False
+    # Resolving references to the chat history adds a few words, an answer
+    # adds sentences.
+    if len(text) > 2 * len(question) + 150:
+        return False
+    return text.endswith("?") or not question.endswith("?")
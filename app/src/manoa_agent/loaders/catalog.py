@@ -0,0 +1,85 @@
+import json
+import re
+from typing import Dict, Tuple
+
+from manoa_agent.parsers.course import course_key, normalize_subject, parse_title
+
+_SUBJECT_NAME = re.compile(r"(?:^|\s)([A-Z][^()]*?)\s*\(([A-Z/]+)\)")
+_UNIT = re.compile(r"\b(?:College|School|Office) of\b")
+_DANGLING = re.compile(r"(?:\b(?:of|and|&)|,)$")
+
+
+def load_catalog(path: str) -> Tuple[Dict[str, dict], Dict[str, str]]:
+    """
+    Load the course catalog (data/course-data/catalog.json).
+
+    Args:
+        path: Path of the catalog file.
+
+    Returns:
+        Tuple[Dict[str, dict], Dict[str, str]]: Courses by canonical course
+            code, each with "code", "subject", "title", "credits" and
+            "description", and full subject names by subject code.
+    """
+    with open(path, encoding="utf-8") as f:
+        catalog = json.load(f)
+
+    courses: Dict[str, dict] = {}
+    subject_names: Dict[str, str] = {}
+    # Colleges and schools, which follow or precede the subject name in the
+    # catalog metadata.
+    units = set()
+    for record in catalog:
+        code = course_key(record["subject"], record["course_number"])
+        subject = normalize_subject(record["subject"])
+        title, credits = parse_title(record["title"])
+        courses.setdefault(
+            code,
+            {
+                "code": code,
+                "subject": subject,
+                "title": title,
+                "credits": credits,
+                "description": record["desc"],
+            },
+        )
+        metadata = record.get("metadata", "")
+        for match in _SUBJECT_NAME.finditer(metadata):
+            if normalize_subject(match.group(2)) == subject:
+                name = re.sub(r"^(?:[A-Z]{2,3} )+", "", match.group(1))
+                subject_names.setdefault(subject, name)
+        units.add(metadata.rpartition(")")[2].strip())
+
+    return courses, _strip_units(subject_names, units)
+
+
+def _strip_units(names: Dict[str, str], units: set) -> Dict[str, str]:
+    """
+    Remove college and school names from the start of subject names, e.g.
+    "College of Natural Sciences Mathematics" becomes "Mathematics".
+
+    Besides the given units, leading "College/School/Office of ..." words are
+    treated as a unit when they are shared by several subjects; of those, the
+    most widely shared (and then longest) prefix is removed.
+    """
+    counts: Dict[str, int] = {}
+    for name in names.values():
+        words = name.split()
+        for i in range(1, len(words)):
+            prefix = " ".join(words[:i])
+            if _UNIT.search(prefix) and not _DANGLING.search(prefix):
+                counts[prefix] = counts.get(prefix, 0) + 1
+
+    stripped = {}
+    for code, name in names.items():
+        words = name.split()
+        prefixes = [" ".join(words[:i]) for i in range(1, len(words))]
+        known = [p for p in prefixes if p in units]
+        shared = [p for p in prefixes if counts.get(p, 0) > 1]
+        if known:
+            name = name[len(known[-1]) :].strip()
+        elif shared:
+            prefix = max(shared, key=lambda p: (counts[p], len(p)))
+            name = name[len(prefix) :].strip()
+        stripped[code] = name
+    return stripped
@@ -1,12 +1,12 @@
 import re
 from pathlib import Path
-from typing import Iterator
+from typing import Iterator, Optional
 
-from bs4 import BeautifulSoup
-from html2text import HTML2Text
 from langchain_core.document_loaders import BaseLoader
 from langchain_core.documents import Document
 
+from manoa_agent.parsers.html_text import HtmlTextExtractor
+
 
 class HtmlDirectoryLoader(BaseLoader):
     """
@@ -28,8 +28,7 @@ class HtmlDirectoryLoader(BaseLoader):
             dir_path: The path to the directory containing HTML files.
         """
         self.dir_path = Path(dir_path)
-        self.html2text = HTML2Text()
-        self.html2text.ignore_images = True
+        self.extractor = HtmlTextExtractor(ignore_images=True)
 
     def faq_html_parser(self, html: str) -> str:
         """
@@ -42,16 +41,18 @@ class HtmlDirectoryLoader(BaseLoader):
             A cleaned string combining the question and answer, or
             None if the expected elements are not found.
         """
-        soup = BeautifulSoup(html, "lxml")
-        question = soup.find(id="kb_article_question")
-        answer = soup.find(id="kb_article_text")
+        root = self.extractor.parse_tree(html)
+        if root is None:
+            return None
+        question = self.extractor.select(root, ids=["kb_article_question"])
+        answer = self.extractor.select(root, ids=["kb_article_text"])
 
-        if not question or not answer:
+        if question is None or answer is None:
             return None
 
-        # Convert HTML to text using HTML2Text.
-        question_text = self.html2text.handle(str(question))
-        answer_text = self.html2text.handle(str(answer))
+        # Both elements come from the one parsed tree.
+        question_text = self.extractor.to_text(question)
+        answer_text = self.extractor.to_text(answer)
 
         combined_text = f"{question_text}\n{answer_text}"
         # Clean up extra newlines and whitespace.
@@ -59,6 +60,35 @@ class HtmlDirectoryLoader(BaseLoader):
 
         return cleaned_text
 
+    def load_file(self, html_file_path: Path) -> Optional[Document]:
+        """
+        Loads and parses a single HTML file.
+
+        Args:
+            html_file_path: The path of the HTML file.
+
+        Returns:
+            A Document with the parsed FAQ text and the source URL, or None if
+            the file cannot be read or has no FAQ content.
+        """
+        html_file_path = Path(html_file_path)
+        try:
+            with html_file_path.open("r", encoding="utf-8") as f:
+                html_content = f.read()
+        except Exception:
+            # Optionally log the error and continue to the next file.
+            return None
+
+        extracted = self.faq_html_parser(html_content)
+        if not extracted:
+            return None
+
+        # Derive the source URL from the file name.
+        # `Path.stem` automatically removes the file extension.
+        source = f"https://www.hawaii.edu/askus/{html_file_path.stem}"
+
+        return Document(page_content=extracted, metadata={"source": source})
+
     def lazy_load(self) -> Iterator[Document]:
         """
         Lazily loads and parses HTML files from the given directory.
@@ -68,19 +98,6 @@ class HtmlDirectoryLoader(BaseLoader):
             containing the source URL.
         """
         for html_file_path in self.dir_path.glob("*.html"):
-            try:
-                with html_file_path.open("r", encoding="utf-8") as f:
-                    html_content = f.read()
-            except Exception as e:
-                # Optionally log the error and continue to the next file.
-                continue
-
-            extracted = self.faq_html_parser(html_content)
-            if not extracted:
-                continue
-
-            # Derive the source URL from the file name.
-            # `Path.stem` automatically removes the file extension.
-            source = f"https://www.hawaii.edu/askus/{html_file_path.stem}"
-
-            yield Document(page_content=extracted, metadata={"source": source})
+            document = self.load_file(html_file_path)
+            if document is not None:
+                yield document
@@ -0,0 +1,112 @@
+import re
+from typing import Iterable, List, Optional, Tuple
+
+# A subject code followed by a course number: "ICS 311", "ics311", "NURS 688L",
+# "CINE/ACM 255". Bare numbers ("or 212") inherit the previous subject.
+_CODE = re.compile(
+    r"\b(?:([A-Za-z]{2,4}(?:/[A-Za-z]{2,4})?)\s*-?\s*)?(\d{3}[A-Za-z]?)\b"
+)
+_CONNECTOR = re.compile(r"^[\s,/;]*(?:(?:or|and)\s+)?$", re.IGNORECASE)
+_TITLE = re.compile(r"^(?:\(Alpha\)\s*)?(.*?)\s*\(([Vv]|[\d.\s\-–]+)\)?\S*$")
+_PREREQUISITES = re.compile(r"\bPre:\s*(.*?)(?:\.\s|\.?$)")
+_CROSS_LISTING = re.compile(r"\(Cross-?listed as ([^)]*)\)", re.IGNORECASE)
+
+
+def normalize_subject(subject: str) -> str:
+    return re.sub(r"\s+", "", subject).upper()
+
+
+def course_key(subject: str, number: str) -> str:
+    """
+    Canonical course code, e.g. course_key("ics", "311") == "ICS 311".
+    """
+    return f"{normalize_subject(subject)} {number.strip().upper()}"
+
+
+def find_course_codes(
+    text: str, subjects: Iterable[str], default_subject: Optional[str] = None
+) -> List[str]:
+    """
+    Find course codes mentioned in a text.
+
+    Subjects must be known subject codes. Two letter subjects must be written
+    in capitals, so that words like "is" or "me" are not read as the IS or ME
+    subjects. A bare number directly following a course ("ICS 211 or 212")
+    belongs to the previous course's subject.
+
+    Args:
+        text: The text to search.
+        subjects: Known subject codes, in capitals.
+        default_subject: Subject of bare numbers that follow no course, e.g.
+            the course's own subject when parsing its prerequisites.
+
+    Returns:
+        List[str]: Canonical course codes in order of appearance, without
+            duplicates.
+    """
+    subjects = set(subjects)
+    codes = []
+    previous: Optional[str] = None
+    previous_end = 0
+    for match in _CODE.finditer(text):
+        token, number = match.groups()
+        subject = None
+        if token and normalize_subject(token) in subjects:
+            if len(token) > 2 or token.isupper():
+                subject = normalize_subject(token)
+        if subject is None and previous is not None:
+            gap = text[previous_end : match.start(2)]
+            if token and token.lower() not in ("or", "and"):
+                gap = None
+            if gap is not None and _CONNECTOR.match(gap):
+                subject = previous
+        elif subject is None and token is None:
+            subject = default_subject
+        if subject is None:
+            previous = None
+            continue
+        codes.append(course_key(subject, number))
+        previous, previous_end = subject, match.end()
+    return list(dict.fromkeys(codes))
+
+
+def parse_title(title: str) -> Tuple[str, Optional[str]]:
+    """
+    Split a catalog title such as "Algorithms (3)" into the course name and its
+    credits ("V" for variable credit). Credits are None when the title has
+    none.
+    """
+    match = _TITLE.match(title.strip())
+    if not match:
+        return title.strip(), None
+    return match.group(1), match.group(2).strip().upper()
+
+
+def prerequisites_text(description: str) -> Optional[str]:
+    """
+    The "Pre: ..." clause of a catalog description, if any.
+    """
+    match = _PREREQUISITES.search(description)
+    return match.group(1).strip() if match else None
+
+
+def cross_listing_text(description: str) -> Optional[str]:
+    """
+    The "(Cross-listed as ...)" clause of a catalog description, if any.
+    """
+    match = _CROSS_LISTING.search(description)
+    return match.group(1).strip() if match else None
+
+
+def course_line(course: dict) -> str:
+    """
+    One-line summary of a catalog course, e.g. "ICS 311: Algorithms (4 credits)".
+    """
+    credits = course["credits"]
+    if credits is None:
+        suffix = ""
+    elif credits == "V":
+        suffix = " (variable credits)"
+    else:
+        suffix = f" ({credits} credits)"
+    return f"{course['code']}: {course['title']}{suffix}"
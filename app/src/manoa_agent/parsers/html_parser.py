@@ -1,29 +1,26 @@
-from bs4 import BeautifulSoup
-from html2text import HTML2Text
+from typing import Optional
 
 from manoa_agent.parsers.base import Parser
+from manoa_agent.parsers.html_text import HtmlTextExtractor
 
 
 class HTMLParser(Parser):
-    def __init__(self, html2text: HTML2Text, ids: list[str] = [], tags: list[str] = []):
-        self.h = html2text
+    def __init__(
+        self,
+        ids: list[str] = [],
+        tags: list[str] = [],
+        extractor: Optional[HtmlTextExtractor] = None,
+    ):
+        """
+        Args:
+            ids: Ids of the element to convert, tried in order.
+            tags: Tag names of the element to convert, tried in order if no id
+                matches. The whole document is converted if nothing matches.
+            extractor: The extractor to convert HTML with, for its options.
+        """
         self.ids = ids
         self.tags = tags
+        self.extractor = extractor or HtmlTextExtractor()
 
     def parse(self, text: str) -> str:
-        soup = BeautifulSoup(text, "html.parser")
-
-        # First, look for elements by id in provided order
-        for element_id in self.ids:
-            element = soup.find(id=element_id)
-            if element:
-                return self.h.handle(str(element))
-
-        # Next, look for the first available element by tag name
-        for tag in self.tags:
-            element = soup.find(tag)
-            if element:
-                return self.h.handle(str(element))
-
-        # Fallback: process the entire HTML
-        return self.h.handle(text)
+        return self.extractor.extract(text, ids=self.ids, tags=self.tags)
@@ -0,0 +1,249 @@
+import re
+from typing import List, Optional, Sequence, Union
+
+import lxml.html
+from lxml.etree import ParserError
+
+# Elements whose content is never text.
+_SKIP = frozenset(
+    {"script", "style", "noscript", "template", "head", "title", "meta", "link"}
+)
+_BLOCK = frozenset(
+    {
+        "address",
+        "article",
+        "aside",
+        "blockquote",
+        "body",
+        "caption",
+        "dd",
+        "details",
+        "div",
+        "dl",
+        "dt",
+        "fieldset",
+        "figcaption",
+        "figure",
+        "footer",
+        "form",
+        "header",
+        "html",
+        "main",
+        "nav",
+        "p",
+        "section",
+        "summary",
+        "table",
+    }
+)
+_HEADINGS = {f"h{level}": "#" * level for level in range(1, 7)}
+_EMPHASIS = {"strong": "**", "b": "**", "em": "_", "i": "_"}
+
+_WHITESPACE = re.compile(r"[ \t\r\n\f\v\xa0]+")
+_BLANK_LINES = re.compile(r"\n{3,}")
+_BLANK_LINES_IN_ITEM = re.compile(r"\n(?:[ \t]*\n)+")
+_LIST_ITEM = re.compile(r"^\s+(?:\*|\d+\.) ")
+
+
+class HtmlTextExtractor:
+    """
+    Converts HTML to markdown-style text in a single pass over the lxml tree.
+
+    Headings become "#" headings, list items "*" or "1." items, links
+    "[text](href)", and emphasis, code, preformatted blocks and table rows are
+    kept in markdown form, so the output works with
+    `StructureAwareTextSplitter` like html2text output does. Unlike parsing
+    with BeautifulSoup, serializing the selected element and parsing it again
+    with html2text, the document is parsed once by libxml2 and the selected
+    element is converted directly. Lines are never wrapped.
+    """
+
+    def __init__(
+        self,
+        ignore_links: bool = False,
+        ignore_mailto_links: bool = False,
+        ignore_images: bool = True,
+        ignore_emphasis: bool = False,
+    ):
+        """
+        Args:
+            ignore_links: Keep only the text of links.
+            ignore_mailto_links: Keep only the text of mailto: links.
+            ignore_images: Drop images instead of writing "![alt](src)".
+            ignore_emphasis: Drop "**" and "_" around bold and italic text.
+        """
+        self.ignore_links = ignore_links
+        self.ignore_mailto_links = ignore_mailto_links
+        self.ignore_images = ignore_images
+        self.ignore_emphasis = ignore_emphasis
+
+    @staticmethod
+    def parse_tree(html: Union[str, bytes]) -> Optional[lxml.html.HtmlElement]:
+        """
+        Parse an HTML document, or return None if it is empty.
+        """
+        try:
+            return lxml.html.document_fromstring(html)
+        except ParserError:
+            return None
+
+    @staticmethod
+    def select(
+        root: lxml.html.HtmlElement,
+        ids: Sequence[str] = (),
+        tags: Sequence[str] = (),
+    ) -> Optional[lxml.html.HtmlElement]:
+        """
+        The first element found by id, trying the ids in order, then by tag
+        name, trying the tags in order.
+        """
+        for element_id in ids:
+            element = root.get_element_by_id(element_id, None)
+            if element is not None:
+                return element
+        for tag in tags:
+            element = next(root.iter(tag), None)
+            if element is not None:
+                return element
+        return None
+
+    def extract(
+        self,
+        html: Union[str, bytes],
+        ids: Sequence[str] = (),
+        tags: Sequence[str] = (),
+        fallback: bool = True,
+    ) -> Optional[str]:
+        """
+        Convert the first element matching `ids` or `tags` to text.
+
+        Args:
+            html: The HTML document.
+            ids: Element ids to look for, in order.
+            tags: Tag names to look for, in order, if no id matches.
+            fallback: Convert the whole document if nothing matches, or if no
+                ids or tags are given.
+
+        Returns:
+            Optional[str]: The text, or None if nothing matches and
+                `fallback` is False.
+        """
+        root = self.parse_tree(html)
+        if root is None:
+            return "" if fallback else None
+        element = self.select(root, ids, tags)
+        if element is None:
+            if not fallback:
+                return None
+            element = root
+        return self.to_text(element)
+
+    def to_text(self, element: lxml.html.HtmlElement) -> str:
+        """
+        Convert an element, including its own markup (e.g. a heading), to text.
+        """
+        out: List[str] = []
+        self._element(element, out, [])
+        return _clean("".join(out))
+
+    def _children(self, element, out: List[str], lists: list) -> None:
+        if element.text:
+            out.append(_WHITESPACE.sub(" ", element.text))
+        for child in element:
+            if isinstance(child.tag, str):
+                self._element(child, out, lists)
+            if child.tail:
+                out.append(_WHITESPACE.sub(" ", child.tail))
+
+    def _inline(self, element, lists: list) -> str:
+        out: List[str] = []
+        self._children(element, out, lists)
+        return "".join(out).strip()
+
+    def _element(self, element, out: List[str], lists: list) -> None:
+        tag = element.tag.lower()
+        if tag in _SKIP:
+            return
+        if tag == "br":
+            out.append("\n")
+        elif tag in _HEADINGS:
+            out.append(f"\n\n{_HEADINGS[tag]} {self._inline(element, lists)}\n\n")
+        elif tag in ("ul", "ol"):
+            lists.append(0 if tag == "ol" else None)
+            out.append("\n" if len(lists) > 1 else "\n\n")
+            self._children(element, out, lists)
+            lists.pop()
+            out.append("\n" if lists else "\n\n")
+        elif tag == "li":
+            if lists and lists[-1] is not None:
+                lists[-1] += 1
+                marker = f"{lists[-1]}."
+            else:
+                marker = "*"
+            indent = "  " * max(len(lists) - 1, 0)
+            # Paragraphs inside an item do not split the list.
+            text = _BLANK_LINES_IN_ITEM.sub("\n", self._inline(element, lists))
+            out.append(f"\n{indent}  {marker} {text}")
+        elif tag == "a":
+            out.append(self._link(element, self._inline(element, lists)))
+        elif tag in _EMPHASIS:
+            text = self._inline(element, lists)
+            if text and not self.ignore_emphasis:
+                text = f"{_EMPHASIS[tag]}{text}{_EMPHASIS[tag]}"
+            out.append(text)
+        elif tag == "code":
+            text = self._inline(element, lists)
+            out.append(f"`{text}`" if text else "")
+        elif tag == "pre":
+            out.append(f"\n\n```\n{element.text_content().strip(chr(10))}\n```\n\n")
+        elif tag == "img":
+            if not self.ignore_images and element.get("src"):
+                out.append(f"![{element.get('alt', '')}]({element.get('src')})")
+        elif tag == "hr":
+            out.append("\n\n* * *\n\n")
+        elif tag == "tr":
+            out.append("\n")
+            self._children(element, out, lists)
+        elif tag in ("td", "th"):
+            out.append(f"{self._inline(element, lists)} | ")
+        elif tag in _BLOCK:
+            out.append("\n\n")
+            self._children(element, out, lists)
+            out.append("\n\n")
+        else:
+            self._children(element, out, lists)
+
+    def _link(self, element, text: str) -> str:
+        href = (element.get("href") or "").strip()
+        if (
+            self.ignore_links
+            or not href
+            or href.startswith(("#", "javascript:"))
+            or (self.ignore_mailto_links and href.startswith("mailto:"))
+        ):
+            return text
+        if not text or text == href:
+            return f"<{href}>"
+        return f"[{text}]({href})"
+
+
+def _clean(text: str) -> str:
+    """
+    Strip the whitespace left around lines by inline elements, keeping list
+    indentation and the content of code blocks, and collapse blank lines.
+    """
+    lines = []
+    in_code = False
+    for line in text.split("\n"):
+        if line.strip() == "```":
+            in_code = not in_code
+            lines.append("```")
+            continue
+        if in_code:
+            lines.append(line)
+            continue
+        line = line.rstrip()
+        if line.endswith(" |"):
+            line = line[:-2].rstrip()
+        lines.append(line if _LIST_ITEM.match(line) else line.lstrip())
+    return _BLANK_LINES.sub("\n\n", "\n".join(lines)).strip()
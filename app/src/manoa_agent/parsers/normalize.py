@@ -0,0 +1,22 @@
+import re
+import unicodedata
+
+_PUNCTUATION = re.compile(r"[^\w\s]")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_question(text: str) -> str:
+    """
+    Normalize a user question so that trivially different phrasings
+    ("Is UH email down?", "is uh  email down") compare equal.
+
+    Args:
+        text: The raw question text.
+
+    Returns:
+        str: The lowercased question with punctuation removed and whitespace
+            collapsed.
+    """
+    text = unicodedata.normalize("NFKC", text).lower()
+    text = _PUNCTUATION.sub(" ", text)
+    return _WHITESPACE.sub(" ", text).strip()
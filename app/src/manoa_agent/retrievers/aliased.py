@@ -0,0 +1,88 @@
+import logging
+import threading
+import time
+from typing import Callable, List, Optional
+
+from langchain_core.callbacks.manager import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from pydantic import ConfigDict, PrivateAttr
+
+from manoa_agent.db.chroma.versions import CollectionVersions
+
+logger = logging.getLogger(__name__)
+
+
+class AliasedRetriever(BaseRetriever):
+    """
+    Retrieves from the collection version an alias currently points to.
+
+    The alias is resolved at most once every `refresh_interval` seconds, so
+    the hot path stays free of extra Chroma calls. When it points somewhere
+    new (a promotion or a rollback), a retriever for the new collection is
+    built with `build` and used for every following query; queries never see
+    a collection that is still being filled.
+    """
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    versions: CollectionVersions
+    alias: str
+    build: Callable[[str], BaseRetriever]
+    refresh_interval: float = 30.0
+
+    _lock: threading.Lock = PrivateAttr(default_factory=threading.Lock)
+    _collection: Optional[str] = PrivateAttr(default=None)
+    _retriever: Optional[BaseRetriever] = PrivateAttr(default=None)
+    _last_checked: float = PrivateAttr(default=0.0)
+
+    @property
+    def collection(self) -> Optional[str]:
+        """
+        The collection currently retrieved from.
+        """
+        return self._collection
+
+    def current(self) -> BaseRetriever:
+        """
+        The retriever for the collection the alias points to, re-resolving the
+        alias if `refresh_interval` has passed.
+        """
+        now = time.monotonic()
+        if (
+            self._retriever is not None
+            and now - self._last_checked < self.refresh_interval
+        ):
+            return self._retriever
+
+        with self._lock:
+            if (
+                self._retriever is not None
+                and now - self._last_checked < self.refresh_interval
+            ):
+                return self._retriever
+            self._last_checked = now
+            try:
+                name = self.versions.resolve(self.alias)
+            except Exception as e:
+                if self._retriever is None:
+                    raise
+                logger.warning(
+                    f"Could not resolve {self.alias}, keeping {self._collection}: {e}"
+                )
+                return self._retriever
+            if name != self._collection:
+                if self._collection is not None:
+                    logger.info(
+                        f"{self.alias} switched from {self._collection} to {name}"
+                    )
+                self._retriever = self.build(name)
+                self._collection = name
+            return self._retriever
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        return self.current().invoke(
+            query, config={"callbacks": run_manager.get_child()}
+        )
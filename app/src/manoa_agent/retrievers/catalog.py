@@ -0,0 +1,145 @@
+from collections import Counter
+from typing import Dict, List, Optional, Set, Tuple
+
+from langchain_core.callbacks.manager import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from pydantic import ConfigDict
+
+from manoa_agent.loaders.catalog import load_catalog
+from manoa_agent.parsers.course import course_line, find_course_codes
+from manoa_agent.parsers.normalize import normalize_question
+from manoa_agent.retrievers.course_graph import CourseGraphRetriever
+
+
+def trigrams(text: str) -> Set[str]:
+    """
+    Character trigrams of the normalized text, padded so that word starts and
+    ends are trigrams of their own.
+    """
+    padded = f" {normalize_question(text)} "
+    return {padded[i : i + 3] for i in range(len(padded) - 2)}
+
+
+class CatalogIndex:
+    """
+    Precomputed lookup index over the course catalog.
+
+    Courses are keyed by canonical course code ("ICS 311"), so questions that
+    name a course are answered with a dictionary lookup. Course titles are
+    indexed by character trigrams for fuzzy matches on questions that name a
+    course by its title, typos included.
+    """
+
+    def __init__(
+        self,
+        courses: Dict[str, dict],
+        subject_names: Dict[str, str],
+        min_title_trigrams: int = 6,
+    ):
+        """
+        Args:
+            courses: Courses by canonical course code, as from `load_catalog`.
+            subject_names: Full subject names by subject code.
+            min_title_trigrams: Titles with fewer trigrams (e.g. "Art") are
+                not matched fuzzily.
+        """
+        self.courses = courses
+        self.subject_names = subject_names
+        self._codes = list(courses)
+        self._sizes: List[int] = []
+        self._postings: Dict[str, List[int]] = {}
+        for i, code in enumerate(self._codes):
+            grams = trigrams(courses[code]["title"])
+            self._sizes.append(len(grams) if len(grams) >= min_title_trigrams else 0)
+            for gram in grams:
+                self._postings.setdefault(gram, []).append(i)
+
+    @classmethod
+    def from_json(cls, path: str) -> "CatalogIndex":
+        return cls(*load_catalog(path))
+
+    def detect(self, text: str) -> List[str]:
+        """
+        Codes of catalog courses mentioned in a text. This is a regular
+        expression match, cheap enough to run on every question.
+        """
+        return [
+            code
+            for code in find_course_codes(text, self.subject_names)
+            if code in self.courses
+        ]
+
+    def get(self, code: str) -> Optional[dict]:
+        return self.courses.get(code)
+
+    def search_titles(
+        self, text: str, k: int = 3, min_score: float = 0.8
+    ) -> List[Tuple[str, float]]:
+        """
+        Courses whose title appears in a text, allowing for typos.
+
+        The score of a course is the share of its title trigrams found in the
+        text, so a question that contains a full title scores 1.
+
+        Args:
+            text: The question.
+            k: Maximum number of courses.
+            min_score: Minimum score.
+
+        Returns:
+            List[Tuple[str, float]]: (course code, score) pairs, best first;
+                longer titles win ties.
+        """
+        counts: Counter = Counter()
+        for gram in trigrams(text):
+            counts.update(self._postings.get(gram, ()))
+        scored = [
+            (i, count / self._sizes[i])
+            for i, count in counts.items()
+            if self._sizes[i] and count / self._sizes[i] >= min_score
+        ]
+        scored.sort(key=lambda item: (-item[1], -self._sizes[item[0]]))
+        return [(self._codes[i], score) for i, score in scored[:k]]
+
+    def course_document(self, code: str) -> Document:
+        course = self.courses[code]
+        subject = course["subject"]
+        lines = [
+            course_line(course),
+            f"Subject: {self.subject_names.get(subject, subject)} ({subject})",
+            course["description"],
+        ]
+        return Document(
+            page_content="\n".join(lines), metadata={"course": code, "subject": subject}
+        )
+
+
+class CatalogRetriever(BaseRetriever):
+    """
+    Retriever over a `CatalogIndex`. Course codes in the query are looked up
+    directly; otherwise course titles are matched by trigrams. No embedding or
+    vector search is involved.
+
+    With a `CourseGraphRetriever`, course documents also carry prerequisite
+    chains and cross-listings from the course graph.
+    """
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    index: CatalogIndex
+    graph_retriever: Optional[CourseGraphRetriever] = None
+    max_courses: int = 5
+
+    def document(self, code: str) -> Document:
+        if self.graph_retriever and code in self.graph_retriever.graph.courses:
+            return self.graph_retriever.course_document(code)
+        return self.index.course_document(code)
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        codes = self.index.detect(query)
+        if not codes:
+            codes = [code for code, _ in self.index.search_titles(query)]
+        return [self.document(code) for code in codes[: self.max_courses]]
@@ -0,0 +1,381 @@
+import logging
+import re
+import xml.etree.ElementTree as ET
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.callbacks.manager import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from pydantic import ConfigDict
+
+from manoa_agent.loaders.catalog import load_catalog
+from manoa_agent.parsers.course import (
+    course_key,
+    course_line,
+    cross_listing_text,
+    find_course_codes,
+    normalize_subject,
+    parse_title,
+    prerequisites_text,
+)
+from manoa_agent.parsers.normalize import normalize_question
+
+logger = logging.getLogger(__name__)
+
+KINDS = (
+    "Course",
+    "Subject",
+    "College",
+    "Degree",
+    "Program",
+    "Certificate",
+    "Abbreviation",
+)
+RELATIONS = (
+    "BELONGS_TO",
+    "CROSS_LISTED_AS",
+    "REQUIRES",
+    "PART_OF",
+    "HAS_ABBREV",
+    "OFFERS",
+    "REPEATABLE_UP_TO",
+)
+
+_GRAPHML = "{http://graphml.graphdrawing.org/xmlns}"
+_FULL_CODE = re.compile(r"^([A-Z]{2,4}(?:/[A-Z]{2,4})?) (\d{3}[A-Z]?)$")
+_CSR = Tuple[np.ndarray, np.ndarray]
+
+
+def _csr(n: int, sources: List[int], targets: List[int]) -> _CSR:
+    """
+    Compressed sparse row adjacency: the neighbours of node i are
+    indices[indptr[i] : indptr[i + 1]].
+    """
+    sources = np.asarray(sources, dtype=np.int32)
+    targets = np.asarray(targets, dtype=np.int32)
+    order = np.argsort(sources, kind="stable")
+    indptr = np.zeros(n + 1, dtype=np.int32)
+    np.cumsum(np.bincount(sources, minlength=n), out=indptr[1:])
+    return indptr, targets[order]
+
+
+class CourseGraph:
+    """
+    In-process graph of the course catalog.
+
+    Nodes are integers with a name and a kind (see KINDS). Each relation is
+    kept as a pair of CSR arrays for outgoing and incoming edges, so
+    neighbourhood lookups are two array slices and prerequisite chains are a
+    breadth-first search over them.
+
+    Courses and their subjects, prerequisites and cross-listings come from
+    catalog.json. Edges from the GraphML export are merged in where their
+    endpoints can be resolved; GraphML course nodes that are not in the
+    catalog are dropped.
+    """
+
+    def __init__(
+        self,
+        names: List[str],
+        kinds: np.ndarray,
+        edges: Dict[str, Tuple[List[int], List[int]]],
+        courses: Dict[str, dict],
+        subject_names: Dict[str, str],
+    ):
+        """
+        Use `load` rather than calling this directly.
+
+        Args:
+            names: Name of every node; course codes for courses and subject
+                codes for catalog subjects.
+            kinds: Index into KINDS of every node.
+            edges: Source and target node lists of every relation.
+            courses: Catalog record of every course, by course code.
+            subject_names: Full name of every subject, by subject code.
+        """
+        self.names = names
+        self.kinds = kinds
+        self.ids = {
+            (KINDS[kind], name): i for i, (kind, name) in enumerate(zip(kinds, names))
+        }
+        self.courses = courses
+        self.subject_names = subject_names
+        n = len(names)
+        self._out = {rel: _csr(n, src, dst) for rel, (src, dst) in edges.items()}
+        self._in = {rel: _csr(n, dst, src) for rel, (src, dst) in edges.items()}
+        # Subject names, longest first, for matching subjects in questions.
+        self._subject_phrases = sorted(
+            (
+                (normalize_question(name), code)
+                for code, name in subject_names.items()
+                if len(name) > 3
+            ),
+            key=lambda item: -len(item[0]),
+        )
+
+    @classmethod
+    def load(cls, graphml_path: str, catalog_path: str) -> "CourseGraph":
+        """
+        Build the graph from catalog.json and a GraphML export.
+
+        Args:
+            graphml_path: Path of the GraphML file, e.g.
+                "data/course-data/all-courses.graphml".
+            catalog_path: Path of "data/course-data/catalog.json".
+
+        Returns:
+            CourseGraph: The graph.
+        """
+        courses, subject_names = load_catalog(catalog_path)
+
+        names: List[str] = []
+        kinds: List[int] = []
+        ids: Dict[Tuple[str, str], int] = {}
+        edges = {rel: set() for rel in RELATIONS}
+
+        def node(kind: str, name: str) -> int:
+            key = (kind, name)
+            if key not in ids:
+                ids[key] = len(names)
+                names.append(name)
+                kinds.append(KINDS.index(kind))
+            return ids[key]
+
+        for code, course in courses.items():
+            course_id = node("Course", code)
+            subject_id = node("Subject", course["subject"])
+            edges["BELONGS_TO"].add((course_id, subject_id))
+            pre = prerequisites_text(course["description"])
+            if pre:
+                subject = course["subject"]
+                for required in find_course_codes(pre, subject_names, subject):
+                    if required in courses and required != code:
+                        edges["REQUIRES"].add((course_id, node("Course", required)))
+            listed = cross_listing_text(course["description"])
+            if listed:
+                for other in find_course_codes(listed, subject_names):
+                    if other in courses and other != code:
+                        edges["CROSS_LISTED_AS"].add((course_id, node("Course", other)))
+
+        # Course titles that belong to a single course, for GraphML nodes that
+        # are named by title.
+        by_title: Dict[str, Optional[str]] = {}
+        for code, course in courses.items():
+            key = normalize_question(course["title"])
+            by_title[key] = code if key not in by_title else None
+        by_subject_name = {
+            normalize_question(name): code for code, name in subject_names.items()
+        }
+
+        def resolve(kind: str, name: str) -> Optional[int]:
+            name = name.strip()
+            if kind == "Course":
+                match = _FULL_CODE.match(name)
+                code = course_key(*match.groups()) if match else None
+                if code not in courses:
+                    code = by_title.get(normalize_question(parse_title(name)[0]))
+                return ids.get(("Course", code)) if code else None
+            if kind == "Subject":
+                code = normalize_subject(name)
+                if code not in subject_names:
+                    code = by_subject_name.get(normalize_question(name))
+                if code:
+                    return node("Subject", code)
+            return node(kind, name) if kind in KINDS else None
+
+        graphml = ET.parse(graphml_path).getroot().find(f"{_GRAPHML}graph")
+        resolved: Dict[str, Optional[int]] = {}
+        for element in graphml.iter(f"{_GRAPHML}node"):
+            data = {d.get("key"): d.text or "" for d in element.iter(f"{_GRAPHML}data")}
+            kind = data.get("labels", "").lstrip(":")
+            resolved[element.get("id")] = resolve(kind, data.get("id", ""))
+        for element in graphml.iter(f"{_GRAPHML}edge"):
+            data = {d.get("key"): d.text or "" for d in element.iter(f"{_GRAPHML}data")}
+            source = resolved.get(element.get("source"))
+            target = resolved.get(element.get("target"))
+            relation = data.get("label")
+            if None in (source, target) or source == target:
+                continue
+            if relation in edges:
+                edges[relation].add((source, target))
+
+        edge_lists = {}
+        for rel, pairs in edges.items():
+            pairs = sorted(pairs)
+            edge_lists[rel] = ([s for s, _ in pairs], [t for _, t in pairs])
+
+        graph = cls(
+            names, np.asarray(kinds, dtype=np.int8), edge_lists, courses, subject_names
+        )
+        logger.info(
+            f"Loaded course graph: {len(names)} nodes, "
+            f"{sum(len(pairs) for pairs in edges.values())} edges"
+        )
+        return graph
+
+    def neighbors(self, node: int, relation: str, reverse: bool = False) -> np.ndarray:
+        """
+        Nodes connected to `node` by `relation`; with `reverse`, the nodes
+        with a `relation` edge to `node`.
+        """
+        indptr, indices = (self._in if reverse else self._out)[relation]
+        return indices[indptr[node] : indptr[node + 1]]
+
+    def _course_id(self, code: str) -> Optional[int]:
+        return self.ids.get(("Course", code))
+
+    def _course_names(self, nodes) -> List[str]:
+        course = KINDS.index("Course")
+        return [self.names[i] for i in nodes if self.kinds[i] == course]
+
+    def prerequisites(
+        self, code: str, max_depth: Optional[int] = None
+    ) -> List[Tuple[str, int]]:
+        """
+        The prerequisite chain of a course, breadth first.
+
+        Args:
+            code: Canonical course code, e.g. "ICS 311".
+            max_depth: Maximum number of prerequisite levels.
+
+        Returns:
+            List[Tuple[str, int]]: (course code, level) pairs, where level 1
+                are the direct prerequisites.
+        """
+        start = self._course_id(code)
+        if start is None:
+            return []
+        seen = {start}
+        chain = []
+        queue = deque([(start, 0)])
+        while queue:
+            current, depth = queue.popleft()
+            if max_depth is not None and depth >= max_depth:
+                continue
+            for neighbor in self.neighbors(current, "REQUIRES").tolist():
+                if neighbor not in seen:
+                    seen.add(neighbor)
+                    chain.append((self.names[neighbor], depth + 1))
+                    queue.append((neighbor, depth + 1))
+        return chain
+
+    def required_by(self, code: str) -> List[str]:
+        """
+        Courses that list `code` as a direct prerequisite.
+        """
+        node = self._course_id(code)
+        if node is None:
+            return []
+        return sorted(self._course_names(self.neighbors(node, "REQUIRES", True)))
+
+    def cross_listings(self, code: str) -> List[str]:
+        """
+        Courses cross-listed with `code`, in either direction.
+        """
+        node = self._course_id(code)
+        if node is None:
+            return []
+        nodes = np.union1d(
+            self.neighbors(node, "CROSS_LISTED_AS"),
+            self.neighbors(node, "CROSS_LISTED_AS", True),
+        )
+        return self._course_names(nodes)
+
+    def courses_in(self, subject: str) -> List[str]:
+        """
+        Courses of a subject, sorted by course number.
+        """
+        node = self.ids.get(("Subject", normalize_subject(subject)))
+        if node is None:
+            return []
+        codes = self._course_names(self.neighbors(node, "BELONGS_TO", True))
+        return sorted(codes, key=lambda code: code.split(" ")[-1])
+
+    def find_subject(self, text: str) -> Optional[str]:
+        """
+        The subject a question refers to, by its code ("ICS", in capitals) or
+        its full name ("Information and Computer Sciences").
+        """
+        for token in re.findall(r"\b[A-Z]{2,4}(?:/[A-Z]{2,4})?\b", text):
+            if token in self.subject_names:
+                return token
+        normalized = f" {normalize_question(text)} "
+        for phrase, code in self._subject_phrases:
+            if f" {phrase} " in normalized:
+                return code
+        return None
+
+
+class CourseGraphRetriever(BaseRetriever):
+    """
+    Retriever that answers course questions from a `CourseGraph`.
+
+    Course codes in the query return one document per course with its
+    description, prerequisite chain, cross-listings and the courses that
+    require it. Without course codes, a subject named in the query returns the
+    list of its courses.
+    """
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    graph: CourseGraph
+    max_courses: int = 5
+    max_depth: Optional[int] = 4
+
+    def course_document(self, code: str) -> Document:
+        course = self.graph.courses[code]
+        subject = course["subject"]
+        lines = [
+            course_line(course),
+            f"Subject: {self.graph.subject_names.get(subject, subject)} ({subject})",
+            course["description"],
+        ]
+
+        chain = self.graph.prerequisites(code, self.max_depth)
+        if chain:
+            levels: Dict[int, List[str]] = {}
+            for required, depth in chain:
+                levels.setdefault(depth, []).append(required)
+            lines.append(
+                "Prerequisite chain: "
+                + "; ".join(
+                    f"level {depth}: {', '.join(codes)}"
+                    for depth, codes in sorted(levels.items())
+                )
+            )
+        listed = self.graph.cross_listings(code)
+        if listed:
+            lines.append(f"Cross-listed as: {', '.join(listed)}")
+        required_by = self.graph.required_by(code)
+        if required_by:
+            lines.append(f"Required by: {', '.join(required_by)}")
+
+        return Document(
+            page_content="\n".join(lines), metadata={"course": code, "subject": subject}
+        )
+
+    def subject_document(self, subject: str) -> Document:
+        lines = [
+            f"Courses in {self.graph.subject_names.get(subject, subject)} ({subject}):"
+        ]
+        for code in self.graph.courses_in(subject):
+            lines.append(course_line(self.graph.courses[code]))
+        return Document(page_content="\n".join(lines), metadata={"subject": subject})
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        codes = [
+            code
+            for code in find_course_codes(query, self.graph.subject_names)
+            if code in self.graph.courses
+        ]
+        if codes:
+            return [self.course_document(code) for code in codes[: self.max_courses]]
+
+        subject = self.graph.find_subject(query)
+        if subject:
+            return [self.subject_document(subject)]
+        return []
@@ -0,0 +1,102 @@
+import math
+import re
+from collections import Counter
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+from langchain_core.callbacks.manager import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from pydantic import ConfigDict
+
+_TOKEN = re.compile(r"\w+")
+
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN.findall(text.lower())
+
+
+class BM25Index:
+    """
+    In-memory Okapi BM25 keyword index.
+    """
+
+    def __init__(self, documents: Sequence[Document], k1: float = 1.5, b: float = 0.75):
+        """
+        Args:
+            documents: The documents to index.
+            k1: Term frequency saturation.
+            b: Document length normalization.
+        """
+        self.documents = list(documents)
+        self.k1 = k1
+        self.b = b
+        self._postings: Dict[str, List[Tuple[int, int]]] = {}
+        lengths = []
+        for i, doc in enumerate(self.documents):
+            counts = Counter(tokenize(doc.page_content))
+            lengths.append(sum(counts.values()))
+            for term, tf in counts.items():
+                self._postings.setdefault(term, []).append((i, tf))
+        self._lengths = np.asarray(lengths, dtype=np.float32)
+        self._avg_length = float(self._lengths.mean()) if lengths else 0.0
+
+    def search(self, query: str, k: int = 4) -> List[Tuple[int, float]]:
+        """
+        Returns:
+            List[Tuple[int, float]]: (document index, score) pairs, best first.
+        """
+        n = len(self.documents)
+        scores = np.zeros(n, dtype=np.float32)
+        norm = self.k1 * (1 - self.b + self.b * self._lengths / (self._avg_length or 1))
+        for term in set(tokenize(query)):
+            postings = self._postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+            rows = np.fromiter((i for i, _ in postings), dtype=np.int64)
+            tfs = np.fromiter((tf for _, tf in postings), dtype=np.float32)
+            scores[rows] += idf * tfs * (self.k1 + 1) / (tfs + norm[rows])
+        top = np.argsort(-scores)[:k]
+        return [(int(i), float(scores[i])) for i in top if scores[i] > 0]
+
+
+def _key(doc: Document) -> tuple:
+    return (doc.metadata.get("source"), doc.page_content)
+
+
+class HybridRetriever(BaseRetriever):
+    """
+    Combines a vector retriever with BM25 keyword search by reciprocal rank
+    fusion, so exact terms (course codes, product names, error messages) that
+    embeddings blur still rank well.
+    """
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    vector_retriever: BaseRetriever
+    keyword_index: BM25Index
+    k: int = 4
+    keyword_k: int = 8
+    rrf_k: int = 60
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        vector_docs = self.vector_retriever.invoke(
+            query, config={"callbacks": run_manager.get_child()}
+        )
+        keyword_docs = [
+            self.keyword_index.documents[i]
+            for i, _ in self.keyword_index.search(query, self.keyword_k)
+        ]
+
+        scores: Dict[tuple, float] = {}
+        docs: Dict[tuple, Document] = {}
+        for ranking in (vector_docs, keyword_docs):
+            for rank, doc in enumerate(ranking):
+                key = _key(doc)
+                docs.setdefault(key, doc)
+                scores[key] = scores.get(key, 0.0) + 1 / (self.rrf_k + rank + 1)
+        best = sorted(scores, key=scores.get, reverse=True)[: self.k]
+        return [docs[key] for key in best]
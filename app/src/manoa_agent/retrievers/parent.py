@@ -0,0 +1,118 @@
+from typing import List, Optional, Sequence
+
+from langchain_core.callbacks.manager import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from langchain_core.stores import BaseStore
+from pydantic import ConfigDict
+
+
+def window(text: str, focus: str, size: int) -> str:
+    """
+    Cut `text` down to at most `size` characters around the first occurrence
+    of `focus`, on line boundaries where possible.
+
+    Args:
+        text: The text to cut.
+        focus: The passage to keep; lines that are not part of `text` (e.g. a
+            section title prefix) are ignored. Without a match, the window
+            starts at the beginning of `text`.
+        size: Maximum number of characters in the window.
+
+    Returns:
+        str: The window.
+    """
+    if len(text) <= size:
+        return text
+    start = end = 0
+    lines = focus.strip().split("\n")
+    for skip in range(len(lines)):
+        passage = "\n".join(lines[skip:]).strip()
+        position = text.find(passage) if passage else -1
+        if position >= 0:
+            start, end = position, position + len(passage)
+            break
+
+    margin = max(0, size - (end - start)) // 2
+    begin = max(0, min(start - margin, len(text) - size))
+    finish = begin + size
+    # Snap to whole lines unless the cut would drop the focus.
+    line_start = text.find("\n", begin, start + 1)
+    if begin > 0 and line_start >= 0:
+        begin = line_start + 1
+    line_end = text.rfind("\n", max(end, begin), finish)
+    if finish < len(text) and line_end >= 0:
+        finish = line_end
+    return text[begin:finish].strip("\n")
+
+
+class SmallToBigRetriever(BaseRetriever):
+    """
+    Matches small child chunks and returns the parent sections they belong to.
+
+    Children are found with `child_retriever` (usually a Chroma retriever over
+    chunks from `StructureAwareTextSplitter`) and their parents are read from a
+    local docstore by the chunk's "parent_id". Parents are deduplicated and
+    keep the rank of their best matching child. Parents longer than
+    `max_parent_size` characters (e.g. stored before the splitter capped
+    them) are cut to a window around that child.
+    """
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    child_retriever: BaseRetriever
+    docstore: BaseStore[str, Document]
+    max_parents: Optional[int] = None
+    max_parent_size: Optional[int] = 4000
+
+    def parents_for(self, children: Sequence[Document]) -> List[Document]:
+        """
+        Map retrieved children to their deduplicated parents. Children without
+        a parent in the docstore are returned as they are.
+        """
+        parent_ids = list(
+            dict.fromkeys(
+                child.metadata["parent_id"]
+                for child in children
+                if child.metadata.get("parent_id")
+            )
+        )
+        stored = dict(zip(parent_ids, self.docstore.mget(parent_ids)))
+
+        parents: List[Document] = []
+        seen = set()
+        for child in children:
+            parent_id = child.metadata.get("parent_id")
+            if not parent_id:
+                parents.append(child)
+                continue
+            if parent_id in seen:
+                continue
+            seen.add(parent_id)
+            parent = stored[parent_id]
+            if parent is None:
+                parents.append(child)
+            elif (
+                self.max_parent_size is not None
+                and len(parent.page_content) > self.max_parent_size
+            ):
+                content = window(
+                    parent.page_content, child.page_content, self.max_parent_size
+                )
+                parents.append(
+                    Document(page_content=content, metadata=dict(parent.metadata))
+                )
+            else:
+                parents.append(parent)
+
+        if self.max_parents is not None:
+            parents = parents[: self.max_parents]
+        return parents
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        children = self.child_retriever.invoke(
+            query, config={"callbacks": run_manager.get_child()}
+        )
+        return self.parents_for(children)
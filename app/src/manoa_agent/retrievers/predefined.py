@@ -0,0 +1,179 @@
+import hashlib
+import json
+import logging
+import threading
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+from langchain_chroma import Chroma
+
+from manoa_agent.embeddings.base import Embedder
+from manoa_agent.parsers.normalize import normalize_question
+
+logger = logging.getLogger(__name__)
+
+
+class PredefinedIndex:
+    """
+    In-memory index over the predefined question/answer collection.
+
+    The predefined collection is small and rarely changes, so instead of
+    querying Chroma for every message the whole collection is loaded once.
+    Lookups first try an exact match on the normalized question text and then
+    fall back to a cosine similarity check against a preloaded, row-normalized
+    embedding matrix.
+
+    The index is refreshed when the ids, questions or answers in the
+    collection change. They are checked at most once every `refresh_interval`
+    seconds so the hot path stays free of network calls. If the collection
+    cannot be loaded at startup, the index starts empty and is loaded by a
+    later check.
+    """
+
+    def __init__(
+        self,
+        collection: Chroma,
+        embedder: Embedder,
+        score_threshold: float = 0.95,
+        refresh_interval: float = 60.0,
+    ):
+        """
+        Args:
+            collection: The Chroma collection holding predefined questions as
+                page content and their answers under the "predefined" metadata
+                key.
+            embedder: Embedder used to embed incoming messages for the
+                similarity check. It must be the model the collection was
+                built with; otherwise only exact matches are found.
+            score_threshold: Minimum cosine similarity for a predefined match.
+            refresh_interval: Minimum number of seconds between checks for
+                collection changes. Use 0 to check on every lookup.
+        """
+        self.collection = collection
+        self.embedder = embedder
+        self.score_threshold = score_threshold
+        self.refresh_interval = refresh_interval
+
+        self._lock = threading.Lock()
+        self._exact: Dict[str, str] = {}
+        self._answers: List[str] = []
+        self._matrix = np.empty((0, 0), dtype=np.float32)
+        self._fingerprint: Optional[str] = None
+        self._last_checked = 0.0
+
+        try:
+            self.refresh()
+        except Exception as e:
+            logger.warning(f"Could not load predefined responses: {e}")
+
+    def __len__(self) -> int:
+        return len(self._answers)
+
+    @staticmethod
+    def fingerprint(records: dict) -> str:
+        """
+        Content hash of the ids, questions and answers of a `get` result.
+        """
+        digest = hashlib.sha1()
+        for row in sorted(
+            zip(records["ids"], records["documents"], records["metadatas"]),
+            key=lambda row: row[0],
+        ):
+            digest.update(json.dumps(row, sort_keys=True).encode("utf-8"))
+        return digest.hexdigest()
+
+    def refresh(self) -> None:
+        """
+        Reload every predefined record from the collection.
+        """
+        records = self.collection.get(include=["documents", "metadatas", "embeddings"])
+
+        exact: Dict[str, str] = {}
+        answers: List[str] = []
+        vectors: List[List[float]] = []
+        for document, metadata, embedding in zip(
+            records["documents"], records["metadatas"], records["embeddings"]
+        ):
+            answer = (metadata or {}).get("predefined", "")
+            if not answer:
+                continue
+            exact.setdefault(normalize_question(document), answer)
+            answers.append(answer)
+            vectors.append(embedding)
+
+        matrix = np.asarray(vectors, dtype=np.float32)
+        if len(matrix):
+            norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+            matrix = matrix / np.where(norms == 0, 1, norms)
+
+        with self._lock:
+            self._exact = exact
+            self._answers = answers
+            self._matrix = matrix
+            self._fingerprint = self.fingerprint(records)
+            self._last_checked = time.monotonic()
+
+        logger.info(f"Loaded {len(answers)} predefined responses into memory")
+
+    def refresh_if_changed(self) -> bool:
+        """
+        Reload the index if the collection changed since the last load.
+
+        Returns:
+            bool: True if the index was reloaded.
+        """
+        now = time.monotonic()
+        if now - self._last_checked < self.refresh_interval:
+            return False
+        self._last_checked = now
+
+        records = self.collection.get(include=["documents", "metadatas"])
+        if self.fingerprint(records) == self._fingerprint:
+            return False
+
+        self.refresh()
+        return True
+
+    def lookup(self, message: str) -> Optional[str]:
+        """
+        Find the predefined answer for a message.
+
+        Args:
+            message: The user message.
+
+        Returns:
+            Optional[str]: The predefined answer, or None if the message does
+                not match any predefined question.
+        """
+        try:
+            self.refresh_if_changed()
+        except Exception as e:
+            logger.warning(f"Could not check predefined collection for changes: {e}")
+
+        answer = self._exact.get(normalize_question(message))
+        if answer is not None:
+            return answer
+
+        with self._lock:
+            answers, matrix = self._answers, self._matrix
+        if not answers:
+            return None
+
+        query = np.asarray(self.embedder.embed_query(message), dtype=np.float32)
+        if query.shape[0] != matrix.shape[1]:
+            # The embedder is not the model the collection was built with.
+            logger.error(
+                f"Query embedding has {query.shape[0]} dimensions, predefined "
+                f"responses have {matrix.shape[1]}; skipping the similarity check"
+            )
+            return None
+        norm = np.linalg.norm(query)
+        if norm == 0:
+            return None
+
+        scores = matrix @ (query / norm)
+        best = int(np.argmax(scores))
+        if scores[best] >= self.score_threshold:
+            return answers[best]
+        return None
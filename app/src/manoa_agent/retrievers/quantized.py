@@ -0,0 +1,313 @@
+"""
+In-process retrieval over reduced, low-precision embeddings.
+
+Build an index from the collection an alias points to, and serve it with
+QUANTIZED_INDEX=<directory> (see main.py):
+
+    python -m manoa_agent.retrievers.quantized general_faq data/quantized/general_faq
+"""
+
+import argparse
+import json
+import logging
+import os
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+from langchain_core.callbacks.manager import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from pydantic import ConfigDict
+
+from manoa_agent.embeddings.base import Embedder
+from manoa_agent.embeddings.quantize import (
+    PCAReducer,
+    normalize_rows,
+    quantize_int8,
+    truncate,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class QuantizedVectorIndex:
+    """
+    In-process vector index over reduced, low-precision embeddings.
+
+    Candidates are scored against shortened (truncated or PCA-reduced) vectors
+    stored as int8 codes or float16. The best `rescore_k` candidates are then
+    rescored with the full-precision vectors. Those can stay memory-mapped on
+    disk, because only the candidate rows are ever read.
+    """
+
+    def __init__(
+        self,
+        vectors: np.ndarray,
+        documents: List[Document],
+        full: Optional[np.ndarray] = None,
+        scale: Optional[np.ndarray] = None,
+        reducer: Optional[PCAReducer] = None,
+        dimensions: Optional[int] = None,
+        collection: Optional[str] = None,
+    ):
+        """
+        Use `build`, `from_collection` or `load` rather than calling this
+        directly.
+
+        Args:
+            vectors: Reduced vectors, int8 codes (with `scale`) or float16.
+            documents: The document of every row.
+            full: Normalized full-precision vectors for rescoring.
+            scale: Per-dimension scale of int8 codes.
+            reducer: PCA reducer, or None if vectors were truncated.
+            dimensions: Number of reduced dimensions.
+            collection: The Chroma collection the index was built from, whose
+                embedding model the queries must be embedded with.
+        """
+        self.vectors = vectors
+        self.documents = documents
+        self.full = full
+        self.scale = scale
+        self.reducer = reducer
+        self.dimensions = dimensions or vectors.shape[1]
+        self.collection = collection
+
+    @classmethod
+    def build(
+        cls,
+        embeddings: Sequence[Sequence[float]],
+        documents: List[Document],
+        dimensions: int = 256,
+        method: str = "truncate",
+        dtype: str = "int8",
+        keep_full: bool = True,
+    ) -> "QuantizedVectorIndex":
+        """
+        Build an index from full-precision embeddings.
+
+        Args:
+            embeddings: Full-precision document embeddings.
+            documents: The documents, in the same order.
+            dimensions: Number of dimensions to keep.
+            method: "truncate" (for text-embedding-3 models) or "pca".
+            dtype: "int8" or "float16".
+            keep_full: Keep full-precision vectors for rescoring.
+
+        Returns:
+            QuantizedVectorIndex: The index.
+        """
+        full = normalize_rows(embeddings)
+        reducer = None
+        if method == "pca":
+            reducer = PCAReducer.fit(full, dimensions)
+            reduced = reducer.transform(full)
+        elif method == "truncate":
+            reduced = truncate(full, dimensions)
+        else:
+            raise ValueError(f"Unknown reduction method: {method}")
+
+        scale = None
+        if dtype == "int8":
+            vectors, scale = quantize_int8(reduced)
+        elif dtype == "float16":
+            vectors = reduced.astype(np.float16)
+        else:
+            raise ValueError(f"Unknown dtype: {dtype}")
+
+        return cls(
+            vectors,
+            documents,
+            full=full if keep_full else None,
+            scale=scale,
+            reducer=reducer,
+            dimensions=dimensions,
+        )
+
+    @classmethod
+    def from_collection(
+        cls, collection, batch_size: int = 1000, **kwargs
+    ) -> "QuantizedVectorIndex":
+        """
+        Build an index from every chunk of a chromadb collection.
+
+        Args:
+            collection: The chromadb collection.
+            batch_size: Number of chunks read per request.
+            **kwargs: Options of `build`, e.g. `dimensions` or `dtype`.
+        """
+        embeddings, documents = [], []
+        while True:
+            batch = collection.get(
+                include=["embeddings", "documents", "metadatas"],
+                limit=batch_size,
+                offset=len(documents),
+            )
+            if not len(batch["ids"]):
+                break
+            embeddings.extend(batch["embeddings"])
+            documents.extend(
+                Document(page_content=text, metadata=metadata or {})
+                for text, metadata in zip(batch["documents"], batch["metadatas"])
+            )
+        if not documents:
+            raise ValueError(f"Collection {collection.name} is empty")
+        index = cls.build(embeddings, documents, **kwargs)
+        index.collection = collection.name
+        return index
+
+    @property
+    def nbytes(self) -> int:
+        """
+        Size in bytes of the in-memory part of the index.
+        """
+        size = self.vectors.nbytes
+        if self.scale is not None:
+            size += self.scale.nbytes
+        if self.reducer is not None:
+            size += self.reducer.components.nbytes + self.reducer.mean.nbytes
+        return size
+
+    def _reduce(self, query: np.ndarray) -> np.ndarray:
+        if self.reducer is not None:
+            return self.reducer.transform(query[None, :])[0]
+        return truncate(query, self.dimensions)
+
+    def search(
+        self, embedding: Sequence[float], k: int = 4, rescore_k: Optional[int] = None
+    ) -> List[Tuple[int, float]]:
+        """
+        Find the rows most similar to a query embedding.
+
+        Args:
+            embedding: Full-precision query embedding.
+            k: Number of results.
+            rescore_k: Number of candidates rescored with full-precision
+                vectors. None uses 4 * k; 0 disables rescoring.
+
+        Returns:
+            List[Tuple[int, float]]: (row, cosine similarity) pairs, best first.
+        """
+        if not len(self.vectors):
+            return []
+        query = normalize_rows(np.asarray(embedding, dtype=np.float32))
+        reduced = self._reduce(query)
+        if self.scale is not None:
+            scores = self.vectors @ (reduced * self.scale)
+        else:
+            scores = self.vectors @ reduced.astype(np.float16)
+        scores = scores.astype(np.float32)
+
+        if rescore_k is None:
+            rescore_k = 4 * k
+        n_candidates = min(len(scores), max(k, rescore_k))
+        candidates = np.argpartition(-scores, n_candidates - 1)[:n_candidates]
+
+        if rescore_k and self.full is not None:
+            scores = np.asarray(self.full[np.sort(candidates)]) @ query
+            candidates = np.sort(candidates)
+        else:
+            scores = scores[candidates]
+
+        order = np.argsort(-scores)[:k]
+        return [(int(candidates[i]), float(scores[i])) for i in order]
+
+    def save(self, path: str) -> None:
+        """
+        Save the index to a directory.
+        """
+        os.makedirs(path, exist_ok=True)
+        np.save(os.path.join(path, "vectors.npy"), self.vectors)
+        if self.scale is not None:
+            np.save(os.path.join(path, "scale.npy"), self.scale)
+        if self.full is not None:
+            np.save(os.path.join(path, "full.npy"), self.full)
+        if self.reducer is not None:
+            self.reducer.save(os.path.join(path, "pca.npz"))
+        with open(os.path.join(path, "documents.jsonl"), "w", encoding="utf-8") as f:
+            for doc in self.documents:
+                record = {"page_content": doc.page_content, "metadata": doc.metadata}
+                f.write(json.dumps(record) + "\n")
+        with open(os.path.join(path, "index.json"), "w") as f:
+            json.dump({"dimensions": self.dimensions, "collection": self.collection}, f)
+
+    @classmethod
+    def load(cls, path: str, mmap_full: bool = True) -> "QuantizedVectorIndex":
+        """
+        Load an index saved with `save`. With `mmap_full`, full-precision
+        vectors are memory-mapped instead of read into memory.
+        """
+
+        def optional(name, **kwargs):
+            file = os.path.join(path, name)
+            return np.load(file, **kwargs) if os.path.exists(file) else None
+
+        pca_path = os.path.join(path, "pca.npz")
+        with open(os.path.join(path, "documents.jsonl"), encoding="utf-8") as f:
+            documents = [Document(**json.loads(line)) for line in f]
+        with open(os.path.join(path, "index.json")) as f:
+            info = json.load(f)
+
+        return cls(
+            np.load(os.path.join(path, "vectors.npy")),
+            documents,
+            full=optional("full.npy", mmap_mode="r" if mmap_full else None),
+            scale=optional("scale.npy"),
+            reducer=PCAReducer.load(pca_path) if os.path.exists(pca_path) else None,
+            dimensions=info["dimensions"],
+            collection=info.get("collection"),
+        )
+
+
+class QuantizedRetriever(BaseRetriever):
+    """
+    Retriever over a `QuantizedVectorIndex`. Only the query embedding needs a
+    network call; the search itself runs in-process.
+    """
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    index: QuantizedVectorIndex
+    embedder: Embedder
+    k: int = 4
+    rescore_k: Optional[int] = None
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        embedding = self.embedder.embed_query(query)
+        results = self.index.search(embedding, k=self.k, rescore_k=self.rescore_k)
+        return [self.index.documents[row] for row, _ in results]
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Build a quantized vector index")
+    parser.add_argument("alias", help="Collection or alias to index")
+    parser.add_argument("path", help="Directory to save the index to")
+    parser.add_argument("--dimensions", type=int, default=256)
+    parser.add_argument("--method", choices=["truncate", "pca"], default="truncate")
+    parser.add_argument("--dtype", choices=["int8", "float16"], default="int8")
+    args = parser.parse_args(argv)
+
+    from chromadb import HttpClient
+    from dotenv import load_dotenv
+
+    from manoa_agent.db.chroma.versions import CollectionVersions
+
+    logging.basicConfig(level=logging.INFO)
+    load_dotenv(override=True)
+    client = HttpClient(host=os.getenv("CHROMA_HOST"), port=os.getenv("CHROMA_PORT"))
+    name = CollectionVersions(client).resolve(args.alias)
+    index = QuantizedVectorIndex.from_collection(
+        client.get_collection(name, embedding_function=None),
+        dimensions=args.dimensions,
+        method=args.method,
+        dtype=args.dtype,
+    )
+    index.save(args.path)
+    logger.info(
+        f"Indexed {len(index.documents)} chunks of {name} in {index.nbytes} bytes"
+    )
+
+
+if __name__ == "__main__":
+    main()
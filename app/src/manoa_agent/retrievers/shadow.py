@@ -0,0 +1,177 @@
+import logging
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Sequence
+
+from langchain_core.callbacks.manager import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from pydantic import ConfigDict, Field, PrivateAttr
+
+from manoa_agent.eval.batch import percentiles
+
+logger = logging.getLogger(__name__)
+
+
+def document_key(doc: Document) -> tuple:
+    """
+    Identity of a retrieved chunk across collections: dual-written collections
+    hold the same chunks, embedded with different models.
+    """
+    return doc.metadata.get("source"), doc.page_content
+
+
+def overlap(primary: Sequence[Document], shadow: Sequence[Document]) -> float:
+    """
+    Share of the chunks retrieved by either side that both retrieved, in the
+    top len(primary) results (1.0 if both are empty).
+    """
+    k = len(primary)
+    a = {document_key(doc) for doc in primary}
+    b = {document_key(doc) for doc in shadow[: k or len(shadow)]}
+    if not a and not b:
+        return 1.0
+    return len(a & b) / len(a | b)
+
+
+def top1_agrees(primary: Sequence[Document], shadow: Sequence[Document]) -> bool:
+    if not primary or not shadow:
+        return not primary and not shadow
+    return document_key(primary[0]) == document_key(shadow[0])
+
+
+class ShadowStats:
+    """
+    Latency and agreement of the served and shadow retrievers over the last
+    `window` shadowed queries.
+    """
+
+    def __init__(self, window: int = 1000):
+        self._lock = threading.Lock()
+        self.queries = 0
+        self.errors = 0
+        self.primary_latency = deque(maxlen=window)
+        self.shadow_latency = deque(maxlen=window)
+        self.overlap = deque(maxlen=window)
+        self.top1 = deque(maxlen=window)
+
+    def record(
+        self,
+        primary: Sequence[Document],
+        shadow: Sequence[Document],
+        primary_latency: float,
+        shadow_latency: float,
+    ) -> None:
+        with self._lock:
+            self.queries += 1
+            self.primary_latency.append(primary_latency)
+            self.shadow_latency.append(shadow_latency)
+            self.overlap.append(overlap(primary, shadow))
+            self.top1.append(top1_agrees(primary, shadow))
+
+    def record_error(self) -> None:
+        with self._lock:
+            self.errors += 1
+
+    def report(self) -> dict:
+        """
+        Returns:
+            dict: Query and error counts, latency percentiles of both sides in
+                seconds, the mean overlap of their results and the share of
+                queries where their top result agrees.
+        """
+        with self._lock:
+            n = len(self.overlap) or 1
+            return {
+                "queries": self.queries,
+                "errors": self.errors,
+                "primary_latency": percentiles(list(self.primary_latency)),
+                "shadow_latency": percentiles(list(self.shadow_latency)),
+                "overlap": round(sum(self.overlap) / n, 4),
+                "top1_agreement": round(sum(self.top1) / n, 4),
+            }
+
+
+class ShadowRetriever(BaseRetriever):
+    """
+    Serves results from `retriever` and replays a sample of the queries
+    against `shadow` (e.g. the same chunks embedded with a candidate model) in
+    the background, recording latency and agreement in `stats`.
+
+    The shadow query never delays or changes the served results, and shadow
+    errors are only counted. When `max_pending` shadow queries are already
+    running, further queries are not shadowed.
+    """
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    retriever: BaseRetriever
+    shadow: BaseRetriever
+    stats: ShadowStats = Field(default_factory=ShadowStats)
+    sample_rate: float = 1.0
+    max_pending: int = 8
+    log_every: int = 100
+
+    _executor: ThreadPoolExecutor = PrivateAttr(
+        default_factory=lambda: ThreadPoolExecutor(
+            max_workers=2, thread_name_prefix="shadow"
+        )
+    )
+    _lock: threading.Lock = PrivateAttr(default_factory=threading.Lock)
+    _pending: int = PrivateAttr(default=0)
+
+    def observe(self, query: str, docs: List[Document], latency: float) -> bool:
+        """
+        Shadow a query that was answered by the served retriever.
+
+        Args:
+            query: The query.
+            docs: The served results.
+            latency: The served retriever's latency in seconds.
+
+        Returns:
+            bool: Whether the query is shadowed.
+        """
+        if random.random() >= self.sample_rate:
+            return False
+        with self._lock:
+            if self._pending >= self.max_pending:
+                return False
+            self._pending += 1
+        self._executor.submit(self._shadow, query, docs, latency)
+        return True
+
+    def _shadow(self, query: str, docs: List[Document], latency: float) -> None:
+        try:
+            start = time.perf_counter()
+            shadow_docs = self.shadow.invoke(query)
+            self.stats.record(docs, shadow_docs, latency, time.perf_counter() - start)
+            if self.log_every and self.stats.queries % self.log_every == 0:
+                logger.info(f"Shadow retrieval: {self.stats.report()}")
+        except Exception as e:
+            self.stats.record_error()
+            logger.warning(f"Shadow retrieval failed: {e!r}")
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    def join(self, timeout: Optional[float] = None) -> None:
+        """
+        Wait for the pending shadow queries, e.g. before reading `stats`.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self._pending and (deadline is None or time.monotonic() < deadline):
+            time.sleep(0.01)
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        start = time.perf_counter()
+        docs = self.retriever.invoke(
+            query, config={"callbacks": run_manager.get_child()}
+        )
+        self.observe(query, docs, time.perf_counter() - start)
+        return docs
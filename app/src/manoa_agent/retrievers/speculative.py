@@ -0,0 +1,193 @@
+import logging
+import math
+import time
+from typing import Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from langchain_core.vectorstores import VectorStoreRetriever
+
+from manoa_agent.embeddings.base import Embedder
+from manoa_agent.parsers.normalize import normalize_question
+from manoa_agent.retrievers.aliased import AliasedRetriever
+from manoa_agent.retrievers.parent import SmallToBigRetriever
+from manoa_agent.retrievers.quantized import QuantizedRetriever
+from manoa_agent.retrievers.shadow import ShadowRetriever
+
+logger = logging.getLogger(__name__)
+
+# Chroma distances converted to relevance scores in [0, 1], the same way
+# LangChain's relevance score search does.
+RELEVANCE_FUNCTIONS: Dict[str, Callable[[float], float]] = {
+    "cosine": lambda distance: 1.0 - distance,
+    "l2": lambda distance: 1.0 - distance / math.sqrt(2),
+    "ip": lambda distance: 1.0 - distance if distance > 0 else -distance,
+}
+
+
+def relevance_function(vectorstore) -> Callable[[float], float]:
+    """
+    Returns:
+        Callable[[float], float]: The function converting distances from a
+            Chroma vector store to relevance scores, chosen by the distance
+            space of its collection (Chroma defaults to "l2"). A relevance
+            function passed to the store takes precedence.
+    """
+    override = getattr(vectorstore, "override_relevance_score_fn", None)
+    if override is not None:
+        return override
+    collection = vectorstore._collection
+    space = (collection.metadata or {}).get("hnsw:space")
+    if space is None:
+        hnsw = (getattr(collection, "configuration", None) or {}).get("hnsw")
+        space = (hnsw or {}).get("space")
+    space = space or "l2"
+    if space not in RELEVANCE_FUNCTIONS:
+        raise ValueError(f"Unsupported distance space: {space}")
+    return RELEVANCE_FUNCTIONS[space]
+
+
+def search_by_vector(
+    retriever: BaseRetriever,
+    embedding: Sequence[float],
+    query: str,
+    embedder: Optional[Embedder] = None,
+) -> List[Document]:
+    """
+    Run a retriever with a precomputed query embedding.
+
+    Vector store retrievers using "similarity" or "similarity_score_threshold"
+    search are queried by vector with their own search settings, so the query
+    is not embedded again. The same applies to a `QuantizedRetriever`, to the
+    child retriever of a `SmallToBigRetriever`, to the current retriever of
+    an `AliasedRetriever` and to the served retriever of a `ShadowRetriever`.
+    Any other retriever is invoked with the query text.
+
+    Args:
+        retriever: The retriever to run.
+        embedding: The embedding of `query`.
+        query: The query text.
+        embedder: The embedder that computed `embedding`. If given, vector
+            stores embedding with another model (e.g. a collection built with
+            a new model) are invoked with the query text instead.
+
+    Returns:
+        List[Document]: The retrieved documents.
+    """
+    if isinstance(retriever, SmallToBigRetriever):
+        children = search_by_vector(
+            retriever.child_retriever, embedding, query, embedder
+        )
+        return retriever.parents_for(children)
+
+    if isinstance(retriever, AliasedRetriever):
+        return search_by_vector(retriever.current(), embedding, query, embedder)
+
+    if isinstance(retriever, ShadowRetriever):
+        start = time.perf_counter()
+        docs = search_by_vector(retriever.retriever, embedding, query, embedder)
+        retriever.observe(query, docs, time.perf_counter() - start)
+        return docs
+
+    if isinstance(retriever, QuantizedRetriever):
+        results = retriever.index.search(embedding, retriever.k, retriever.rescore_k)
+        return [retriever.index.documents[row] for row, _ in results]
+
+    if not isinstance(retriever, VectorStoreRetriever):
+        return retriever.invoke(query)
+
+    if embedder is not None and retriever.vectorstore.embeddings is not embedder:
+        return retriever.invoke(query)
+
+    vectorstore = retriever.vectorstore
+    kwargs = dict(retriever.search_kwargs)
+    embedding = list(embedding)
+
+    if retriever.search_type == "similarity":
+        return vectorstore.similarity_search_by_vector(embedding, **kwargs)
+
+    if retriever.search_type == "similarity_score_threshold":
+        score_threshold = kwargs.pop("score_threshold", None)
+        relevance_fn = relevance_function(vectorstore)
+        results = vectorstore.similarity_search_by_vector_with_relevance_scores(
+            embedding, **kwargs
+        )
+        return [
+            doc
+            for doc, distance in results
+            if score_threshold is None or relevance_fn(distance) >= score_threshold
+        ]
+
+    return retriever.invoke(query)
+
+
+class SpeculativeRetriever:
+    """
+    Retrieval for the raw user message, started before the graph knows whether
+    retrieval is needed at all or what the reformulated question will be.
+
+    `speculate` runs alongside `GeneralAgentNode`. Once the question has been
+    reformulated, `resolve` reuses the speculative documents if the reformulated
+    question is the same as the raw message or close to it by embedding
+    similarity, and otherwise retrieves again with the reformulated question.
+    """
+
+    def __init__(
+        self,
+        embedder: Embedder,
+        retrievers: Dict[str, BaseRetriever],
+        similarity_threshold: float = 0.9,
+    ):
+        """
+        Args:
+            embedder: Embedder for queries. It must be the embedder used by
+                the vector store retrievers.
+            retrievers: Retrievers keyed by name, as in `DocumentsNode`.
+            similarity_threshold: Minimum cosine similarity between the raw and
+                reformulated question for the speculative documents to be used.
+        """
+        self.embedder = embedder
+        self.retrievers = retrievers
+        self.similarity_threshold = similarity_threshold
+
+    def speculate(self, query: str, retriever_name: str) -> Optional[dict]:
+        """
+        Retrieve documents for the raw message.
+
+        Returns:
+            Optional[dict]: The query, its embedding and the documents, or
+                None if the retriever does not exist.
+        """
+        retriever = self.retrievers.get(retriever_name)
+        if retriever is None:
+            return None
+        embedding = self.embedder.embed_query(query)
+        return {
+            "query": query,
+            "embedding": embedding,
+            "docs": search_by_vector(retriever, embedding, query, self.embedder),
+        }
+
+    def resolve(
+        self, speculation: dict, reformulated: str, retriever: BaseRetriever
+    ) -> List[Document]:
+        """
+        Return the documents for the reformulated question, reusing the
+        speculative results when the questions match closely enough.
+        """
+        if normalize_question(reformulated) == normalize_question(speculation["query"]):
+            logger.info("Speculative retrieval hit: reformulated question unchanged")
+            return list(speculation["docs"])
+
+        embedding = np.asarray(self.embedder.embed_query(reformulated))
+        speculative = np.asarray(speculation["embedding"])
+        norms = np.linalg.norm(embedding) * np.linalg.norm(speculative)
+        similarity = float(embedding @ speculative / norms) if norms else 0.0
+
+        if similarity >= self.similarity_threshold:
+            logger.info(f"Speculative retrieval hit: similarity {similarity:.3f}")
+            return list(speculation["docs"])
+
+        logger.info(f"Speculative retrieval miss: similarity {similarity:.3f}")
+        return search_by_vector(retriever, embedding, reformulated, self.embedder)
@@ -0,0 +1,208 @@
+import asyncio
+import logging
+import math
+import time
+from contextlib import asynccontextmanager
+from ipaddress import IPv4Network, IPv6Network, ip_address, ip_network
+from typing import List, Optional, Sequence, Union
+
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from manoa_agent.server.ratelimit import ClientRateLimiter
+
+logger = logging.getLogger(__name__)
+
+IPNetwork = Union[IPv4Network, IPv6Network]
+
+
+class Saturated(Exception):
+    """
+    Raised when a request cannot be admitted because the server is at capacity.
+    """
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"Server saturated, retry after {retry_after:.1f}s")
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """
+    Bounded admission queue for expensive requests.
+
+    At most `max_concurrency` requests run at once. Up to `max_queue` more wait
+    for a slot for at most `queue_timeout` seconds. Anything beyond that is
+    rejected immediately with a `Saturated` error carrying an estimate of when
+    capacity will free up.
+    """
+
+    def __init__(
+        self, max_concurrency: int = 16, max_queue: int = 64, queue_timeout: float = 10
+    ):
+        """
+        Args:
+            max_concurrency: Number of requests allowed to run concurrently.
+            max_queue: Number of requests allowed to wait for a free slot.
+            queue_timeout: Maximum number of seconds a request waits in the
+                queue before it is rejected.
+        """
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._waiting = 0
+        self._running = 0
+        # Exponentially weighted moving average of request service time.
+        self._service_time = 1.0
+
+    @property
+    def waiting(self) -> int:
+        return self._waiting
+
+    @property
+    def running(self) -> int:
+        return self._running
+
+    def retry_after(self) -> float:
+        """
+        Estimate the number of seconds until a new request could be admitted.
+        """
+        backlog = self._waiting + 1
+        return max(1.0, self._service_time * backlog / self.max_concurrency)
+
+    @asynccontextmanager
+    async def admit(self):
+        """
+        Hold a concurrency slot for the duration of the context.
+
+        Raises:
+            Saturated: If the queue is full or the wait exceeded the timeout.
+        """
+        if self._semaphore.locked() and self._waiting >= self.max_queue:
+            raise Saturated(self.retry_after())
+
+        self._waiting += 1
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            raise Saturated(self.retry_after())
+        finally:
+            self._waiting -= 1
+
+        self._running += 1
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self._running -= 1
+            self._semaphore.release()
+            elapsed = time.monotonic() - start
+            self._service_time = 0.8 * self._service_time + 0.2 * elapsed
+
+
+def parse_networks(spec: str) -> List[IPNetwork]:
+    """
+    Parse a comma separated list of addresses or networks, e.g.
+    "127.0.0.1,::1,10.0.0.0/8".
+    """
+    return [ip_network(part.strip()) for part in spec.split(",") if part.strip()]
+
+
+def _is_trusted(address: str, trusted_proxies: Sequence[IPNetwork]) -> bool:
+    try:
+        ip = ip_address(address)
+    except ValueError:
+        return False
+    return any(ip in network for network in trusted_proxies)
+
+
+def client_id(scope: Scope, trusted_proxies: Sequence[IPNetwork] = ()) -> str:
+    """
+    Identify the client of a request.
+
+    Identity headers are only honored when the socket peer is one of the
+    `trusted_proxies`, since any other client could send a new value with
+    every request to escape its rate limit. From a trusted proxy, an explicit
+    "x-client-id" header wins (the web frontend sets it to the address its own
+    reverse proxy received the request from); otherwise the last
+    "x-forwarded-for" address that is not a trusted proxy is used. Anything else is identified by the socket peer.
+    """
+    client = scope.get("client")
+    peer = client[0] if client else "unknown"
+    if not _is_trusted(peer, trusted_proxies):
+        return peer
+
+    headers = dict(scope.get("headers") or [])
+    explicit = headers.get(b"x-client-id")
+    if explicit:
+        return explicit.decode("latin-1")
+    forwarded = headers.get(b"x-forwarded-for")
+    if forwarded:
+        hops = [hop.strip() for hop in forwarded.decode("latin-1").split(",")]
+        for hop in reversed(hops):
+            if hop and not _is_trusted(hop, trusted_proxies):
+                return hop
+    return peer
+
+
+class AdmissionMiddleware:
+    """
+    ASGI middleware applying per-client rate limits and admission control to
+    POST requests under `path_prefix`.
+
+    Rate-limited clients get a 429 and saturated servers a 503, both with a
+    Retry-After header, before any work is started for the request. Clients
+    are identified by `client_id`, honoring identity headers only from
+    `trusted_proxies` (addresses or networks, e.g. "127.0.0.1,10.0.0.0/8").
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        controller: AdmissionController,
+        limiter: Optional[ClientRateLimiter] = None,
+        path_prefix: str = "/askus",
+        trusted_proxies: Union[str, Sequence[IPNetwork]] = (),
+    ):
+        self.app = app
+        self.controller = controller
+        self.limiter = limiter
+        self.path_prefix = path_prefix
+        if isinstance(trusted_proxies, str):
+            trusted_proxies = parse_networks(trusted_proxies)
+        self.trusted_proxies = list(trusted_proxies)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if (
+            scope["type"] != "http"
+            or scope["method"] != "POST"
+            or not scope["path"].startswith(self.path_prefix)
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        if self.limiter:
+            wait = self.limiter.check(client_id(scope, self.trusted_proxies))
+            if wait > 0:
+                response = self._reject(429, "Too many requests", wait)
+                await response(scope, receive, send)
+                return
+
+        try:
+            async with self.controller.admit():
+                await self.app(scope, receive, send)
+        except Saturated as e:
+            logger.warning(
+                f"Rejecting request: {self.controller.running} running, "
+                f"{self.controller.waiting} waiting"
+            )
+            response = self._reject(503, "Server is busy", e.retry_after)
+            await response(scope, receive, send)
+
+    @staticmethod
+    def _reject(status_code: int, detail: str, retry_after: float) -> JSONResponse:
+        return JSONResponse(
+            {"detail": detail},
+            status_code=status_code,
+            headers={"Retry-After": str(math.ceil(retry_after))},
+        )
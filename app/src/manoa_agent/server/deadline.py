@@ -0,0 +1,23 @@
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from manoa_agent.llm.gateway import request_deadline
+
+
+class DeadlineMiddleware:
+    """
+    ASGI middleware giving every HTTP request under `path_prefix` a deadline
+    that the `LLMGateway` derives its per-node timeouts from.
+    """
+
+    def __init__(self, app: ASGIApp, seconds: float, path_prefix: str = "/askus"):
+        self.app = app
+        self.seconds = seconds
+        self.path_prefix = path_prefix
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or not scope["path"].startswith(self.path_prefix):
+            await self.app(scope, receive, send)
+            return
+
+        with request_deadline(self.seconds):
+            await self.app(scope, receive, send)
@@ -0,0 +1,120 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket.
+
+    The bucket holds at most `capacity` tokens and refills continuously at
+    `rate` tokens per second. Callers either take tokens without waiting
+    (`try_acquire`) or block until enough tokens are available (`acquire`).
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        """
+        Args:
+            rate: Tokens added per second.
+            capacity: Maximum number of tokens (the allowed burst).
+        """
+        if rate <= 0 or capacity <= 0:
+            raise ValueError("rate and capacity must be positive")
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        elapsed = now - self._updated
+        self._tokens = min(self.capacity, self._tokens + elapsed * self.rate)
+        self._updated = now
+
+    def try_acquire(self, tokens: float = 1) -> float:
+        """
+        Take tokens if they are available.
+
+        Args:
+            tokens: Number of tokens to take.
+
+        Returns:
+            float: 0 if the tokens were taken, otherwise the number of seconds
+                until enough tokens will be available.
+        """
+        with self._lock:
+            self._refill(time.monotonic())
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                return 0.0
+            return (tokens - self._tokens) / self.rate
+
+    def acquire(self, tokens: float = 1, timeout: Optional[float] = None) -> bool:
+        """
+        Block until tokens are available and take them.
+
+        Args:
+            tokens: Number of tokens to take.
+            timeout: Maximum number of seconds to wait, or None to wait as long
+                as needed.
+
+        Returns:
+            bool: True if the tokens were taken, False if the timeout expired.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            wait = self.try_acquire(tokens)
+            if wait == 0:
+                return True
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                wait = min(wait, remaining)
+            time.sleep(wait)
+
+
+class ClientRateLimiter:
+    """
+    Per-client token buckets.
+
+    Buckets are created on first use and the least recently used ones are
+    evicted once more than `max_clients` clients are tracked, so memory stays
+    bounded no matter how many distinct clients connect.
+    """
+
+    def __init__(self, rate: float, capacity: float, max_clients: int = 10000):
+        """
+        Args:
+            rate: Requests per second allowed for each client.
+            capacity: Burst size allowed for each client.
+            max_clients: Maximum number of client buckets kept in memory.
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self.max_clients = max_clients
+        self._buckets: "OrderedDict[str, TokenBucket]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def check(self, client_id: str) -> float:
+        """
+        Count a request against a client's limit.
+
+        Args:
+            client_id: Identifier of the client making the request.
+
+        Returns:
+            float: 0 if the request is allowed, otherwise the number of seconds
+                the client should wait before retrying.
+        """
+        with self._lock:
+            bucket = self._buckets.get(client_id)
+            if bucket is None:
+                bucket = TokenBucket(self.rate, self.capacity)
+                self._buckets[client_id] = bucket
+                if len(self._buckets) > self.max_clients:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(client_id)
+        return bucket.try_acquire()
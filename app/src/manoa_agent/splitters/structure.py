@@ -0,0 +1,276 @@
+import hashlib
+import re
+from typing import Iterable, List, Optional, Sequence, Tuple
+
+from langchain.text_splitter import RecursiveCharacterTextSplitter, TextSplitter
+from langchain_core.documents import Document
+
+# One pattern for every structural boundary, so a document is scanned once.
+# Hard boundaries (headings, policy outline numbering) start a new section,
+# soft boundaries (list items and steps) are only places where a chunk may end.
+_BOUNDARY = re.compile(
+    r"""
+    ^[ \t]*(?:
+        (?P<heading>\#{1,6})[ \t]+\S
+      | (?P<roman>(?=[IVX])X{0,3}(?:IX|IV|V?I{0,3}))\.[ \t]+\S
+      | (?P<letter>[A-Z])\.[ \t]+\S
+      | (?P<decimal>\d+(?:\.\d+)+)\.?[ \t]+\S
+      | (?P<item>\d+[.)]|[a-z][.)]|\([a-z0-9]+\)|[*+-])[ \t]+\S
+    )
+    """,
+    re.MULTILINE | re.VERBOSE,
+)
+
+
+def _level(match: re.Match) -> Optional[int]:
+    """
+    Returns the section level of a boundary, or None for soft boundaries.
+    """
+    if match.group("heading"):
+        return len(match.group("heading"))
+    if match.group("roman"):
+        return 1
+    if match.group("letter"):
+        return 2
+    if match.group("decimal"):
+        return 2 + match.group("decimal").count(".")
+    return None
+
+
+def _title(segment: str) -> str:
+    first_line = segment.split("\n", 1)[0]
+    return first_line.strip().lstrip("#").strip()
+
+
+def _parent_id(source: str, text: str) -> str:
+    return hashlib.sha1(f"{source}\n{text}".encode("utf-8")).hexdigest()[:16]
+
+
+class StructureAwareTextSplitter(TextSplitter):
+    """
+    Splits AskUs articles and policy text along their structure.
+
+    Markdown headings (as produced by HtmlTextExtractor) and policy outline
+    numbering ("III.", "A.", "1.2") start new sections, and list items/steps are kept
+    whole wherever possible. Sections up to `parent_level` form parent
+    documents (a whole AskUs article, or a top-level policy section) and are
+    packed into small child chunks. Every chunk is prefixed with the titles of
+    the sections it belongs to, so it still makes sense on its own.
+
+    Chunks produced by `split_documents` carry a `parent_id` and `section` in
+    their metadata and, with `include_parent_content`, the full text of their
+    parent, which `expand_to_parents` swaps in at answer time. Parents longer
+    than `max_parent_size` (e.g. a policy section spanning pages) are split at
+    segment boundaries, so an answer never pulls in a whole document.
+    """
+
+    def __init__(
+        self,
+        chunk_size: int = 1000,
+        chunk_overlap: int = 0,
+        parent_level: int = 1,
+        include_parent_content: bool = True,
+        max_parent_size: Optional[int] = 4000,
+        **kwargs,
+    ):
+        """
+        Args:
+            chunk_size: Maximum number of characters in a chunk.
+            chunk_overlap: Overlap used only when a single section or list item
+                is longer than `chunk_size` and has to be cut.
+            parent_level: Deepest section level that starts a new parent.
+            include_parent_content: Whether to store the parent text in each
+                chunk's metadata under "parent_content".
+            max_parent_size: Maximum number of characters in a parent, at
+                least `chunk_size`, or None for no limit.
+            **kwargs: Passed to TextSplitter.
+        """
+        super().__init__(chunk_size=chunk_size, chunk_overlap=chunk_overlap, **kwargs)
+        if max_parent_size is not None and max_parent_size < chunk_size:
+            raise ValueError(
+                f"max_parent_size ({max_parent_size}) must be at least "
+                f"chunk_size ({chunk_size})"
+            )
+        self.parent_level = parent_level
+        self.include_parent_content = include_parent_content
+        self.max_parent_size = max_parent_size
+        self._fallback = RecursiveCharacterTextSplitter(
+            chunk_size=chunk_size, chunk_overlap=chunk_overlap
+        )
+        self._parent_fallback = (
+            RecursiveCharacterTextSplitter(chunk_size=max_parent_size, chunk_overlap=0)
+            if max_parent_size is not None
+            else None
+        )
+
+    def _sections(self, text: str) -> List[List[Tuple[str, bool, Tuple[str, ...]]]]:
+        """
+        Scan the text once and group its segments into parents.
+
+        Returns:
+            A list of parents, each a list of (segment text, starts a section,
+            section titles) tuples.
+        """
+        matches = list(_BOUNDARY.finditer(text))
+        starts = [0] + [m.start() for m in matches if m.start() > 0]
+        levels = [None] * (len(starts) - len(matches)) + [_level(m) for m in matches]
+        ends = starts[1:] + [len(text)]
+
+        parents: List[List[Tuple[str, bool, Tuple[str, ...]]]] = [[]]
+        path: List[Tuple[int, str]] = []
+        for start, end, level in zip(starts, ends, levels):
+            segment = text[start:end].strip("\n")
+            if not segment.strip():
+                continue
+            if level is not None:
+                while path and path[-1][0] >= level:
+                    path.pop()
+                path.append((level, _title(segment)))
+                if level <= self.parent_level and parents[-1]:
+                    parents.append([])
+            titles = tuple(title for _, title in path)
+            parents[-1].append((segment, level is not None, titles))
+        return [part for parent in parents if parent for part in self._cap(parent)]
+
+    def _cap(
+        self, parent: List[Tuple[str, bool, Tuple[str, ...]]]
+    ) -> List[List[Tuple[str, bool, Tuple[str, ...]]]]:
+        """
+        Split a parent into consecutive runs of segments of at most
+        `max_parent_size` characters, cutting segments that are longer.
+        """
+        if self.max_parent_size is None:
+            return [parent]
+
+        parts: List[List[Tuple[str, bool, Tuple[str, ...]]]] = [[]]
+        size = 0
+        for segment, is_section, titles in parent:
+            pieces = [segment]
+            if len(segment) > self.max_parent_size:
+                pieces = self._parent_fallback.split_text(segment)
+            for index, piece in enumerate(pieces):
+                if parts[-1] and size + len(piece) > self.max_parent_size:
+                    parts.append([])
+                    size = 0
+                parts[-1].append((piece, is_section and index == 0, titles))
+                size += len(piece) + 1
+        return parts
+
+    def _pack(self, parent: List[Tuple[str, bool, Tuple[str, ...]]]) -> List[str]:
+        """
+        Pack the segments of one parent into chunks of at most `chunk_size`.
+        """
+        chunks: List[str] = []
+        current: List[str] = []
+        current_len = 0
+        current_titles: Tuple[str, ...] = ()
+        min_chunk = self._chunk_size // 4
+
+        def flush():
+            if not current:
+                return
+            body = "\n".join(current)
+            titles = current_titles
+            if titles and body.lstrip("# ").startswith(titles[-1]):
+                titles = titles[:-1]
+            if titles:
+                body = " > ".join(titles) + "\n" + body
+            chunks.append(body)
+
+        for segment, is_section, titles in parent:
+            too_long = current_len + len(segment) > self._chunk_size
+            if current and (too_long or (is_section and current_len >= min_chunk)):
+                flush()
+                current, current_len = [], 0
+            if not current:
+                current_titles = titles
+            if len(segment) > self._chunk_size:
+                # A single section or step that does not fit is cut by size.
+                pieces = self._fallback.split_text(segment)
+                for piece in pieces[:-1]:
+                    current = [piece]
+                    flush()
+                segment = pieces[-1]
+                current = []
+            current.append(segment)
+            current_len += len(segment) + 1
+        flush()
+        return chunks
+
+    def split_text(self, text: str) -> List[str]:
+        return [
+            chunk for parent in self._sections(text) for chunk in self._pack(parent)
+        ]
+
+    def split_with_parents(
+        self, documents: Iterable[Document]
+    ) -> Tuple[List[Document], List[Document]]:
+        """
+        Split documents into child chunks and the parent sections they belong to.
+
+        Args:
+            documents: The documents to split.
+
+        Returns:
+            Tuple[List[Document], List[Document]]: The child chunks and the
+                parent documents. Both carry a "parent_id" in their metadata.
+        """
+        children: List[Document] = []
+        parents: List[Document] = []
+        for document in documents:
+            source = document.metadata.get("source", "")
+            for parent in self._sections(document.page_content):
+                parent_text = "\n".join(segment for segment, _, _ in parent)
+                parent_id = _parent_id(source, parent_text)
+                section = " > ".join(parent[0][2])
+                parent_metadata = {
+                    **document.metadata,
+                    "parent_id": parent_id,
+                    "section": section,
+                }
+                parents.append(
+                    Document(page_content=parent_text, metadata=parent_metadata)
+                )
+
+                for index, chunk in enumerate(self._pack(parent)):
+                    metadata = {**parent_metadata, "chunk_index": index}
+                    if self.include_parent_content:
+                        metadata["parent_content"] = parent_text
+                    children.append(Document(page_content=chunk, metadata=metadata))
+        return children, parents
+
+    def split_documents(self, documents: Iterable[Document]) -> List[Document]:
+        children, _ = self.split_with_parents(documents)
+        return children
+
+
+def expand_to_parents(documents: Sequence[Document]) -> List[Document]:
+    """
+    Replace retrieved chunks with their parent sections, keeping the retrieval
+    order and dropping parents that were already returned for an earlier chunk.
+    Chunks without "parent_content" metadata are kept as they are.
+
+    Args:
+        documents: The retrieved chunks.
+
+    Returns:
+        List[Document]: The deduplicated parent documents.
+    """
+    expanded: List[Document] = []
+    seen = set()
+    for document in documents:
+        parent_id = document.metadata.get("parent_id")
+        parent_content = document.metadata.get("parent_content")
+        if not parent_id or not parent_content:
+            expanded.append(document)
+            continue
+        if parent_id in seen:
+            continue
+        seen.add(parent_id)
+        metadata = {
+            key: value
+            for key, value in document.metadata.items()
+            if key not in ("parent_content", "chunk_index")
+        }
+        expanded.append(Document(page_content=parent_content, metadata=metadata))
+    return expanded
@@ -0,0 +1,27 @@
+from langchain_core.retrievers import BaseRetriever
+
+
+class StaticLoader:
+    """
+    Loads the same documents on every call.
+    """
+
+    def __init__(self, docs):
+        self.docs = docs
+
+    def load(self):
+        return list(self.docs)
+
+
+class StaticRetriever(BaseRetriever):
+    """
+    Returns the same documents for every query, or raises if `fail` is set.
+    """
+
+    docs: list = []
+    fail: bool = False
+
+    def _get_relevant_documents(self, query, *, run_manager):
+        if self.fail:
+            raise ConnectionError("retriever is down")
+        return list(self.docs)
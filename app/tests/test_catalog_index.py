@@ -0,0 +1,54 @@
+import unittest
+
+from manoa_agent.retrievers.catalog import CatalogIndex, CatalogRetriever
+
+
+def course(code, title, credits="3", description=""):
+    return {
+        "code": code,
+        "subject": code.split()[0],
+        "title": title,
+        "credits": credits,
+        "description": description,
+    }
+
+
+class TestCatalogIndex(unittest.TestCase):
+    def setUp(self):
+        courses = [
+            course("ICS 311", "Algorithms", "4", "Design of algorithms."),
+            course("ARCH 686", "Historic Preservation Practicum"),
+            course("ART 101", "Art"),
+            course("HON 499", "Directed Reading/Research", "V"),
+        ]
+        self.index = CatalogIndex(
+            {c["code"]: c for c in courses},
+            {"ICS": "Information and Computer Sciences", "ARCH": "Architecture"},
+        )
+
+    def test_detect_course_codes(self):
+        self.assertEqual(self.index.detect("what is ics311?"), ["ICS 311"])
+        self.assertEqual(
+            self.index.detect("how many credits is ARCH 686"), ["ARCH 686"]
+        )
+        # Known subject, but not a catalog course.
+        self.assertEqual(self.index.detect("what is ICS 999"), [])
+        self.assertEqual(self.index.detect("is the library open"), [])
+
+    def test_title_search_tolerates_typos(self):
+        results = self.index.search_titles("who teaches historic preservaton practicum")
+        self.assertEqual(results[0][0], "ARCH 686")
+        # Short titles are not matched fuzzily.
+        self.assertEqual(self.index.search_titles("art"), [])
+
+    def test_retriever(self):
+        retriever = CatalogRetriever(index=self.index)
+        (doc,) = retriever.invoke("How many credits is ICS 311?")
+        self.assertEqual(doc.metadata["course"], "ICS 311")
+        self.assertIn("ICS 311: Algorithms (4 credits)", doc.page_content)
+        (doc,) = retriever.invoke("what is directed reading/research")
+        self.assertIn("(variable credits)", doc.page_content)
+
+
+if __name__ == "__main__":
+    unittest.main()
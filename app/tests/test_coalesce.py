@@ -0,0 +1,136 @@
+import asyncio
+import threading
+import time
+import unittest
+
+from manoa_agent.agent.coalesce import SingleFlight, question_key
+
+
+class TestSingleFlight(unittest.TestCase):
+    def test_concurrent_calls_share_result(self):
+        flight = SingleFlight()
+        calls = []
+
+        def compute():
+            calls.append(1)
+            time.sleep(0.2)
+            return "answer"
+
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(flight.do("k", compute)))
+            for _ in range(5)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(results, ["answer"] * 5)
+        self.assertEqual(len(calls), 1)
+
+    def test_exception_is_shared(self):
+        flight = SingleFlight()
+
+        def fail():
+            raise ValueError("upstream failed")
+
+        with self.assertRaises(ValueError):
+            flight.do("k", fail)
+        # The key is released after the failure.
+        self.assertEqual(flight.do("k", lambda: 1), 1)
+
+    def test_async_concurrent_calls_share_result(self):
+        flight = SingleFlight()
+        calls = []
+
+        async def compute():
+            calls.append(1)
+            await asyncio.sleep(0.1)
+            return "answer"
+
+        async def run():
+            return await asyncio.gather(*(flight.ado("k", compute) for _ in range(5)))
+
+        self.assertEqual(asyncio.run(run()), ["answer"] * 5)
+        self.assertEqual(len(calls), 1)
+
+    def test_followers_get_copies(self):
+        flight = SingleFlight()
+
+        async def compute():
+            await asyncio.sleep(0.05)
+            return {"messages": ["answer"]}
+
+        async def run():
+            return await asyncio.gather(*(flight.ado("k", compute) for _ in range(3)))
+
+        results = asyncio.run(run())
+        results[0]["messages"].append("changed by the leader's caller")
+        self.assertEqual(results[1], {"messages": ["answer"]})
+        self.assertIsNot(results[1], results[2])
+
+    def test_cancelled_leader_does_not_cancel_followers(self):
+        flight = SingleFlight()
+        calls = []
+
+        async def compute():
+            calls.append(1)
+            await asyncio.sleep(0.1)
+            return "answer"
+
+        async def run():
+            leader = asyncio.ensure_future(flight.ado("k", compute))
+            await asyncio.sleep(0)
+            follower = asyncio.ensure_future(flight.ado("k", compute))
+            await asyncio.sleep(0.01)
+            leader.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await leader
+            return await follower
+
+        self.assertEqual(asyncio.run(run()), "answer")
+        self.assertEqual(len(calls), 1)
+
+    def test_computation_cancelled_when_every_caller_is_gone(self):
+        flight = SingleFlight()
+        cancelled = []
+
+        async def compute():
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.append(1)
+                raise
+
+        async def run():
+            callers = [
+                asyncio.ensure_future(flight.ado("k", compute)) for _ in range(2)
+            ]
+            await asyncio.sleep(0.01)
+            for caller in callers:
+                caller.cancel()
+            await asyncio.gather(*callers, return_exceptions=True)
+            await asyncio.sleep(0.01)
+            # The key is released, so the next call runs again.
+            return await flight.ado("k", lambda: asyncio.sleep(0, result="again"))
+
+        self.assertEqual(asyncio.run(run()), "again")
+        self.assertEqual(cancelled, [1])
+
+    def test_question_key(self):
+        first = {"messages": [{"type": "human", "content": "Is UH email down?"}]}
+        same = {"messages": [{"type": "human", "content": "is uh email  down"}]}
+        follow_up = {
+            "messages": [
+                {"type": "human", "content": "hi"},
+                {"type": "ai", "content": "Hello!"},
+                {"type": "human", "content": "Is UH email down?"},
+            ]
+        }
+        self.assertEqual(question_key(first), question_key(same))
+        self.assertIsNone(question_key(follow_up))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,153 @@
+import unittest
+import uuid
+
+import chromadb
+from langchain_core.retrievers import BaseRetriever
+
+from manoa_agent.db.chroma.versions import CollectionVersions, carry_over
+from manoa_agent.retrievers.aliased import AliasedRetriever
+
+
+class NamedRetriever(BaseRetriever):
+    """
+    Returns no documents; only records which collection it was built for.
+    """
+
+    name: str
+
+    def _get_relevant_documents(self, query, *, run_manager):
+        return []
+
+
+class ConstantEmbedder:
+    def __init__(self, vector):
+        self.vector = vector
+        self.texts = []
+
+    def embed_documents(self, texts):
+        self.texts.extend(texts)
+        return [list(self.vector) for _ in texts]
+
+
+class TestCollectionVersions(unittest.TestCase):
+    def setUp(self):
+        self.client = chromadb.EphemeralClient()
+        self.alias = f"faq_{uuid.uuid4().hex[:8]}"
+        self.versions = CollectionVersions(
+            self.client, registry=f"aliases_{uuid.uuid4().hex[:8]}"
+        )
+
+    def build(self):
+        name = self.versions.create(self.alias)
+        self.client.get_collection(name).add(ids=["1"], embeddings=[[0.0, 1.0]])
+        return name
+
+    def test_unpromoted_alias_resolves_to_itself(self):
+        self.assertEqual(self.versions.resolve(self.alias), self.alias)
+
+    def test_promote_and_rollback(self):
+        v1 = self.build()
+        v2 = self.build()
+        self.assertEqual(v2, f"{self.alias}-v2")
+        self.assertEqual(self.versions.versions(self.alias), [1, 2])
+
+        self.assertEqual(self.versions.promote(self.alias, v1), self.alias)
+        self.assertEqual(self.versions.promote(self.alias, v2), v1)
+        self.assertEqual(self.versions.resolve(self.alias), v2)
+
+        self.assertEqual(self.versions.rollback(self.alias), v1)
+        self.assertEqual(self.versions.resolve(self.alias), v1)
+        # Rolling back again undoes the rollback.
+        self.assertEqual(self.versions.rollback(self.alias), v2)
+
+    def test_refuse_empty_collection(self):
+        name = self.versions.create(self.alias)
+        with self.assertRaises(ValueError):
+            self.versions.promote(self.alias, name)
+        self.assertEqual(self.versions.resolve(self.alias), self.alias)
+
+    def test_rollback_without_previous(self):
+        with self.assertRaises(ValueError):
+            self.versions.rollback(self.alias)
+
+    def test_prune_keeps_served_versions(self):
+        names = [self.build() for _ in range(4)]
+        self.versions.promote(self.alias, names[0])
+        self.versions.promote(self.alias, names[1])
+        deleted = self.versions.prune(self.alias, keep=1)
+        # v1 and v2 are previous and current, v4 is the newest.
+        self.assertEqual(deleted, [names[2]])
+        self.assertEqual(self.versions.versions(self.alias), [1, 2, 4])
+
+    def test_served(self):
+        names = [self.build() for _ in range(3)]
+        self.assertEqual(self.versions.served(), [])
+        self.versions.promote(self.alias, names[0])
+        self.versions.promote(self.alias, names[1])
+        # The unversioned alias collection does not exist.
+        self.assertEqual(self.versions.served(), names[:2])
+        self.assertTrue(self.versions.exists(names[2]))
+        self.assertFalse(self.versions.exists(self.alias))
+
+    def test_carry_over(self):
+        served = self.client.get_collection(self.versions.create(self.alias))
+        served.upsert(
+            ids=["1", "2", "3", "4"],
+            embeddings=[[1.0, 0.0]] * 4,
+            documents=["loaded", "streamed", "streamed 2", "removed"],
+            metadatas=[
+                {"source": "a"},
+                {"source": "b", "origin": "crawl"},
+                {"source": "b", "origin": "crawl"},
+                {"source": "c"},
+            ],
+        )
+        target = self.client.get_collection(self.versions.create(self.alias))
+        target.add(
+            ids=["a"],
+            embeddings=[[0.0, 1.0]],
+            documents=["new"],
+            metadatas=[{"source": "a"}],
+        )
+        self.assertEqual(carry_over(served, target, batch_size=2), 2)
+        copied = target.get(ids=["2", "3"], include=["embeddings"])
+        self.assertEqual([list(e) for e in copied["embeddings"]], [[1.0, 0.0]] * 2)
+        # Sources the new version loaded itself are not copied, nor are
+        # loaded sources that were removed from the data since.
+        self.assertEqual(sorted(target.get()["ids"]), ["2", "3", "a"])
+
+        # Built with another model, the copied chunks are embedded again.
+        other = self.client.get_collection(self.versions.create(self.alias))
+        embedder = ConstantEmbedder([0.0, 1.0])
+        self.assertEqual(carry_over(served, other, embedder), 2)
+        self.assertEqual(sorted(embedder.texts), ["streamed", "streamed 2"])
+        embeddings = other.get(ids=["2"], include=["embeddings"])["embeddings"]
+        self.assertEqual(list(embeddings[0]), [0.0, 1.0])
+
+    def test_aliased_retriever_follows_alias(self):
+        v1 = self.build()
+        v2 = self.build()
+        self.versions.promote(self.alias, v1)
+        built = []
+
+        def build(name):
+            built.append(name)
+            return NamedRetriever(name=name)
+
+        retriever = AliasedRetriever(
+            versions=self.versions, alias=self.alias, build=build, refresh_interval=0
+        )
+        self.assertEqual(retriever.invoke("question"), [])
+        self.assertEqual(retriever.collection, v1)
+
+        self.versions.promote(self.alias, v2)
+        self.assertEqual(retriever.current().name, v2)
+        self.versions.rollback(self.alias)
+        self.assertEqual(retriever.current().name, v1)
+        # Unchanged aliases reuse the retriever.
+        retriever.current()
+        self.assertEqual(built, [v1, v2, v1])
+
+
+if __name__ == "__main__":
+    unittest.main()
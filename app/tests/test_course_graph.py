@@ -0,0 +1,124 @@
+import json
+import os
+import tempfile
+import unittest
+
+from manoa_agent.parsers.course import find_course_codes, parse_title
+from manoa_agent.retrievers.course_graph import CourseGraph, CourseGraphRetriever
+
+ICS_METADATA = "College of Natural Sciences Information and Computer Sciences (ICS)"
+CATALOG = [
+    {
+        "subject": "ICS",
+        "course_number": "111",
+        "title": "Introduction to Computer Science I (4)",
+        "desc": "Programming basics.",
+        "metadata": ICS_METADATA,
+    },
+    {
+        "subject": "ICS",
+        "course_number": "211",
+        "title": "Introduction to Computer Science II (4)",
+        "desc": "Data structures. Pre: 111 or consent.",
+        "metadata": ICS_METADATA,
+    },
+    {
+        "subject": "ICS",
+        "course_number": "311",
+        "title": "Algorithms (4)",
+        "desc": "Design of algorithms. Pre: 211 and MATH 241; or consent.",
+        "metadata": ICS_METADATA,
+    },
+    {
+        "subject": "MATH",
+        "course_number": "241",
+        "title": "Calculus I (4)",
+        "desc": "Limits and derivatives. (Cross-listed as ICS 241)",
+        "metadata": "College of Natural Sciences Mathematics (MATH)",
+    },
+    {
+        "subject": "ICS",
+        "course_number": "241",
+        "title": "Discrete Mathematics (3)",
+        "desc": "Logic and sets.",
+        "metadata": ICS_METADATA,
+    },
+]
+
+GRAPHML = """<?xml version="1.0" encoding="UTF-8"?>
+<graphml xmlns="http://graphml.graphdrawing.org/xmlns">
+<key id="id" for="node" attr.name="id" attr.type="string"/>
+<key id="labels" for="node" attr.name="labels" attr.type="string"/>
+<key id="label" for="edge" attr.name="label" attr.type="string"/>
+<graph id="G" edgedefault="directed">
+<node id="n0"><data key="labels">:Course</data><data key="id">Algorithms</data></node>
+<node id="n1"><data key="labels">:Course</data><data key="id">113</data></node>
+<node id="n2"><data key="labels">:Subject</data><data key="id">ICS</data></node>
+<node id="n3"><data key="labels">:Degree</data><data key="id">BS</data></node>
+<edge source="n0" target="n1"><data key="label">REQUIRES</data></edge>
+<edge source="n2" target="n3"><data key="label">OFFERS</data></edge>
+</graph>
+</graphml>
+"""
+
+
+class TestCourseGraph(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            catalog_path = os.path.join(tmp_dir, "catalog.json")
+            graphml_path = os.path.join(tmp_dir, "courses.graphml")
+            with open(catalog_path, "w") as f:
+                json.dump(CATALOG, f)
+            with open(graphml_path, "w") as f:
+                f.write(GRAPHML)
+            cls.graph = CourseGraph.load(graphml_path, catalog_path)
+
+    def test_find_course_codes(self):
+        subjects = {"ICS", "MATH", "IS"}
+        self.assertEqual(
+            find_course_codes("ics311 or 312, and MATH 241", subjects),
+            ["ICS 311", "ICS 312", "MATH 241"],
+        )
+        self.assertEqual(find_course_codes("what is 101", subjects), [])
+        self.assertEqual(
+            parse_title("(Alpha) Art Since 1945 (3)"), ("Art Since 1945", "3")
+        )
+
+    def test_subject_names_drop_college(self):
+        self.assertEqual(
+            self.graph.subject_names["ICS"], "Information and Computer Sciences"
+        )
+
+    def test_prerequisite_chain(self):
+        self.assertEqual(
+            self.graph.prerequisites("ICS 311"),
+            [("ICS 211", 1), ("MATH 241", 1), ("ICS 111", 2)],
+        )
+        self.assertEqual(self.graph.prerequisites("ICS 311", max_depth=1)[-1][1], 1)
+        self.assertEqual(self.graph.required_by("ICS 211"), ["ICS 311"])
+
+    def test_cross_listings_both_directions(self):
+        self.assertEqual(self.graph.cross_listings("ICS 241"), ["MATH 241"])
+        self.assertEqual(self.graph.cross_listings("MATH 241"), ["ICS 241"])
+
+    def test_graphml_merge(self):
+        # Unresolvable GraphML course nodes are dropped.
+        self.assertNotIn(("Course", "113"), self.graph.ids)
+        ics = self.graph.ids[("Subject", "ICS")]
+        degrees = self.graph.neighbors(ics, "OFFERS")
+        self.assertEqual([self.graph.names[i] for i in degrees], ["BS"])
+
+    def test_retriever(self):
+        retriever = CourseGraphRetriever(graph=self.graph)
+        (doc,) = retriever.invoke("What do I need before ICS 311?")
+        self.assertIn("Algorithms (4 credits)", doc.page_content)
+        self.assertIn("level 2: ICS 111", doc.page_content)
+
+        (doc,) = retriever.invoke("information and computer sciences courses")
+        self.assertEqual(doc.metadata["subject"], "ICS")
+        self.assertIn("ICS 241: Discrete Mathematics (3 credits)", doc.page_content)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,121 @@
+import json
+import os
+import tempfile
+import unittest
+
+from langchain_chroma import Chroma
+from langchain_core.documents import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from langchain_core.stores import InMemoryStore
+
+from manoa_agent.db.chroma.utils import document_ids
+from manoa_agent.ingest.delta import apply_delta, read_delta
+from manoa_agent.splitters.structure import StructureAwareTextSplitter
+
+
+def page(url, change, text=None):
+    record = {"url": url, "change": change}
+    if text is not None:
+        record["extracted"] = text
+    return record
+
+
+class TestCrawlDelta(unittest.TestCase):
+    def setUp(self):
+        self.collection = Chroma(
+            collection_name="test_crawl_delta",
+            embedding_function=DeterministicFakeEmbedding(size=16),
+        )
+        self.docstore = InMemoryStore()
+        self.splitter = StructureAwareTextSplitter(
+            chunk_size=200, chunk_overlap=0, include_parent_content=False
+        )
+
+    def tearDown(self):
+        self.collection.delete_collection()
+
+    def sources(self):
+        metadatas = self.collection.get(include=["metadatas"])["metadatas"]
+        return sorted({metadata["source"] for metadata in metadatas})
+
+    def apply(self, records):
+        return apply_delta(self.collection, records, self.splitter, self.docstore)
+
+    def test_apply_delta(self):
+        self.apply(
+            [
+                page("a", "added", "# Parking\nBuy a permit online."),
+                page("b", "added", "# Library\nOpen until 10pm."),
+            ]
+        )
+        self.assertEqual(self.sources(), ["a", "b"])
+        # Tagged so a rebuilt version carries them over.
+        metadatas = self.collection.get(include=["metadatas"])["metadatas"]
+        self.assertEqual({metadata["origin"] for metadata in metadatas}, {"crawl"})
+        old_parents = list(self.docstore.yield_keys())
+
+        stats = self.apply(
+            [
+                page("a", "updated", "# Parking\nPermits are sold at the kiosk."),
+                page("b", "deleted"),
+                page("c", "added", "# Dining\nCampus Center food court."),
+            ]
+        )
+        self.assertEqual(stats, {"added": 1, "updated": 1, "deleted": 1})
+        self.assertEqual(self.sources(), ["a", "c"])
+        texts = self.collection.get(where={"source": "a"})["documents"]
+        self.assertTrue(any("kiosk" in text for text in texts))
+        self.assertFalse(any("online" in text for text in texts))
+        # Parents of the replaced and deleted pages are gone.
+        self.assertEqual(self.docstore.mget(old_parents), [None] * len(old_parents))
+
+    def test_ids_match_full_uploads(self):
+        text = "# Parking\nBuy a permit online.\n# Hours\nOpen 24/7."
+        self.apply([page("a", "added", text)])
+        chunks, _ = self.splitter.split_with_parents(
+            [Document(page_content=text, metadata={"source": "a"})]
+        )
+        self.assertEqual(
+            sorted(self.collection.get()["ids"]), sorted(document_ids(chunks))
+        )
+
+    def test_parents_of_other_versions_are_kept(self):
+        self.apply([page("a", "added", "# Parking\nBuy a permit online.")])
+        parents = list(self.docstore.yield_keys())
+        # The previous version still serves page "a" with the same parents.
+        previous = Chroma(
+            collection_name="test_crawl_delta_previous",
+            embedding_function=DeterministicFakeEmbedding(size=16),
+        )
+        self.addCleanup(previous.delete_collection)
+        previous.add_documents(self.collection.get_by_ids(self.collection.get()["ids"]))
+
+        apply_delta(
+            self.collection,
+            [page("a", "deleted")],
+            self.splitter,
+            self.docstore,
+            protect=[previous],
+        )
+        self.assertEqual(self.sources(), [])
+        self.assertNotIn(None, self.docstore.mget(parents))
+
+    def test_read_delta_formats(self):
+        records = [page("a", "added", "text"), page("b", "deleted")]
+        with tempfile.TemporaryDirectory() as tmp:
+            lines = os.path.join(tmp, "delta.jsonl")
+            with open(lines, "w", encoding="utf-8") as f:
+                f.write("".join(json.dumps(r) + "\n" for r in records))
+            array = os.path.join(tmp, "delta.json")
+            with open(array, "w", encoding="utf-8") as f:
+                json.dump(records, f)
+            self.assertEqual(read_delta(lines), records)
+            self.assertEqual(read_delta(array), records)
+
+    def test_unknown_change(self):
+        with self.assertRaises(ValueError):
+            self.apply([page("a", "moved")])
+
+
+if __name__ == "__main__":
+    unittest.main()
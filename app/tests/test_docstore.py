@@ -0,0 +1,84 @@
+import os
+import tempfile
+import unittest
+
+from langchain_core.documents import Document
+
+from manoa_agent.db.docstore import SQLiteDocStore
+from manoa_agent.retrievers.parent import SmallToBigRetriever, window
+from tests.helpers import StaticRetriever
+
+
+class TestSQLiteDocStore(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.store = SQLiteDocStore(os.path.join(self.tmp_dir.name, "docs.sqlite"))
+
+    def tearDown(self):
+        self.store.close()
+        self.tmp_dir.cleanup()
+
+    def test_set_get_delete(self):
+        self.store.mset(
+            [
+                ("a", Document(page_content="parent a", metadata={"source": "x"})),
+                ("b", Document(page_content="parent b")),
+            ]
+        )
+        a, missing, b = self.store.mget(["a", "missing", "b"])
+        self.assertEqual(a.page_content, "parent a")
+        self.assertEqual(a.metadata, {"source": "x"})
+        self.assertIsNone(missing)
+        self.assertEqual(b.page_content, "parent b")
+        self.assertEqual(sorted(self.store.yield_keys()), ["a", "b"])
+
+        self.store.mdelete(["a"])
+        self.assertEqual(list(self.store.yield_keys(prefix="a")), [])
+
+    def test_small_to_big_retriever(self):
+        self.store.mset(
+            [
+                ("p1", Document(page_content="parent one")),
+                ("p2", Document(page_content="parent two")),
+            ]
+        )
+        children = [
+            Document(page_content="chunk 1a", metadata={"parent_id": "p1"}),
+            Document(page_content="chunk 2a", metadata={"parent_id": "p2"}),
+            Document(page_content="chunk 1b", metadata={"parent_id": "p1"}),
+            Document(page_content="no parent"),
+            Document(page_content="unknown", metadata={"parent_id": "p3"}),
+        ]
+        retriever = SmallToBigRetriever(
+            child_retriever=StaticRetriever(docs=children), docstore=self.store
+        )
+        results = [doc.page_content for doc in retriever.invoke("query")]
+        self.assertEqual(results, ["parent one", "parent two", "no parent", "unknown"])
+
+    def test_long_parents_are_cut_around_the_child(self):
+        lines = [f"line {i:03d} of a very long policy" for i in range(300)]
+        self.store.mset([("p1", Document(page_content="\n".join(lines)))])
+        child = Document(
+            page_content="III. Policy\nline 150 of a very long policy",
+            metadata={"parent_id": "p1"},
+        )
+        retriever = SmallToBigRetriever(
+            child_retriever=StaticRetriever(docs=[child]),
+            docstore=self.store,
+            max_parent_size=300,
+        )
+        [parent] = retriever.invoke("query")
+        self.assertLessEqual(len(parent.page_content), 300)
+        # The child is in the middle of the window, which keeps whole lines.
+        self.assertTrue(parent.page_content.startswith("line 146 "))
+        self.assertTrue(parent.page_content.endswith("line 154 of a very long policy"))
+
+    def test_window(self):
+        text = "a\nbb\nccc\ndddd"
+        self.assertEqual(window(text, "anything", 100), text)
+        self.assertEqual(window(text, "dddd", 9), "ccc\ndddd")
+        self.assertEqual(window(text, "missing", 5), "a\nbb")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,69 @@
+import unittest
+
+from langchain_core.language_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage
+from langgraph.graph import END, START, StateGraph
+
+from manoa_agent.agent.states import AgentOutputState, AgentState
+from manoa_agent.eval.batch import aggregate, compare, run_batch
+from manoa_agent.llm.gateway import LLMGateway
+
+
+def build_agent():
+    usage = {"input_tokens": 5, "output_tokens": 2, "total_tokens": 7}
+    llm = GenericFakeChatModel(
+        messages=iter([AIMessage("hi", usage_metadata=usage)] * 10)
+    )
+    gateway = LLMGateway()
+
+    def reformulate(state):
+        return {"retriever": state["retriever"]}
+
+    def answer(state):
+        if state["messages"][-1].content == "fail":
+            raise ValueError("fail")
+        message = gateway.invoke("answer", llm, state["messages"])
+        return {"message": message, "sources": ["https://example.com/a"]}
+
+    workflow = StateGraph(AgentState, output=AgentOutputState)
+    workflow.add_node("reformulate", reformulate)
+    workflow.add_node("answer", answer)
+    workflow.add_edge(START, "reformulate")
+    workflow.add_edge("reformulate", "answer")
+    workflow.add_edge("answer", END)
+    return workflow.compile()
+
+
+class TestBatchRunner(unittest.TestCase):
+    def test_run_batch(self):
+        items = [
+            {
+                "id": "ok",
+                "messages": [{"type": "human", "content": "hello"}],
+                "expected_sources": ["https://example.com/a"],
+            },
+            {"id": "error", "messages": [{"type": "human", "content": "fail"}]},
+        ]
+        ok, error = run_batch(build_agent(), items, concurrency=2, warmup=False)
+
+        self.assertEqual(ok["answer"], "hi")
+        self.assertTrue(ok["source_hit"])
+        self.assertEqual(set(ok["node_timings"]), {"reformulate", "answer"})
+        self.assertEqual(ok["tokens"], {"answer": {"input": 5, "output": 2}})
+        self.assertGreater(ok["latency"], 0)
+        self.assertIn("fail", error["error"])
+
+        report = aggregate([ok, error])
+        self.assertEqual(report["items"], 2)
+        self.assertEqual(report["errors"], 1)
+        self.assertEqual(report["tokens"]["answer"], {"input": 5, "output": 2})
+        self.assertEqual(report["source_hit_rate"], 1.0)
+
+    def test_compare(self):
+        old = {"errors": 1, "latency": {"p95": 2.0, "p50": 1.0}}
+        new = {"errors": 1, "latency": {"p95": 3.0, "p50": 1.0}}
+        self.assertEqual(compare(old, new), {"latency.p95": (2.0, 3.0)})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,77 @@
+import unittest
+
+from manoa_agent.parsers.html_parser import HTMLParser
+from manoa_agent.parsers.html_text import HtmlTextExtractor
+
+PAGE = """
+<html><head><title>Ignored</title><script>track()</script></head>
+<body>
+<nav><a href="/">Home</a></nav>
+<main id="content">
+<h2 id="question">How do I   reset my password?</h2>
+<div id="answer">
+<p>Go to <a href="https://www.hawaii.edu/account">UH Account</a> and
+<strong>Forgot password</strong>.</p>
+<ol>
+<li><p>Enter your UH username.</p><p>Or your email.</p></li>
+<li>Answer the questions:
+<ul><li>first</li><li>second</li></ul>
+</li>
+</ol>
+<p>Email <a href="mailto:help@hawaii.edu">help@hawaii.edu</a>
+<img src="logo.png" alt="logo"></p>
+</div>
+</main>
+</body></html>
+"""
+
+
+class TestHtmlTextExtractor(unittest.TestCase):
+    def test_selected_element_to_markdown(self):
+        text = HtmlTextExtractor().extract(PAGE, ids=["answer"])
+        self.assertEqual(
+            text,
+            "Go to [UH Account](https://www.hawaii.edu/account) and "
+            "**Forgot password**.\n"
+            "\n"
+            "  1. Enter your UH username.\n"
+            "Or your email.\n"
+            "  2. Answer the questions:\n"
+            "    * first\n"
+            "    * second\n"
+            "\n"
+            "Email [help@hawaii.edu](mailto:help@hawaii.edu)",
+        )
+
+    def test_heading_element_keeps_its_markup(self):
+        extractor = HtmlTextExtractor()
+        root = extractor.parse_tree(PAGE)
+        question = extractor.select(root, ids=["missing", "question"])
+        self.assertEqual(extractor.to_text(question), "## How do I reset my password?")
+
+    def test_options(self):
+        extractor = HtmlTextExtractor(
+            ignore_links=True, ignore_images=False, ignore_emphasis=True
+        )
+        text = extractor.extract(PAGE, tags=["main"])
+        self.assertIn("Go to UH Account and Forgot password.", text)
+        self.assertIn("![logo](logo.png)", text)
+        self.assertNotIn("Home", text)
+
+        text = HtmlTextExtractor(ignore_mailto_links=True).extract(PAGE)
+        self.assertIn("Email help@hawaii.edu", text)
+        self.assertNotIn("track()", text)
+        self.assertNotIn("Ignored", text)
+
+    def test_no_match(self):
+        extractor = HtmlTextExtractor()
+        self.assertIsNone(extractor.extract(PAGE, ids=["missing"], fallback=False))
+        self.assertEqual(extractor.extract(""), "")
+
+    def test_html_parser(self):
+        parser = HTMLParser(ids=["missing"], tags=["h2"])
+        self.assertEqual(parser.parse(PAGE), "## How do I reset my password?")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,70 @@
+import unittest
+
+from langchain_chroma import Chroma
+from langchain_core.documents import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from langchain_core.language_models import FakeListChatModel
+from langchain_core.stores import InMemoryStore
+
+from manoa_agent.ingest.hypothetical import (
+    HypotheticalQuestionIndexer,
+    parse_questions,
+)
+
+
+def article(source, text):
+    return Document(page_content=text, metadata={"source": source})
+
+
+class TestHypotheticalQuestionIndexer(unittest.TestCase):
+    def setUp(self):
+        self.collection = Chroma(
+            collection_name="test_askus_questions",
+            embedding_function=DeterministicFakeEmbedding(size=16),
+        )
+        self.docstore = InMemoryStore()
+        response = "1. How do I log in?\n2) where is the login page\n- How do I log in"
+        self.llm = FakeListChatModel(responses=[response])
+        self.indexer = HypotheticalQuestionIndexer(
+            self.collection, self.docstore, self.llm, n_questions=3
+        )
+
+    def tearDown(self):
+        self.collection.delete_collection()
+
+    def test_parse_questions(self):
+        self.assertEqual(
+            parse_questions("1. First?\n2) Second?\n\n- Third?\n• Fourth?"),
+            ["First?", "Second?", "Third?", "Fourth?"],
+        )
+
+    def test_index_is_incremental(self):
+        docs = [
+            article("a", "## How do I reset my password?\nUse the reset page."),
+            article("b", "## How do I log in?\nGo to the login page."),
+        ]
+        stats = self.indexer.index(docs)
+        self.assertEqual(stats["added"], 2)
+
+        questions = self.collection.get(where={"parent_id": "a"})["documents"]
+        self.assertEqual(questions[0], "How do I reset my password?")
+        self.assertIn("where is the login page", questions)
+        # Near-duplicates of the same question are stored once.
+        b_questions = self.collection.get(where={"parent_id": "b"})["documents"]
+        self.assertEqual(len(b_questions), 2)
+        self.assertEqual(self.docstore.mget(["a"])[0].metadata["parent_id"], "a")
+
+        docs = [article("a", "## How do I reset my password?\nCall the help desk.")]
+        stats = self.indexer.index(docs)
+        self.assertEqual(
+            stats, {"added": 0, "updated": 1, "removed": 1, "unchanged": 0}
+        )
+        self.assertEqual(self.collection.get(where={"parent_id": "b"})["ids"], [])
+        self.assertEqual(self.docstore.mget(["b"]), [None])
+
+        stats = self.indexer.index(docs)
+        self.assertEqual(stats["unchanged"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
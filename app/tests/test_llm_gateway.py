@@ -0,0 +1,143 @@
+import json
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from manoa_agent.llm.gateway import (
+    DeadlineExceeded,
+    LLMGateway,
+    build_chat_model,
+    request_deadline,
+)
+from manoa_agent.server.ratelimit import TokenBucket
+
+
+class StubOpenAIServer(ThreadingHTTPServer):
+    """
+    Minimal OpenAI compatible chat completions server. Each request pops the
+    next (status, delay) pair from `script`; once empty it answers 200 at once.
+    """
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), StubHandler)
+        self.script = []
+        self.requests = 0
+        self.lock = threading.Lock()
+
+    def next_response(self):
+        with self.lock:
+            self.requests += 1
+            return self.script.pop(0) if self.script else (200, 0)
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        status, delay = self.server.next_response()
+        time.sleep(delay)
+        if status == 200:
+            body = {
+                "id": "stub",
+                "object": "chat.completion",
+                "created": 0,
+                "model": "stub",
+                "choices": [
+                    {
+                        "index": 0,
+                        "message": {"role": "assistant", "content": "pong"},
+                        "finish_reason": "stop",
+                    }
+                ],
+                "usage": {
+                    "prompt_tokens": 1,
+                    "completion_tokens": 1,
+                    "total_tokens": 2,
+                },
+            }
+        else:
+            body = {"error": {"message": "stub error", "type": "stub"}}
+        payload = json.dumps(body).encode()
+        try:
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+
+class TestLLMGateway(unittest.TestCase):
+    def setUp(self):
+        self.server = StubOpenAIServer()
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        self.llm = build_chat_model(
+            "stub",
+            timeout=5,
+            base_url=f"http://127.0.0.1:{self.server.server_port}/v1",
+            api_key="test",
+        )
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_retries_rate_limited_call(self):
+        self.server.script = [(429, 0)]
+        gateway = LLMGateway(max_retries=2, backoff_base=0.01)
+        self.assertEqual(gateway.invoke("node", self.llm, "ping").content, "pong")
+        self.assertEqual(self.server.requests, 2)
+
+    def test_node_timeout(self):
+        self.server.script = [(200, 1)]
+        gateway = LLMGateway(timeouts={"node": 0.2}, max_retries=0)
+        with self.assertRaises(TimeoutError):
+            gateway.invoke("node", self.llm, "ping")
+
+    def test_abandoned_call_stops_at_timeout(self):
+        self.server.script = [(200, 2)]
+        gateway = LLMGateway(timeouts={"node": 0.2}, max_retries=0)
+        with self.assertRaises(TimeoutError):
+            gateway.invoke("node", self.llm, "ping")
+        # The HTTP request in the worker gives up at the same deadline instead
+        # of waiting for the slow response.
+        start = time.monotonic()
+        gateway._executor.shutdown(wait=True)
+        self.assertLess(time.monotonic() - start, 1)
+
+    def test_hedged_request_wins(self):
+        self.server.script = [(200, 2)]
+        gateway = LLMGateway(hedge=True, hedge_min_samples=1)
+        gateway._record("node", 0.05)
+
+        start = time.monotonic()
+        self.assertEqual(gateway.invoke("node", self.llm, "ping").content, "pong")
+        self.assertLess(time.monotonic() - start, 1)
+        self.assertEqual(self.server.requests, 2)
+
+    def test_fast_calls_leave_hedge_budget(self):
+        budget = TokenBucket(rate=0.001, capacity=3)
+        gateway = LLMGateway(hedge=True, hedge_min_samples=1, budget=budget)
+        gateway._record("node", 5)
+        for _ in range(2):
+            gateway.invoke("node", self.llm, "ping")
+        # One token per call, none for hedges that were never sent.
+        self.assertEqual(self.server.requests, 2)
+        self.assertEqual(budget.try_acquire(), 0)
+        self.assertGreater(budget.try_acquire(), 0)
+
+    def test_deadline_exceeded(self):
+        gateway = LLMGateway()
+        with request_deadline(0):
+            with self.assertRaises(DeadlineExceeded):
+                gateway.invoke("node", self.llm, "ping")
+        self.assertEqual(self.server.requests, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,88 @@
+import os
+import tempfile
+import threading
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from manoa_agent.embeddings.onnx import DynamicBatcher, find_model, mean_pool
+
+
+class SlowEmbedding:
+    """
+    Embeds a text as [len(text)], recording the size of every batch.
+    """
+
+    def __init__(self, delay=0.01):
+        self.delay = delay
+        self.sizes = []
+        self.started = threading.Event()
+
+    def __call__(self, texts):
+        self.started.set()
+        self.sizes.append(len(texts))
+        threading.Event().wait(self.delay)
+        if "fail" in texts:
+            raise RuntimeError("model failed")
+        return np.array([[float(len(text))] for text in texts])
+
+
+class TestDynamicBatcher(unittest.TestCase):
+    def test_results_in_order(self):
+        batcher = DynamicBatcher(SlowEmbedding(delay=0), max_batch_size=4)
+        texts = ["a" * n for n in range(1, 11)]
+        self.assertEqual(batcher.embed(texts), [[float(n)] for n in range(1, 11)])
+        batcher.close()
+
+    def test_concurrent_queries_share_batches(self):
+        embedding = SlowEmbedding()
+        batcher = DynamicBatcher(embedding, max_batch_size=8)
+        with ThreadPoolExecutor(16) as executor:
+            results = list(executor.map(lambda n: batcher.embed(["a" * n]), range(64)))
+        batcher.close()
+        self.assertEqual(results, [[[float(n)]] for n in range(64)])
+        self.assertLess(len(embedding.sizes), 64)
+        self.assertLessEqual(max(embedding.sizes), 8)
+
+    def test_lone_query_is_not_delayed(self):
+        embedding = SlowEmbedding(delay=0)
+        batcher = DynamicBatcher(embedding, max_batch_size=8, max_wait=0)
+        batcher.embed(["query"])
+        batcher.embed(["query"])
+        batcher.close()
+        self.assertEqual(embedding.sizes, [1, 1])
+
+    def test_errors_reach_every_caller_of_the_batch(self):
+        embedding = SlowEmbedding(delay=0)
+        batcher = DynamicBatcher(embedding, max_batch_size=8, max_wait=0.05)
+        futures = batcher.submit(["ok", "fail"])
+        for future in futures:
+            with self.assertRaises(RuntimeError):
+                future.result(timeout=5)
+        # The worker keeps serving after a failed batch.
+        self.assertEqual(batcher.embed(["ok"]), [[2.0]])
+        batcher.close()
+
+
+class TestOnnxHelpers(unittest.TestCase):
+    def test_mean_pool_ignores_padding(self):
+        hidden = np.array([[[1.0, 2.0], [3.0, 4.0], [100.0, 100.0]]])
+        mask = np.array([[1, 1, 0]])
+        np.testing.assert_allclose(mean_pool(hidden, mask), [[2.0, 3.0]])
+
+    def test_find_model_prefers_quantized(self):
+        with tempfile.TemporaryDirectory() as model_dir:
+            with self.assertRaises(FileNotFoundError):
+                find_model(model_dir)
+            os.makedirs(os.path.join(model_dir, "onnx"))
+            for name in ("model.onnx", os.path.join("onnx", "model_quantized.onnx")):
+                open(os.path.join(model_dir, name), "wb").close()
+            self.assertEqual(
+                find_model(model_dir),
+                os.path.join(model_dir, "onnx", "model_quantized.onnx"),
+            )
+
+
+if __name__ == "__main__":
+    unittest.main()
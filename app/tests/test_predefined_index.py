@@ -0,0 +1,99 @@
+import unittest
+
+from manoa_agent.embeddings.base import Embedder
+from manoa_agent.retrievers.predefined import PredefinedIndex
+
+VECTORS = {
+    "what is your name": [1.0, 0.0, 0.0],
+    "whats your name": [0.99, 0.1, 0.0],
+    "how do i reset my password": [0.0, 1.0, 0.0],
+}
+
+
+class FakeEmbedder(Embedder):
+    def embed_query(self, text):
+        return VECTORS.get(text.lower(), [0.0, 0.0, 1.0])
+
+
+class ShortEmbedder(Embedder):
+    """
+    A different model, with fewer dimensions than the collection.
+    """
+
+    def embed_query(self, text):
+        return [1.0, 0.0]
+
+
+class FakeCollection:
+    def __init__(self, records):
+        self.records = records
+        self.get_calls = 0
+        self.available = True
+
+    def get(self, include=None):
+        if not self.available:
+            raise ConnectionError("Chroma is down")
+        # Only full loads are counted, not change checks.
+        if "embeddings" in include:
+            self.get_calls += 1
+        return {
+            "ids": [str(i) for i in range(len(self.records))],
+            "documents": [question for question, _ in self.records],
+            "metadatas": [{"predefined": answer} for _, answer in self.records],
+            "embeddings": [VECTORS[question.lower()] for question, _ in self.records],
+        }
+
+
+class TestPredefinedIndex(unittest.TestCase):
+    def setUp(self):
+        self.collection = FakeCollection([("What is your name", "I am Hoku.")])
+        self.index = PredefinedIndex(
+            self.collection, FakeEmbedder(), score_threshold=0.95, refresh_interval=0
+        )
+
+    def test_exact_match(self):
+        self.assertEqual(self.index.lookup("what is your NAME?"), "I am Hoku.")
+
+    def test_similarity_match(self):
+        self.assertEqual(self.index.lookup("Whats your name"), "I am Hoku.")
+
+    def test_no_match(self):
+        self.assertIsNone(self.index.lookup("How do I reset my password"))
+
+    def test_dimension_mismatch(self):
+        index = PredefinedIndex(self.collection, ShortEmbedder(), refresh_interval=0)
+        with self.assertLogs("manoa_agent.retrievers.predefined", "ERROR"):
+            self.assertIsNone(index.lookup("Whats your name"))
+        # Exact matches do not need the embedder.
+        self.assertEqual(index.lookup("what is your name"), "I am Hoku.")
+
+    def test_refresh_on_change(self):
+        self.collection.records.append(
+            ("How do I reset my password", "Visit the password reset page.")
+        )
+        self.assertEqual(
+            self.index.lookup("how do i reset my password"),
+            "Visit the password reset page.",
+        )
+        self.assertEqual(self.collection.get_calls, 2)
+
+    def test_refresh_on_edited_answer(self):
+        self.collection.records[0] = ("What is your name", "My name is Hoku.")
+        self.assertEqual(self.index.lookup("what is your name"), "My name is Hoku.")
+
+    def test_no_reload_without_change(self):
+        self.index.lookup("what is your name")
+        self.assertEqual(self.collection.get_calls, 1)
+
+    def test_startup_without_chroma(self):
+        self.collection.available = False
+        index = PredefinedIndex(self.collection, FakeEmbedder(), refresh_interval=0)
+        self.assertEqual(len(index), 0)
+        self.assertIsNone(index.lookup("what is your name"))
+
+        self.collection.available = True
+        self.assertEqual(index.lookup("what is your name"), "I am Hoku.")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,90 @@
+import os
+import tempfile
+import unittest
+import uuid
+
+import chromadb
+import numpy as np
+from langchain_core.documents import Document
+
+from manoa_agent.embeddings.quantize import (
+    PCAReducer,
+    dequantize_int8,
+    quantize_int8,
+    truncate,
+)
+from manoa_agent.retrievers.quantized import QuantizedVectorIndex
+
+
+class TestQuantize(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.embeddings = rng.normal(size=(200, 64)).astype(np.float32)
+        self.documents = [Document(page_content=f"doc {i}") for i in range(200)]
+
+    def test_int8_round_trip(self):
+        codes, scale = quantize_int8(self.embeddings)
+        self.assertEqual(codes.dtype, np.int8)
+        error = np.abs(dequantize_int8(codes, scale) - self.embeddings).max(axis=0)
+        self.assertTrue(np.all(error <= scale / 2 + 1e-6))
+
+    def test_truncate_normalizes(self):
+        reduced = truncate(self.embeddings, 16)
+        self.assertEqual(reduced.shape, (200, 16))
+        np.testing.assert_allclose(np.linalg.norm(reduced, axis=1), 1, rtol=1e-5)
+
+    def test_pca_keeps_requested_dimensions(self):
+        reducer = PCAReducer.fit(self.embeddings, 8)
+        self.assertEqual(reducer.transform(self.embeddings).shape, (200, 8))
+
+    def test_rescoring_recovers_exact_neighbours(self):
+        index = QuantizedVectorIndex.build(
+            self.embeddings, self.documents, dimensions=16, dtype="int8"
+        )
+        for row in range(0, 200, 20):
+            results = index.search(self.embeddings[row], k=1, rescore_k=50)
+            self.assertEqual(results[0][0], row)
+            self.assertAlmostEqual(results[0][1], 1, places=5)
+
+    def test_empty_index(self):
+        for dtype in ("int8", "float16"):
+            index = QuantizedVectorIndex.build(
+                np.zeros((0, 64), dtype=np.float32), [], dimensions=16, dtype=dtype
+            )
+            self.assertEqual(index.search(self.embeddings[0], k=4), [])
+
+    def test_from_collection(self):
+        collection = chromadb.EphemeralClient().create_collection(
+            f"quantized_{uuid.uuid4().hex[:8]}", embedding_function=None
+        )
+        collection.add(
+            ids=[str(i) for i in range(20)],
+            embeddings=self.embeddings[:20].tolist(),
+            documents=[doc.page_content for doc in self.documents[:20]],
+            metadatas=[{"source": str(i)} for i in range(20)],
+        )
+        index = QuantizedVectorIndex.from_collection(
+            collection, batch_size=7, dimensions=16
+        )
+        self.assertEqual(index.collection, collection.name)
+        row, _ = index.search(self.embeddings[5], k=1)[0]
+        self.assertEqual(index.documents[row].page_content, "doc 5")
+        self.assertEqual(index.documents[row].metadata, {"source": "5"})
+
+    def test_save_and_load(self):
+        index = QuantizedVectorIndex.build(
+            self.embeddings, self.documents, dimensions=16, method="pca"
+        )
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "index")
+            index.save(path)
+            loaded = QuantizedVectorIndex.load(path)
+            self.assertEqual(
+                loaded.search(self.embeddings[3], k=3),
+                index.search(self.embeddings[3], k=3),
+            )
+            self.assertEqual(loaded.documents[3].page_content, "doc 3")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,80 @@
+import time
+import unittest
+
+from manoa_agent.server.admission import client_id, parse_networks
+from manoa_agent.server.ratelimit import ClientRateLimiter, TokenBucket
+
+
+def scope(peer, **headers):
+    return {
+        "client": (peer, 50000),
+        "headers": [
+            (name.replace("_", "-").encode(), value.encode())
+            for name, value in headers.items()
+        ],
+    }
+
+
+class TestTokenBucket(unittest.TestCase):
+    def test_burst_then_wait(self):
+        bucket = TokenBucket(rate=10, capacity=3)
+        for _ in range(3):
+            self.assertEqual(bucket.try_acquire(), 0)
+        wait = bucket.try_acquire()
+        self.assertGreater(wait, 0)
+        self.assertLessEqual(wait, 0.1)
+
+    def test_acquire_blocks_until_refilled(self):
+        bucket = TokenBucket(rate=20, capacity=1)
+        bucket.try_acquire()
+        start = time.monotonic()
+        self.assertTrue(bucket.acquire())
+        self.assertGreaterEqual(time.monotonic() - start, 0.03)
+
+    def test_acquire_timeout(self):
+        bucket = TokenBucket(rate=0.1, capacity=1)
+        bucket.try_acquire()
+        self.assertFalse(bucket.acquire(timeout=0.05))
+
+
+class TestClientRateLimiter(unittest.TestCase):
+    def test_clients_are_limited_independently(self):
+        limiter = ClientRateLimiter(rate=0.1, capacity=2)
+        self.assertEqual(limiter.check("a"), 0)
+        self.assertEqual(limiter.check("a"), 0)
+        self.assertGreater(limiter.check("a"), 0)
+        self.assertEqual(limiter.check("b"), 0)
+
+    def test_evicts_least_recently_used(self):
+        limiter = ClientRateLimiter(rate=0.1, capacity=1, max_clients=2)
+        limiter.check("a")
+        limiter.check("b")
+        limiter.check("c")
+        # "a" was evicted, so it starts again with a full bucket.
+        self.assertEqual(limiter.check("a"), 0)
+
+
+class TestClientId(unittest.TestCase):
+    def setUp(self):
+        self.trusted = parse_networks("127.0.0.1, 10.0.0.0/8")
+
+    def test_headers_from_untrusted_peer_are_ignored(self):
+        request = scope("203.0.113.7", x_client_id="spoofed", x_forwarded_for="1.2.3.4")
+        self.assertEqual(client_id(request, self.trusted), "203.0.113.7")
+        self.assertEqual(client_id(request), "203.0.113.7")
+
+    def test_trusted_proxy_forwards_client_id(self):
+        request = scope("127.0.0.1", x_client_id="session", x_forwarded_for="1.2.3.4")
+        self.assertEqual(client_id(request, self.trusted), "session")
+
+    def test_forwarded_for_skips_trusted_hops(self):
+        # The leftmost address is whatever the client sent.
+        request = scope("10.0.0.2", x_forwarded_for="9.9.9.9, 198.51.100.4, 10.0.0.1")
+        self.assertEqual(client_id(request, self.trusted), "198.51.100.4")
+
+    def test_trusted_proxy_without_headers(self):
+        self.assertEqual(client_id(scope("127.0.0.1"), self.trusted), "127.0.0.1")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,66 @@
+import unittest
+from typing import List
+
+from langchain_core.callbacks.manager import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+from manoa_agent.eval.retrieval import evaluate, ranked_sources
+from manoa_agent.retrievers.hybrid import BM25Index, HybridRetriever
+
+
+class FixedRetriever(BaseRetriever):
+    documents: List[Document]
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        return self.documents
+
+
+def doc(source: str, text: str = "") -> Document:
+    return Document(page_content=text or source, metadata={"source": source})
+
+
+class TestRetrievalEval(unittest.TestCase):
+    def setUp(self):
+        self.documents = [
+            doc("vpn", "Connect to the UH VPN with Cisco Secure Client"),
+            doc("wifi", "Join the UHM wireless network eduroam"),
+            doc("email", "Set up UH Gmail forwarding and filters"),
+        ]
+
+    def test_bm25_ranks_matching_terms(self):
+        index = BM25Index(self.documents)
+        results = index.search("cisco vpn", k=2)
+        self.assertEqual(results[0][0], 0)
+        self.assertEqual(len(results), 1)
+
+    def test_hybrid_adds_keyword_matches(self):
+        retriever = HybridRetriever(
+            vector_retriever=FixedRetriever(documents=[self.documents[1]]),
+            keyword_index=BM25Index(self.documents),
+            k=2,
+        )
+        sources = ranked_sources(retriever.invoke("gmail forwarding"))
+        self.assertEqual(set(sources), {"wifi", "email"})
+
+    def test_ranked_sources_deduplicates(self):
+        docs = [doc("a"), doc("b"), doc("a"), Document(page_content="c")]
+        self.assertEqual(ranked_sources(docs), ["a", "b"])
+
+    def test_evaluate(self):
+        retriever = FixedRetriever(documents=[doc("a"), doc("b")])
+        queries = [
+            {"query": "q1", "expected_sources": ["a"]},
+            {"query": "q2", "expected_sources": ["b"]},
+            {"query": "q3", "expected_sources": ["c"]},
+        ]
+        report = evaluate(retriever, queries, k=2)
+        self.assertAlmostEqual(report["recall@2"], 0.6667)
+        self.assertAlmostEqual(report["mrr"], 0.5)
+        self.assertIn("p95", report["latency"])
+
+
+if __name__ == "__main__":
+    unittest.main()
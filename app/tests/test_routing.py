@@ -0,0 +1,102 @@
+import os
+import unittest
+from unittest import mock
+
+from langchain_core.exceptions import OutputParserException
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.runnables import RunnableLambda
+
+from manoa_agent.llm.gateway import DeadlineExceeded, LLMGateway
+from manoa_agent.llm.routing import ModelRouter, invoke_with_fallback, is_reformulation
+
+
+def failing(error):
+    def fail(_):
+        raise error
+
+    return RunnableLambda(fail)
+
+
+class TestModelRouter(unittest.TestCase):
+    def test_small_nodes_fall_back_to_large(self):
+        large = FakeListChatModel(responses=["large"])
+        small = FakeListChatModel(responses=["small"])
+        router = ModelRouter(large, {"reformulate": small})
+        self.assertIs(router.model("reformulate"), small)
+        self.assertIs(router.model("rag_agent"), large)
+        self.assertIs(router.fallback("reformulate"), large)
+        self.assertIsNone(router.fallback("rag_agent"))
+
+    def test_from_env(self):
+        env = {
+            "OPENAI_API_KEY": "test",
+            "LLM_MODEL": "gpt-large",
+            "LLM_SMALL_MODEL": "gpt-small",
+            "LLM_MODEL_GENERAL_AGENT": "gpt-large",
+        }
+        with mock.patch.dict(os.environ, env):
+            router = ModelRouter.from_env()
+        self.assertEqual(router.model("reformulate").model_name, "gpt-small")
+        # Nodes sharing a spec share the model and its connection pool.
+        self.assertIs(router.model("general_agent"), router.large)
+        self.assertIs(router.model("rag_agent"), router.large)
+
+
+class TestInvokeWithFallback(unittest.TestCase):
+    def setUp(self):
+        self.gateway = LLMGateway(max_retries=0)
+        self.large = FakeListChatModel(responses=["large"])
+
+    def invoke(self, small, validate=lambda output: True):
+        return invoke_with_fallback(
+            self.gateway,
+            "node",
+            lambda llm: llm,
+            small,
+            self.large,
+            "question",
+            validate,
+        )
+
+    def test_valid_output_is_kept(self):
+        small = FakeListChatModel(responses=["small"])
+        self.assertEqual(self.invoke(small).content, "small")
+
+    def test_invalid_output_falls_back(self):
+        small = FakeListChatModel(responses=["small"])
+        output = self.invoke(small, lambda output: output.content != "small")
+        self.assertEqual(output.content, "large")
+
+    def test_parse_errors_fall_back(self):
+        output = self.invoke(failing(OutputParserException("not json")))
+        self.assertEqual(output.content, "large")
+
+    def test_deadline_and_bugs_are_raised(self):
+        with self.assertRaises(DeadlineExceeded):
+            self.invoke(failing(DeadlineExceeded("late")))
+        with self.assertRaises(KeyError):
+            self.invoke(failing(KeyError("bug")))
+
+
+class TestIsReformulation(unittest.TestCase):
+    def check(self, output, question):
+        return is_reformulation(AIMessage(content=output), question)
+
+    def test_rewritten_question(self):
+        self.assertTrue(
+            self.check("When is the ICS 111 final exam?", "When is its final?")
+        )
+        self.assertTrue(self.check("Tell me about ICS 111", "tell me about it"))
+
+    def test_answers_are_rejected(self):
+        question = "How do I apply?"
+        self.assertFalse(self.check("", question))
+        self.assertFalse(self.check("You apply online.", question))
+        self.assertFalse(self.check("Steps:\n1. Apply online?", question))
+        long_question = "How do I apply to UH Manoa " + "as a transfer " * 20 + "?"
+        self.assertFalse(self.check(long_question, question))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,155 @@
+import json
+import os
+import tempfile
+import threading
+import unittest
+import uuid
+
+import chromadb
+from langchain_core.stores import InMemoryStore
+
+from manoa_agent.embeddings.base import Embedder
+from manoa_agent.ingest.sharded import (
+    IngestCheckpoint,
+    ShardedIngestion,
+    load_manifest,
+    plan_shards,
+)
+
+HTML_DIR = os.path.join(os.path.dirname(__file__), "data", "html")
+PARKING = "# Parking\n" + "Buy a permit online. " * 80
+LIBRARY = "# Library\n" + "Open until 10pm. " * 10
+
+
+def record(page, text):
+    return {"url": f"https://example.edu/{page}", "extracted": text}
+
+
+class CountingEmbedder(Embedder):
+    def __init__(self):
+        self.texts = 0
+        self._lock = threading.Lock()
+
+    def embed_query(self, text):
+        with self._lock:
+            self.texts += 1
+        return [float(len(text) % 7), 1.0, float(text.count(" ") % 5)]
+
+
+class TestShardedIngestion(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.feed_path = os.path.join(self.tmp_dir.name, "feed.jsonl")
+        self.write_feed(
+            [
+                record("parking", PARKING),
+                record("library", LIBRARY),
+                record("empty", " "),
+            ]
+        )
+        self.manifest_path = os.path.join(self.tmp_dir.name, "manifest.json")
+        with open(self.manifest_path, "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "chunk_size": 400,
+                    "chunk_overlap": 0,
+                    "shard_size": 2,
+                    "sources": [
+                        {
+                            "name": "askus",
+                            "type": "html_dir",
+                            "path": HTML_DIR,
+                            "collection": "faq",
+                        },
+                        {
+                            "name": "feed",
+                            "type": "json",
+                            "path": self.feed_path,
+                            "collection": "pages",
+                        },
+                    ],
+                },
+                f,
+            )
+        client = chromadb.EphemeralClient()
+        self.collections = {
+            name: client.create_collection(f"{name}-{uuid.uuid4().hex[:8]}")
+            for name in ("faq", "pages")
+        }
+        self.embedder = CountingEmbedder()
+        self.docstore = InMemoryStore()
+        self.checkpoint = IngestCheckpoint(
+            os.path.join(self.tmp_dir.name, "checkpoint.sqlite")
+        )
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def write_feed(self, records):
+        with open(self.feed_path, "w", encoding="utf-8") as f:
+            for entry in records:
+                f.write(json.dumps(entry) + "\n")
+
+    def run_ingestion(self):
+        manifest = load_manifest(self.manifest_path)
+        ingestion = ShardedIngestion(
+            self.collections,
+            self.embedder,
+            docstore=self.docstore,
+            checkpoint=self.checkpoint,
+            workers=0,
+            batch_size=3,
+            max_pending_batches=2,
+        )
+        return ingestion.run(plan_shards(manifest), 400, 0)
+
+    def sources(self, name):
+        metadatas = self.collections[name].get(include=["metadatas"])["metadatas"]
+        return sorted({metadata["source"] for metadata in metadatas})
+
+    def test_ingest_and_resume(self):
+        report = self.run_ingestion()
+        # 9 AskUs files and 3 feed records, in shards of 2.
+        self.assertEqual(report["shards"], {"planned": 7, "skipped": 0, "ingested": 7})
+        self.assertEqual(report["stages"]["parse"]["items"], 9 + 2)
+        chunks = sum(collection.count() for collection in self.collections.values())
+        self.assertEqual(report["stages"]["embed"]["items"], chunks)
+        self.assertEqual(report["stages"]["write"]["items"], chunks)
+        self.assertEqual(len(self.sources("faq")), 9)
+        self.assertEqual(
+            self.sources("pages"),
+            ["https://example.edu/library", "https://example.edu/parking"],
+        )
+        self.assertTrue(list(self.docstore.yield_keys()))
+
+        # Nothing changed: every shard is skipped.
+        embedded = self.embedder.texts
+        report = self.run_ingestion()
+        self.assertEqual(report["shards"]["skipped"], 7)
+        self.assertEqual(self.embedder.texts, embedded)
+
+        # Only the shard with the changed record is ingested again, and the
+        # chunks the shorter page no longer has are removed.
+        parking = {"where": {"source": "https://example.edu/parking"}}
+        self.assertGreater(len(self.collections["pages"].get(**parking)["ids"]), 1)
+        self.write_feed(
+            [
+                record("parking", "# Parking\nGone."),
+                record("library", LIBRARY),
+                record("empty", " "),
+            ]
+        )
+        report = self.run_ingestion()
+        self.assertEqual(report["shards"]["ingested"], 1)
+        parking_chunks = self.collections["pages"].get(**parking)["documents"]
+        self.assertEqual(parking_chunks, ["# Parking\nGone."])
+
+    def test_invalid_manifest(self):
+        with open(self.manifest_path, "w", encoding="utf-8") as f:
+            json.dump({"sources": [{"name": "x", "type": "csv", "path": "x"}]}, f)
+        with self.assertRaises(ValueError):
+            load_manifest(self.manifest_path)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,97 @@
+import unittest
+import uuid
+
+import chromadb
+from langchain_chroma import Chroma
+from langchain_core.documents import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from langchain_core.stores import InMemoryStore
+
+from manoa_agent.db.chroma.versions import CollectionVersions
+from manoa_agent.embeddings import convert
+from manoa_agent.retrievers.aliased import AliasedRetriever
+from manoa_agent.retrievers.parent import SmallToBigRetriever
+from manoa_agent.retrievers.speculative import SpeculativeRetriever, search_by_vector
+
+
+class CountingEmbedder(convert.LangChainEmbeddingAdapter):
+    def __init__(self, size=16):
+        super().__init__(DeterministicFakeEmbedding(size=size))
+        self.queries = []
+
+    def embed_query(self, text):
+        self.queries.append(text)
+        return super().embed_query(text)
+
+
+class TestSpeculativeRetrieval(unittest.TestCase):
+    def setUp(self):
+        self.client = chromadb.EphemeralClient()
+        self.embedder = CountingEmbedder()
+        self.alias = f"faq_{uuid.uuid4().hex[:8]}"
+        versions = CollectionVersions(
+            self.client, registry=f"aliases_{uuid.uuid4().hex[:8]}"
+        )
+        name = versions.create(self.alias)
+        self.store = self.chroma(name)
+        self.store.add_documents(
+            [
+                Document(page_content=f"chunk {i}", metadata={"parent_id": f"p{i}"})
+                for i in range(5)
+            ]
+        )
+        versions.promote(self.alias, name)
+        self.docstore = InMemoryStore()
+        self.docstore.mset(
+            [(f"p{i}", Document(page_content=f"parent {i}")) for i in range(5)]
+        )
+        self.search_type = "similarity"
+        self.search_kwargs = {"k": 2}
+        self.retriever = SmallToBigRetriever(
+            child_retriever=AliasedRetriever(
+                versions=versions,
+                alias=self.alias,
+                build=lambda name: self.chroma(name).as_retriever(
+                    search_type=self.search_type, search_kwargs=self.search_kwargs
+                ),
+                refresh_interval=0,
+            ),
+            docstore=self.docstore,
+        )
+
+    def chroma(self, name):
+        return Chroma(
+            collection_name=name,
+            client=self.client,
+            embedding_function=self.embedder,
+            collection_metadata={"hnsw:space": "cosine"},
+        )
+
+    def test_query_is_embedded_once(self):
+        speculator = SpeculativeRetriever(self.embedder, {"faq": self.retriever})
+        speculation = speculator.speculate("chunk 3", "faq")
+        docs = speculator.resolve(speculation, "Chunk 3", self.retriever)
+        self.assertEqual(docs[0].page_content, "parent 3")
+        # Neither the aliased Chroma retriever nor the reused results embed
+        # the query again.
+        self.assertEqual(self.embedder.queries, ["chunk 3"])
+
+    def test_score_threshold_uses_cosine_relevance(self):
+        self.search_type = "similarity_score_threshold"
+        self.search_kwargs = {"k": 5, "score_threshold": 0.99}
+        embedding = self.embedder.embed_query("chunk 1")
+        docs = search_by_vector(self.retriever, embedding, "chunk 1", self.embedder)
+        # Only the identical chunk has a cosine similarity of 1.
+        self.assertEqual([doc.page_content for doc in docs], ["parent 1"])
+        self.assertEqual(self.embedder.queries, ["chunk 1"])
+
+    def test_other_models_embed_the_text(self):
+        other = CountingEmbedder()
+        embedding = other.embed_query("chunk 2")
+        docs = search_by_vector(self.retriever, embedding, "chunk 2", other)
+        self.assertEqual(docs[0].page_content, "parent 2")
+        self.assertEqual(self.embedder.queries, ["chunk 2"])
+
+
+if __name__ == "__main__":
+    unittest.main()
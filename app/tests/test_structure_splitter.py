@@ -0,0 +1,94 @@
+import unittest
+
+from langchain_core.documents import Document
+
+from manoa_agent.loaders.html import HtmlDirectoryLoader
+from manoa_agent.splitters.structure import (
+    StructureAwareTextSplitter,
+    expand_to_parents,
+)
+
+POLICY = """UH Policy 5.201
+I. Purpose
+This policy sets out the purpose.
+II. Definitions
+A. Student means a person enrolled at the university.
+B. Faculty means a person employed to teach at the university.
+III. Policy
+A. General
+1. Item one.
+2. Item two.
+B. Specific
+Specific text.
+"""
+
+
+class TestStructureAwareTextSplitter(unittest.TestCase):
+    def test_policy_sections_are_parents(self):
+        splitter = StructureAwareTextSplitter(chunk_size=80)
+        children, parents = splitter.split_with_parents(
+            [Document(page_content=POLICY, metadata={"source": "policy"})]
+        )
+
+        self.assertEqual(len(parents), 4)
+        self.assertEqual(parents[2].metadata["section"], "II. Definitions")
+        parent_ids = [parent.metadata["parent_id"] for parent in parents]
+        for child in children:
+            # Chunks may exceed the size only by their section title prefix.
+            self.assertLessEqual(len(child.page_content), 80 + len("II. Definitions\n"))
+            self.assertIn(child.metadata["parent_id"], parent_ids)
+
+        faculty = next(c for c in children if "Faculty" in c.page_content)
+        self.assertTrue(faculty.page_content.startswith("II. Definitions\n"))
+
+    def test_askus_article_is_one_parent(self):
+        docs = HtmlDirectoryLoader("tests/data/html").load()
+        splitter = StructureAwareTextSplitter(chunk_size=300)
+        children, parents = splitter.split_with_parents(docs)
+
+        self.assertEqual(len(parents), len(docs))
+        self.assertGreater(len(children), len(docs))
+        for child in children:
+            self.assertEqual(child.metadata["parent_content"].count("\n## "), 0)
+
+    def test_long_sections_are_capped(self):
+        steps = "\n".join(f"{i}. Step {i} of the procedure." for i in range(1, 60))
+        text = f"I. Procedure\n{steps}\nII. Other\nOther text.\n"
+        splitter = StructureAwareTextSplitter(chunk_size=200, max_parent_size=500)
+        children, parents = splitter.split_with_parents(
+            [Document(page_content=text, metadata={"source": "policy"})]
+        )
+
+        procedure = [p for p in parents if p.metadata["section"] == "I. Procedure"]
+        self.assertGreater(len(procedure), 1)
+        for parent in parents:
+            self.assertLessEqual(len(parent.page_content), 500)
+        self.assertEqual(parents[-1].page_content, "II. Other\nOther text.")
+        # Every step is still in exactly one parent, and every child points to
+        # the part of the section it was cut from.
+        self.assertEqual(
+            "\n".join(p.page_content for p in procedure), f"I. Procedure\n{steps}"
+        )
+        for child in children:
+            body = child.page_content.split("\n", 1)[-1]
+            self.assertIn(body, child.metadata["parent_content"])
+
+        with self.assertRaises(ValueError):
+            StructureAwareTextSplitter(chunk_size=1000, max_parent_size=500)
+
+    def test_expand_to_parents_deduplicates(self):
+        splitter = StructureAwareTextSplitter(chunk_size=80)
+        children = splitter.split_documents(
+            [Document(page_content=POLICY, metadata={"source": "policy"})]
+        )
+        same_parent = [c for c in children if c.metadata["section"] == "III. Policy"]
+        self.assertEqual(len(same_parent), 2)
+
+        expanded = expand_to_parents(same_parent)
+        self.assertEqual(len(expanded), 1)
+        self.assertIn("Specific text.", expanded[0].page_content)
+        self.assertNotIn("parent_content", expanded[0].metadata)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,133 @@
+import os
+import tempfile
+import unittest
+
+from langchain_chroma import Chroma
+from langchain_core.documents import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from manoa_agent.db.chroma import utils
+from manoa_agent.db.chroma.journal import UploadJournal
+from tests.helpers import StaticLoader
+
+
+class FlakyEmbedding(DeterministicFakeEmbedding):
+    """
+    Fails the embedding calls whose numbers are in `failures` with `error`.
+    """
+
+    failures: set = set()
+    calls: int = 0
+    error: type = ConnectionError
+
+    def embed_documents(self, texts):
+        self.calls += 1
+        if self.calls in self.failures:
+            raise self.error(f"call {self.calls} failed")
+        return super().embed_documents(texts)
+
+
+class TestUploadJournal(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.journal = UploadJournal(os.path.join(self.tmp_dir.name, "journal.sqlite"))
+        self.embedding = FlakyEmbedding(size=8)
+        self.collection = Chroma(
+            collection_name="test_upload_journal", embedding_function=self.embedding
+        )
+        self.loader = StaticLoader(
+            [
+                Document(page_content=f"page {i}", metadata={"source": str(i)})
+                for i in range(10)
+            ]
+        )
+
+    def tearDown(self):
+        self.collection.delete_collection()
+        self.journal.close()
+        self.tmp_dir.cleanup()
+
+    def upload(self, **kwargs):
+        return utils.upload(
+            self.collection,
+            self.loader,
+            batch_size=3,
+            journal=self.journal,
+            backoff_base=0,
+            **kwargs,
+        )
+
+    def count(self):
+        return len(self.collection.get()["ids"])
+
+    def test_retry_transient_failure(self):
+        self.embedding.failures = {2}
+        ids = self.upload()
+        self.assertEqual(len(ids), 10)
+        self.assertEqual(self.count(), 10)
+        self.assertEqual(self.embedding.calls, 5)
+
+    def test_permanent_failure_is_not_retried(self):
+        self.embedding.failures = {2}
+        self.embedding.error = ValueError
+        with self.assertRaises(ValueError):
+            self.upload()
+        self.assertEqual(self.embedding.calls, 2)
+
+    def test_resume_after_failure(self):
+        # The third batch fails until its retries run out.
+        self.embedding.failures = {3, 4}
+        with self.assertRaises(ConnectionError):
+            self.upload(max_retries=1)
+        self.assertEqual(self.count(), 6)
+        self.assertEqual(self.journal.committed_documents("test_upload_journal"), 6)
+
+        self.embedding.calls = 0
+        self.embedding.failures = set()
+        ids = self.upload()
+        # Only the two remaining batches were embedded, without duplicates.
+        self.assertEqual(self.embedding.calls, 2)
+        self.assertEqual(self.count(), 10)
+        self.assertEqual(len(set(ids)), 10)
+
+        # Without resume, everything is uploaded again under the same ids.
+        self.upload(resume=False)
+        self.assertEqual(self.embedding.calls, 6)
+        self.assertEqual(self.count(), 10)
+
+    def test_without_journal_upserts(self):
+        utils.upload(self.collection, self.loader, batch_size=3)
+        utils.upload(self.collection, self.loader, batch_size=3)
+        self.assertEqual(self.count(), 10)
+
+    def test_inserted_document_shifts_nothing(self):
+        self.upload()
+        self.embedding.calls = 0
+        self.loader.docs.insert(
+            0, Document(page_content="new page", metadata={"source": "new"})
+        )
+        ids = self.upload()
+        # Only the new source is embedded; the others keep their ids.
+        self.assertEqual(self.embedding.calls, 1)
+        self.assertEqual(self.count(), 11)
+        self.assertEqual(sorted(ids), sorted(self.collection.get()["ids"]))
+
+    def test_changed_source_drops_outdated_chunks(self):
+        self.loader.docs.append(
+            Document(page_content="page 9, part 2", metadata={"source": "9"})
+        )
+        self.upload()
+        self.assertEqual(self.count(), 11)
+        self.loader.docs.pop()
+        self.loader.docs[9] = Document(
+            page_content="page 9 v2", metadata={"source": "9"}
+        )
+        self.upload()
+        self.assertEqual(self.count(), 10)
+        self.assertEqual(
+            self.collection.get(where={"source": "9"})["documents"], ["page 9 v2"]
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
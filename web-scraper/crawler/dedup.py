@@ -0,0 +1,241 @@
+"""
+Duplicate detection and boilerplate removal for crawled pages.
+
+Pages are split into blocks (the paragraphs of the extracted text). A block
+that appears on at least `min_pages` pages of the same site (host and first
+path segment, e.g. www.hawaii.edu/its) is treated as navigation or footer
+and removed. The remaining text is fingerprinted twice: a SHA-256 of the
+normalized text for exact duplicates, and a 64-bit SimHash of word shingles
+for near duplicates. To find near duplicates within `max_distance` bits
+without a scan, SimHashes are indexed by `max_distance + 1` bands of bits:
+two fingerprints that differ in at most `max_distance` bits agree on at least
+one whole band.
+"""
+
+import hashlib
+import re
+import sqlite3
+from urllib.parse import urlparse
+
+_WORD = re.compile(r"\w+")
+_BLOCK_SEPARATOR = re.compile(r"\n\s*\n")
+
+
+def _hash64(text):
+    digest = hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big")
+
+
+def _signed(value):
+    # SQLite integers are signed 64-bit.
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+
+def normalize(text):
+    return " ".join(_WORD.findall(text.lower()))
+
+
+def split_blocks(text):
+    return [block.strip() for block in _BLOCK_SEPARATOR.split(text) if block.strip()]
+
+
+def simhash(text, shingle_size=3):
+    """
+    64-bit SimHash of the word shingles of a text.
+    """
+    words = _WORD.findall(text.lower())
+    shingles = [
+        " ".join(words[i : i + shingle_size])
+        for i in range(max(len(words) - shingle_size + 1, 1))
+    ]
+    weights = [0] * 64
+    for shingle in shingles:
+        value = _hash64(shingle)
+        for bit in range(64):
+            weights[bit] += 1 if value >> bit & 1 else -1
+    return sum(1 << bit for bit, weight in enumerate(weights) if weight > 0)
+
+
+def hamming(a, b):
+    return bin(a ^ b).count("1")
+
+
+def bands(fingerprint, count):
+    """
+    Split a fingerprint into `count` bands of 64 // count bits.
+    """
+    width = 64 // count
+    mask = (1 << width) - 1
+    return [fingerprint >> (i * width) & mask for i in range(count)]
+
+
+def site(url):
+    parsed = urlparse(url)
+    segment = parsed.path.strip("/").split("/", 1)[0]
+    return f"{parsed.netloc}/{segment}"
+
+
+class ContentIndex:
+    """
+    Block occurrences and fingerprints of the kept pages, in SQLite (in
+    memory unless a path is given, so they can persist between incremental
+    crawls).
+    """
+
+    def __init__(self, path=":memory:", min_pages=5, max_distance=3):
+        """
+        Args:
+            path: SQLite file, or ":memory:".
+            min_pages: Number of pages of a site a block must appear on to be
+                treated as boilerplate.
+            max_distance: Maximum SimHash Hamming distance of near duplicates.
+        """
+        self.min_pages = min_pages
+        self.max_distance = max_distance
+        self.bands = max_distance + 1
+        self._conn = sqlite3.connect(path, isolation_level=None)
+        self._conn.executescript(
+            "PRAGMA journal_mode=WAL;"
+            "CREATE TABLE IF NOT EXISTS blocks ("
+            "site TEXT NOT NULL, block INTEGER NOT NULL, url TEXT NOT NULL, "
+            "PRIMARY KEY (site, block, url));"
+            "CREATE INDEX IF NOT EXISTS blocks_url ON blocks (url);"
+            "CREATE TABLE IF NOT EXISTS pages ("
+            "url TEXT PRIMARY KEY, exact TEXT NOT NULL, simhash INTEGER NOT NULL);"
+            "CREATE INDEX IF NOT EXISTS pages_exact ON pages (exact);"
+            "CREATE TABLE IF NOT EXISTS page_bands ("
+            "url TEXT NOT NULL, band INTEGER NOT NULL, value INTEGER NOT NULL, "
+            "PRIMARY KEY (url, band));"
+            "CREATE INDEX IF NOT EXISTS page_bands_value ON page_bands (band, value);"
+            "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);"
+        )
+        self._rebuild_bands()
+
+    def _rebuild_bands(self):
+        # The band layout depends on max_distance; an index persisted with
+        # another distance is re-banded from the stored fingerprints.
+        row = self._conn.execute(
+            "SELECT value FROM meta WHERE key = 'bands'"
+        ).fetchone()
+        if row and int(row[0]) == self.bands:
+            return
+        self._conn.execute("DELETE FROM page_bands")
+        for url, fingerprint in self._conn.execute(
+            "SELECT url, simhash FROM pages"
+        ).fetchall():
+            self._add_bands(url, fingerprint % (1 << 64))
+        self._conn.execute(
+            "INSERT OR REPLACE INTO meta (key, value) VALUES ('bands', ?)",
+            (str(self.bands),),
+        )
+
+    def _add_bands(self, url, fingerprint):
+        self._conn.executemany(
+            "INSERT OR REPLACE INTO page_bands (url, band, value) VALUES (?, ?, ?)",
+            [
+                (url, band, value)
+                for band, value in enumerate(bands(fingerprint, self.bands))
+            ],
+        )
+
+    def strip_boilerplate(self, url, text):
+        """
+        Remove the blocks of a page that appear on at least `min_pages` pages
+        of its site, counting the page itself and the kept pages recorded with
+        `record_blocks`.
+
+        Returns:
+            tuple: The remaining text and the number of removed blocks.
+        """
+        page_site = site(url)
+        blocks = split_blocks(text)
+        counts = {}
+        kept = []
+        for block in blocks:
+            value = _signed(_hash64(normalize(block)))
+            if value not in counts:
+                counts[value] = self._pages_with(page_site, value, url) + 1
+            if counts[value] < self.min_pages:
+                kept.append(block)
+        return "\n\n".join(kept), len(blocks) - len(kept)
+
+    def record_blocks(self, url, text):
+        """
+        Record the blocks of a kept page, replacing those of its last version.
+        Only kept pages are recorded, so duplicates of a page (e.g. mirrors)
+        do not turn its content into boilerplate.
+        """
+        page_site = site(url)
+        hashes = {_signed(_hash64(normalize(block))) for block in split_blocks(text)}
+        self._conn.execute("DELETE FROM blocks WHERE url = ?", (url,))
+        self._conn.executemany(
+            "INSERT OR IGNORE INTO blocks (site, block, url) VALUES (?, ?, ?)",
+            [(page_site, value, url) for value in hashes],
+        )
+
+    def _pages_with(self, page_site, block, url):
+        return self._conn.execute(
+            "SELECT COUNT(*) FROM blocks WHERE site = ? AND block = ? AND url != ?",
+            (page_site, block, url),
+        ).fetchone()[0]
+
+    def find_duplicate(self, url, text):
+        """
+        Check a page against the indexed pages other than `url`, and index it
+        if it is not a duplicate.
+
+        Returns:
+            tuple: The kind of duplicate ("exact" or "near") and the URL of
+                the page it duplicates, or None for a new page.
+        """
+        duplicate, exact, fingerprint = self._match(url, text)
+        # A page that was kept before may have become a duplicate.
+        self._remove_fingerprint(url)
+        if duplicate:
+            return duplicate
+        self._conn.execute(
+            "INSERT INTO pages (url, exact, simhash) VALUES (?, ?, ?)",
+            (url, exact, _signed(fingerprint)),
+        )
+        self._add_bands(url, fingerprint)
+        return None
+
+    def _match(self, url, text):
+        exact = hashlib.sha256(normalize(text).encode("utf-8")).hexdigest()
+        row = self._conn.execute(
+            "SELECT url FROM pages WHERE exact = ? AND url != ? LIMIT 1", (exact, url)
+        ).fetchone()
+        if row:
+            return ("exact", row[0]), exact, None
+
+        fingerprint = simhash(text)
+        values = bands(fingerprint, self.bands)
+        condition = " OR ".join("(b.band = ? AND b.value = ?)" for _ in values)
+        candidates = self._conn.execute(
+            "SELECT DISTINCT p.url, p.simhash FROM page_bands b "
+            f"JOIN pages p ON p.url = b.url WHERE b.url != ? AND ({condition})",
+            (url, *(x for pair in enumerate(values) for x in pair)),
+        )
+        for other, other_fingerprint in candidates:
+            distance = hamming(fingerprint, other_fingerprint % (1 << 64))
+            if distance <= self.max_distance:
+                return ("near", other), exact, fingerprint
+        return None, exact, fingerprint
+
+    def _remove_fingerprint(self, url):
+        self._conn.execute("DELETE FROM pages WHERE url = ?", (url,))
+        self._conn.execute("DELETE FROM page_bands WHERE url = ?", (url,))
+
+    def contains(self, url):
+        """
+        Whether a page was kept, i.e. is indexed as a non-duplicate.
+        """
+        row = self._conn.execute("SELECT 1 FROM pages WHERE url = ?", (url,))
+        return row.fetchone() is not None
+
+    def remove(self, url):
+        self._remove_fingerprint(url)
+        self._conn.execute("DELETE FROM blocks WHERE url = ?", (url,))
+
+    def close(self):
+        self._conn.close()
@@ -0,0 +1,372 @@
+"""
+Incremental crawling.
+
+The crawl state of every spider is kept in a SQLite file between runs: each
+URL the spider has requested (the frontier), with the callback and depth it
+was requested with, the ETag and Last-Modified validators of its last
+response and the hash of its content.
+
+On the next run every known URL is requested again next to the start URLs,
+with If-None-Match/If-Modified-Since headers, so pages are revalidated
+directly instead of being rediscovered by following links. Pages the server
+reports as not modified are skipped without a download, pages whose text (or
+PDF) hash is unchanged are dropped, and only the changes reach the feed:
+
+    {"url": ..., "extracted": ..., "content_hash": ..., "change": "added"}
+    {"url": ..., "extracted": ..., "content_hash": ..., "change": "updated"}
+    {"url": ..., "change": "deleted"}
+
+Links are only followed on pages that are downloaded, so a new page that is
+only linked from pages answered with 304 is not discovered. Known pages up to
+INCREMENTAL_FULL_FETCH_DEPTH (0, the start pages, by default) are therefore
+always downloaded and parsed; raise it to also re-read the index pages below
+them, or run a full crawl now and then to catch new pages deeper down.
+
+A page is deleted when a URL that produced an item before now answers
+404 or 410. The hash of a PDF is only stored once its item made it through
+the item pipelines, so a PDF whose text could not be extracted is parsed
+again on the next run. Enable with:
+
+    scrapy crawl manoa -s INCREMENTAL_ENABLED=1 -O delta.jsonl
+"""
+
+import hashlib
+import os
+import sqlite3
+import weakref
+
+from itemadapter import ItemAdapter, is_item
+from scrapy import Request, signals
+from scrapy.exceptions import NotConfigured
+
+GONE_STATUSES = (404, 410)
+
+_states = weakref.WeakKeyDictionary()
+
+
+def content_hash(content):
+    """
+    SHA-256 of extracted text, or of raw bytes such as a PDF body.
+    """
+    if isinstance(content, str):
+        content = content.encode("utf-8")
+    return hashlib.sha256(content).hexdigest()
+
+
+class CrawlState:
+    """
+    Pages known to a spider, persisted in a SQLite file.
+    """
+
+    def __init__(self, path):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self._conn = sqlite3.connect(path, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS pages ("
+            "url TEXT PRIMARY KEY, callback TEXT, depth INTEGER NOT NULL DEFAULT 0, "
+            "etag TEXT, last_modified TEXT, content_hash TEXT)"
+        )
+
+    def get(self, url):
+        row = self._conn.execute(
+            "SELECT callback, depth, etag, last_modified, content_hash "
+            "FROM pages WHERE url = ?",
+            (url,),
+        ).fetchone()
+        if row is None:
+            return None
+        keys = ("callback", "depth", "etag", "last_modified", "content_hash")
+        return dict(zip(keys, row))
+
+    def add(self, url, callback, depth):
+        """
+        Add a URL to the frontier, unless it is already known.
+        """
+        self._conn.execute(
+            "INSERT OR IGNORE INTO pages (url, callback, depth) VALUES (?, ?, ?)",
+            (url, callback, depth),
+        )
+
+    def update(self, url, callback, depth, etag, last_modified, content_hash):
+        """
+        Record the validators and text hash of a fetched page.
+        """
+        self._conn.execute(
+            "INSERT INTO pages "
+            "(url, callback, depth, etag, last_modified, content_hash) "
+            "VALUES (?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT(url) DO UPDATE SET etag = excluded.etag, "
+            "last_modified = excluded.last_modified, "
+            "content_hash = excluded.content_hash",
+            (url, callback, depth, etag, last_modified, content_hash),
+        )
+
+    def remove(self, url):
+        self._conn.execute("DELETE FROM pages WHERE url = ?", (url,))
+
+    def frontier(self):
+        """
+        Every known URL with the callback and depth it was requested with,
+        shallowest first.
+        """
+        return self._conn.execute(
+            "SELECT url, callback, depth FROM pages ORDER BY depth, url"
+        ).fetchall()
+
+    def close(self):
+        self._conn.close()
+
+
+def get_state(crawler):
+    """
+    The crawl state of a crawler's spider, shared by the incremental
+    middlewares.
+
+    Raises:
+        NotConfigured: If incremental crawling is not enabled.
+    """
+    if not crawler.settings.getbool("INCREMENTAL_ENABLED"):
+        raise NotConfigured
+    if crawler not in _states:
+        path = os.path.join(
+            crawler.settings.get("INCREMENTAL_STATE_DIR", "crawl-state"),
+            f"{crawler.spidercls.name}.sqlite",
+        )
+        _states[crawler] = CrawlState(path)
+        crawler.signals.connect(
+            _states[crawler].close, signal=signals.engine_stopped, weak=False
+        )
+    return _states[crawler]
+
+
+def _header(response, name):
+    value = response.headers.get(name)
+    return value.decode("latin-1") if value else None
+
+
+def _callback_name(request, spider):
+    """
+    Name of a request's callback, if it is a method of the spider, so the
+    request can be rebuilt on the next run.
+    """
+    callback = request.callback
+    if callback is None:
+        return None
+    if getattr(callback, "__self__", None) is spider:
+        return callback.__name__
+    return None
+
+
+class ConditionalRequestMiddleware:
+    """
+    Downloader middleware that revalidates known pages with conditional
+    requests, and lets 304, 404 and 410 responses to them through to the
+    `IncrementalSpiderMiddleware`.
+    """
+
+    def __init__(self, state, full_fetch_depth=0):
+        """
+        Args:
+            state: The spider's `CrawlState`.
+            full_fetch_depth: Known pages up to this depth are downloaded
+                without validators, so their links are followed and new pages
+                are discovered. -1 revalidates every page.
+        """
+        self.state = state
+        self.full_fetch_depth = full_fetch_depth
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(
+            get_state(crawler),
+            crawler.settings.getint("INCREMENTAL_FULL_FETCH_DEPTH", 0),
+        )
+
+    def process_request(self, request, spider):
+        page = self.state.get(request.url)
+        if page is None:
+            return None
+        if request.meta.get("depth", 0) > self.full_fetch_depth:
+            if page["etag"]:
+                request.headers.setdefault("If-None-Match", page["etag"])
+            if page["last_modified"]:
+                request.headers.setdefault("If-Modified-Since", page["last_modified"])
+        statuses = request.meta.get("handle_httpstatus_list", [])
+        request.meta["handle_httpstatus_list"] = [
+            *statuses,
+            304,
+            *GONE_STATUSES,
+        ]
+        request.meta["incremental_known"] = True
+        return None
+
+
+class _PageNotModified(Exception):
+    pass
+
+
+class _PageGone(Exception):
+    pass
+
+
+class IncrementalSpiderMiddleware:
+    """
+    Spider middleware that seeds the crawl with the persisted frontier,
+    records every new request in it, and reduces the spider's items to the
+    pages that were added, updated or deleted since the last run.
+    """
+
+    def __init__(self, crawler, state):
+        self.crawler = crawler
+        self.state = state
+        self.stats = crawler.stats
+        # Pages of PDF items still in the item pipelines, by item URL.
+        self._pending = {}
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        middleware = cls(crawler, get_state(crawler))
+        crawler.signals.connect(middleware._item_passed, signal=signals.item_scraped)
+        crawler.signals.connect(middleware._item_failed, signal=signals.item_dropped)
+        crawler.signals.connect(middleware._item_failed, signal=signals.item_error)
+        return middleware
+
+    def _seeds(self, spider):
+        for url, callback, depth in self.state.frontier():
+            yield Request(
+                url,
+                callback=getattr(spider, callback) if callback else None,
+                meta={"depth": depth},
+            )
+
+    async def process_start(self, start):
+        async for request in start:
+            yield request
+        for request in self._seeds(self.crawler.spider):
+            yield request
+
+    def process_start_requests(self, start_requests, spider):
+        # Scrapy before 2.13.
+        yield from start_requests
+        yield from self._seeds(spider)
+
+    def process_spider_input(self, response, spider):
+        if not response.meta.get("incremental_known"):
+            return None
+        if response.status == 304:
+            raise _PageNotModified(response.url)
+        if response.status in GONE_STATUSES:
+            raise _PageGone(response.url)
+        return None
+
+    def process_spider_exception(self, response, exception, spider):
+        if isinstance(exception, _PageNotModified):
+            self.stats.inc_value("incremental/not_modified")
+            return []
+        if isinstance(exception, _PageGone):
+            page = self.state.get(response.url)
+            self.state.remove(response.url)
+            if page and page["content_hash"]:
+                self.stats.inc_value("incremental/deleted")
+                return [{"url": response.url, "change": "deleted"}]
+            return []
+        return None
+
+    def _filter(self, output, spider):
+        """
+        Record a request in the frontier, or hash an item and compare it with
+        the last run.
+
+        Returns:
+            tuple: The output to pass on (None to drop it) and the item's hash.
+        """
+        if isinstance(output, Request):
+            self.state.add(
+                output.url, _callback_name(output, spider), output.meta.get("depth", 0)
+            )
+            return output, None
+        # PDFs are hashed before their text is extracted by the pipeline, so
+        # unchanged PDFs are never parsed.
+        content = output.get("extracted", output.get("pdf"))
+        if content is None:
+            return output, None
+
+        digest = content_hash(content)
+        page = self.state.get(output["url"])
+        if page and page["content_hash"] == digest:
+            self.stats.inc_value("incremental/unchanged")
+            return None, digest
+        change = "updated" if page and page["content_hash"] else "added"
+        self.stats.inc_value(f"incremental/{change}")
+        output["content_hash"] = digest
+        output["change"] = change
+        return output, digest
+
+    def _page(self, response, spider, content_hash):
+        return (
+            response.url,
+            _callback_name(response.request, spider),
+            response.meta.get("depth", 0),
+            _header(response, "ETag"),
+            _header(response, "Last-Modified"),
+            content_hash,
+        )
+
+    def _defer(self, output, response, spider, item_hash):
+        """
+        Hold back the page of a PDF item until the item pipelines extracted
+        its text. Recording its validators and hash now would make the next
+        run skip a PDF whose extraction failed.
+
+        Returns:
+            bool: Whether the page was held back.
+        """
+        if not is_item(output) or "pdf" not in ItemAdapter(output):
+            return False
+        url = ItemAdapter(output)["url"]
+        self._pending[url] = self._page(response, spider, item_hash)
+        return True
+
+    def _item_passed(self, item):
+        page = self._pending.pop(ItemAdapter(item).get("url"), None)
+        if page is not None:
+            self.state.update(*page)
+
+    def _item_failed(self, item):
+        if self._pending.pop(ItemAdapter(item).get("url"), None) is not None:
+            self.stats.inc_value("incremental/pdf_not_recorded")
+
+    def _record(self, response, spider, content_hash):
+        # Called after the items are passed on, so a page whose items were
+        # lost to an interrupted run is not reported as unchanged next time.
+        self.state.update(*self._page(response, spider, content_hash))
+
+    def process_spider_output(self, response, result, spider):
+        content_hash = None
+        deferred = False
+        for output in result:
+            output, item_hash = self._filter(output, spider)
+            if output is not None and self._defer(output, response, spider, item_hash):
+                deferred = True
+            else:
+                content_hash = item_hash or content_hash
+            if output is not None:
+                yield output
+        if not deferred:
+            self._record(response, spider, content_hash)
+
+    async def process_spider_output_async(self, response, result, spider):
+        content_hash = None
+        deferred = False
+        async for output in result:
+            output, item_hash = self._filter(output, spider)
+            if output is not None and self._defer(output, response, spider, item_hash):
+                deferred = True
+            else:
+                content_hash = item_hash or content_hash
+            if output is not None:
+                yield output
+        if not deferred:
+            self._record(response, spider, content_hash)
@@ -0,0 +1,76 @@
+"""
+PDF text extraction outside the reactor thread.
+
+pdfminer is pure Python and CPU bound, so parsing a PDF inside a spider
+callback stalls every other download. `extract_pdf_text` runs in the worker
+processes of `crawler.pipelines.PdfExtractionPipeline` instead, and
+`PdfTextCache` keeps the text of every PDF by content hash, so a PDF that has
+been parsed once is never parsed again.
+"""
+
+import logging
+import math
+import os
+import signal
+import sqlite3
+from io import BytesIO
+
+
+def _timeout(signum, frame):
+    raise TimeoutError("PDF text extraction timed out")
+
+
+def extract_pdf_text(data, timeout=None):
+    """
+    Extract the text of a PDF. Runs in a worker process.
+
+    Args:
+        data: The PDF file contents.
+        timeout: Seconds after which extraction is abandoned with a
+            TimeoutError, where SIGALRM is available.
+    """
+    from pdfminer.high_level import extract_text
+
+    # Set pdfminer logger to WARNING to suppress debug clutter
+    logging.getLogger("pdfminer").setLevel(logging.WARNING)
+
+    alarm = timeout and hasattr(signal, "SIGALRM")
+    if alarm:
+        previous = signal.signal(signal.SIGALRM, _timeout)
+        signal.alarm(math.ceil(timeout))
+    try:
+        return extract_text(BytesIO(data))
+    finally:
+        if alarm:
+            signal.alarm(0)
+            signal.signal(signal.SIGALRM, previous)
+
+
+class PdfTextCache:
+    """
+    Extracted PDF text by content hash, persisted in a SQLite file.
+    """
+
+    def __init__(self, path):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS pdf_text "
+            "(content_hash TEXT PRIMARY KEY, text TEXT NOT NULL)"
+        )
+
+    def get(self, content_hash):
+        row = self._conn.execute(
+            "SELECT text FROM pdf_text WHERE content_hash = ?", (content_hash,)
+        ).fetchone()
+        return row[0] if row else None
+
+    def set(self, content_hash, text):
+        self._conn.execute(
+            "INSERT OR REPLACE INTO pdf_text (content_hash, text) VALUES (?, ?)",
+            (content_hash, text),
+        )
+
+    def close(self):
+        self._conn.close()
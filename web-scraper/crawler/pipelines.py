@@ -3,11 +3,373 @@
 # Don't forget to add your pipeline to the ITEM_PIPELINES setting
 # See: https://docs.scrapy.org/en/latest/topics/item-pipeline.html
 
+import asyncio
+import functools
+import logging
+import multiprocessing
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 
 # useful for handling different item types with a single interface
 from itemadapter import ItemAdapter
+from scrapy.exceptions import DropItem, NotConfigured
+from scrapy.utils.defer import deferred_from_coro
+
+from crawler.dedup import ContentIndex
+from crawler.incremental import content_hash
+from crawler.pdf import PdfTextCache, extract_pdf_text
+
+logger = logging.getLogger(__name__)
+
+APP_DIR = os.path.join(os.path.dirname(__file__), "..", "..", "app")
 
 
 class CrawlerPipeline:
     def process_item(self, item, spider):
         return item
+
+
+class PdfExtractionPipeline:
+    """
+    Replaces the raw "pdf" bytes of an item with the "extracted" text.
+
+    Extraction runs in a process pool, so the reactor keeps downloading while
+    PDFs are parsed. Every PDF gets PDF_EXTRACT_TIMEOUT seconds, and the text
+    is cached by content hash in PDF_TEXT_CACHE_PATH. PDFs that fail or time
+    out are dropped, and with incremental crawling they are not recorded as
+    seen, so the next run downloads and parses them again.
+    """
+
+    def __init__(self, workers=None, timeout=60.0, cache_path=None, stats=None):
+        self.workers = workers
+        self.timeout = timeout
+        self.cache_path = cache_path
+        self.stats = stats
+        self.executor = None
+        self.cache = None
+        # Identical PDFs under different URLs are parsed once per run.
+        self._pending = {}
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        return cls(
+            workers=settings.getint("PDF_EXTRACT_WORKERS") or None,
+            timeout=settings.getfloat("PDF_EXTRACT_TIMEOUT", 60.0),
+            cache_path=settings.get("PDF_TEXT_CACHE_PATH"),
+            stats=crawler.stats,
+        )
+
+    def open_spider(self, spider):
+        # Spawned rather than forked workers, since the crawler process runs
+        # the reactor and its thread pool.
+        self.executor = ProcessPoolExecutor(
+            self.workers, mp_context=multiprocessing.get_context("spawn")
+        )
+        if self.cache_path:
+            self.cache = PdfTextCache(self.cache_path)
+
+    def close_spider(self, spider):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        if self.cache is not None:
+            self.cache.close()
+
+    def _inc(self, key):
+        if self.stats is not None:
+            self.stats.inc_value(f"pdf/{key}")
+
+    async def _extract(self, digest, data):
+        future = self._pending.get(digest)
+        if future is None:
+            future = asyncio.wrap_future(
+                self.executor.submit(extract_pdf_text, data, self.timeout)
+            )
+            self._pending[digest] = future
+            future.add_done_callback(lambda _: self._pending.pop(digest, None))
+        # The worker enforces the timeout; this one also covers a stuck worker.
+        # Shielded, so a timeout here does not cancel other waiters.
+        return await asyncio.wait_for(asyncio.shield(future), self.timeout + 5)
+
+    async def process_item(self, item, spider):
+        adapter = ItemAdapter(item)
+        if "pdf" not in adapter:
+            return item
+
+        data = adapter.pop("pdf")
+        digest = adapter.get("content_hash") or content_hash(data)
+        text = self.cache.get(digest) if self.cache is not None else None
+        if text is not None:
+            self._inc("cached")
+        else:
+            try:
+                text = await self._extract(digest, data)
+            except Exception as e:
+                self._inc("failed")
+                raise DropItem(
+                    f"Error extracting text from PDF {adapter['url']}: {e!r}"
+                )
+            self._inc("extracted")
+            if self.cache is not None:
+                self.cache.set(digest, text)
+
+        adapter["extracted"] = text
+        return item
+
+
+class DedupPipeline:
+    """
+    Strips navigation and footer blocks repeated across the pages of a site
+    from the "extracted" text, then drops pages with no text left and pages
+    that duplicate, exactly or nearly, a page kept earlier. A page that was
+    kept before is instead passed on as a "deleted" record, so its chunks are
+    removed from the collection.
+
+    With incremental crawling the index is kept next to the crawl state, so
+    changed pages are also checked against the pages of earlier runs.
+    """
+
+    def __init__(self, path=":memory:", min_pages=5, max_distance=3, stats=None):
+        self.path = path
+        self.min_pages = min_pages
+        self.max_distance = max_distance
+        self.stats = stats
+        self.index = None
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        path = ":memory:"
+        if settings.getbool("INCREMENTAL_ENABLED"):
+            state_dir = settings.get("INCREMENTAL_STATE_DIR", "crawl-state")
+            os.makedirs(state_dir, exist_ok=True)
+            path = os.path.join(state_dir, f"{crawler.spidercls.name}-content.sqlite")
+        return cls(
+            path=path,
+            min_pages=settings.getint("BOILERPLATE_MIN_PAGES", 5),
+            max_distance=settings.getint("DEDUP_MAX_DISTANCE", 3),
+            stats=crawler.stats,
+        )
+
+    def open_spider(self, spider):
+        self.index = ContentIndex(self.path, self.min_pages, self.max_distance)
+
+    def close_spider(self, spider):
+        self.index.close()
+
+    def process_item(self, item, spider):
+        adapter = ItemAdapter(item)
+        url = adapter.get("url")
+        if adapter.get("change") == "deleted":
+            self.index.remove(url)
+            return item
+        if "extracted" not in adapter:
+            return item
+
+        extracted = adapter["extracted"]
+        # A page kept earlier may have become empty or a duplicate; its
+        # chunks are then deleted downstream instead of silently kept.
+        known = self.index.contains(url)
+        text, stripped = self.index.strip_boilerplate(url, extracted)
+        if stripped:
+            self.stats.inc_value("dedup/boilerplate_blocks", stripped)
+        if not text.strip():
+            self.index.remove(url)
+            self.stats.inc_value("dedup/empty")
+            return self._drop(
+                url, known, f"No text left after removing boilerplate: {url}"
+            )
+
+        duplicate = self.index.find_duplicate(url, text)
+        if duplicate:
+            self.index.remove(url)
+            kind, other = duplicate
+            self.stats.inc_value(f"dedup/{kind}")
+            return self._drop(url, known, f"{url} is a {kind} duplicate of {other}")
+
+        self.index.record_blocks(url, extracted)
+        adapter["extracted"] = text
+        return item
+
+    def _drop(self, url, known, reason):
+        if not known:
+            raise DropItem(reason)
+        self.stats.inc_value("dedup/deleted")
+        logger.info(f"{reason}; deleting the indexed page")
+        return {"url": url, "change": "deleted"}
+
+
+class ChromaPipeline:
+    """
+    Streams crawled pages into a Chroma collection while the crawl runs.
+
+    Items are buffered into batches of CHROMA_BATCH_SIZE pages. Each batch is
+    split, embedded and upserted with `manoa_agent.ingest.delta.apply_delta`
+    on a worker thread, with at most CHROMA_MAX_CONCURRENCY batches in
+    flight; when all are busy, items wait, so the crawl slows down to the
+    speed of the embedding API instead of piling up pages in memory. Pages
+    without a "change" (full crawls) replace what the collection holds for
+    their URL, and "deleted" records remove it.
+
+    The collection is configured like `app/load_db.py`, from the CHROMA_HOST,
+    CHROMA_PORT, EMBEDDING_MODEL, EMBEDDING_DIMENSIONS and DOCSTORE_PATH
+    environment variables. CHROMA_COLLECTION is an alias: pages go to the
+    version it points to when the spider opens, embedded with the model that
+    version was built with, or created with EMBEDDING_MODEL recorded.
+
+    With SHADOW_EMBEDDING_MODEL (and SHADOW_EMBEDDING_DIMENSIONS) set, every
+    batch is also applied to a shadow version embedded with that model, like
+    load_db.py does: the version named by SHADOW_COLLECTION, or a new one.
+    """
+
+    def __init__(
+        self,
+        collection_name="general_faq",
+        batch_size=32,
+        max_concurrency=4,
+        app_dir=APP_DIR,
+        stats=None,
+    ):
+        self.collection_name = collection_name
+        self.batch_size = batch_size
+        self.max_concurrency = max_concurrency
+        self.app_dir = os.path.abspath(app_dir)
+        self.stats = stats
+        self._buffer = []
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        if not settings.getbool("CHROMA_PIPELINE_ENABLED"):
+            raise NotConfigured
+        return cls(
+            collection_name=settings.get("CHROMA_COLLECTION", "general_faq"),
+            batch_size=settings.getint("CHROMA_BATCH_SIZE", 32),
+            max_concurrency=settings.getint("CHROMA_MAX_CONCURRENCY", 4),
+            app_dir=settings.get("MANOA_AGENT_APP_DIR", APP_DIR),
+            stats=crawler.stats,
+        )
+
+    def open_spider(self, spider):
+        src = os.path.join(self.app_dir, "src")
+        if src not in sys.path:
+            sys.path.insert(0, src)
+
+        from chromadb import HttpClient
+        from langchain_chroma import Chroma
+
+        from manoa_agent.db.chroma.migration import (
+            EmbedderRegistry,
+            embedding_metadata,
+        )
+        from manoa_agent.db.chroma.versions import CollectionVersions
+        from manoa_agent.db.docstore import SQLiteDocStore
+        from manoa_agent.embeddings import convert
+        from manoa_agent.ingest.delta import apply_delta
+        from manoa_agent.splitters.structure import StructureAwareTextSplitter
+
+        embedding_model = os.getenv("EMBEDDING_MODEL", "text-embedding-3-large")
+        embedding_dimensions = os.getenv("EMBEDDING_DIMENSIONS")
+        embedding_dimensions = (
+            int(embedding_dimensions) if embedding_dimensions else None
+        )
+        embedders = EmbedderRegistry(
+            convert.from_spec(embedding_model, embedding_dimensions),
+            embedding_model,
+            embedding_dimensions,
+        )
+        client = HttpClient(
+            host=os.getenv("CHROMA_HOST"), port=os.getenv("CHROMA_PORT")
+        )
+        versions = CollectionVersions(client)
+        name = versions.resolve(self.collection_name)
+        logger.info(f"Streaming pages into {name}")
+        self.collection = Chroma(
+            collection_name=name,
+            client=client,
+            embedding_function=embedders.get_or_create(client, name),
+        )
+        self.collections = [self.collection]
+        shadow_model = os.getenv("SHADOW_EMBEDDING_MODEL")
+        if shadow_model:
+            shadow_dimensions = os.getenv("SHADOW_EMBEDDING_DIMENSIONS")
+            shadow_dimensions = int(shadow_dimensions) if shadow_dimensions else None
+            shadow_name = os.getenv("SHADOW_COLLECTION") or versions.create(
+                self.collection_name,
+                metadata=embedding_metadata(shadow_model, shadow_dimensions),
+            )
+            logger.info(f"Also streaming pages into {shadow_name}")
+            self.collections.append(
+                Chroma(
+                    collection_name=shadow_name,
+                    client=client,
+                    embedding_function=convert.from_spec(
+                        shadow_model, shadow_dimensions
+                    ),
+                )
+            )
+        # The same splitting and parent docstore as load_db.py, so streamed
+        # pages are served like loaded ones.
+        self.splitter = StructureAwareTextSplitter(
+            chunk_size=1000, chunk_overlap=100, include_parent_content=False
+        )
+        self.docstore = SQLiteDocStore(
+            os.getenv(
+                "DOCSTORE_PATH", os.path.join(self.app_dir, "data", "docstore.sqlite")
+            )
+        )
+        # The docstore is shared by every version: parents that the previous
+        # version (for a rollback) or the shadow version still references are
+        # kept.
+        self.apply_delta = functools.partial(
+            apply_delta,
+            protect=[collection._collection for collection in self.collections]
+            + [
+                client.get_collection(served, embedding_function=None)
+                for served in versions.served()
+            ],
+        )
+        self.executor = ThreadPoolExecutor(self.max_concurrency)
+        self.semaphore = asyncio.Semaphore(self.max_concurrency)
+
+    async def process_item(self, item, spider):
+        adapter = ItemAdapter(item)
+        change = adapter.get("change", "updated")
+        if change != "deleted" and "extracted" not in adapter:
+            return item
+        record = {"url": adapter["url"], "change": change}
+        if change != "deleted":
+            record["extracted"] = adapter["extracted"]
+        self._buffer.append(record)
+        if len(self._buffer) >= self.batch_size:
+            await self._flush()
+        return item
+
+    async def _flush(self):
+        batch, self._buffer = self._buffer, []
+        if not batch:
+            return
+        async with self.semaphore:
+            try:
+                await asyncio.get_running_loop().run_in_executor(
+                    self.executor, self._apply, batch
+                )
+            except Exception as e:
+                # The pages stay in the feed; they can be loaded later with
+                # CRAWL_DELTA.
+                logger.error(f"Failed to upload {len(batch)} pages to Chroma: {e!r}")
+                self.stats.inc_value("chroma/failed_pages", len(batch))
+                return
+        self.stats.inc_value("chroma/pages", len(batch))
+
+    def _apply(self, batch):
+        for collection in self.collections:
+            self.apply_delta(collection, batch, self.splitter, self.docstore)
+
+    async def _close(self):
+        # Items still in the buffer when the crawl ends.
+        await self._flush()
+        self.executor.shutdown()
+
+    def close_spider(self, spider):
+        return deferred_from_coro(self._close())
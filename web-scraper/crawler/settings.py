@@ -21,15 +21,17 @@ DEPTH_LIMIT = 3
 ROBOTSTXT_OBEY = False
 
 # Configure maximum concurrent requests performed by Scrapy (default: 16)
-#CONCURRENT_REQUESTS = 32
+CONCURRENT_REQUESTS = 32
 
 # Configure a delay for requests for the same website (default: 0)
 # See https://docs.scrapy.org/en/latest/topics/settings.html#download-delay
 # See also autothrottle settings and docs
-#DOWNLOAD_DELAY = 3
+DOWNLOAD_DELAY = 0.25
 # The download delay setting will honor only one of:
-#CONCURRENT_REQUESTS_PER_DOMAIN = 16
+CONCURRENT_REQUESTS_PER_DOMAIN = 8
 #CONCURRENT_REQUESTS_PER_IP = 16
+DOWNLOAD_TIMEOUT = 30
+RETRY_TIMES = 2
 
 # Disable cookies (enabled by default)
 #COOKIES_ENABLED = False
@@ -45,15 +47,39 @@ ROBOTSTXT_OBEY = False
 
 # Enable or disable spider middlewares
 # See https://docs.scrapy.org/en/latest/topics/spider-middleware.html
-#SPIDER_MIDDLEWARES = {
-#    "crawler.middlewares.CrawlerSpiderMiddleware": 543,
-#}
+SPIDER_MIDDLEWARES = {
+    # Before HttpErrorMiddleware (50), so it sees 304/404/410 responses.
+    "crawler.incremental.IncrementalSpiderMiddleware": 45,
+}
 
 # Enable or disable downloader middlewares
 # See https://docs.scrapy.org/en/latest/topics/downloader-middleware.html
-#DOWNLOADER_MIDDLEWARES = {
-#    "crawler.middlewares.CrawlerDownloaderMiddleware": 543,
-#}
+DOWNLOADER_MIDDLEWARES = {
+    "crawler.incremental.ConditionalRequestMiddleware": 560,
+    # Next to the downloader, so it sees errors before RetryMiddleware (550).
+    "crawler.throttle.AdaptiveConcurrencyMiddleware": 950,
+}
+
+# Halve a domain's concurrency when more than MAX_ERROR_RATE of a window of
+# responses are errors, and add one (up to CONCURRENT_REQUESTS_PER_DOMAIN) when
+# a window is error free and faster than TARGET_LATENCY seconds (see
+# crawler/throttle.py).
+ADAPTIVE_CONCURRENCY_ENABLED = True
+ADAPTIVE_CONCURRENCY_WINDOW = 20
+ADAPTIVE_CONCURRENCY_MAX_ERROR_RATE = 0.05
+ADAPTIVE_CONCURRENCY_TARGET_LATENCY = 1.0
+
+# Incremental crawling (see crawler/incremental.py): revalidate the pages of
+# the previous runs and emit only added, updated and deleted pages, e.g.
+#   scrapy crawl manoa -s INCREMENTAL_ENABLED=1 -O delta.jsonl
+INCREMENTAL_ENABLED = False
+INCREMENTAL_STATE_DIR = "crawl-state"
+# Links are only followed on downloaded pages: a page answering 304 is not
+# parsed, so new pages linked only from unchanged pages are missed. Known pages
+# up to this depth (0: the start pages) are always downloaded so their links
+# are followed; raise it, or run a full crawl now and then, to find new pages
+# deeper in the site.
+INCREMENTAL_FULL_FETCH_DEPTH = 0
 
 # Enable or disable extensions
 # See https://docs.scrapy.org/en/latest/topics/extensions.html
@@ -63,20 +89,41 @@ ROBOTSTXT_OBEY = False
 
 # Configure item pipelines
 # See https://docs.scrapy.org/en/latest/topics/item-pipeline.html
-#ITEM_PIPELINES = {
-#    "crawler.pipelines.CrawlerPipeline": 300,
-#}
+ITEM_PIPELINES = {
+    "crawler.pipelines.PdfExtractionPipeline": 100,
+    "crawler.pipelines.DedupPipeline": 200,
+    "crawler.pipelines.ChromaPipeline": 300,
+}
+
+# PDF text extraction runs in a process pool (default: one worker per CPU).
+#PDF_EXTRACT_WORKERS = 4
+PDF_EXTRACT_TIMEOUT = 60
+PDF_TEXT_CACHE_PATH = "crawl-state/pdf-text.sqlite"
+
+# Blocks repeated on this many pages of a site are removed as boilerplate, and
+# pages whose SimHash is within DEDUP_MAX_DISTANCE bits of a kept page are
+# dropped as near duplicates.
+BOILERPLATE_MIN_PAGES = 5
+DEDUP_MAX_DISTANCE = 3
+
+# Upload pages to Chroma while crawling instead of loading a feed afterwards:
+#   scrapy crawl manoa -s CHROMA_PIPELINE_ENABLED=1
+# Uses the app's embedder, splitter and docstore (see ChromaPipeline).
+CHROMA_PIPELINE_ENABLED = False
+CHROMA_COLLECTION = "general_faq"
+CHROMA_BATCH_SIZE = 32
+CHROMA_MAX_CONCURRENCY = 4
 
 # Enable and configure the AutoThrottle extension (disabled by default)
 # See https://docs.scrapy.org/en/latest/topics/autothrottle.html
-#AUTOTHROTTLE_ENABLED = True
+AUTOTHROTTLE_ENABLED = True
 # The initial download delay
-#AUTOTHROTTLE_START_DELAY = 5
+AUTOTHROTTLE_START_DELAY = 0.5
 # The maximum download delay to be set in case of high latencies
-#AUTOTHROTTLE_MAX_DELAY = 60
+AUTOTHROTTLE_MAX_DELAY = 30
 # The average number of requests Scrapy should be sending in parallel to
 # each remote server
-#AUTOTHROTTLE_TARGET_CONCURRENCY = 1.0
+AUTOTHROTTLE_TARGET_CONCURRENCY = 4.0
 # Enable showing throttling stats for every response received:
 #AUTOTHROTTLE_DEBUG = False
 
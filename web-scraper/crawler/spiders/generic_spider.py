@@ -1,28 +1,29 @@
+import re
+
 import scrapy
 from scrapy.linkextractors import LinkExtractor
-from bs4 import BeautifulSoup
-import html2text
+
+from crawler.text import HtmlTextExtractor
+
+# URLs and link texts of pages likely to answer questions.
+FAQ_PATTERN = re.compile(
+    r"faq|askus|help|how[-_ ]?to|support|question|policy|guide", re.IGNORECASE
+)
+FAQ_PRIORITY = 10
 
 class ManoaSpider(scrapy.Spider):
     name = "manoa"
-    allow_domains = ("www.hawaii.edu",)
-    link_extractor = LinkExtractor(allow_domains=allow_domains, canonicalize=True)
+    # Enforced by OffsiteMiddleware for every request, not only extracted links.
+    allowed_domains = ("www.hawaii.edu",)
+    link_extractor = LinkExtractor(allow_domains=allowed_domains, canonicalize=True)
     start_urls = ["https://www.hawaii.edu/"]
 
     def __init__(self):
         super().__init__(self.name)
-        self.h = html2text.HTML2Text()
-        self.h.ignore_images = True
-        self.h.ignore_mailto_links = True
+        self.extractor = HtmlTextExtractor(ignore_images=True, ignore_mailto_links=True)
 
     def extract_text(self, html):
-        soup = BeautifulSoup(html, 'lxml')
-        main_tag = soup.find('main')
-
-        if not main_tag:
-            return ""
-
-        return self.h.handle(str(main_tag))    
+        return self.extractor.extract(html, tags=["main"], fallback=False) or ""
 
     def parse(self, response):
         extracted_text = self.extract_text(response.body)
@@ -30,4 +31,13 @@ class ManoaSpider(scrapy.Spider):
             yield {"url": response.url, "extracted": extracted_text}
 
         for link in self.link_extractor.extract_links(response):
-            yield scrapy.Request(link.url)
\ No newline at end of file
+            yield scrapy.Request(link.url, priority=self.link_priority(link))
+
+    def link_priority(self, link):
+        """
+        Crawl FAQ-like pages first, so they are fetched early even when a
+        crawl is cut short.
+        """
+        if FAQ_PATTERN.search(link.url) or FAQ_PATTERN.search(link.text or ""):
+            return FAQ_PRIORITY
+        return 0
\ No newline at end of file
@@ -1,36 +1,24 @@
 import scrapy
 from scrapy.crawler import CrawlerProcess
-from bs4 import BeautifulSoup
-import html2text
-from io import BytesIO
-from pdfminer.high_level import extract_text
-import logging
 
-# Set pdfminer logger to WARNING to suppress debug clutter
-logging.getLogger("pdfminer").setLevel(logging.WARNING)
+from crawler.text import HtmlTextExtractor
 
 class PolicySpider(scrapy.Spider):
     name = "policy_spider"
+    allowed_domains = ("hawaii.edu",)
     start_urls = [
         "https://www.hawaii.edu/policy/index.php?action=viewPolicyText&policyTextName=title"
     ]
 
     def __init__(self, *args, **kwargs):
         super(PolicySpider, self).__init__(*args, **kwargs)
-        # Set up html2text instance to convert HTML to text.
-        self.h = html2text.HTML2Text()
-        self.h.ignore_links = True
+        self.extractor = HtmlTextExtractor(ignore_links=True)
 
     def extract_text(self, html):
         """
-        Extract text from HTML using BeautifulSoup.
-        This version looks for an element with id="content-table".
+        Extract the text of the element with id="content-table".
         """
-        soup = BeautifulSoup(html, "lxml")
-        content_table = soup.find(id="content-table")
-        if not content_table:
-            return ""
-        return self.h.handle(str(content_table))
+        return self.extractor.extract(html, ids=["content-table"], fallback=False) or ""
 
     def parse(self, response):
         """
@@ -76,8 +64,9 @@ class PolicySpider(scrapy.Spider):
 
     def parse_pdf(self, response):
         """
-        Processes PDF responses. Follows a 302 redirect if needed,
-        extracts text from PDF using pdfminer, and yields the item.
+        Processes PDF responses. Follows a 302 redirect if needed and
+        yields the PDF itself; its text is extracted off the reactor thread
+        by PdfExtractionPipeline.
         """
         if response.status == 302:
             location = response.headers.get("Location")
@@ -92,12 +81,7 @@ class PolicySpider(scrapy.Spider):
                 )
             return
 
-        try:
-            pdf_text = extract_text(BytesIO(response.body))
-        except Exception as e:
-            self.logger.error("Error extracting text from PDF: %s", e)
-            pdf_text = ""
-        yield {"url": response.url, "extracted": pdf_text}
+        yield {"url": response.url, "pdf": response.body}
 
     def parse_html(self, response):
         """
@@ -113,6 +97,11 @@ if __name__ == "__main__":
         "LOG_LEVEL": "INFO",
         "FEED_FORMAT": "json",
         "FEED_URI": "policies.json",
+        "ITEM_PIPELINES": {
+            "crawler.pipelines.PdfExtractionPipeline": 100,
+            "crawler.pipelines.DedupPipeline": 200,
+        },
+        "PDF_TEXT_CACHE_PATH": "crawl-state/pdf-text.sqlite",
     })
     process.crawl(PolicySpider)
     process.start()
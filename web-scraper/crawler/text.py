@@ -0,0 +1,15 @@
+"""
+HTML to text for the spiders, with the extractor the app's loaders use, so
+crawled pages and loaded pages are converted the same way.
+"""
+
+import os
+import sys
+
+APP_SRC = os.path.join(os.path.dirname(__file__), "..", "..", "app", "src")
+if os.path.abspath(APP_SRC) not in map(os.path.abspath, sys.path):
+    sys.path.insert(0, os.path.abspath(APP_SRC))
+
+from manoa_agent.parsers.html_text import HtmlTextExtractor  # noqa: E402
+
+__all__ = ["HtmlTextExtractor"]
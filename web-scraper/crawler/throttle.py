@@ -0,0 +1,107 @@
+from scrapy.exceptions import NotConfigured
+
+# Responses that mean the server is overloaded or rate limiting us.
+ERROR_STATUSES = (429, 500, 502, 503, 504)
+
+
+def _retry_after(response):
+    value = response.headers.get("Retry-After")
+    try:
+        return float(value) if value else None
+    except ValueError:
+        # An HTTP date; AutoThrottle's backoff covers it.
+        return None
+
+
+class AdaptiveConcurrencyMiddleware:
+    """
+    Downloader middleware that adapts the concurrency of every download slot
+    (one per domain) to what the server can take, next to AutoThrottle, which
+    adapts the delay between requests to latency.
+
+    Responses are counted in windows of ADAPTIVE_CONCURRENCY_WINDOW per slot.
+    When more than ADAPTIVE_CONCURRENCY_MAX_ERROR_RATE of a window are errors
+    (429, 5xx, timeouts and other download failures) the slot's concurrency is
+    halved; when a window is error free and its mean latency is below
+    ADAPTIVE_CONCURRENCY_TARGET_LATENCY, it grows by one, up to
+    CONCURRENT_REQUESTS_PER_DOMAIN. A Retry-After header on a 429 or 503 also
+    raises the slot's delay.
+    """
+
+    def __init__(self, crawler):
+        settings = crawler.settings
+        if not settings.getbool("ADAPTIVE_CONCURRENCY_ENABLED"):
+            raise NotConfigured
+        self.crawler = crawler
+        self.window = settings.getint("ADAPTIVE_CONCURRENCY_WINDOW", 20)
+        self.max_error_rate = settings.getfloat(
+            "ADAPTIVE_CONCURRENCY_MAX_ERROR_RATE", 0.05
+        )
+        self.target_latency = settings.getfloat(
+            "ADAPTIVE_CONCURRENCY_TARGET_LATENCY", 1.0
+        )
+        self.max_concurrency = settings.getint("CONCURRENT_REQUESTS_PER_DOMAIN", 8)
+        self.max_delay = settings.getfloat("AUTOTHROTTLE_MAX_DELAY", 60.0)
+        # Slot key -> [responses, errors, latency sum, latency count]
+        self._windows = {}
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(crawler)
+
+    def _slot(self, request):
+        key = request.meta.get("download_slot")
+        return key, self.crawler.engine.downloader.slots.get(key)
+
+    def process_response(self, request, response, spider=None):
+        error = response.status in ERROR_STATUSES
+        self._record(request, error, request.meta.get("download_latency"))
+        if response.status in (429, 503):
+            delay = _retry_after(response)
+            key, slot = self._slot(request)
+            if delay and slot is not None:
+                slot.delay = min(max(slot.delay, delay), self.max_delay)
+        return response
+
+    def process_exception(self, request, exception, spider=None):
+        self._record(request, True, None)
+        return None
+
+    def _record(self, request, error, latency):
+        key, slot = self._slot(request)
+        if slot is None:
+            return
+        window = self._windows.setdefault(key, [0, 0, 0.0, 0])
+        window[0] += 1
+        window[1] += error
+        if latency is not None:
+            window[2] += latency
+            window[3] += 1
+        if window[0] < self.window:
+            return
+
+        responses, errors, latency_sum, latencies = window
+        self._windows[key] = [0, 0, 0.0, 0]
+        stats = self.crawler.stats
+        if errors / responses > self.max_error_rate:
+            concurrency = max(1, slot.concurrency // 2)
+            stats.inc_value("adaptive_concurrency/decreased")
+        elif (
+            not errors
+            and latencies
+            and latency_sum / latencies < self.target_latency
+            and slot.concurrency < self.max_concurrency
+        ):
+            concurrency = slot.concurrency + 1
+            stats.inc_value("adaptive_concurrency/increased")
+        else:
+            return
+        self.crawler.spider.logger.debug(
+            "Download slot %s concurrency %d -> %d (%d errors in %d responses)",
+            key,
+            slot.concurrency,
+            concurrency,
+            errors,
+            responses,
+        )
+        slot.concurrency = concurrency
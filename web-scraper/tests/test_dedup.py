@@ -0,0 +1,159 @@
+import os
+import tempfile
+import unittest
+
+from scrapy.exceptions import DropItem
+from scrapy.statscollectors import MemoryStatsCollector
+from scrapy.utils.test import get_crawler
+
+from crawler.dedup import ContentIndex, bands, hamming, simhash, site
+from crawler.pipelines import DedupPipeline
+
+NAV = "Home | Students | Faculty | Contact"
+FOOTER = "University of Hawaii at Manoa, 2500 Campus Road, Honolulu"
+ARTICLE = " ".join(
+    f"Section {i} of the policy sets rule {i * 7 % 13} for program {i % 5}."
+    for i in range(40)
+)
+# One word changed: a different page for exact matching, the same for SimHash.
+NEAR = ARTICLE.replace("rule 3 ", "rule three ", 1)
+
+
+def page(body):
+    return f"{NAV}\n\n{body}\n\n{FOOTER}"
+
+
+def url(n):
+    return f"https://www.hawaii.edu/its/page-{n}"
+
+
+class TestContentIndex(unittest.TestCase):
+    def setUp(self):
+        self.index = ContentIndex(min_pages=3, max_distance=3)
+
+    def tearDown(self):
+        self.index.close()
+
+    def keep(self, page_url, text):
+        """
+        Run a page through the index like DedupPipeline, returning the kept
+        text or None if the page is dropped.
+        """
+        stripped, _ = self.index.strip_boilerplate(page_url, text)
+        if self.index.find_duplicate(page_url, stripped):
+            self.index.remove(page_url)
+            return None
+        self.index.record_blocks(page_url, text)
+        return stripped
+
+    def test_repeated_blocks_are_stripped(self):
+        for n in range(2):
+            self.assertEqual(
+                self.keep(url(n), page(f"Article {n}")), page(f"Article {n}")
+            )
+        # The third page of the site makes the navigation and footer boilerplate.
+        text, removed = self.index.strip_boilerplate(url(2), page("Article 2"))
+        self.assertEqual((text, removed), ("Article 2", 2))
+
+    def test_boilerplate_is_per_site(self):
+        for n in range(3):
+            self.keep(url(n), page(f"Article {n}"))
+        other = "https://www.hawaii.edu/admissions/apply"
+        text, removed = self.index.strip_boilerplate(other, page("Apply"))
+        self.assertEqual(removed, 0)
+
+    def test_exact_and_near_duplicates(self):
+        self.assertIsNotNone(self.keep(url(0), ARTICLE))
+        self.assertEqual(self.index.find_duplicate(url(1), ARTICLE), ("exact", url(0)))
+        self.assertEqual(self.index.find_duplicate(url(2), NEAR), ("near", url(0)))
+        different = "Tuition is due two weeks before the start of the semester."
+        self.assertIsNone(self.index.find_duplicate(url(3), different))
+
+    def test_duplicates_do_not_make_boilerplate(self):
+        # Mirrors of one article are dropped, so its text is not recorded
+        # as a block repeated across the site.
+        for n in range(4):
+            kept = self.keep(url(n), ARTICLE)
+            self.assertEqual(kept is not None, n == 0)
+        text, removed = self.index.strip_boilerplate(url(9), ARTICLE)
+        self.assertEqual((text, removed), (ARTICLE, 0))
+
+    def test_updated_page_is_not_its_own_duplicate(self):
+        self.keep(url(0), ARTICLE)
+        self.assertIsNone(self.index.find_duplicate(url(0), ARTICLE))
+        for _ in range(3):
+            self.assertEqual(self.keep(url(0), page("Article")), page("Article"))
+
+    def test_remove(self):
+        self.keep(url(0), ARTICLE)
+        self.index.remove(url(0))
+        self.assertIsNone(self.index.find_duplicate(url(1), ARTICLE))
+
+    def test_persisted_index_is_rebanded(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "content.sqlite")
+            index = ContentIndex(path, max_distance=3)
+            index.find_duplicate(url(0), ARTICLE)
+            index.close()
+
+            index = ContentIndex(path, max_distance=7)
+            self.assertEqual(index.find_duplicate(url(1), NEAR), ("near", url(0)))
+            index.close()
+
+
+class TestDedupPipeline(unittest.TestCase):
+    def setUp(self):
+        stats = MemoryStatsCollector(get_crawler())
+        self.pipeline = DedupPipeline(min_pages=3, stats=stats)
+        self.pipeline.open_spider(None)
+
+    def tearDown(self):
+        self.pipeline.close_spider(None)
+
+    def process(self, page_url, text):
+        return self.pipeline.process_item({"url": page_url, "extracted": text}, None)
+
+    def test_new_duplicate_is_dropped(self):
+        self.process(url(0), ARTICLE)
+        with self.assertRaises(DropItem):
+            self.process(url(1), NEAR)
+
+    def test_kept_page_turned_duplicate_is_deleted(self):
+        self.process(url(0), ARTICLE)
+        self.process(url(1), "Another article entirely.")
+        self.assertEqual(
+            self.process(url(1), NEAR), {"url": url(1), "change": "deleted"}
+        )
+        self.assertFalse(self.pipeline.index.contains(url(1)))
+
+    def test_kept_page_turned_empty_is_deleted(self):
+        self.process(url(0), ARTICLE)
+        self.assertEqual(
+            self.process(url(0), "   "), {"url": url(0), "change": "deleted"}
+        )
+        # Once deleted, it is new again.
+        with self.assertRaises(DropItem):
+            self.process(url(0), "   ")
+
+
+class TestFingerprints(unittest.TestCase):
+    def test_simhash_is_stable_under_small_edits(self):
+        self.assertLessEqual(hamming(simhash(ARTICLE), simhash(NEAR)), 3)
+        self.assertGreater(hamming(simhash(ARTICLE), simhash(NAV)), 3)
+
+    def test_bands_cover_the_fingerprint(self):
+        fingerprint = simhash(ARTICLE)
+        self.assertEqual(
+            sum(band << (16 * i) for i, band in enumerate(bands(fingerprint, 4))),
+            fingerprint,
+        )
+
+    def test_site(self):
+        self.assertEqual(
+            site("https://www.hawaii.edu/its/help/a"), "www.hawaii.edu/its"
+        )
+        self.assertEqual(site("https://manoa.hawaii.edu"), "manoa.hawaii.edu/")
+
+
+if __name__ == "__main__":
+    unittest.main()
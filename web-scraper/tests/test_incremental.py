@@ -0,0 +1,111 @@
+import tempfile
+import unittest
+
+from scrapy import Request, Spider, signals
+from scrapy.exceptions import DropItem
+from scrapy.http import HtmlResponse
+from scrapy.utils.test import get_crawler
+
+from crawler.incremental import (
+    ConditionalRequestMiddleware,
+    IncrementalSpiderMiddleware,
+    get_state,
+)
+
+
+class PdfSpider(Spider):
+    name = "pdf"
+
+    def parse_pdf(self, response):
+        pass
+
+
+class TestIncrementalPdfs(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.crawler = get_crawler(
+            PdfSpider,
+            {"INCREMENTAL_ENABLED": True, "INCREMENTAL_STATE_DIR": self.tmp_dir.name},
+        )
+        self.spider = self.crawler._create_spider()
+        self.state = get_state(self.crawler)
+        self.middleware = IncrementalSpiderMiddleware.from_crawler(self.crawler)
+
+    def tearDown(self):
+        self.state.close()
+        self.tmp_dir.cleanup()
+
+    def crawl(self, body):
+        url = "https://example.edu/policy.pdf"
+        request = Request(url, callback=self.spider.parse_pdf)
+        response = HtmlResponse(
+            url, body=body, headers={"ETag": '"v1"'}, request=request
+        )
+        items = [{"url": url, "pdf": body}]
+        return (
+            list(self.middleware.process_spider_output(response, items, self.spider)),
+            url,
+        )
+
+    def test_pdf_is_recorded_once_extracted(self):
+        [item], url = self.crawl(b"%PDF-1.4 text")
+        self.assertIsNone(self.state.get(url))
+        self.crawler.signals.send_catch_log(
+            signals.item_scraped, item=item, response=None, spider=self.spider
+        )
+        self.assertEqual(self.state.get(url)["etag"], '"v1"')
+
+        # Unchanged on the next run.
+        self.assertEqual(self.crawl(b"%PDF-1.4 text")[0], [])
+
+    def test_failed_pdf_is_parsed_again(self):
+        [item], url = self.crawl(b"%PDF-1.4 broken")
+        self.crawler.signals.send_catch_log(
+            signals.item_dropped,
+            item=item,
+            response=None,
+            exception=DropItem("no text"),
+            spider=self.spider,
+        )
+        self.assertIsNone(self.state.get(url))
+        [item], _ = self.crawl(b"%PDF-1.4 broken")
+        self.assertEqual(item["change"], "added")
+
+
+class TestConditionalRequests(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.crawler = get_crawler(
+            PdfSpider,
+            {"INCREMENTAL_ENABLED": True, "INCREMENTAL_STATE_DIR": self.tmp_dir.name},
+        )
+        self.spider = self.crawler._create_spider()
+        self.state = get_state(self.crawler)
+        self.middleware = ConditionalRequestMiddleware.from_crawler(self.crawler)
+        for url, depth in (("https://example.edu/", 0), ("https://example.edu/a", 1)):
+            self.state.update(url, None, depth, '"v1"', None, "hash")
+
+    def tearDown(self):
+        self.state.close()
+        self.tmp_dir.cleanup()
+
+    def request(self, url, depth):
+        request = Request(url, meta={"depth": depth})
+        self.middleware.process_request(request, self.spider)
+        return request
+
+    def test_start_pages_are_downloaded_in_full(self):
+        start = self.request("https://example.edu/", 0)
+        self.assertNotIn(b"If-None-Match", start.headers)
+        self.assertIn(404, start.meta["handle_httpstatus_list"])
+        page = self.request("https://example.edu/a", 1)
+        self.assertEqual(page.headers[b"If-None-Match"], b'"v1"')
+
+    def test_full_fetch_depth(self):
+        self.middleware.full_fetch_depth = -1
+        start = self.request("https://example.edu/", 0)
+        self.assertEqual(start.headers[b"If-None-Match"], b'"v1"')
+
+
+if __name__ == "__main__":
+    unittest.main()
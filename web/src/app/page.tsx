@@ -24,7 +24,7 @@ export default function Home() {
   const [messages, setMessages] = useState<ChatMessage[]>([default_message]);
   const [input, setInput] = useState("");
   const [loading, setLoading] = useState(false);
-  const [retriever] = useState<"general" | "askus" | "policies" | "graphdb">(
+  const [retriever] = useState<"general" | "askus" | "policies" | "graphdb" | "courses">(
     "general",
   );
   const messagesEndRef = useRef<HTMLDivElement>(null);
@@ -43,12 +43,16 @@ export default function Home() {
       setLoading(false);
     },
     onError: (error) => {
+      const code = error.data?.code;
       setMessages((prev) => [
         ...prev,
         {
           message: {
             type: "ai",
-            content: "Sorry, my services may be unavailable at this time.",
+            content:
+              code === "TOO_MANY_REQUESTS" || code === "SERVICE_UNAVAILABLE"
+                ? error.message
+                : "Sorry, my services may be unavailable at this time.",
           },
           sources: [],
         },
@@ -8,6 +8,9 @@ export const env = createEnv({
    */
   server: {
     NODE_ENV: z.enum(["development", "test", "production"]),
+    // Reverse proxies in front of the frontend that append the client's
+    // address to x-forwarded-for (e.g. nginx with $proxy_add_x_forwarded_for).
+    ASKUS_FRONTEND_PROXY_HOPS: z.coerce.number().int().min(1).default(1),
   },
 
   /**
@@ -25,6 +28,7 @@ export const env = createEnv({
    */
   runtimeEnv: {
     NODE_ENV: process.env.NODE_ENV,
+    ASKUS_FRONTEND_PROXY_HOPS: process.env.ASKUS_FRONTEND_PROXY_HOPS,
     // NEXT_PUBLIC_CLIENTVAR: process.env.NEXT_PUBLIC_CLIENTVAR,
   },
   /**
@@ -1,8 +1,53 @@
+import { TRPCError } from "@trpc/server";
 import { z } from "zod";
 
+import { env } from "~/env";
 import { createTRPCRouter, publicProcedure } from "~/server/api/trpc";
 import axios from "axios";
 
+/**
+ * Identify the browser behind a request for the API's per-client rate limit
+ * by the address the request came from, as recorded in `x-forwarded-for` by
+ * the reverse proxies in front of the frontend (ASKUS_FRONTEND_PROXY_HOPS of
+ * them). Entries further left were sent by the client itself, like any
+ * cookie or header, and would let it pick a new identity, and with it a new
+ * rate limit, for every request.
+ */
+function clientAddress(headers: Headers): string {
+  const hops = (headers.get("x-forwarded-for") ?? "")
+    .split(",")
+    .map((hop) => hop.trim())
+    .filter((hop) => hop.length > 0);
+  return (
+    hops[Math.max(hops.length - env.ASKUS_FRONTEND_PROXY_HOPS, 0)] ??
+    "anonymous"
+  );
+}
+
+/**
+ * Turn the API's rate limit and overload responses into errors the chat can
+ * show to the user.
+ */
+function apiError(error: unknown): unknown {
+  if (!axios.isAxiosError(error) || !error.response) {
+    return error;
+  }
+  const retryAfter = Number(error.response.headers["retry-after"]) || 5;
+  if (error.response.status === 429) {
+    return new TRPCError({
+      code: "TOO_MANY_REQUESTS",
+      message: `You are asking questions too quickly. Please wait ${retryAfter} seconds and try again.`,
+    });
+  }
+  if (error.response.status === 503) {
+    return new TRPCError({
+      code: "SERVICE_UNAVAILABLE",
+      message: `AskUs is busy right now. Please try again in ${retryAfter} seconds.`,
+    });
+  }
+  return error;
+}
+
 export const chatRouter = createTRPCRouter({
   response: publicProcedure
     .input(
@@ -10,7 +55,7 @@ export const chatRouter = createTRPCRouter({
         input: z.array(
           z.object({ type: z.enum(["human", "ai"]), content: z.string() }),
         ),
-        retriever: z.enum(["default", "askus", "policies", "graphdb", "general"]).default("default"),
+        retriever: z.enum(["default", "askus", "policies", "graphdb", "general", "courses"]).default("default"),
       }),
     )
     .output(
@@ -30,10 +75,17 @@ export const chatRouter = createTRPCRouter({
         },
       };
 
-      const response = await axios.post(
-        "http://localhost:8001/askus/invoke",
-        body,
-      );
+      const response = await axios
+        .post(
+          "http://localhost:8001/askus/invoke",
+          body,
+          // The API only trusts this header from the frontend's own address
+          // (ASKUS_TRUSTED_PROXIES).
+          { headers: { "x-client-id": clientAddress(ctx.headers) } },
+        )
+        .catch((error: unknown) => {
+          throw apiError(error);
+        });
 
       const sources = response.data.output.sources;
       const message = response.data.output.message;